@@ -0,0 +1,40 @@
+"""
+Load SAM function modules in-process for benchmarking
+"""
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FUNCTIONS_DIR = REPO_ROOT / 'infrastructure' / 'sam' / 'functions'
+# Lambda layers are mounted on the import path of every function
+LAYERS_DIR = REPO_ROOT / 'infrastructure' / 'sam' / 'layers'
+
+DEFAULT_ENV = {
+    'AWS_DEFAULT_REGION': 'ap-south-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'CONTENT_TABLE': 'SanchaarContent-bench',
+    'OUTPUT_BUCKET': 'sanchaar-output-bench',
+    'INGESTION_BUCKET': 'sanchaar-ingestion-bench'
+}
+
+
+def load_function(name, env=None):
+    """Import functions/<name>/app.py as a fresh module with its siblings importable"""
+    for key, value in {**DEFAULT_ENV, **(env or {})}.items():
+        os.environ.setdefault(key, value)
+
+    for layer_dir in sorted(LAYERS_DIR.iterdir()):
+        if layer_dir.is_dir() and str(layer_dir) not in sys.path:
+            sys.path.append(str(layer_dir))
+
+    function_dir = FUNCTIONS_DIR / name
+    if str(function_dir) not in sys.path:
+        sys.path.insert(0, str(function_dir))
+
+    spec = importlib.util.spec_from_file_location(f'{name}_app', function_dir / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,492 @@
+"""
+A small Amazon States Language interpreter for running the content pipeline
+state machine in-process
+
+Covers what content_pipeline.asl.json uses and a little more: Task, Pass,
+Choice, Map, Parallel, Wait, Succeed and Fail states; InputPath,
+Parameters / ItemSelector, ResultSelector, ResultPath and OutputPath; Retry
+and Catch; JSONPath with dotted names, ['name'], [n] and [*]; the context
+object ($$.Execution, $$.State, $$.Map.Item, $$.Task.Token); and the
+States.Format, States.StringToJson, States.JsonToString, States.Array,
+States.ArrayLength and States.UUID intrinsics.
+
+Task resources are callables keyed by resource ARN, called with the
+evaluated Parameters and the context object. For .waitForTaskToken the
+interpreter issues the token, calls the resource and waits until the
+token is settled through TaskTokens, which stands in for the Step
+Functions client. Timeouts, retry intervals and Wait states are
+multiplied by time_scale so a run does not sit out real back-off.
+"""
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from botocore.exceptions import ClientError
+
+WAIT_FOR_TASK_TOKEN = '.waitForTaskToken'
+# Terminal errors: States.ALL and States.TaskFailed do not match them
+TERMINAL_ERRORS = {'States.Runtime', 'States.DataLimitExceeded'}
+
+_PATH_TOKEN = re.compile(r"\.([^.\[]+)|\[(\d+|\*)\]|\['([^']*)'\]")
+
+
+class StatesError(Exception):
+    """An error raised inside an execution, matched by Retry and Catch"""
+
+    def __init__(self, error, cause=''):
+        super().__init__(f'{error}: {cause}')
+        self.error = error
+        self.cause = cause
+
+
+class TaskTokens:
+    """Step Functions client stand-in that settles task tokens issued by executions"""
+
+    def __init__(self):
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def issue(self):
+        token = uuid4().hex
+        with self._lock:
+            self._waiters[token] = {'event': threading.Event()}
+        return token
+
+    def wait(self, token, timeout=None):
+        waiter = self._waiters[token]
+        settled = waiter['event'].wait(timeout)
+        with self._lock:
+            self._waiters.pop(token, None)
+        if not settled:
+            raise StatesError('States.Timeout', 'Task token was not settled in time')
+        if 'error' in waiter:
+            raise StatesError(waiter['error'], waiter.get('cause', ''))
+        return waiter['output']
+
+    def settle(self, token, operation, **outcome):
+        with self._lock:
+            waiter = self._waiters.get(token)
+            if waiter is None or waiter['event'].is_set():
+                raise ClientError({'Error': {'Code': 'TaskDoesNotExist', 'Message': 'Task token is not waiting'}},
+                                  operation)
+            waiter.update(outcome)
+            waiter['event'].set()
+
+    def send_task_success(self, taskToken, output):
+        self.settle(taskToken, 'SendTaskSuccess', output=json.loads(output))
+
+    def send_task_failure(self, taskToken, error='', cause=''):
+        self.settle(taskToken, 'SendTaskFailure', error=error or 'States.TaskFailed', cause=cause)
+
+    def send_task_heartbeat(self, taskToken):
+        if taskToken not in self._waiters:
+            raise ClientError({'Error': {'Code': 'TaskDoesNotExist', 'Message': 'Task token is not waiting'}},
+                              'SendTaskHeartbeat')
+
+
+def lambda_invoke(functions):
+    """
+    Resource for arn:aws:states:::lambda:invoke: FunctionName -> handler.
+    The result has the Lambda Invoke response shape; an exception becomes a
+    task failure named after its type, as for a function error.
+    """
+    def invoke(parameters, context):
+        handler = functions[parameters['FunctionName']]
+        try:
+            payload = handler(parameters.get('Payload', {}), None)
+        except StatesError:
+            raise
+        except Exception as e:
+            raise StatesError(type(e).__name__, json.dumps({'errorMessage': str(e), 'errorType': type(e).__name__}))
+        return {'StatusCode': 200, 'ExecutedVersion': '$LATEST', 'Payload': payload}
+    return invoke
+
+
+def timestamp():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def parse_path(path):
+    if not path.startswith('$'):
+        raise StatesError('States.Runtime', f'Invalid path: {path}')
+    rest = path[2:] if path.startswith('$$') else path[1:]
+    tokens = []
+    position = 0
+    while position < len(rest):
+        match = _PATH_TOKEN.match(rest, position)
+        if not match:
+            raise StatesError('States.Runtime', f'Unsupported path: {path}')
+        name, index, quoted = match.groups()
+        tokens.append(quoted if quoted is not None else name if name is not None else
+                      '*' if index == '*' else int(index))
+        position = match.end()
+    return tokens
+
+
+def select(data, tokens, path):
+    for position, token in enumerate(tokens):
+        if token == '*':
+            if not isinstance(data, list):
+                raise StatesError('States.Runtime', f'{path} applies [*] to a non-array')
+            return [select(item, tokens[position + 1:], path) for item in data]
+        if isinstance(token, int):
+            if not isinstance(data, list) or token >= len(data):
+                raise StatesError('States.Runtime', f'{path} could not be found in the input')
+        elif not isinstance(data, dict) or token not in data:
+            raise StatesError('States.Runtime', f'{path} could not be found in the input')
+        data = data[token]
+    return data
+
+
+def get_path(data, path, context=None):
+    """Value at a JSONPath ($ for data, $$ for the context object)"""
+    if path.startswith('$$'):
+        return select(context or {}, parse_path(path), path)
+    return select(data, parse_path(path), path)
+
+
+def is_present(data, path, context=None):
+    try:
+        get_path(data, path, context)
+        return True
+    except StatesError:
+        return False
+
+
+def set_path(data, path, value):
+    """data with value placed at a reference path; '$' replaces it"""
+    tokens = parse_path(path)
+    if not tokens:
+        return value
+    result = json.loads(json.dumps(data)) if isinstance(data, dict) else {}
+    target = result
+    for token in tokens[:-1]:
+        if not isinstance(target.get(token), dict):
+            target[token] = {}
+        target = target[token]
+    target[tokens[-1]] = value
+    return result
+
+
+class IntrinsicParser:
+    """Recursive-descent parser for States.* intrinsic function calls"""
+
+    def __init__(self, text, data, context):
+        self.text = text
+        self.data = data
+        self.context = context
+        self.position = 0
+
+    def parse(self):
+        value = self.expression()
+        self.skip()
+        if self.position != len(self.text):
+            raise StatesError('States.Runtime', f'Trailing input in intrinsic: {self.text}')
+        return value
+
+    def skip(self):
+        while self.position < len(self.text) and self.text[self.position] == ' ':
+            self.position += 1
+
+    def expression(self):
+        self.skip()
+        text = self.text[self.position:]
+        if text.startswith("'"):
+            return self.string()
+        if text.startswith('$'):
+            match = re.match(r"\$\$?(?:\.[^.\[,) ]+|\[(?:\d+|\*)\]|\['[^']*'\])*", text)
+            self.position += match.end()
+            return get_path(self.data, match.group(0), self.context)
+        if text.startswith('States.'):
+            match = re.match(r'States\.(\w+)\(', text)
+            self.position += match.end()
+            arguments = []
+            self.skip()
+            if self.text[self.position] != ')':
+                while True:
+                    arguments.append(self.expression())
+                    self.skip()
+                    if self.text[self.position] == ',':
+                        self.position += 1
+                        continue
+                    break
+            self.position += 1
+            return call_intrinsic(match.group(1), arguments)
+        match = re.match(r'-?\d+(\.\d+)?|true|false|null', text)
+        if not match:
+            raise StatesError('States.Runtime', f'Cannot parse intrinsic: {self.text}')
+        self.position += match.end()
+        return json.loads(match.group(0))
+
+    def string(self):
+        self.position += 1
+        chars = []
+        while self.text[self.position] != "'":
+            if self.text[self.position] == '\\':
+                self.position += 1
+            chars.append(self.text[self.position])
+            self.position += 1
+        self.position += 1
+        return ''.join(chars)
+
+
+def call_intrinsic(name, arguments):
+    if name == 'Format':
+        template, values = arguments[0], iter(arguments[1:])
+        return re.sub(r'\{\}', lambda _: format_value(next(values)), template)
+    if name == 'StringToJson':
+        return json.loads(arguments[0])
+    if name == 'JsonToString':
+        return json.dumps(arguments[0], separators=(',', ':'), ensure_ascii=False)
+    if name == 'Array':
+        return list(arguments)
+    if name == 'ArrayLength':
+        return len(arguments[0])
+    if name == 'UUID':
+        return str(uuid4())
+    raise StatesError('States.Runtime', f'Unsupported intrinsic function: States.{name}')
+
+
+def format_value(value):
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def evaluate(template, data, context):
+    """A Parameters / ResultSelector template with its .$ fields resolved"""
+    if isinstance(template, dict):
+        result = {}
+        for key, value in template.items():
+            if key.endswith('.$'):
+                result[key[:-2]] = (IntrinsicParser(value, data, context).parse() if value.startswith('States.')
+                                    else get_path(data, value, context))
+            else:
+                result[key] = evaluate(value, data, context)
+        return result
+    if isinstance(template, list):
+        return [evaluate(value, data, context) for value in template]
+    return template
+
+
+def error_matches(names, error):
+    if error in names:
+        return True
+    if error in TERMINAL_ERRORS:
+        return False
+    return 'States.ALL' in names or ('States.TaskFailed' in names and error != 'States.Timeout')
+
+
+COMPARATORS = {
+    'StringEquals': lambda a, b: isinstance(a, str) and a == b,
+    'StringLessThan': lambda a, b: isinstance(a, str) and a < b,
+    'StringGreaterThan': lambda a, b: isinstance(a, str) and a > b,
+    'NumericEquals': lambda a, b: isinstance(a, (int, float)) and a == b,
+    'NumericLessThan': lambda a, b: isinstance(a, (int, float)) and a < b,
+    'NumericLessThanEquals': lambda a, b: isinstance(a, (int, float)) and a <= b,
+    'NumericGreaterThan': lambda a, b: isinstance(a, (int, float)) and a > b,
+    'NumericGreaterThanEquals': lambda a, b: isinstance(a, (int, float)) and a >= b,
+    'BooleanEquals': lambda a, b: isinstance(a, bool) and a == b,
+    'IsNull': lambda a, b: (a is None) == b,
+    'IsString': lambda a, b: isinstance(a, str) == b,
+    'IsNumeric': lambda a, b: (isinstance(a, (int, float)) and not isinstance(a, bool)) == b,
+    'IsBoolean': lambda a, b: isinstance(a, bool) == b
+}
+
+
+def choice_matches(rule, data, context):
+    if 'And' in rule:
+        return all(choice_matches(inner, data, context) for inner in rule['And'])
+    if 'Or' in rule:
+        return any(choice_matches(inner, data, context) for inner in rule['Or'])
+    if 'Not' in rule:
+        return not choice_matches(rule['Not'], data, context)
+    variable = rule['Variable']
+    if 'IsPresent' in rule:
+        return is_present(data, variable, context) == rule['IsPresent']
+    value = get_path(data, variable, context)
+    for name, compare in COMPARATORS.items():
+        if name in rule:
+            return compare(value, rule[name])
+        if f'{name}Path' in rule:
+            return compare(value, get_path(data, rule[f'{name}Path'], context))
+    raise StatesError('States.Runtime', f'Unsupported choice rule: {sorted(rule)}')
+
+
+class StateMachine:
+    """
+    Runs executions of one state machine definition. on_state, when given,
+    is called as on_state(state_name, state_type, started, duration_s, error)
+    after every state, including those inside Map and Parallel iterations.
+    """
+
+    def __init__(self, definition, resources, time_scale=1.0, on_state=None):
+        self.definition = definition
+        self.resources = resources
+        self.time_scale = time_scale
+        self.on_state = on_state
+        self.tokens = TaskTokens()
+
+    @classmethod
+    def from_file(cls, path, substitutions=None, **kwargs):
+        with open(path) as f:
+            text = f.read()
+        for name, value in (substitutions or {}).items():
+            text = text.replace('${' + name + '}', value)
+        return cls(json.loads(text), **kwargs)
+
+    def execute(self, execution_input, name=None):
+        """Run one execution to completion; returns its status, output or error and timing"""
+        name = name or uuid4().hex
+        context = {
+            'Execution': {'Id': f'arn:aws:states:local:000000000000:execution:pipeline:{name}',
+                          'Name': name, 'Input': execution_input, 'StartTime': timestamp()},
+            'StateMachine': {'Id': 'arn:aws:states:local:000000000000:stateMachine:pipeline', 'Name': 'pipeline'}
+        }
+        started = time.perf_counter()
+        try:
+            output = self.run(self.definition, execution_input, context)
+            result = {'status': 'SUCCEEDED', 'output': output}
+        except StatesError as e:
+            result = {'status': 'FAILED', 'error': e.error, 'cause': e.cause}
+        result['duration_s'] = time.perf_counter() - started
+        return result
+
+    def run(self, machine, data, context):
+        name = machine['StartAt']
+        while True:
+            state = machine['States'][name]
+            state_context = dict(context, State={'Name': name, 'EnteredTime': timestamp(), 'RetryCount': 0})
+            started = time.perf_counter()
+            error = None
+            try:
+                data, name = self.step(name, state, data, state_context)
+            except StatesError as e:
+                error = e.error
+                raise
+            finally:
+                if self.on_state:
+                    self.on_state(state_context['State']['Name'], state['Type'], started,
+                                  time.perf_counter() - started, error)
+            if name is None:
+                return data
+
+    def step(self, name, state, data, context):
+        """Run one state; returns (output, next state name or None at the end)"""
+        kind = state['Type']
+        if kind == 'Fail':
+            raise StatesError(state.get('Error', 'States.Fail'), state.get('Cause', ''))
+        if kind == 'Succeed':
+            return data, None
+
+        effective = get_path(data, state['InputPath'], context) if state.get('InputPath') else data
+        if kind == 'Choice':
+            for rule in state.get('Choices', []):
+                if choice_matches(rule, effective, context):
+                    return self.output(state, effective, context), rule['Next']
+            if 'Default' not in state:
+                raise StatesError('States.NoChoiceMatched', f'No choice rule matched in {name}')
+            return self.output(state, effective, context), state['Default']
+        if kind == 'Wait':
+            seconds = state.get('Seconds') or get_path(effective, state.get('SecondsPath', '$'), context)
+            time.sleep(seconds * self.time_scale)
+            return self.output(state, effective, context), self.next(state)
+
+        try:
+            result = self.attempt(name, state, effective, context)
+        except StatesError as e:
+            for catcher in state.get('Catch', []):
+                if error_matches(catcher['ErrorEquals'], e.error):
+                    error_output = {'Error': e.error, 'Cause': e.cause}
+                    return set_path(data, catcher.get('ResultPath', '$'), error_output), catcher['Next']
+            raise
+        if kind != 'Pass' and 'ResultSelector' in state:
+            result = evaluate(state['ResultSelector'], result, context)
+        if 'ResultPath' in state and state['ResultPath'] is None:
+            combined = data
+        else:
+            combined = set_path(data, state.get('ResultPath', '$'), result)
+        return self.output(state, combined, context), self.next(state)
+
+    def attempt(self, name, state, effective, context):
+        """Run the state's work, retrying per its Retry policy"""
+        attempts = {}
+        while True:
+            try:
+                return self.work(state, effective, context)
+            except StatesError as e:
+                retrier = next((index for index, retrier in enumerate(state.get('Retry', []))
+                                if error_matches(retrier['ErrorEquals'], e.error)), None)
+                if retrier is None:
+                    raise
+                policy = state['Retry'][retrier]
+                count = attempts.get(retrier, 0)
+                if count >= policy.get('MaxAttempts', 3):
+                    raise
+                attempts[retrier] = count + 1
+                context['State']['RetryCount'] += 1
+                delay = policy.get('IntervalSeconds', 1) * policy.get('BackoffRate', 2.0) ** count
+                time.sleep(min(delay, policy.get('MaxDelaySeconds', delay)) * self.time_scale)
+
+    def work(self, state, effective, context):
+        kind = state['Type']
+        if kind == 'Pass':
+            if 'Result' in state:
+                return state['Result']
+            return evaluate(state['Parameters'], effective, context) if 'Parameters' in state else effective
+        if kind == 'Task':
+            return self.task(state, effective, context)
+        if kind == 'Map':
+            return self.map(state, effective, context)
+        if kind == 'Parallel':
+            branches = state['Branches']
+            with ThreadPoolExecutor(max_workers=len(branches)) as executor:
+                return list(executor.map(lambda branch: self.run(branch, effective, context), branches))
+        raise StatesError('States.Runtime', f'Unsupported state type: {kind}')
+
+    def task(self, state, effective, context):
+        resource = state['Resource']
+        wait_for_token = resource.endswith(WAIT_FOR_TASK_TOKEN)
+        if wait_for_token:
+            resource = resource[:-len(WAIT_FOR_TASK_TOKEN)]
+            context = dict(context, Task={'Token': self.tokens.issue()})
+        if resource not in self.resources:
+            raise StatesError('States.Runtime', f'No local handler for resource {resource}')
+        parameters = evaluate(state['Parameters'], effective, context) if 'Parameters' in state else effective
+        result = self.resources[resource](parameters, context)
+        if not wait_for_token:
+            return result
+        timeout = state.get('TimeoutSeconds')
+        return self.tokens.wait(context['Task']['Token'], timeout * self.time_scale if timeout else None)
+
+    def map(self, state, effective, context):
+        items = get_path(effective, state.get('ItemsPath', '$'), context)
+        if not isinstance(items, list):
+            raise StatesError('States.Runtime', 'Map ItemsPath does not select an array')
+        processor = state.get('ItemProcessor') or state['Iterator']
+        selector = state.get('ItemSelector') or state.get('Parameters')
+
+        def iterate(indexed):
+            index, value = indexed
+            item_context = dict(context, Map={'Item': {'Index': index, 'Value': value}})
+            item_input = evaluate(selector, effective, item_context) if selector else value
+            return self.run(processor, item_input, item_context)
+
+        if not items:
+            return []
+        workers = min(state.get('MaxConcurrency') or len(items), len(items))
+        if workers == 1:
+            return [iterate(indexed) for indexed in enumerate(items)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(iterate, enumerate(items)))
+
+    def output(self, state, data, context):
+        if 'OutputPath' in state:
+            return None if state['OutputPath'] is None else get_path(data, state['OutputPath'], context)
+        return data
+
+    @staticmethod
+    def next(state):
+        return None if state.get('End') else state['Next']
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark the global admission scheduler against moto DynamoDB with a
+local Step Functions stand-in: a burst of executions, each transcreating
+into several languages, competing for the account's transcreation slots.
+
+Reports queue wait per priority class, peak and mean utilisation of the
+slots, and the concurrency the static per-execution Map limits would have
+put on the account for the same burst.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, load_function
+
+TABLE = 'SanchaarAdmission-bench'
+STATIC_MAX_CONCURRENCY = 10
+
+
+class SerialClient:
+    """moto is not thread-safe under concurrent transactions; one call at a time"""
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return method(*args, **kwargs)
+        return call
+
+
+class LocalStepFunctions:
+    """
+    Step Functions stand-in: a granted task token starts the agent call,
+    which holds its slot for the service time and then releases it
+    """
+
+    def __init__(self, app, service_time, workers):
+        self.app = app
+        self.service_time = service_time
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.requests = {}
+        self.in_flight = 0
+        self.peak = 0
+        self.busy_area = 0.0
+        self.last_change = None
+        self.done = threading.Event()
+        self.remaining = 0
+        self._lock = threading.Lock()
+
+    def track(self, delta):
+        now = time.perf_counter()
+        with self._lock:
+            if self.last_change is not None:
+                self.busy_area += self.in_flight * (now - self.last_change)
+            self.last_change = now
+            self.in_flight += delta
+            self.peak = max(self.peak, self.in_flight)
+
+    def send_task_success(self, taskToken, output):
+        request = self.requests[taskToken]
+        if 'granted_at' in request:
+            raise ClientError({'Error': {'Code': 'InvalidToken', 'Message': 'Task already settled'}},
+                              'SendTaskSuccess')
+        request['granted_at'] = time.perf_counter()
+        self.track(1)
+        self.executor.submit(self.run, request, json.loads(output))
+
+    def run(self, request, lease):
+        time.sleep(self.service_time())
+        self.track(-1)
+        self.app.release_handler({'lease': lease}, None)
+        with self._lock:
+            self.remaining -= 1
+            if not self.remaining:
+                self.done.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the global admission scheduler')
+    parser.add_argument('--executions', type=int, default=20)
+    parser.add_argument('--languages', type=int, default=10, help='Transcreation requests per execution')
+    parser.add_argument('--capacity', type=int, default=20)
+    parser.add_argument('--service-ms', type=float, nargs=2, default=[200, 600], help='Agent call time range')
+    parser.add_argument('--mix', default='breaking_news:0.1,standard:0.6,evergreen:0.3')
+    parser.add_argument('--workers', type=int, default=128)
+    args = parser.parse_args()
+
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ['ADMISSION_TABLE'] = TABLE
+    os.environ['ADMISSION_CAPACITY'] = json.dumps({'transcreation': args.capacity, 'encode': 20})
+    rng = random.Random(9)
+    classes, weights = zip(*((name, float(share)) for name, share in
+                             (pair.split(':') for pair in args.mix.split(','))))
+
+    with mock_aws():
+        boto3.client('dynamodb').create_table(
+            TableName=TABLE,
+            BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[
+                {'AttributeName': 'resource', 'AttributeType': 'S'},
+                {'AttributeName': 'slot', 'AttributeType': 'S'}
+            ],
+            KeySchema=[
+                {'AttributeName': 'resource', 'KeyType': 'HASH'},
+                {'AttributeName': 'slot', 'KeyType': 'RANGE'}
+            ]
+        )
+        app = load_function('admission')
+        from sanchaar_common import admission
+        stepfunctions = LocalStepFunctions(app, lambda: rng.uniform(*args.service_ms) / 1000, args.workers)
+        admission._clients['stepfunctions'] = stepfunctions
+        admission._clients['dynamodb'] = SerialClient(boto3.client('dynamodb'))
+
+        priorities = [rng.choices(classes, weights)[0] for _ in range(args.executions)]
+        stepfunctions.remaining = args.executions * args.languages
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as submitters:
+            def submit(number):
+                for language in range(args.languages):
+                    token = f'token-{number}-{language}'
+                    stepfunctions.requests[token] = {'priority': priorities[number], 'enqueued': time.perf_counter()}
+                    app.acquire_handler({'resource': 'transcreation', 'priority': priorities[number],
+                                         'task_token': token}, None)
+            list(submitters.map(submit, range(args.executions)))
+        stepfunctions.done.wait(timeout=600)
+        elapsed = time.perf_counter() - started
+        stepfunctions.executor.shutdown()
+        final = admission.stats('transcreation')
+
+    waits = {}
+    for request in stepfunctions.requests.values():
+        waits.setdefault(request['priority'], []).append((request['granted_at'] - request['enqueued']) * 1000)
+    print(json.dumps({
+        'requests': len(stepfunctions.requests),
+        'capacity': args.capacity,
+        'peak_in_flight': stepfunctions.peak,
+        'mean_utilisation': round(stepfunctions.busy_area / elapsed / args.capacity, 3),
+        'makespan_s': round(elapsed, 2),
+        'queue_wait_p50_ms': {name: round(statistics.median(values), 1) for name, values in sorted(waits.items())},
+        'queue_wait_p95_ms': {name: round(sorted(values)[int(len(values) * 0.95) - 1], 1)
+                              for name, values in sorted(waits.items())},
+        'static_limits_peak_concurrency': args.executions * min(args.languages, STATIC_MAX_CONCURRENCY),
+        'final_in_flight': final['in_flight'],
+        'final_queued': final['queued']
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
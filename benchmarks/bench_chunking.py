@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark chunked transcription planning and stitching on a synthetic
+recording, checking the stitched transcript against the ground truth
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from _lambda import FUNCTIONS_DIR
+
+sys.path.insert(0, str(FUNCTIONS_DIR / 'voice_processor'))
+
+from chunking import plan_chunks, stitch_transcripts  # noqa: E402
+
+VOCABULARY = ['namaste', 'hamare', 'naye', 'utpaad', 'mein', 'aapka', 'swagat', 'hai', 'yeh',
+              'aapke', 'jeevan', 'ko', 'badal', 'dega', 'bharat', 'ke', 'liye', 'bana']
+
+
+def synthetic_recording(minutes, seed=11):
+    """Two-speaker ground truth items plus the silences an analyzer would find"""
+    rng = random.Random(seed)
+    items, silences = [], []
+    clock, speaker = 0.0, 0
+    while clock < minutes * 60:
+        for _ in range(rng.randint(8, 40)):
+            duration = rng.uniform(0.2, 0.5)
+            items.append({'type': 'pronunciation', 'start': clock, 'end': clock + duration,
+                          'content': rng.choice(VOCABULARY), 'speaker': speaker})
+            clock += duration + rng.uniform(0.02, 0.12)
+        items.append({'type': 'punctuation', 'content': '.'})
+        pause = rng.uniform(0.5, 2.0)
+        silences.append((clock, clock + pause))
+        clock += pause
+        if rng.random() < 0.3:
+            speaker = 1 - speaker
+    return clock, items, silences
+
+
+def chunk_document(chunk, items, rng):
+    """What Transcribe returns for one chunk: relative times, its own speaker numbering"""
+    relabel = rng.random() < 0.5
+    output, inside = [], False
+    for item in items:
+        if item['type'] == 'punctuation':
+            if inside:
+                output.append({'type': 'punctuation', 'alternatives': [{'content': item['content']}]})
+            continue
+        inside = chunk['start'] <= item['start'] and item['end'] <= chunk['end']
+        if inside:
+            jitter = rng.uniform(-0.04, 0.04)
+            speaker = 1 - item['speaker'] if relabel else item['speaker']
+            output.append({
+                'type': 'pronunciation',
+                'start_time': f"{max(item['start'] - chunk['start'] + jitter, 0):.3f}",
+                'end_time': f"{item['end'] - chunk['start'] + jitter:.3f}",
+                'alternatives': [{'confidence': '0.99', 'content': item['content']}],
+                'speaker_label': f'spk_{speaker}'
+            })
+    return {'results': {'items': output}, 'status': 'COMPLETED'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chunked transcription split/stitch')
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--realtime-factor', type=float, default=0.35,
+                        help='Modelled Transcribe turnaround per second of audio')
+    args = parser.parse_args()
+
+    duration, items, silences = synthetic_recording(args.minutes)
+    rng = random.Random(3)
+
+    started = time.perf_counter()
+    chunks = plan_chunks(duration, silences)
+    documents = [chunk_document(chunk, items, rng) for chunk in chunks]
+    planned = time.perf_counter()
+    stitched = stitch_transcripts(chunks, documents, 'sanchaar-bench')
+    finished = time.perf_counter()
+
+    truth = [item for item in items if item['type'] == 'pronunciation']
+    words = [item for item in stitched['results']['items'] if item['type'] == 'pronunciation']
+    same_words = [w['alternatives'][0]['content'] for w in words] == [t['content'] for t in truth]
+    speaker_agreement = None
+    if same_words:
+        pairs = {(t['speaker'], w['speaker_label']) for t, w in zip(truth, words)}
+        speaker_agreement = len(pairs) == len({t['speaker'] for t in truth})
+    max_error = max((abs(float(w['start_time']) - t['start']) for t, w in zip(truth, words)), default=0)
+
+    longest = max(chunk['end'] - chunk['start'] for chunk in chunks)
+    print(json.dumps({
+        'audio_minutes': round(duration / 60, 1),
+        'chunks': len(chunks),
+        'longest_chunk_seconds': round(longest, 1),
+        'plan_and_fixture_seconds': round(planned - started, 3),
+        'stitch_seconds': round(finished - planned, 3),
+        'words': len(truth),
+        'stitched_words_match': same_words,
+        'speakers_consistent': speaker_agreement,
+        'max_timestamp_error_seconds': round(max_error, 3),
+        'modelled_turnaround_minutes': {
+            'whole_file': round(duration * args.realtime_factor / 60, 1),
+            'chunked': round(longest * args.realtime_factor / 60, 1)
+        }
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark claim-check offloading of the content pipeline state against moto:
+the execution state after DistributionFanout with everything inline versus
+with the bulky fields offloaded the way the functions offload them
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, LAYERS_DIR
+
+sys.path.insert(0, str(LAYERS_DIR / 'common'))
+
+from sanchaar_common import claim_check  # noqa: E402
+
+STATE_LIMIT_BYTES = 256 * 1024
+LANGUAGES = ['hi', 'ta', 'te', 'bn', 'mr', 'gu', 'kn', 'ml', 'pa', 'or']
+RATIOS = ['9:16', '1:1', '16:9']
+PLATFORMS = ['whatsapp', 'sharechat', 'instagram']
+
+
+def transcreations(words):
+    return [{'language': language, 'Completion': ' '.join(f'शब्द{i}' for i in range(words)),
+             'usage': {'inputTokens': 1100, 'outputTokens': 300}} for language in LANGUAGES]
+
+
+def media_output(ratio, cues):
+    tracks = [{'language': language, 'srt': f's3://out/subtitles/{language}.srt',
+               'vtt': f's3://out/subtitles/{language}.vtt',
+               'cues': [{'start': i * 2.0, 'end': i * 2.0 + 1.8, 'text': f'पंक्ति {i}'} for i in range(cues)]}
+              for language in LANGUAGES]
+    analysis = {'safe_for_distribution': True,
+                'keyframes': [{'timestamp': i, 'labels': [{'Name': f'label-{j}', 'Confidence': 97.5}
+                                                          for j in range(20)]} for i in range(5)]}
+    return {
+        'job_id': '1700000000000-abcdef',
+        'aspect_ratios': [ratio],
+        'outputs': {ratio: f's3://out/{ratio}/video.mp4'},
+        'streaming_manifests': {ratio: f's3://out/{ratio}/index.m3u8'},
+        'subtitles': tracks,
+        'content_analysis': analysis
+    }
+
+
+def distribution_result(platform, recipients):
+    rows = [{'language': language, 'recipient': f'+91{9000000000 + n}', 'status': 'sent',
+             'message_id': f'wamid.{platform}.{language}.{n:06d}'}
+            for language in LANGUAGES for n in range(recipients)]
+    return {'platform': platform, 'status': 'delivered', 'result': rows}
+
+
+def build_state(offload, args):
+    """Execution state as the Lambdas now return it (offload) or as before (identity)"""
+    return {
+        'content_id': 'c0ffee00-0000-4000-8000-000000000000',
+        'transcreations': offload(transcreations(args.words), 'transcreations'),
+        'media_outputs': [{'Payload': {'statusCode': 200, 'body': json.dumps(dict(
+            media_output(ratio, args.cues),
+            subtitles=offload(media_output(ratio, args.cues)['subtitles'], 'subtitles'),
+            content_analysis=offload(media_output(ratio, args.cues)['content_analysis'], 'content-analysis')
+        ), ensure_ascii=False)}} for ratio in RATIOS],
+        'distribution_results': [{'Payload': {'statusCode': 200, 'body': json.dumps(dict(
+            distribution_result(platform, args.recipients),
+            result=offload(distribution_result(platform, args.recipients)['result'], 'distribution-results')
+        ))}} for platform in PLATFORMS]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark claim-check offloading of the pipeline state')
+    parser.add_argument('--words', type=int, default=400, help='Words per transcreation')
+    parser.add_argument('--cues', type=int, default=60, help='Subtitle cues per language')
+    parser.add_argument('--recipients', type=int, default=50, help='Recipients per language and platform')
+    parser.add_argument('--transitions', type=int, default=8, help='States the payload is copied through')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    with mock_aws():
+        boto3.client('s3').create_bucket(
+            Bucket=DEFAULT_ENV['OUTPUT_BUCKET'],
+            CreateBucketConfiguration={'LocationConstraint': DEFAULT_ENV['AWS_DEFAULT_REGION']}
+        )
+        claim_check.CLAIM_CHECK_BUCKET = DEFAULT_ENV['OUTPUT_BUCKET']
+
+        inline = len(claim_check.encode(build_state(lambda value, namespace: value, args)))
+        started = time.perf_counter()
+        state = build_state(claim_check.offload, args)
+        offload_ms = (time.perf_counter() - started) * 1000
+        offloaded = len(claim_check.encode(state))
+
+        # Cold resolves, as a downstream function in a fresh container would do them
+        latencies = []
+        for _ in range(args.repeat):
+            claim_check._resolved.clear()
+            started = time.perf_counter()
+            claim_check.resolve(state['transcreations'])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        stored = sum(obj['Size'] for obj in boto3.client('s3').list_objects_v2(
+            Bucket=DEFAULT_ENV['OUTPUT_BUCKET'], Prefix=claim_check.CLAIM_CHECK_PREFIX).get('Contents', []))
+
+    print(json.dumps({
+        'state_bytes_inline': inline,
+        'state_bytes_offloaded': offloaded,
+        'inline_over_limit': inline > STATE_LIMIT_BYTES,
+        'bytes_copied_inline': inline * args.transitions,
+        'bytes_copied_offloaded': offloaded * args.transitions,
+        's3_bytes_compressed': stored,
+        'offload_ms': round(offload_ms, 1),
+        'resolve_p50_ms': round(statistics.median(latencies), 2)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
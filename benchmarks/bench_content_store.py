@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark content records against moto: round-trip equality, item counts
+and stored bytes of the compressed, chunked layout versus the old
+LogResults layout (payloads as JSON strings in one item), and write/read
+latency, for gzip and, when installed, zstd
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, LAYERS_DIR
+
+sys.path.insert(0, str(LAYERS_DIR / 'common'))
+
+from sanchaar_common import content_store  # noqa: E402
+
+ITEM_LIMIT_BYTES = 400 * 1024
+LANGUAGES = ['hi', 'ta', 'te', 'bn', 'mr', 'gu', 'kn', 'ml', 'pa', 'or']
+PLATFORMS = ['whatsapp', 'sharechat', 'instagram']
+WORDS = ['त्योहार', 'सेल', 'ऑफर', 'நன்றி', 'பண்டிகை', 'పండుగ', 'উৎসব', 'ഓണം', 'ਵਧਾਈ', 'ଉତ୍ସବ',
+         'नवीन', 'collection', 'free', 'delivery', 'आज', 'कल', 'family', 'gift']
+
+
+def build_record(recipients, words, seed=5):
+    rng = random.Random(seed)
+    transcreations = [{'language': language,
+                       'Completion': ' '.join(rng.choice(WORDS) for _ in range(words)),
+                       'usage': {'inputTokens': rng.randrange(900, 1400), 'outputTokens': rng.randrange(200, 400)}}
+                      for language in LANGUAGES]
+    distribution_results = [{
+        'platform': platform,
+        'status': 'delivered',
+        'statusCode': 200,
+        'result': [{'language': language, 'recipient': f'+91{rng.randrange(6000000000, 9999999999)}',
+                    'status': rng.choice(['sent', 'sent', 'sent', 'failed']),
+                    'message_id': f'wamid.{rng.getrandbits(96):024x}'}
+                   for language in LANGUAGES for _ in range(recipients)]
+    } for platform in PLATFORMS]
+    return {'transcreations': transcreations, 'distribution_results': distribution_results}
+
+
+def legacy_item_bytes(payloads):
+    """Size of the item the old LogResults putItem wrote"""
+    item = {name: json.dumps(value) for name, value in payloads.items()}
+    return sum(len(name) + len(value.encode('utf-8')) for name, value in item.items())
+
+
+def stored_item_bytes(client, table, content_id):
+    """Item count and DynamoDB-style size (attribute names plus values) of a record"""
+    items = client.query(TableName=table, KeyConditionExpression='content_id = :id',
+                         ExpressionAttributeValues={':id': {'S': content_id}})['Items']
+    size = 0
+    for item in items:
+        for name, value in item.items():
+            (kind, data), = value.items()
+            size += len(name) + (len(data) if kind == 'B' else len(str(data).encode('utf-8')))
+    return len(items), size
+
+
+def create_table(table):
+    boto3.client('dynamodb').create_table(
+        TableName=table,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'content_id', 'AttributeType': 'S'},
+            {'AttributeName': 'version', 'AttributeType': 'N'}
+        ],
+        KeySchema=[
+            {'AttributeName': 'content_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'version', 'KeyType': 'RANGE'}
+        ]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compressed, chunked content records')
+    parser.add_argument('--recipients', type=int, nargs='+', default=[5, 100, 1000, 5000],
+                        help='Recipients per language and platform, one record size per value')
+    parser.add_argument('--words', type=int, default=300, help='Words per transcreation')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    table = DEFAULT_ENV['CONTENT_TABLE']
+    bucket = DEFAULT_ENV['OUTPUT_BUCKET']
+    codecs = {'gzip': content_store.CODEC_GZIP}
+    if content_store.zstandard:
+        codecs['zstd'] = content_store.CODEC_ZSTD
+
+    rows = []
+    with mock_aws():
+        client = boto3.client('dynamodb')
+        boto3.client('s3').create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={'LocationConstraint': DEFAULT_ENV['AWS_DEFAULT_REGION']}
+        )
+        create_table(table)
+        for recipients in args.recipients:
+            payloads = build_record(recipients, args.words)
+            legacy = legacy_item_bytes(payloads)
+            for codec_name, codec in codecs.items():
+                store = content_store.ContentStore(table, client=client, bucket=bucket, codec=codec)
+                content_id = f'content-{recipients}-{codec_name}'
+                version = 1700000000
+                attributes = {'status': 'completed', 'created_at': '2026-10-18T00:00:00Z', 'user_id': 'bench'}
+                writes = []
+                reads = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    summary = store.put_record(content_id, version, attributes, payloads)
+                    writes.append((time.perf_counter() - started) * 1000)
+                    started = time.perf_counter()
+                    record = store.get_record(content_id, version)
+                    reads.append((time.perf_counter() - started) * 1000)
+                assert {name: record[name] for name in payloads} == payloads, 'round trip changed the record'
+                assert record['user_id'] == 'bench' and record['status'] == 'completed'
+                assert store.latest_version(content_id) == version
+                items, stored = stored_item_bytes(client, table, content_id)
+                overflow = sum(placement.get('bytes', 0) for placement in summary['layout'].values()
+                               if 's3' in placement)
+                rows.append({
+                    'recipients': recipients,
+                    'codec': codec_name,
+                    'legacy_item_bytes': legacy,
+                    'legacy_fits': legacy <= ITEM_LIMIT_BYTES,
+                    'items': items,
+                    'dynamodb_bytes': stored,
+                    's3_bytes': overflow,
+                    'ratio': round(legacy / (stored + overflow), 1),
+                    'placement': {name: next(iter(placement)) for name, placement in summary['layout'].items()},
+                    'write_p50_ms': round(statistics.median(writes), 1),
+                    'read_p50_ms': round(statistics.median(reads), 1)
+                })
+
+    print(json.dumps(rows, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark platform_distributor delivery against a local stub HTTP server
+"""
+import argparse
+import json
+import os
+import time
+
+from stub_servers import StubPlatformServer
+from _lambda import load_function
+
+
+def make_variants(count):
+    languages = ['hi', 'ta', 'te', 'bn', 'mr', 'gu', 'kn', 'ml', 'pa', 'or']
+    return [{
+        'language': languages[i % len(languages)],
+        'recipient': f'91{9000000000 + i}',
+        'text': f'Sanchaar benchmark variant {i}',
+        'hashtags': ['#sanchaar']
+    } for i in range(count)]
+
+
+def run(app, platform, variants, max_in_flight):
+    event = {
+        'platform': platform,
+        'content_variants': variants,
+        'media_urls': {'9:16': 'https://cdn.example.com/9:16/video.mp4'},
+        'max_in_flight': max_in_flight
+    }
+    started = time.perf_counter()
+    response = app.lambda_handler(event, None)
+    elapsed = time.perf_counter() - started
+    body = json.loads(response['body'])
+    return elapsed, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the platform delivery engine')
+    parser.add_argument('--platform', default='whatsapp', choices=['whatsapp', 'sharechat', 'instagram'])
+    parser.add_argument('--variants', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub latency per request (s)')
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--rate-limits', default=None, help='RATE_LIMITS JSON passed to the distributor')
+    args = parser.parse_args()
+
+    if args.rate_limits:
+        os.environ['RATE_LIMITS'] = args.rate_limits
+    os.environ.setdefault('DELIVERY_BACKOFF_BASE_SECONDS', '0.05')
+
+    server = StubPlatformServer(
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after
+    )
+    with server:
+        for name in ('WHATSAPP_API_URL', 'SHARECHAT_API_URL', 'INSTAGRAM_API_URL'):
+            os.environ[name] = server.url
+        app = load_function('platform_distributor')
+        variants = make_variants(args.variants)
+
+        report = []
+        for in_flight in args.in_flight:
+            server.requests = server.connections = 0
+            elapsed, body = run(app, args.platform, variants, in_flight)
+            report.append({
+                'platform': args.platform,
+                'max_in_flight': in_flight,
+                'variants': len(variants),
+                'status': body.get('status'),
+                'seconds': round(elapsed, 3),
+                'variants_per_second': round(len(variants) / elapsed, 1),
+                'requests': server.requests,
+                'new_connections': server.connections,
+                'failed': sum(1 for row in body.get('result', []) if row.get('status') != 200),
+                'throttle_wait_ms': sum(row.get('throttle_wait_ms', 0) for row in body.get('result', []))
+            })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark reindexing the knowledge base corpus with the embedding cache:
+a cold load, a full reload after editing a share of the passages, and a
+reload with a cache too small to hold the corpus
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from _lambda import REPO_ROOT
+from bench_kb_ingest import write_corpus
+from stub_servers import StubOpenSearchServer
+
+sys.path.insert(0, str(REPO_ROOT / 'scripts'))
+
+from embedding_cache import CachedEmbedder, EmbeddingCache  # noqa: E402
+from kb_ingest import FakeEmbedder, INDEX_TEXT_FIELDS, build_client, ingest  # noqa: E402
+
+
+class CountingEmbedder(FakeEmbedder):
+    """Counts the texts that reach the (fake) model"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.embedded = 0
+        self.lock = threading.Lock()
+
+    def embed(self, texts):
+        with self.lock:
+            self.embedded += len(texts)
+        return super().embed(texts)
+
+
+def edit_corpus(root, fraction, seed=3):
+    """Rewrite a fraction of the passages in every uncompressed corpus file"""
+    rng = random.Random(seed)
+    edited = 0
+    for index_name, field in INDEX_TEXT_FIELDS.items():
+        for path in sorted((root / index_name).glob('*.jsonl')):
+            documents = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+            for number, document in enumerate(documents):
+                if rng.random() < fraction:
+                    document[field] = f'{document[field]} (revised {number})'
+                    edited += 1
+            path.write_text(''.join(json.dumps(d, ensure_ascii=False) + '\n' for d in documents),
+                            encoding='utf-8')
+    return edited
+
+
+def run(corpus, workdir, name, cache_dir, args, max_entries=1_000_000):
+    embedder = CountingEmbedder(dimension=args.dimension, latency=args.embed_latency)
+    cached = CachedEmbedder(embedder, EmbeddingCache(cache_dir, embedder.model_id, args.dimension,
+                                                     dtype=args.dtype, max_entries=max_entries))
+    with StubOpenSearchServer(latency=args.bulk_latency) as server:
+        summary = ingest(corpus, build_client(server.url), cached, Path(workdir) / f'checkpoint-{name}.json',
+                         batch_size=args.batch_size, max_in_flight=4, report_every=60)
+    print(json.dumps({'run': name, 'embedded_texts': embedder.embedded, **summary}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the embedding cache during reindexing')
+    parser.add_argument('--documents-per-file', type=int, default=2000)
+    parser.add_argument('--files-per-index', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--edit-fraction', type=float, default=0.05)
+    parser.add_argument('--embed-latency', type=float, default=0.02, help='Fake embedding latency per batch (s)')
+    parser.add_argument('--bulk-latency', type=float, default=0.005, help='Stub _bulk latency (s)')
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default='float16')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = Path(workdir) / 'corpus'
+        total = write_corpus(corpus, args.documents_per_file, args.files_per_index)
+        cache_dir = Path(workdir) / 'cache'
+        print(json.dumps({'corpus_documents': total}))
+
+        run(corpus, workdir, 'cold', cache_dir, args)
+        run(corpus, workdir, 'unchanged', cache_dir, args)
+        edited = edit_corpus(corpus, args.edit_fraction)
+        print(json.dumps({'edited_passages': edited}))
+        run(corpus, workdir, 'edited', cache_dir, args)
+        # A cache capped below the corpus size keeps working and evicts the least recently used rows
+        run(corpus, workdir, 'bounded', Path(workdir) / 'small-cache', args, max_entries=total // 4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark voice_processor ingestion of an upload burst against moto:
+one invocation per EventBridge event versus SQS batches
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+import boto3
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, load_function
+
+
+def upload_event(bucket, index):
+    return {
+        'source': 'aws.s3',
+        'detail-type': 'Object Created',
+        'time': '2024-06-01T10:00:00Z',
+        'detail': {
+            'bucket': {'name': bucket},
+            'object': {
+                'key': f'voice-commands/user-{index % 50}/command-{index}.mp3',
+                'etag': uuid.UUID(int=index).hex,
+                'sequencer': f'{index:016X}'
+            }
+        }
+    }
+
+
+def sqs_batches(events, batch_size, redelivery_rate):
+    """Wrap events as SQS records, redelivering a fraction of them"""
+    records = [{'messageId': str(uuid.uuid4()), 'body': json.dumps(event)} for event in events]
+    redelivered = records[:int(len(records) * redelivery_rate)]
+    records += [dict(record, messageId=str(uuid.uuid4())) for record in redelivered]
+    for start in range(0, len(records), batch_size):
+        yield {'Records': records[start:start + batch_size]}
+
+
+def create_resources(bucket, table_name):
+    boto3.client('s3').create_bucket(
+        Bucket=bucket,
+        CreateBucketConfiguration={'LocationConstraint': DEFAULT_ENV['AWS_DEFAULT_REGION']}
+    )
+    boto3.client('dynamodb').create_table(
+        TableName=table_name,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'content_id', 'AttributeType': 'S'},
+            {'AttributeName': 'version', 'AttributeType': 'N'}
+        ],
+        KeySchema=[
+            {'AttributeName': 'content_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'version', 'KeyType': 'RANGE'}
+        ]
+    )
+
+
+def count_state(table_name):
+    items = boto3.client('dynamodb').scan(TableName=table_name, Select='COUNT')['Count']
+    jobs = 0
+    paginator_args = {'MaxResults': 100}
+    client = boto3.client('transcribe')
+    while True:
+        page = client.list_transcription_jobs(**paginator_args)
+        jobs += len(page['TranscriptionJobSummaries'])
+        if not page.get('NextToken'):
+            return items, jobs
+        paginator_args['NextToken'] = page['NextToken']
+
+
+def run(mode, uploads, batch_size, redelivery_rate):
+    bucket = 'sanchaar-ingestion-bench'
+    with mock_aws():
+        create_resources(bucket, DEFAULT_ENV['CONTENT_TABLE'])
+        app = load_function('voice_processor')
+        events = [upload_event(bucket, index) for index in range(uploads)]
+        redelivered = events[:int(len(events) * redelivery_rate)]
+
+        started = time.perf_counter()
+        invocations = 0
+        failures = 0
+        if mode == 'per_event':
+            for event in events + redelivered:
+                invocations += 1
+                failures += app.lambda_handler(event, None)['statusCode'] != 200
+        else:
+            for batch in sqs_batches(events, batch_size, redelivery_rate):
+                invocations += 1
+                failures += len(app.batch_handler(batch, None)['batchItemFailures'])
+        elapsed = time.perf_counter() - started
+
+        items, jobs = count_state(DEFAULT_ENV['CONTENT_TABLE'])
+        return {
+            'mode': mode,
+            'uploads': uploads,
+            'invocations': invocations,
+            'seconds': round(elapsed, 3),
+            'failures': failures,
+            'metadata_items': items,
+            'transcription_jobs': jobs
+        }
+
+
+def main():
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+
+    parser = argparse.ArgumentParser(description='Benchmark burst ingestion modes')
+    parser.add_argument('--uploads', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--redelivery-rate', type=float, default=0.1,
+                        help='Fraction of events delivered twice')
+    args = parser.parse_args()
+
+    for mode in ('per_event', 'batch'):
+        print(json.dumps(run(mode, args.uploads, args.batch_size, args.redelivery_rate)))
+
+
+if __name__ == '__main__':
+    main()
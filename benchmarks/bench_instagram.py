@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Compare sequential and pipelined Instagram publishing against a fake Graph API
+"""
+import argparse
+import json
+import os
+import time
+
+from stub_servers import FakeGraphServer
+from _lambda import load_function
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Instagram publishing modes')
+    parser.add_argument('--variants', type=int, default=10)
+    parser.add_argument('--min-processing', type=float, default=1.0)
+    parser.add_argument('--max-processing', type=float, default=3.0)
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'pipelined'])
+    args = parser.parse_args()
+
+    os.environ.setdefault('INSTAGRAM_POLL_INTERVAL_SECONDS', '0.25')
+    os.environ.setdefault('INSTAGRAM_POLL_MAX_INTERVAL_SECONDS', '0.5')
+    # Keep the rate limiter out of the way; this measures processing overlap
+    os.environ.setdefault('RATE_LIMITS', json.dumps({'instagram': {'rate': 1000, 'burst': 1000}}))
+
+    server = FakeGraphServer(
+        processing_seconds=(args.min_processing, args.max_processing),
+        latency=0.02
+    )
+    report = []
+    with server:
+        os.environ['INSTAGRAM_API_URL'] = server.url
+        app = load_function('platform_distributor')
+        variants = [{'language': f'lang-{i}', 'text': f'Variant {i}'} for i in range(args.variants)]
+
+        for mode in args.modes:
+            app.INSTAGRAM_PUBLISH_MODE = mode
+            server.published = server.status_lookups = 0
+            started = time.perf_counter()
+            response = app.lambda_handler({
+                'platform': 'instagram',
+                'content_variants': variants,
+                'media_urls': {'9:16': 'https://cdn.example.com/9:16/video.mp4'}
+            }, None)
+            elapsed = time.perf_counter() - started
+            body = json.loads(response['body'])
+            report.append({
+                'mode': mode,
+                'variants': len(variants),
+                'status': body.get('status'),
+                'seconds': round(elapsed, 3),
+                'published': server.published,
+                'status_lookups': server.status_lookups,
+                'max_processing_seconds': args.max_processing
+            })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark the cost of the shared latency instrumentation:
+
+- timed() around an empty block, against the bare block
+- a boto3 call answered by botocore's Stubber (no network) on a plain and
+  an instrumented session, so the difference is the event hooks alone
+- the per-invocation EMF flush for a typical hot-path call mix
+- with the X-Ray SDK installed, timed() on a sampled trace
+
+Overheads are reported per call and against a 5 ms DynamoDB round trip.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import redirect_stdout
+
+import boto3
+from botocore.stub import Stubber
+
+from _lambda import DEFAULT_ENV, LAYERS_DIR
+
+sys.path.insert(0, str(LAYERS_DIR / 'common'))
+
+from sanchaar_common import instrumentation  # noqa: E402
+
+TYPICAL_CALL_MS = 5.0
+LANGUAGES = ['hi', 'ta', 'te', 'bn', 'mr', 'gu', 'kn', 'ml', 'pa', 'or']
+
+
+def per_call_us(func, calls, repeats):
+    """Best-of-repeats mean time per call in microseconds"""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(calls)
+        samples.append((time.perf_counter() - started) / calls * 1e6)
+    return min(samples)
+
+
+def bare_blocks(calls):
+    for _ in range(calls):
+        pass
+
+
+def timed_blocks(calls):
+    for _ in range(calls):
+        with instrumentation.timed('bench.block', platform='whatsapp', language='hi'):
+            pass
+
+
+def stubbed_client(session, calls):
+    client = session.client('dynamodb')
+    stubber = Stubber(client)
+    for _ in range(calls):
+        stubber.add_response('get_item', {'Item': {'content_id': {'S': 'c'}}})
+    stubber.activate()
+    return client
+
+
+def client_calls(session):
+    def run(calls):
+        client = stubbed_client(session, calls)
+        started = time.perf_counter()
+        for _ in range(calls):
+            client.get_item(TableName='t', Key={'content_id': {'S': 'c'}})
+        # Exclude queueing the stubbed responses from the measurement
+        return time.perf_counter() - started
+    return run
+
+
+def per_client_call_us(session, calls, repeats):
+    run = client_calls(session)
+    return min(run(calls) / calls * 1e6 for _ in range(repeats))
+
+
+def invocation_records():
+    """A distributor-like invocation: ledger reads, one HTTP send per variant"""
+    for language in LANGUAGES:
+        instrumentation.record('dynamodb.GetItem', 4.2, False, 'whatsapp', language)
+        instrumentation.record('whatsapp.messages', 180.0, False, 'whatsapp', language)
+        instrumentation.record('dynamodb.UpdateItem', 6.1, False, 'whatsapp', language)
+    instrumentation.record('s3.PutObject', 22.0)
+    instrumentation.record('handler.lambda_handler', 950.0)
+
+
+def flush_us(repeats):
+    samples = []
+    sink = io.StringIO()
+    for _ in range(repeats):
+        invocation_records()
+        started = time.perf_counter()
+        with redirect_stdout(sink):
+            lines = instrumentation.flush('platform_distributor', 'request-id')
+        samples.append((time.perf_counter() - started) * 1e6)
+        sink.seek(0)
+        sink.truncate()
+    return statistics.median(samples), lines
+
+
+def xray_timed_us(calls, repeats):
+    if instrumentation.xray_recorder is None:
+        return None
+    recorder = instrumentation.xray_recorder
+    # Default streaming: subsegments go to the daemon address in batches of 30, as in Lambda
+    recorder.configure(sampling=False, context_missing='IGNORE_ERROR')
+    os.environ['_X_AMZN_TRACE_ID'] = 'Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f42cd8ad8;Sampled=1'
+    recorder.begin_segment('bench')
+    try:
+        return per_call_us(timed_blocks, calls, repeats)
+    finally:
+        recorder.end_segment()
+        del os.environ['_X_AMZN_TRACE_ID']
+
+
+def discard():
+    with redirect_stdout(io.StringIO()):
+        instrumentation.flush('bench')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the latency instrumentation overhead')
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+
+    bare = per_call_us(bare_blocks, args.calls, args.repeats)
+    timed = per_call_us(timed_blocks, args.calls, args.repeats)
+    discard()
+
+    plain_session = boto3.session.Session()
+    instrumented_session = instrumentation.instrument_boto3(boto3.session.Session())
+    # Alternate the sessions so warm-up favours neither
+    plain_call = instrumented_call = float('inf')
+    for _ in range(args.repeats):
+        plain_call = min(plain_call, per_client_call_us(plain_session, args.calls // 4, 1))
+        instrumented_call = min(instrumented_call, per_client_call_us(instrumented_session, args.calls // 4, 1))
+    hooked_records = len(instrumentation._records)
+    discard()
+
+    flush_median, flush_lines = flush_us(args.repeats * 20)
+    with redirect_stdout(io.StringIO()):
+        xray = xray_timed_us(args.calls // 10, args.repeats)
+    discard()
+
+    hook_overhead = instrumented_call - plain_call
+    print(json.dumps({
+        'timed_block_overhead_us': round(timed - bare, 2),
+        'boto3_call_plain_us': round(plain_call, 1),
+        'boto3_call_instrumented_us': round(instrumented_call, 1),
+        'boto3_hook_overhead_us': round(hook_overhead, 2),
+        'boto3_hook_overhead_pct_of_5ms_call': round(hook_overhead / (TYPICAL_CALL_MS * 1000) * 100, 3),
+        'boto3_calls_recorded': hooked_records,
+        'flush_per_invocation_us': round(flush_median, 1),
+        'flush_emf_lines': flush_lines,
+        'xray_timed_block_us': round(xray, 2) if xray is not None else 'aws_xray_sdk not installed'
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
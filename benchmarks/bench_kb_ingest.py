@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark knowledge base corpus ingestion against a stub OpenSearch with a
+fake embedder, including an interrupted load that resumes from its checkpoint
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+from _lambda import REPO_ROOT
+from stub_servers import StubOpenSearchServer
+
+sys.path.insert(0, str(REPO_ROOT / 'scripts'))
+
+from kb_ingest import FakeEmbedder, build_client, ingest  # noqa: E402
+
+LANGUAGES = ['hi', 'ta', 'te', 'bn', 'mr', 'gu', 'kn', 'ml', 'pa', 'or']
+
+
+def write_corpus(root, documents_per_file, files_per_index):
+    rng = random.Random(9)
+    generators = {
+        'cultural-references': lambda i: {'text': f'Festival reference {i} ' * 8, 'language': rng.choice(LANGUAGES),
+                                          'category': 'festival', 'region': 'north'},
+        'idioms-phrases': lambda i: {'source_phrase': f'idiom {i}', 'target_phrase': f'muhavara {i}',
+                                     'source_language': 'en', 'target_language': rng.choice(LANGUAGES)},
+        'brand-guidelines': lambda i: {'guideline': f'Guideline {i}: keep tone respectful', 'category': 'tone'}
+    }
+    total = 0
+    for index_name, generate in generators.items():
+        (root / index_name).mkdir(parents=True)
+        for number in range(files_per_index):
+            compressed = number % 2 == 1
+            path = root / index_name / f'part-{number:03d}.jsonl{".gz" if compressed else ""}'
+            opener = gzip.open if compressed else open
+            with opener(path, 'wt', encoding='utf-8') as f:
+                for i in range(documents_per_file):
+                    f.write(json.dumps(generate(i), ensure_ascii=False) + '\n')
+                    total += 1
+    return total
+
+
+class CrashingEmbedder(FakeEmbedder):
+    """Fails after a number of batches to simulate an interrupted load"""
+
+    def __init__(self, crash_after, **kwargs):
+        super().__init__(**kwargs)
+        self.remaining = crash_after
+
+    def embed(self, texts):
+        self.remaining -= 1
+        if self.remaining < 0:
+            raise RuntimeError('simulated interruption')
+        return super().embed(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark knowledge base corpus ingestion')
+    parser.add_argument('--documents-per-file', type=int, default=2000)
+    parser.add_argument('--files-per-index', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--embed-latency', type=float, default=0.02, help='Fake embedding latency per batch (s)')
+    parser.add_argument('--bulk-latency', type=float, default=0.02, help='Stub _bulk latency (s)')
+    parser.add_argument('--reject-rate', type=float, default=0.01, help='Fraction of bulk items answered 429')
+    parser.add_argument('--dimension', type=int, default=1536)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = Path(workdir) / 'corpus'
+        total = write_corpus(corpus, args.documents_per_file, args.files_per_index)
+
+        for in_flight in args.in_flight:
+            with StubOpenSearchServer(latency=args.bulk_latency, reject_rate=args.reject_rate) as server:
+                summary = ingest(corpus, build_client(server.url),
+                                 FakeEmbedder(args.dimension, latency=args.embed_latency),
+                                 Path(workdir) / f'checkpoint-{in_flight}.json',
+                                 batch_size=args.batch_size, max_in_flight=in_flight, report_every=60)
+                print(json.dumps({'max_in_flight': in_flight, 'corpus_documents': total,
+                                  'indexed': sum(server.documents.values()), **summary}))
+
+        # Interrupt a load part-way through, then resume it from the checkpoint
+        checkpoint = Path(workdir) / 'checkpoint-resume.json'
+        with StubOpenSearchServer(latency=args.bulk_latency) as server:
+            client = build_client(server.url)
+            crash_after = total // args.batch_size // 2
+            try:
+                ingest(corpus, client, CrashingEmbedder(crash_after, dimension=args.dimension),
+                       checkpoint, batch_size=args.batch_size, max_in_flight=4, report_every=60)
+            except RuntimeError:
+                pass
+            before = len(server.ids)
+            summary = ingest(corpus, client, FakeEmbedder(args.dimension), checkpoint,
+                             batch_size=args.batch_size, max_in_flight=4, report_every=60)
+            print(json.dumps({
+                'resume': True,
+                'indexed_before_interruption': before,
+                'indexed_after_resume': summary['documents'],
+                'unique_documents': len(server.ids),
+                'corpus_documents': total,
+                'rewritten_documents': sum(count - 1 for count in server.ids.values())
+            }))
+
+        # The same interruption where the store assigns ids, as OpenSearch Serverless does
+        checkpoint = Path(workdir) / 'checkpoint-resume-no-ids.json'
+        with StubOpenSearchServer(latency=args.bulk_latency) as server:
+            client = build_client(server.url)
+            try:
+                ingest(corpus, client, CrashingEmbedder(crash_after, dimension=args.dimension), checkpoint,
+                       batch_size=args.batch_size, max_in_flight=4, with_ids=False, report_every=60)
+            except RuntimeError:
+                pass
+            ingest(corpus, client, FakeEmbedder(args.dimension), checkpoint,
+                   batch_size=args.batch_size, max_in_flight=4, with_ids=False, report_every=60)
+            print(json.dumps({
+                'resume': True,
+                'with_ids': False,
+                'indexed_documents': sum(server.documents.values()),
+                'corpus_documents': total,
+                'duplicated_documents': sum(server.documents.values()) - total
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark task-token completion of media processing with local stand-ins
+for MediaConvert (encodes that finish after a simulated duration and emit
+job state change events to the completion handler) and Step Functions
+(records when each execution is resumed), on moto S3.
+
+Reports how long after its encode finished each execution resumed, and
+compares that with the old fire-and-forget flow, which moved on before
+the encode existed, and with polling the job from a Wait loop.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import threading
+import time
+from uuid import uuid4
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, load_function
+from stub_clients import LocalMediaConvert, LocalRekognition
+
+RATIOS = ['9:16', '1:1', '16:9']
+
+
+class LocalStepFunctions:
+    """Step Functions stand-in: records when each task token is settled"""
+
+    def __init__(self):
+        self.settled = {}
+        self._lock = threading.Lock()
+
+    def settle(self, task_token, outcome):
+        with self._lock:
+            if task_token in self.settled:
+                raise ClientError({'Error': {'Code': 'InvalidToken', 'Message': 'Task already settled'}},
+                                  'SendTaskSuccess')
+            self.settled[task_token] = dict(outcome, at=time.perf_counter())
+
+    def send_task_success(self, taskToken, output):
+        self.settle(taskToken, {'status': 'success', 'output': json.loads(output)})
+
+    def send_task_failure(self, taskToken, error, cause):
+        self.settle(taskToken, {'status': 'failure', 'error': error, 'cause': cause})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark task-token completion of MediaConvert jobs')
+    parser.add_argument('--executions', type=int, default=12)
+    parser.add_argument('--sources', type=int, default=8, help='Distinct sources; repeats join in-flight jobs')
+    parser.add_argument('--encode-seconds', type=float, nargs=2, default=[0.5, 2.0],
+                        help='Range of simulated encode time per job')
+    parser.add_argument('--failure-rate', type=float, default=0.1)
+    parser.add_argument('--poll-interval', type=float, default=30.0,
+                        help='Wait state interval of the polling alternative (s, scaled like the encodes)')
+    parser.add_argument('--time-scale', type=float, default=60.0,
+                        help='Real encode seconds per simulated second, for the polling comparison')
+    args = parser.parse_args()
+
+    for key, value in {**DEFAULT_ENV, 'MEDIACONVERT_ROLE': 'arn:aws:iam::123456789012:role/bench',
+                       'MEDIACONVERT_ENDPOINT': 'https://mediaconvert.local'}.items():
+        os.environ.setdefault(key, value)
+    rng = random.Random(3)
+
+    with mock_aws():
+        s3 = boto3.client('s3')
+        for bucket in (DEFAULT_ENV['INGESTION_BUCKET'], DEFAULT_ENV['OUTPUT_BUCKET']):
+            s3.create_bucket(Bucket=bucket,
+                             CreateBucketConfiguration={'LocationConstraint': DEFAULT_ENV['AWS_DEFAULT_REGION']})
+        for number in range(args.sources):
+            s3.put_object(Bucket=DEFAULT_ENV['INGESTION_BUCKET'], Key=f'media-uploads/video/source-{number}.mp4',
+                          Body=os.urandom(1024))
+            # Stored keyframes stand in for ffmpeg extraction in content analysis
+            s3.put_object(Bucket=DEFAULT_ENV['INGESTION_BUCKET'],
+                          Key=f'keyframes/media-uploads/video/source-{number}.mp4/frame-0.jpg', Body=os.urandom(256))
+
+        app = load_function('media_convert')
+        import clients
+        stepfunctions = LocalStepFunctions()
+        mediaconvert = LocalMediaConvert(
+            app.job_complete_handler,
+            lambda settings: rng.uniform(*args.encode_seconds),
+            failure_rate=args.failure_rate
+        )
+        clients._clients.update({'mediaconvert': mediaconvert, 'stepfunctions': stepfunctions,
+                                 'rekognition': LocalRekognition()})
+
+        executions = []
+        for number in range(args.executions):
+            token = f'token-{number}-{uuid4().hex}'
+            source = number % args.sources
+            started = time.perf_counter()
+            response = app.lambda_handler({
+                'media_uri': f"s3://{DEFAULT_ENV['INGESTION_BUCKET']}/media-uploads/video/source-{source}.mp4",
+                'aspect_ratios': RATIOS,
+                'subtitle_languages': [],
+                'task_token': token
+            }, None)
+            body = json.loads(response['body'])
+            executions.append({'token': token, 'started': started, 'returned': time.perf_counter(),
+                               'job_id': body.get('job_id') or next(iter(body.get('cache_hits', {}).values()), None)})
+        mediaconvert.wait()
+
+    delays = []
+    fire_and_forget_early = []
+    polling_delays = []
+    outcomes = {}
+    resolved = 0
+    for execution in executions:
+        settled = stepfunctions.settled.get(execution['token'])
+        assert settled, f"execution {execution['token']} was never resumed"
+        outcomes[settled['status']] = outcomes.get(settled['status'], 0) + 1
+        job = mediaconvert.jobs[execution['job_id']]
+        delays.append((settled['at'] - job['finished_at']) * 1000)
+        # Fire-and-forget moved on when the handler returned, before the encode finished
+        fire_and_forget_early.append((job['finished_at'] - execution['returned']) * 1000)
+        encode = (job['finished_at'] - execution['started']) * args.time_scale
+        polling_delays.append((math.ceil(encode / args.poll_interval) * args.poll_interval - encode) * 1000)
+        if settled['status'] == 'success':
+            outputs = json.loads(settled['output']['body'])['outputs']
+            resolved += all(uri and uri.endswith('.mp4') for uri in outputs.values())
+
+    print(json.dumps({
+        'executions': len(executions),
+        'jobs': len(mediaconvert.jobs),
+        'outcomes': outcomes,
+        'successes_with_resolved_outputs': resolved,
+        'resume_after_encode_p50_ms': round(statistics.median(delays), 1),
+        'resume_after_encode_max_ms': round(max(delays), 1),
+        'fire_and_forget_ahead_of_encode_p50_ms': round(statistics.median(fire_and_forget_early), 1),
+        'polling_resume_after_encode_p50_ms': round(statistics.median(polling_delays), 1),
+        'polling_interval_s': args.poll_interval
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark of the content pipeline, in-process
+
+Runs content_pipeline.asl.json with the local ASL interpreter against the
+real Lambda handlers: voice_processor (fast path, local transcription
+backend) and its transcript resolver, the transcreation cache, admission,
+media_convert with its completion handler, platform_distributor and
+content_recorder. Around them:
+
+- moto for S3 and DynamoDB, or DynamoDB Local with --dynamodb-endpoint;
+  moto is not thread-safe, so its backend serves one call at a time and
+  --aws-latency-ms adds simulated round trips outside that lock. The
+  report gives moto's busy fraction: near 1 the run measured moto, and
+  DynamoDB Local is the way to go past a hundred or so executions
+- stand-ins for MediaConvert (encodes that finish and emit completion
+  events), Rekognition and Transcribe, and fake Bedrock agents
+- local WhatsApp/ShareChat and Graph API servers with configurable latency
+  and 429 rates
+
+Synthetic executions run with up to --concurrency in flight (at most 1000).
+The report has p50/p95/p99 per state and per function, end-to-end latency,
+throughput, cold-start cost and peak memory, as JSON. --output writes it to
+a file; --baseline compares with an earlier report and exits 1 when a p95
+or the throughput regressed beyond --tolerance.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+from moto.core.botocore_stubber import BotocoreStubber
+
+from _lambda import DEFAULT_ENV, REPO_ROOT, load_function
+from asl import StateMachine, StatesError, lambda_invoke
+from bench_voice_command import COMMANDS, synthetic_command
+from stub_clients import LocalMediaConvert, LocalRekognition, LocalTranscribe
+from stub_servers import FakeGraphServer, StubPlatformServer
+
+DEFINITION = REPO_ROOT / 'infrastructure' / 'sam' / 'statemachine' / 'content_pipeline.asl.json'
+MAX_CONCURRENCY = 1000
+# Beyond this the serialised moto backend, not the functions, sets the pace
+MOTO_CONCURRENCY = 100
+ADMISSION_TABLE = 'SanchaarAdmission-bench'
+SUPERVISOR_AGENT = 'supervisor-agent-id'
+TRANSCREATION_AGENT = 'transcreation-agent-id'
+LANGUAGES = ['hi', 'ta', 'te', 'bn', 'mr', 'gu', 'kn', 'ml', 'pa', 'or']
+RATIOS = ['9:16', '1:1', '16:9']
+PLATFORMS = ['whatsapp', 'sharechat', 'instagram']
+
+# DefinitionSubstitutions of the template -> local function names
+SUBSTITUTIONS = {
+    'VoiceProcessorFunctionArn': 'voice_processor',
+    'TranscriptResolverFunctionArn': 'transcript_resolver',
+    'TranscreationCacheLookupFunctionArn': 'transcreation_cache_lookup',
+    'TranscreationCacheStoreFunctionArn': 'transcreation_cache_store',
+    'AdmissionAcquireFunctionArn': 'admission_acquire',
+    'AdmissionReleaseFunctionArn': 'admission_release',
+    'MediaConvertFunctionArn': 'media_convert',
+    'PlatformDistributorFunctionArn': 'platform_distributor',
+    'ContentRecorderFunctionArn': 'content_recorder',
+    'BedrockAgentId': SUPERVISOR_AGENT
+}
+# Local function name -> (function directory, handler)
+HANDLERS = {
+    'voice_processor': ('voice_processor', 'lambda_handler'),
+    'transcript_resolver': ('voice_processor', 'transcript_handler'),
+    'transcreation_cache_lookup': ('transcreation_cache', 'lookup_handler'),
+    'transcreation_cache_store': ('transcreation_cache', 'store_handler'),
+    'admission_acquire': ('admission', 'acquire_handler'),
+    'admission_release': ('admission', 'release_handler'),
+    'media_convert': ('media_convert', 'lambda_handler'),
+    'media_convert_complete': ('media_convert', 'job_complete_handler'),
+    'platform_distributor': ('platform_distributor', 'lambda_handler'),
+    'content_recorder': ('content_recorder', 'lambda_handler')
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarise(values_ms):
+    if not values_ms:
+        return {'count': 0}
+    return {
+        'count': len(values_ms),
+        'p50_ms': round(percentile(values_ms, 0.50), 2),
+        'p95_ms': round(percentile(values_ms, 0.95), 2),
+        'p99_ms': round(percentile(values_ms, 0.99), 2),
+        'max_ms': round(max(values_ms), 2)
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Recorder:
+    """Thread-safe latency samples by name, keeping each name's first call apart"""
+
+    def __init__(self):
+        self.samples = {}
+        self.first = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration_ms, error=None):
+        with self._lock:
+            if name not in self.first:
+                self.first[name] = duration_ms
+            else:
+                self.samples.setdefault(name, []).append(duration_ms)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self):
+        return {name: dict(summarise(self.samples.get(name, [])), first_ms=round(first, 2),
+                           errors=self.errors.get(name, 0))
+                for name, first in sorted(self.first.items())}
+
+
+def timed_handler(name, handler, recorder):
+    def invoke(event, context):
+        started = time.perf_counter()
+        error = None
+        try:
+            response = handler(event, context)
+            status = response.get('statusCode') if isinstance(response, dict) else None
+            error = 'status' if isinstance(status, int) and status >= 500 else None
+            return response
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            recorder.add(name, (time.perf_counter() - started) * 1000, error)
+    return invoke
+
+
+def serialise_moto(latency_ms):
+    """
+    One moto backend call at a time, each after a simulated network round
+    trip. Returns counters of the calls and the time moto spent serving them.
+    """
+    original = BotocoreStubber.__call__
+    lock = threading.Lock()
+    usage = {'calls': 0, 'busy_s': 0.0}
+
+    def call(self, event_name, request, **kwargs):
+        if latency_ms[1] > 0:
+            time.sleep(random.uniform(*latency_ms) / 1000)
+        with lock:
+            started = time.perf_counter()
+            try:
+                return original(self, event_name, request, **kwargs)
+            finally:
+                usage['calls'] += 1
+                usage['busy_s'] += time.perf_counter() - started
+    BotocoreStubber.__call__ = call
+    return usage
+
+
+class FakeAgents:
+    """
+    Bedrock invokeAgent stand-in, returning the parsed agent answers the
+    state machine reads: the supervisor's plan, transcreations and the
+    quality verdict
+    """
+
+    def __init__(self, args, sources, rng):
+        self.latency_ms = args.agent_ms
+        self.failure_rate = args.agent_failure_rate
+        self.languages = LANGUAGES[:args.languages]
+        self.platforms = args.platforms
+        self.variants = args.variants
+        self.media_mode = args.media_mode
+        self.sources = sources
+        self.rng = rng
+
+    def __call__(self, parameters, context):
+        time.sleep(self.rng.uniform(*self.latency_ms) / 1000)
+        if parameters['AgentId'] == TRANSCREATION_AGENT:
+            if self.rng.random() < self.failure_rate:
+                raise StatesError('BedrockAgent.ThrottlingException', 'Simulated agent throttling')
+            language, text = parameters['InputText'].split(': ', 1)
+            return {'language': language.rsplit(' ', 1)[-1], 'text': f'[{language}] {text}'}
+        if parameters['InputText'].startswith('Validate'):
+            return {'status': 'approved'}
+        return self.plan(parameters['SessionId'], parameters['InputText'])
+
+    def plan(self, content_id, transcript):
+        media_uri = self.sources[int(hashlib.sha256(content_id.encode()).hexdigest(), 16) % len(self.sources)]
+        return {
+            'brand': 'bench',
+            'target_languages': [{'language': language, 'source_text': transcript} for language in self.languages],
+            'aspect_ratios': [{'media_uri': media_uri, 'aspect_ratio': ratio, 'subtitle_languages': []}
+                              for ratio in RATIOS],
+            'target_platforms': [{
+                'platform': platform,
+                'content_variants': [{
+                    'language': self.languages[index % len(self.languages)],
+                    'recipient': f'91{9000000000 + index}',
+                    'text': f'{content_id} variant {index}',
+                    'hashtags': ['#sanchaar']
+                } for index in range(self.variants)]
+            } for platform in self.platforms],
+            'media_processing_mode': self.media_mode
+        }
+
+
+def create_tables(dynamodb):
+    tables = [
+        (DEFAULT_ENV['CONTENT_TABLE'], [('content_id', 'S', 'HASH'), ('version', 'N', 'RANGE')]),
+        (ADMISSION_TABLE, [('resource', 'S', 'HASH'), ('slot', 'S', 'RANGE')])
+    ]
+    for name, keys in tables:
+        try:
+            dynamodb.create_table(
+                TableName=name,
+                BillingMode='PAY_PER_REQUEST',
+                AttributeDefinitions=[{'AttributeName': key, 'AttributeType': kind} for key, kind, _ in keys],
+                KeySchema=[{'AttributeName': key, 'KeyType': role} for key, _, role in keys]
+            )
+        except ClientError as e:
+            # DynamoDB Local keeps tables between runs
+            if e.response['Error']['Code'] != 'ResourceInUseException':
+                raise
+
+
+def prepare_commands(args):
+    """One synthetic WAV per command phrase, and transcription fixtures keyed by its PCM"""
+    commands = []
+    fixtures = {}
+    for index, (language, text) in enumerate(COMMANDS):
+        wav, pcm = synthetic_command(args.command_seconds, index)
+        fixtures[hashlib.sha256(pcm).hexdigest()] = {'transcript': text, 'language_code': language}
+        commands.append(wav)
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(fixtures, f, ensure_ascii=False)
+    return commands, f.name
+
+
+def upload_inputs(args, voice_app, commands, rng):
+    """Source videos and one voice command upload per execution; returns execution inputs"""
+    s3 = boto3.client('s3')
+    for bucket in (DEFAULT_ENV['INGESTION_BUCKET'], DEFAULT_ENV['OUTPUT_BUCKET']):
+        s3.create_bucket(Bucket=bucket,
+                         CreateBucketConfiguration={'LocationConstraint': DEFAULT_ENV['AWS_DEFAULT_REGION']})
+    sources = []
+    for number in range(args.sources):
+        key = f'media-uploads/video/source-{number}.mp4'
+        s3.put_object(Bucket=DEFAULT_ENV['INGESTION_BUCKET'], Key=key, Body=os.urandom(4096))
+        # Stored keyframes stand in for ffmpeg extraction in content analysis
+        s3.put_object(Bucket=DEFAULT_ENV['INGESTION_BUCKET'], Key=f'keyframes/{key}/frame-0.jpg', Body=os.urandom(256))
+        sources.append(f"s3://{DEFAULT_ENV['INGESTION_BUCKET']}/{key}")
+
+    classes, weights = zip(*((name, float(share)) for name, share in
+                             (pair.split(':') for pair in args.mix.split(','))))
+    inputs = []
+    for number in range(args.executions):
+        wav = commands[number % len(commands)]
+        key = f'voice-commands/user-{number % 50}/command-{number}.wav'
+        s3.put_object(Bucket=DEFAULT_ENV['INGESTION_BUCKET'], Key=key, Body=wav)
+        event_time = '2026-10-18T10:00:00Z'
+        detail = {'bucket': {'name': DEFAULT_ENV['INGESTION_BUCKET']},
+                  'object': {'key': key, 'size': len(wav), 'sequencer': f'{number:016X}'}}
+        upload = voice_app.build_upload(DEFAULT_ENV['INGESTION_BUCKET'], key, detail['object']['sequencer'],
+                                        event_time, len(wav))
+        inputs.append({'time': event_time, 'detail': detail, 'content_id': upload['content_id'],
+                       'version': upload['version'], 'priority': rng.choices(classes, weights)[0]})
+    return sources, inputs
+
+
+def load_functions(recorder):
+    """
+    Import every function the state machine invokes, timing each import.
+    Layer modules and boto3 are imported once, by the first function that
+    needs them, so later functions' import times leave them out where
+    separate execution environments would each pay for them.
+    """
+    imports_ms = {}
+    loaded = {}
+    for module in dict.fromkeys(module for module, _ in HANDLERS.values()):
+        started = time.perf_counter()
+        loaded[module] = load_function(module)
+        imports_ms[module] = round((time.perf_counter() - started) * 1000, 2)
+    handlers = {name: timed_handler(name, getattr(loaded[module], attribute), recorder)
+                for name, (module, attribute) in HANDLERS.items()}
+    return loaded, imports_ms, handlers
+
+
+def run_load(machine, inputs, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda pair: machine.execute(pair[1], name=f'bench-{pair[0]}'),
+                                    enumerate(inputs)))
+    return results, time.perf_counter() - started
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Regressions of p95 latencies and throughput against a baseline report"""
+    regressions = []
+    checks = [('end_to_end', report['end_to_end'], baseline.get('end_to_end', {}))]
+    for section in ('states', 'functions'):
+        for name, current in report[section].items():
+            checks.append((f'{section}.{name}', current, baseline.get(section, {}).get(name, {})))
+    for name, current, previous in checks:
+        if 'p95_ms' not in current or 'p95_ms' not in previous:
+            continue
+        limit = previous['p95_ms'] * (1 + tolerance)
+        if current['p95_ms'] > limit and current['p95_ms'] - previous['p95_ms'] > min_delta_ms:
+            regressions.append({'metric': f'{name}.p95_ms', 'baseline': previous['p95_ms'],
+                                'current': current['p95_ms']})
+    previous_throughput = baseline.get('throughput_per_s')
+    if previous_throughput and report['throughput_per_s'] < previous_throughput * (1 - tolerance):
+        regressions.append({'metric': 'throughput_per_s', 'baseline': previous_throughput,
+                            'current': report['throughput_per_s']})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the content pipeline end to end, in-process')
+    parser.add_argument('--executions', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help=f'Executions in flight at once (at most {MAX_CONCURRENCY})')
+    parser.add_argument('--languages', type=int, default=5, help='Target languages per content piece')
+    parser.add_argument('--platforms', nargs='+', default=PLATFORMS, choices=PLATFORMS)
+    parser.add_argument('--variants', type=int, default=3, help='Content variants per platform')
+    parser.add_argument('--sources', type=int, default=20, help='Distinct source videos; repeats join encodes')
+    parser.add_argument('--media-mode', default='multi_output', choices=['multi_output', 'per_ratio'])
+    parser.add_argument('--mix', default='breaking_news:0.1,standard:0.6,evergreen:0.3',
+                        help='Admission priority classes of the executions')
+    parser.add_argument('--command-seconds', type=float, default=3.0, help='Length of the voice commands')
+    parser.add_argument('--transcribe-latency', type=float, default=0.2,
+                        help='Local transcription backend latency per command (s)')
+    parser.add_argument('--agent-ms', type=float, nargs=2, default=[200, 800], help='Bedrock agent latency range')
+    parser.add_argument('--agent-failure-rate', type=float, default=0.0,
+                        help='Fraction of transcreation agent calls that fail')
+    parser.add_argument('--encode-seconds', type=float, nargs=2, default=[1.0, 3.0],
+                        help='Range of simulated encode time per job')
+    parser.add_argument('--platform-latency', type=float, default=0.05, help='Platform API latency (s)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of platform requests given 429')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--rate-limits', default=json.dumps({'instagram': {'rate': 1000, 'burst': 1000}}),
+                        help='RATE_LIMITS JSON for the distributor; the production Instagram quota dominates otherwise')
+    parser.add_argument('--aws-latency-ms', type=float, nargs=2, default=[0, 0],
+                        help='Simulated round trip added to each moto call')
+    parser.add_argument('--dynamodb-endpoint', default=None, help='DynamoDB Local URL instead of moto DynamoDB')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='Multiplier for ASL retry intervals, Wait states and timeouts')
+    parser.add_argument('--seed', type=int, default=11)
+    parser.add_argument('--output', default=None, help='Also write the JSON report to this file')
+    parser.add_argument('--baseline', default=None, help='Earlier report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='Ignore p95 changes smaller than this')
+    args = parser.parse_args()
+    if not 1 <= args.concurrency <= MAX_CONCURRENCY:
+        parser.error(f'--concurrency must be between 1 and {MAX_CONCURRENCY}')
+    if args.concurrency > MOTO_CONCURRENCY and not args.dynamodb_endpoint:
+        print(f'Above {MOTO_CONCURRENCY} concurrent executions moto DynamoDB bounds the run; '
+              'consider --dynamodb-endpoint with DynamoDB Local', file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    commands, fixtures_path = prepare_commands(args)
+    env = {
+        'ADMISSION_TABLE': ADMISSION_TABLE,
+        'MEDIACONVERT_ROLE': 'arn:aws:iam::123456789012:role/bench',
+        'MEDIACONVERT_ENDPOINT': 'https://mediaconvert.local',
+        'VOICE_COMMAND_FAST_PATH': 'true',
+        'VOICE_COMMAND_BACKEND': 'local',
+        'VOICE_COMMAND_LOCAL_FIXTURES': fixtures_path,
+        'VOICE_COMMAND_LOCAL_LATENCY_SECONDS': str(args.transcribe_latency),
+        'DELIVERY_BACKOFF_BASE_SECONDS': '0.05',
+        'INSTAGRAM_POLL_INTERVAL_SECONDS': '0.25',
+        'INSTAGRAM_POLL_MAX_INTERVAL_SECONDS': '0.5',
+        'RATE_LIMITS': args.rate_limits
+    }
+    if args.dynamodb_endpoint:
+        env['AWS_ENDPOINT_URL_DYNAMODB'] = args.dynamodb_endpoint
+    for key, value in {**DEFAULT_ENV, **env}.items():
+        os.environ.setdefault(key, value)
+    # Execution threads mostly wait; smaller stacks keep 1000 executions' worth of them cheap
+    threading.stack_size(512 * 1024)
+
+    moto_usage = serialise_moto(args.aws_latency_ms)
+    platform_server = StubPlatformServer(latency=args.platform_latency, jitter=args.platform_latency / 2,
+                                         throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    graph_server = FakeGraphServer(processing_seconds=(0.2, 0.6), latency=args.platform_latency,
+                                   throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    recorder = Recorder()
+    states = Recorder()
+
+    with mock_aws(), platform_server, graph_server:
+        os.environ['WHATSAPP_API_URL'] = os.environ['SHARECHAT_API_URL'] = platform_server.url
+        os.environ['INSTAGRAM_API_URL'] = graph_server.url
+        create_tables(boto3.client('dynamodb'))
+        rss_before_load_mb = peak_rss_mb()
+        loaded, imports_ms, handlers = load_functions(recorder)
+        rss_after_load_mb = peak_rss_mb()
+
+        import clients
+        from sanchaar_common import admission
+        machine = StateMachine.from_file(
+            DEFINITION,
+            substitutions=SUBSTITUTIONS,
+            resources={},
+            time_scale=args.time_scale,
+            on_state=lambda name, kind, started, duration, error: states.add(name, duration * 1000, error)
+        )
+        sources, inputs = upload_inputs(args, loaded['voice_processor'], commands, rng)
+        machine.resources.update({
+            'arn:aws:states:::lambda:invoke': lambda_invoke(handlers),
+            'arn:aws:states:::bedrock:invokeAgent': FakeAgents(args, sources, random.Random(args.seed + 1))
+        })
+        mediaconvert = LocalMediaConvert(handlers['media_convert_complete'],
+                                         lambda settings: rng.uniform(*args.encode_seconds))
+        clients._clients.update({'mediaconvert': mediaconvert, 'stepfunctions': machine.tokens,
+                                 'rekognition': LocalRekognition()})
+        admission._clients['stepfunctions'] = machine.tokens
+        loaded['voice_processor'].transcribe = LocalTranscribe()
+
+        # Handlers log every call; keep the report readable
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results, elapsed = run_load(machine, inputs, args.concurrency)
+                mediaconvert.wait()
+            finally:
+                sys.stdout = stdout
+    os.unlink(fixtures_path)
+
+    statuses = {}
+    failures = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        if result['status'] == 'FAILED':
+            failures[result['error']] = failures.get(result['error'], 0) + 1
+        elif result['output'].get('status'):
+            # FlagForReview and HandleError end in success with a status
+            statuses[result['output']['status']] = statuses.get(result['output']['status'], 0) + 1
+    function_report = recorder.report()
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'executions': len(results),
+        'statuses': statuses,
+        'failures': failures,
+        'makespan_s': round(elapsed, 3),
+        'throughput_per_s': round(len(results) / elapsed, 3),
+        'end_to_end': summarise([result['duration_s'] * 1000 for result in results]),
+        'states': states.report(),
+        'functions': function_report,
+        'cold_start': {
+            name: {
+                'import_ms': imports_ms[HANDLERS[name][0]],
+                'first_invoke_ms': stats['first_ms'],
+                'warm_p50_ms': stats.get('p50_ms')
+            } for name, stats in function_report.items()
+        },
+        'platform_requests': platform_server.requests + graph_server.requests,
+        # A backend busy for most of the makespan means the run measured moto, not the functions
+        'moto': {'calls': moto_usage['calls'], 'busy_s': round(moto_usage['busy_s'], 3),
+                 'busy_fraction': round(moto_usage['busy_s'] / elapsed, 3)},
+        'memory': {
+            'rss_before_imports_mb': rss_before_load_mb,
+            'rss_after_imports_mb': rss_after_load_mb,
+            'peak_rss_mb': peak_rss_mb()
+        }
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        exit_code = 1 if report['regressions'] else 0
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Benchmark the status aggregator against a local stand-in for the content
+table's DynamoDB stream:
+
+- content records go through their real lifecycle against moto: a
+  processing head, the transcribed update, the completed record written by
+  content_recorder, with some runs re-recorded and some records deleted
+- the stream stand-in batches the changes per shard for stream_handler,
+  and a share of batches is delivered again after being applied, whole or
+  as its first half, as Lambda retries and bisects batches
+- a dashboard client follows events_handler after every batch,
+  applying snapshots and deltas as the EventSource hook does
+
+The aggregate and the client's counters are checked against the counts the
+simulation expects, and every call the feed makes is checked to avoid the
+content table.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import boto3
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, LAYERS_DIR, load_function
+from stub_clients import LocalDynamoDBStream
+
+sys.path.insert(0, str(LAYERS_DIR / 'common'))
+
+AGGREGATE_TABLE = 'SanchaarStatusAggregate-bench'
+
+
+def create_tables(client, content_table):
+    client.create_table(
+        TableName=content_table,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'content_id', 'AttributeType': 'S'},
+            {'AttributeName': 'version', 'AttributeType': 'N'}
+        ],
+        KeySchema=[
+            {'AttributeName': 'content_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'version', 'KeyType': 'RANGE'}
+        ]
+    )
+    client.create_table(
+        TableName=AGGREGATE_TABLE,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[{'AttributeName': 'aggregate_id', 'AttributeType': 'S'}],
+        KeySchema=[{'AttributeName': 'aggregate_id', 'KeyType': 'HASH'}]
+    )
+
+
+def has_status(record):
+    """The FilterCriteria of the StatusAggregatorFunction event source"""
+    change = record['dynamodb']
+    return any('status' in (change.get(image) or {}) for image in ('NewImage', 'OldImage'))
+
+
+def distribution_rows(rng, platforms, languages, failure_rate):
+    return {platform: [{'language': language, 'status': 500 if rng.random() < failure_rate else 200}
+                       for language in languages]
+            for platform in platforms}
+
+
+def recorder_event(content_id, version, rows):
+    return {
+        'content_id': content_id,
+        'version': version,
+        'status': 'completed',
+        'transcreations': [{'language': row['language'], 'text': 'x' * 200} for row in next(iter(rows.values()))],
+        'distribution_results': [
+            {'Payload': {'statusCode': 200, 'body': json.dumps({'platform': platform, 'status': 'ok', 'result': result})}}
+            for platform, result in rows.items()
+        ],
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def expected_counters(records):
+    counts = Counter()
+    for record in records.values():
+        if record['deleted']:
+            continue
+        counts[f"status#{record['status']}"] += 1
+        for platform, rows in (record['rows'] or {}).items():
+            for row in rows:
+                outcome = 'delivered' if row['status'] == 200 else 'failed'
+                counts[f'delivery#{platform}#{outcome}'] += 1
+                counts[f"language#{row['language']}#{outcome}"] += 1
+    return {name: count for name, count in counts.items() if count}
+
+
+class DashboardClient:
+    """Follows the events feed as usePipelineStatusStream does"""
+
+    def __init__(self, events_handler):
+        self.events_handler = events_handler
+        self.revision = None
+        self.counters = {}
+        self.latency = None
+        self.events = Counter()
+        self.bytes = {'snapshot': [], 'delta': []}
+
+    def follow(self):
+        headers = {} if self.revision is None else {'Last-Event-ID': str(self.revision)}
+        body = self.events_handler({'headers': headers}, None)['body']
+        for block in body.split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if line and not line.startswith(':'))
+            if 'event' not in fields:
+                continue
+            data = json.loads(fields['data'])
+            if fields['event'] == 'snapshot':
+                self.counters = dict(data['counters'])
+            else:
+                for name, count in data['counters'].items():
+                    self.counters[name] = self.counters.get(name, 0) + count
+                self.counters = {name: count for name, count in self.counters.items() if count}
+            self.latency = data['latency']
+            self.revision = int(fields['id'])
+            self.events[fields['event']] += 1
+            self.bytes[fields['event']].append(len(block))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark stream aggregation of pipeline status')
+    parser.add_argument('--records', type=int, default=400)
+    parser.add_argument('--platforms', default='whatsapp,instagram,sharechat')
+    parser.add_argument('--languages', default='hi,ta,te,bn,mr')
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='Share of variants a platform rejects')
+    parser.add_argument('--stuck-share', type=float, default=0.1, help='Share of records left processing')
+    parser.add_argument('--rerecord-share', type=float, default=0.1, help='Share of completed runs recorded again')
+    parser.add_argument('--delete-share', type=float, default=0.05)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--redeliver-rate', type=float, default=0.2,
+                        help='Share of applied batches delivered again, as after a failed invocation')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    env = {'STATUS_AGGREGATE_TABLE': AGGREGATE_TABLE, 'EVENTS_WAIT_SECONDS': '0'}
+    for key, value in {**DEFAULT_ENV, **env}.items():
+        os.environ.setdefault(key, value)
+    rng = random.Random(args.seed)
+    platforms = args.platforms.split(',')
+    languages = args.languages.split(',')
+    content_table = DEFAULT_ENV['CONTENT_TABLE']
+
+    with mock_aws():
+        client = boto3.client('dynamodb')
+        create_tables(client, content_table)
+        stream = LocalDynamoDBStream(content_table, ['content_id', 'version'], args.shards, has_status)
+        writer = stream.wrap(client)
+
+        recorder = load_function('content_recorder')
+        aggregator = load_function('status_aggregator', env)
+        from sanchaar_common import content_store, status_aggregate
+        from sanchaar_common.status_index import status_attributes, status_update
+        content_store._store = content_store.ContentStore(content_table, client=writer)
+
+        # Every table the feed and the aggregator read or write
+        tables_touched = Counter()
+        status_aggregate.get_client('dynamodb').meta.events.register(
+            'provide-client-params.dynamodb.*',
+            lambda params, **kwargs: tables_touched.update(
+                params.get('RequestItems', {}).keys() if 'RequestItems' in params
+                else [params.get('TableName')] if 'TableName' in params
+                else [item[kind]['TableName'] for item in params.get('TransactItems', []) for kind in item]))
+
+        dashboard = DashboardClient(aggregator.events_handler)
+        handler_ms = []
+        outcomes = Counter()
+
+        def drain():
+            while stream.pending():
+                for event in stream.poll(args.batch_size):
+                    deliveries = [event]
+                    if rng.random() < args.redeliver_rate:
+                        records = event['Records']
+                        deliveries.append(event if rng.random() < 0.5
+                                          else {'Records': records[:max(len(records) // 2, 1)]})
+                    for delivery in deliveries:
+                        started = time.perf_counter()
+                        body = json.loads(aggregator.stream_handler(delivery, None)['body'])
+                        handler_ms.append((time.perf_counter() - started) * 1000)
+                        outcomes['applied'] += body['applied']
+                        outcomes['skipped'] += body['skipped']
+                    dashboard.follow()
+
+        now = time.time()
+        records = {}
+        for _ in range(args.records):
+            content_id = str(uuid4())
+            # Versions are upload times; spread them so completions land in several latency buckets
+            version = int(now - rng.lognormvariate(5, 0.8))
+            records[content_id] = {'version': version, 'status': 'processing', 'rows': None, 'deleted': False}
+            writer.put_item(TableName=content_table, Item={
+                'content_id': {'S': content_id},
+                'version': {'N': str(version)},
+                'user_id': {'S': f'user-{rng.randrange(50)}'},
+                'created_at': {'S': datetime.fromtimestamp(version, timezone.utc).isoformat()},
+                **{name: {'S': value} for name, value in status_attributes('processing', content_id).items()}
+            })
+
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                drain()
+                for content_id, record in records.items():
+                    if rng.random() < args.stuck_share:
+                        continue
+                    expression, names, values = status_update('transcribed', content_id)
+                    writer.update_item(
+                        TableName=content_table,
+                        Key={'content_id': {'S': content_id}, 'version': {'N': str(record['version'])}},
+                        UpdateExpression=f'SET {expression}',
+                        ExpressionAttributeNames=names,
+                        ExpressionAttributeValues={name: {'S': value} for name, value in values.items()}
+                    )
+                    record['status'] = 'transcribed'
+                drain()
+                completed = 0
+                for content_id, record in records.items():
+                    if record['status'] != 'transcribed':
+                        continue
+                    record['rows'] = distribution_rows(rng, platforms, languages, args.failure_rate)
+                    recorder.lambda_handler(recorder_event(content_id, record['version'], record['rows']), None)
+                    record['status'] = 'completed'
+                    completed += 1
+                drain()
+                for content_id, record in records.items():
+                    if record['status'] == 'completed' and rng.random() < args.rerecord_share:
+                        record['rows'] = distribution_rows(rng, platforms, languages, args.failure_rate / 2)
+                        recorder.lambda_handler(recorder_event(content_id, record['version'], record['rows']), None)
+                    if rng.random() < args.delete_share:
+                        writer.delete_item(TableName=content_table, Key={
+                            'content_id': {'S': content_id}, 'version': {'N': str(record['version'])}})
+                        record['deleted'] = True
+                drain()
+            finally:
+                sys.stdout = stdout
+        elapsed = time.perf_counter() - started
+
+        expected = expected_counters(records)
+        totals = status_aggregate.read_totals()
+        latency = status_aggregate.read_latency()
+        assert totals['counters'] == expected, 'aggregate counters differ from the simulated records'
+        assert dashboard.counters == expected, 'dashboard counters differ from the simulated records'
+        assert sum(latency['buckets'].values()) == completed, 'latency histogram misses completions'
+        assert set(tables_touched) == {AGGREGATE_TABLE}, f'the aggregate path read {set(tables_touched)}'
+
+        scanned = client.scan(TableName=content_table)
+        scan_bytes = len(json.dumps(scanned['Items'], default=str))
+
+    print(json.dumps({
+        'records': args.records,
+        'stream_records': sum(len(shard) for shard in stream.shards),
+        'filtered_records': stream.filtered,
+        'records_applied': outcomes['applied'],
+        'redelivered_records_skipped': outcomes['skipped'],
+        'handler_p50_ms': round(statistics.median(handler_ms), 2),
+        'handler_p95_ms': round(percentile(handler_ms, 0.95), 2),
+        'elapsed_s': round(elapsed, 2),
+        'aggregate_revision': totals['revision'],
+        'counters': len(totals['counters']),
+        'latency_buckets': latency['buckets'],
+        'feed_events': dict(dashboard.events),
+        'snapshot_bytes_p50': round(statistics.median(dashboard.bytes['snapshot'])),
+        'delta_bytes_p50': round(statistics.median(dashboard.bytes['delta'])) if dashboard.bytes['delta'] else None,
+        'content_table_scan_bytes': scan_bytes,
+        'aggregate_path_tables': dict(tables_touched),
+        'verified': True
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
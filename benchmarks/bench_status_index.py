@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark the write-sharded status index: how a burst of new "processing"
+items spreads over index partitions with and without sharding, and whether
+query_by_status pages through every item in created_at order.
+
+Runs against moto by default, or against DynamoDB Local with
+--endpoint-url http://localhost:8000 (docker run -p 8000:8000 amazon/dynamodb-local).
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import boto3
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, LAYERS_DIR
+
+sys.path.insert(0, str(LAYERS_DIR / 'common'))
+
+from sanchaar_common import status_index  # noqa: E402
+
+STATUSES = ['processing', 'transcribed', 'completed', 'transcription_failed']
+
+
+def create_table(client, table):
+    client.create_table(
+        TableName=table,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'content_id', 'AttributeType': 'S'},
+            {'AttributeName': 'version', 'AttributeType': 'N'},
+            {'AttributeName': 'status_shard', 'AttributeType': 'S'},
+            {'AttributeName': 'created_at', 'AttributeType': 'S'}
+        ],
+        KeySchema=[
+            {'AttributeName': 'content_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'version', 'KeyType': 'RANGE'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': status_index.STATUS_INDEX,
+            'KeySchema': [
+                {'AttributeName': 'status_shard', 'KeyType': 'HASH'},
+                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }]
+    )
+    client.get_waiter('table_exists').wait(TableName=table)
+
+
+def make_items(count, shards, processing_share, seed=3):
+    rng = random.Random(seed)
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    items = []
+    for _ in range(count):
+        content_id = str(uuid4())
+        created = start + timedelta(milliseconds=rng.randrange(86_400_000))
+        status = 'processing' if rng.random() < processing_share else rng.choice(STATUSES[1:])
+        items.append({
+            'content_id': content_id,
+            'version': int(created.timestamp()),
+            'user_id': f'user-{rng.randrange(200)}',
+            'created_at': created.isoformat(),
+            **status_index.status_attributes(status, content_id, shards)
+        })
+    return items
+
+
+def write_items(table, items, workers):
+    def write(batch):
+        with table.batch_writer() as writer:
+            for item in batch:
+                writer.put_item(Item=item)
+    batches = [items[start:start + 25] for start in range(0, len(items), 25)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(write, batches))
+
+
+def hottest_share(keys):
+    counts = Counter(keys)
+    return round(max(counts.values()) / len(keys), 3), len(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the write-sharded status index')
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--processing-share', type=float, default=0.9,
+                        help='Share of items still processing, as during an ingestion burst')
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--endpoint-url', help='DynamoDB Local endpoint; moto is used when omitted')
+    args = parser.parse_args()
+
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    table_name = f"{DEFAULT_ENV['CONTENT_TABLE']}-{uuid4().hex[:8]}"
+    items = make_items(args.items, args.shards, args.processing_share)
+
+    with contextlib.nullcontext() if args.endpoint_url else mock_aws():
+        client = boto3.client('dynamodb', endpoint_url=args.endpoint_url)
+        create_table(client, table_name)
+        table = boto3.resource('dynamodb', endpoint_url=args.endpoint_url).Table(table_name)
+        try:
+            started = time.perf_counter()
+            write_items(table, items, args.workers)
+            write_s = time.perf_counter() - started
+
+            expected = sorted((item for item in items if item['status'] == 'processing'),
+                              key=lambda item: item['created_at'], reverse=True)
+            pages = []
+            seen = []
+            cursor = None
+            while True:
+                started = time.perf_counter()
+                page = status_index.query_by_status(table_name, 'processing', limit=args.page_size, cursor=cursor,
+                                                    shards=args.shards, client=client)
+                pages.append((time.perf_counter() - started) * 1000)
+                seen.extend(page['items'])
+                cursor = page['cursor']
+                if not cursor:
+                    break
+            assert [item['content_id'] for item in seen] == [item['content_id'] for item in expected], \
+                'paged results differ from the created_at order'
+        finally:
+            client.delete_table(TableName=table_name)
+
+    unsharded, _ = hottest_share([item['status'] for item in items])
+    sharded, partitions = hottest_share([item['status_shard'] for item in items])
+    print(json.dumps({
+        'items': len(items),
+        'shards': args.shards,
+        'hottest_index_key_share_unsharded': unsharded,
+        'hottest_index_key_share_sharded': sharded,
+        'index_keys_sharded': partitions,
+        'write_items_per_s': round(len(items) / write_s),
+        'processing_items': len(expected),
+        'pages': len(pages),
+        'page_p50_ms': round(statistics.median(pages), 1),
+        'order_verified': True
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
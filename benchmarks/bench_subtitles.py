@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark subtitle generation on synthetic Transcribe output
+"""
+import argparse
+import codecs
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from _lambda import FUNCTIONS_DIR
+
+sys.path.insert(0, str(FUNCTIONS_DIR / 'media_convert'))
+
+from subtitles import build_subtitle_files  # noqa: E402
+
+VOCABULARY = ['नमस्ते', 'हमारे', 'नए', 'उत्पाद', 'में', 'आपका', 'स्वागत', 'है', 'यह', 'आपके',
+              'जीवन', 'को', 'बदल', 'देगा', 'भारत', 'के', 'लिए', 'बना']
+
+
+def synthetic_transcript(minutes, words_per_minute=150, seed=7):
+    """Transcribe-shaped JSON with speaker labels ahead of the items array"""
+    rng = random.Random(seed)
+    items, segments, words = [], [], []
+    clock = 0.0
+    for index in range(int(minutes * words_per_minute)):
+        duration = rng.uniform(0.2, 0.45)
+        start, end = clock, clock + duration
+        word = rng.choice(VOCABULARY)
+        words.append(word)
+        items.append({'start_time': f'{start:.3f}', 'end_time': f'{end:.3f}', 'type': 'pronunciation',
+                      'alternatives': [{'confidence': '0.98', 'content': word}], 'speaker_label': 'spk_0'})
+        if index % 12 == 11:
+            items.append({'type': 'punctuation', 'alternatives': [{'confidence': '0.0', 'content': '।'}]})
+            words.append('।')
+        clock = end + (rng.uniform(0.5, 1.2) if index % 40 == 39 else rng.uniform(0.02, 0.1))
+    segments.append({'start_time': '0.0', 'end_time': f'{clock:.3f}', 'speaker_label': 'spk_0',
+                     'items': [{'start_time': i['start_time'], 'end_time': i['end_time'], 'speaker_label': 'spk_0'}
+                               for i in items if i['type'] == 'pronunciation']})
+    document = {
+        'jobName': 'sanchaar-bench',
+        'results': {
+            'transcripts': [{'transcript': ' '.join(words)}],
+            'speaker_labels': {'speakers': 1, 'segments': segments},
+            'items': items
+        },
+        'status': 'COMPLETED'
+    }
+    return json.dumps(document, ensure_ascii=False), ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the subtitle engine')
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--languages', nargs='+', default=['hi', 'ta', 'te', 'bn'])
+    args = parser.parse_args()
+
+    document, source_text = synthetic_transcript(args.minutes)
+    translations = {language: source_text for language in args.languages[1:]}
+
+    # Read as the Lambda reads the S3 body; a StringIO would hold the whole document decoded
+    transcript = codecs.getreader('utf-8')(io.BytesIO(document.encode('utf-8')))
+    with tempfile.TemporaryDirectory() as workdir:
+        tracemalloc.start()
+        started = time.perf_counter()
+        files = build_subtitle_files(transcript, args.languages, args.languages[0], translations, workdir)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        written = sum(os.path.getsize(content[extension]) for content in files.values() for extension in ('srt', 'vtt'))
+
+    print(json.dumps({
+        'transcript_minutes': args.minutes,
+        'transcript_bytes': len(document.encode('utf-8')),
+        'languages': len(files),
+        'cues': {language: content['cues'] for language, content in files.items()},
+        'subtitle_bytes': written,
+        'seconds': round(elapsed, 3),
+        'seconds_per_language': round(elapsed / max(len(files), 1), 3),
+        'peak_tracemalloc_mb': round(peak / 2 ** 20, 2)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark the transcreation cache stage against moto with the hashing
+embedder and a fake transcreation agent: a stream of campaign posts where
+some are reposted verbatim, some lightly edited and the rest new
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import boto3
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, load_function
+
+TABLE = 'SanchaarTranscreationCache-bench'
+LANGUAGES = ['hi', 'ta', 'te', 'bn', 'mr']
+BRANDS = ['chai-co', 'kurta-house', 'cricket-app']
+WORDS = ('festive sale offer new collection family celebrate diwali pongal onam season discount '
+         'exclusive launch today tomorrow weekend free delivery order now limited stock style '
+         'comfort tradition modern gift loved ones bright colours summer monsoon winter').split()
+
+
+class FakeAgent:
+    """Transcreation agent stand-in with a fixed latency and token usage"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.tokens = 0
+
+    def invoke(self, item):
+        time.sleep(self.latency)
+        self.calls += 1
+        usage = {'inputTokens': 900 + len(item['source_text']) // 4, 'outputTokens': 250}
+        self.tokens += usage['inputTokens'] + usage['outputTokens']
+        return {'Completion': f"[{item['language']}] {item['source_text']}", 'usage': usage}
+
+
+def make_posts(count, repeat_rate, edit_rate, seed=11):
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(count):
+        roll = rng.random()
+        if posts and roll < repeat_rate:
+            posts.append(dict(rng.choice(posts), kind='repeat'))
+        elif posts and roll < repeat_rate + edit_rate:
+            base = rng.choice(posts)
+            words = base['text'].split()
+            words[rng.randrange(len(words))] = rng.choice(WORDS)
+            posts.append({'brand': base['brand'], 'text': ' '.join(words), 'kind': 'edit'})
+        else:
+            posts.append({'brand': rng.choice(BRANDS), 'text': ' '.join(rng.choice(WORDS) for _ in range(40)),
+                          'kind': 'new'})
+    return posts
+
+
+def create_table():
+    boto3.client('dynamodb').create_table(
+        TableName=TABLE,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'partition', 'AttributeType': 'S'},
+            {'AttributeName': 'text_hash', 'AttributeType': 'S'},
+            {'AttributeName': 'created_at', 'AttributeType': 'N'}
+        ],
+        KeySchema=[
+            {'AttributeName': 'partition', 'KeyType': 'HASH'},
+            {'AttributeName': 'text_hash', 'KeyType': 'RANGE'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'partition-created_at-index',
+            'KeySchema': [
+                {'AttributeName': 'partition', 'KeyType': 'HASH'},
+                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }]
+    )
+
+
+def run_pipeline(app, agent, post, content_id):
+    """LookupTranscreationCache -> TranscreationParallel (misses only) -> StoreTranscreations"""
+    supervisor_response = {
+        'brand': post['brand'],
+        'target_languages': [{'language': language, 'source_text': post['text']} for language in LANGUAGES]
+    }
+    started = time.perf_counter()
+    lookup = json.loads(app.lookup_handler({'content_id': content_id, 'supervisor_response': supervisor_response},
+                                           None)['body'])
+    lookup_ms = (time.perf_counter() - started) * 1000
+    results = [agent.invoke(item) for item in lookup['misses']]
+    started = time.perf_counter()
+    merged = json.loads(app.store_handler({'brand': lookup['brand'], 'hits': lookup['hits'],
+                                           'misses': lookup['misses'], 'results': results}, None)['body'])
+    store_ms = (time.perf_counter() - started) * 1000
+    return lookup, merged['transcreations'], lookup_ms, store_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the semantic transcreation cache')
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--repeat-rate', type=float, default=0.25)
+    parser.add_argument('--edit-rate', type=float, default=0.25)
+    parser.add_argument('--agent-latency', type=float, default=0.0, help='Fake agent latency per call (s)')
+    parser.add_argument('--threshold', type=float, default=0.95)
+    parser.add_argument('--max-entries', type=int, default=500)
+    args = parser.parse_args()
+
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    posts = make_posts(args.posts, args.repeat_rate, args.edit_rate)
+    with mock_aws():
+        create_table()
+        app = load_function('transcreation_cache', {
+            'TRANSCREATION_CACHE_TABLE': TABLE,
+            'TRANSCREATION_CACHE_EMBEDDER': 'hashing',
+            'TRANSCREATION_CACHE_SIMILARITY': str(args.threshold),
+            'TRANSCREATION_CACHE_MAX_ENTRIES': str(args.max_entries)
+        })
+        agent = FakeAgent(args.agent_latency)
+        matches = {}
+        lookup_latencies = []
+        store_latencies = []
+        tokens_saved = 0
+        for number, post in enumerate(posts):
+            lookup, transcreations, lookup_ms, store_ms = run_pipeline(app, agent, post, f'content-{number}')
+            assert len(transcreations) == len(LANGUAGES)
+            lookup_latencies.append(lookup_ms)
+            store_latencies.append(store_ms)
+            tokens_saved += sum(hit['tokens'] for hit in lookup['hits'])
+            for hit in lookup['hits']:
+                key = (post['kind'], hit['match'])
+                matches[key] = matches.get(key, 0) + 1
+            for miss in lookup['misses']:
+                matches[post['kind'], 'miss'] = matches.get((post['kind'], 'miss'), 0) + 1
+
+    requests = len(posts) * len(LANGUAGES)
+    print(json.dumps({
+        'posts': len(posts),
+        'language_requests': requests,
+        'agent_calls': agent.calls,
+        'hit_rate': round(1 - agent.calls / requests, 4),
+        'tokens_spent': agent.tokens,
+        'tokens_saved': tokens_saved,
+        'outcomes': {f'{kind}:{match}': count for (kind, match), count in sorted(matches.items())},
+        'lookup_p50_ms': round(statistics.median(lookup_latencies), 2),
+        'store_p50_ms': round(statistics.median(store_latencies), 2)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark the voice-command fast path against moto with the local
+transcription backend, reporting per-stage latency against the 3 s budget
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+import wave
+
+import boto3
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, load_function
+
+BUDGET_MS = 3000
+
+COMMANDS = [
+    ('hi-IN', 'हमारे नए उत्पाद का वीडियो दस भाषाओं में व्हाट्सएप पर भेजो'),
+    ('ta-IN', 'இந்த வீடியோவை இன்ஸ்டாகிராமில் பகிரவும்'),
+    ('te-IN', 'ఈ ప్రకటనను తెలుగు మరియు కన్నడలో పంపండి'),
+    ('bn-IN', 'এই ভিডিওটি শেয়ারচ্যাটে পোস্ট করুন')
+]
+
+
+def synthetic_command(seconds, seed, sample_rate=16000):
+    """Mono 16-bit WAV with a speech-like amplitude envelope"""
+    rng = random.Random(seed)
+    frames = bytearray()
+    for n in range(int(seconds * sample_rate)):
+        envelope = abs(math.sin(n / sample_rate * math.pi * 3))
+        sample = int(envelope * rng.uniform(-8000, 8000))
+        frames += sample.to_bytes(2, 'little', signed=True)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(sample_rate)
+        output.writeframes(bytes(frames))
+    return buffer.getvalue(), bytes(frames)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the voice-command fast path')
+    parser.add_argument('--commands', type=int, default=40)
+    parser.add_argument('--seconds', type=float, nargs=2, default=[2.0, 8.0], help='Command length range')
+    parser.add_argument('--backend-latency', type=float, default=0.35,
+                        help='Simulated streaming session setup and finalisation (s)')
+    parser.add_argument('--realtime-factor', type=float, default=0.1,
+                        help='Simulated transcription time per second of audio')
+    args = parser.parse_args()
+
+    bucket = DEFAULT_ENV['INGESTION_BUCKET']
+    rng = random.Random(5)
+    commands = []
+    fixtures = {}
+    for index in range(args.commands):
+        language, text = COMMANDS[index % len(COMMANDS)]
+        wav, pcm = synthetic_command(rng.uniform(*args.seconds), index)
+        fixtures[hashlib.sha256(pcm).hexdigest()] = {'transcript': text, 'language_code': language}
+        commands.append((f'voice-commands/user-{index}/command-{index}.wav', wav, language))
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(fixtures, f, ensure_ascii=False)
+    env = {
+        'VOICE_COMMAND_FAST_PATH': 'true',
+        'VOICE_COMMAND_BACKEND': 'local',
+        'VOICE_COMMAND_LOCAL_FIXTURES': f.name,
+        'VOICE_COMMAND_LOCAL_LATENCY_SECONDS': str(args.backend_latency),
+        'VOICE_COMMAND_LOCAL_REALTIME_FACTOR': str(args.realtime_factor)
+    }
+    for key, value in {**DEFAULT_ENV, **env}.items():
+        os.environ[key] = value
+
+    with mock_aws():
+        boto3.client('s3').create_bucket(
+            Bucket=bucket,
+            CreateBucketConfiguration={'LocationConstraint': DEFAULT_ENV['AWS_DEFAULT_REGION']}
+        )
+        boto3.client('dynamodb').create_table(
+            TableName=DEFAULT_ENV['CONTENT_TABLE'],
+            BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[
+                {'AttributeName': 'content_id', 'AttributeType': 'S'},
+                {'AttributeName': 'version', 'AttributeType': 'N'}
+            ],
+            KeySchema=[
+                {'AttributeName': 'content_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'version', 'KeyType': 'RANGE'}
+            ]
+        )
+        app = load_function('voice_processor')
+
+        stages = {}
+        totals = []
+        correct = 0
+        for index, (key, wav, language) in enumerate(commands):
+            boto3.client('s3').put_object(Bucket=bucket, Key=key, Body=wav)
+            event = {
+                'time': '2024-06-01T10:00:00Z',
+                'detail': {
+                    'bucket': {'name': bucket},
+                    'object': {'key': key, 'size': len(wav), 'sequencer': f'{index:016X}'}
+                }
+            }
+            started = time.perf_counter()
+            body = json.loads(app.lambda_handler(event, None)['body'])
+            totals.append((time.perf_counter() - started) * 1000)
+            correct += body.get('language_code') == language
+            for stage, ms in body.get('latency_ms', {}).items():
+                stages.setdefault(stage, []).append(ms)
+
+    os.unlink(f.name)
+    print(json.dumps({
+        'commands': len(commands),
+        'language_identified': correct,
+        'stage_ms_p50': {stage: round(statistics.median(values), 2) for stage, values in stages.items()},
+        'stage_ms_p95': {stage: round(percentile(values, 0.95), 2) for stage, values in stages.items()},
+        'total_ms_p50': round(statistics.median(totals), 2),
+        'total_ms_p95': round(percentile(totals, 0.95), 2),
+        'within_budget': sum(total <= BUDGET_MS for total in totals)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Local stand-ins for AWS clients that moto does not emulate usefully for
+benchmarks: MediaConvert jobs that finish and emit their completion events,
+Rekognition, Transcribe batch jobs, and a table's DynamoDB stream
+"""
+import base64
+import random
+import threading
+import time
+import zlib
+from itertools import count
+from uuid import uuid4
+
+from botocore.exceptions import ClientError
+
+
+class LocalMediaConvert:
+    """
+    MediaConvert stand-in: each job runs for a simulated encode time, then
+    its COMPLETE (or ERROR) event is delivered to the completion handler on
+    a background thread, as EventBridge would invoke it
+    """
+
+    def __init__(self, on_event, encode_seconds, failure_rate=0.0, seed=7):
+        self.on_event = on_event
+        self.encode_seconds = encode_seconds
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.jobs = {}
+        self.threads = []
+
+    def create_job(self, Role, Settings, UserMetadata=None):
+        job_id = f'{int(time.time() * 1000)}-{uuid4().hex[:6]}'
+        duration = self.encode_seconds(Settings)
+        failed = self.rng.random() < self.failure_rate
+        self.jobs[job_id] = {'Id': job_id, 'Status': 'PROGRESSING', 'Settings': Settings,
+                             'duration': duration, 'finished_at': None}
+        thread = threading.Thread(target=self.finish, args=(job_id, duration, failed, UserMetadata or {}))
+        thread.start()
+        self.threads.append(thread)
+        return {'Job': {'Id': job_id, 'Status': 'SUBMITTED'}}
+
+    def get_job(self, Id):
+        job = self.jobs[Id]
+        return {'Job': {'Id': Id, 'Status': job['Status']}}
+
+    def finish(self, job_id, duration, failed, user_metadata):
+        time.sleep(duration)
+        job = self.jobs[job_id]
+        job['Status'] = 'ERROR' if failed else 'COMPLETE'
+        job['finished_at'] = time.perf_counter()
+        detail = {'jobId': job_id, 'status': job['Status'], 'userMetadata': user_metadata,
+                  'timing': {'startTime': 0, 'finishTime': int(duration * 1000)}}
+        if failed:
+            detail.update(errorCode=1040, errorMessage='Simulated encode failure')
+        else:
+            detail['outputGroupDetails'] = output_group_details(job['Settings'])
+        self.on_event({'source': 'aws.mediaconvert', 'detail-type': 'MediaConvert Job State Change',
+                       'detail': detail}, None)
+
+    def wait(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class LocalRekognition:
+    def detect_faces(self, **kwargs):
+        return {'FaceDetails': []}
+
+    def detect_text(self, **kwargs):
+        return {'TextDetections': []}
+
+    def detect_moderation_labels(self, **kwargs):
+        return {'ModerationLabels': []}
+
+
+class LocalTranscribe:
+    """Transcribe stand-in: batch jobs report COMPLETED once job_seconds have passed"""
+
+    def __init__(self, job_seconds=0.0):
+        self.job_seconds = job_seconds
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def start_transcription_job(self, TranscriptionJobName, **kwargs):
+        with self._lock:
+            if TranscriptionJobName in self.jobs:
+                raise ClientError({'Error': {'Code': 'ConflictException',
+                                             'Message': 'The requested job name already exists'}},
+                                  'StartTranscriptionJob')
+            self.jobs[TranscriptionJobName] = dict(kwargs, started=time.perf_counter())
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName,
+                                     'TranscriptionJobStatus': 'IN_PROGRESS'}}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        job = self.jobs[TranscriptionJobName]
+        done = time.perf_counter() - job['started'] >= self.job_seconds
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName,
+                                     'TranscriptionJobStatus': 'COMPLETED' if done else 'IN_PROGRESS'}}
+
+
+
+class LocalDynamoDBStream:
+    """
+    DynamoDB Streams stand-in for one table. Writes made through a client
+    from wrap() append NEW_AND_OLD_IMAGES records, in Lambda event format,
+    to the shard of their partition key; poll() hands out the next batch of
+    every shard as the event source mapping would. Records failing
+    record_filter are dropped, like FilterCriteria.
+    """
+
+    def __init__(self, table_name, key_names, shards=4, record_filter=None, region='ap-south-1'):
+        self.table_name = table_name
+        self.key_names = key_names
+        self.record_filter = record_filter
+        self.region = region
+        self.shards = [[] for _ in range(shards)]
+        self.positions = [0] * shards
+        self.filtered = 0
+        self._sequence = count(100000000000000000000)
+        self._lock = threading.Lock()
+
+    def wrap(self, client):
+        return StreamingClient(client, self)
+
+    def capture(self, client, table_name, keys, call):
+        """Run a write, recording the images before and after it of every key it touches"""
+        if table_name != self.table_name:
+            return call()
+        with self._lock:
+            old = [self.read(client, key) for key in keys]
+            result = call()
+            for key, before in zip(keys, old):
+                self.append(key, before, self.read(client, key))
+            return result
+
+    def read(self, client, key):
+        return client.get_item(TableName=self.table_name, Key=key, ConsistentRead=True).get('Item')
+
+    def append(self, key, old, new):
+        # Writes that leave an item as it was produce no stream record
+        if old == new:
+            return
+        change = {
+            'ApproximateCreationDateTime': time.time(),
+            'Keys': event_image(key),
+            'SequenceNumber': str(next(self._sequence)),
+            'StreamViewType': 'NEW_AND_OLD_IMAGES'
+        }
+        if old:
+            change['OldImage'] = event_image(old)
+        if new:
+            change['NewImage'] = event_image(new)
+        record = {
+            'eventID': uuid4().hex,
+            'eventName': 'MODIFY' if old and new else 'INSERT' if new else 'REMOVE',
+            'eventVersion': '1.1',
+            'eventSource': 'aws:dynamodb',
+            'awsRegion': self.region,
+            'dynamodb': change,
+            'eventSourceARN': f'arn:aws:dynamodb:{self.region}:000000000000:table/{self.table_name}/stream/local'
+        }
+        if self.record_filter and not self.record_filter(record):
+            self.filtered += 1
+            return
+        partition = str(next(iter(key.values())))
+        self.shards[zlib.crc32(partition.encode('utf-8')) % len(self.shards)].append(record)
+
+    def key_of(self, item):
+        return {name: item[name] for name in self.key_names}
+
+    def pending(self):
+        with self._lock:
+            return sum(len(records) - position for records, position in zip(self.shards, self.positions))
+
+    def poll(self, batch_size):
+        """The next batch of each shard with records waiting, as stream handler events"""
+        events = []
+        with self._lock:
+            for shard, records in enumerate(self.shards):
+                position = self.positions[shard]
+                if position < len(records):
+                    events.append({'Records': records[position:position + batch_size]})
+                    self.positions[shard] = min(len(records), position + batch_size)
+        return events
+
+
+class StreamingClient:
+    """DynamoDB client whose item writes feed a LocalDynamoDBStream"""
+
+    def __init__(self, client, stream):
+        self.client = client
+        self.stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def put_item(self, **kwargs):
+        return self.stream.capture(self.client, kwargs['TableName'], [self.stream.key_of(kwargs['Item'])],
+                                   lambda: self.client.put_item(**kwargs))
+
+    def update_item(self, **kwargs):
+        return self.stream.capture(self.client, kwargs['TableName'], [kwargs['Key']],
+                                   lambda: self.client.update_item(**kwargs))
+
+    def delete_item(self, **kwargs):
+        return self.stream.capture(self.client, kwargs['TableName'], [kwargs['Key']],
+                                   lambda: self.client.delete_item(**kwargs))
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        requests = RequestItems.get(self.stream.table_name, [])
+        keys = [self.stream.key_of(request['PutRequest']['Item']) if 'PutRequest' in request
+                else request['DeleteRequest']['Key'] for request in requests]
+        return self.stream.capture(self.client, self.stream.table_name if keys else None, keys,
+                                   lambda: self.client.batch_write_item(RequestItems=RequestItems, **kwargs))
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        keys = []
+        for entry in TransactItems:
+            (action, request), = entry.items()
+            if action != 'ConditionCheck' and request['TableName'] == self.stream.table_name:
+                keys.append(self.stream.key_of(request['Item']) if action == 'Put' else request['Key'])
+        return self.stream.capture(self.client, self.stream.table_name if keys else None, keys,
+                                   lambda: self.client.transact_write_items(TransactItems=TransactItems, **kwargs))
+
+
+def event_image(item):
+    """A low-level item as Lambda delivers it in stream events: binary values base64-encoded"""
+    return {name: {'B': base64.b64encode(value['B']).decode('ascii')} if 'B' in value else value
+            for name, value in item.items()}
+
+
+def output_group_details(settings):
+    """The outputGroupDetails MediaConvert reports for a job's settings"""
+    from job_settings import output_uri
+    media_uri = settings['Inputs'][0]['FileInput']
+    groups = []
+    for group in settings['OutputGroups']:
+        group_settings = group['OutputGroupSettings']
+        if group_settings['Type'] == 'FILE_GROUP_SETTINGS':
+            destination = group_settings['FileGroupSettings']['Destination']
+            groups.append({'type': 'FILE_GROUP', 'outputDetails': [
+                {'outputFilePaths': [output_uri(destination, media_uri, name_modifier=output.get('NameModifier', ''))]}
+                for output in group['Outputs']
+            ]})
+        else:
+            destination = next(value['Destination'] for value in group_settings.values()
+                               if isinstance(value, dict) and 'Destination' in value)
+            groups.append({'type': group_settings['Type'].replace('_SETTINGS', ''), 'outputDetails': [],
+                           'playlistFilePaths': [output_uri(destination, media_uri, 'm3u8')]})
+    return groups
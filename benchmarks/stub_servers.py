@@ -0,0 +1,182 @@
+"""
+Local stand-ins for the WhatsApp, ShareChat and Instagram Graph APIs and
+the OpenSearch _bulk API
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+
+class StubPlatformServer:
+    """Threaded HTTP server that answers every platform endpoint with canned JSON"""
+
+    def __init__(self, latency=0.05, jitter=0.0, throttle_rate=0.0, retry_after=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, attribute):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def respond(self, method, path, body):
+        """Return (status, headers, payload) for a request; subclasses override"""
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            headers = {} if self.retry_after is None else {'Retry-After': str(self.retry_after)}
+            return 429, headers, {'error': {'code': 130429, 'message': 'Rate limit hit'}}
+        if path.endswith('/messages'):
+            return 200, {}, {'messages': [{'id': f'wamid.{uuid4().hex}'}]}
+        if path.endswith('/posts'):
+            return 200, {}, {'post_id': uuid4().hex}
+        return 200, {}, {'id': uuid4().hex}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stub.count('connections')
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                stub.count('requests')
+                delay = stub.latency + random.uniform(0, stub.jitter)
+                if delay:
+                    time.sleep(delay)
+                status, headers, payload = stub.respond(method, self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def do_PUT(self):
+                self._serve('PUT')
+
+        return Handler
+
+
+class FakeGraphServer(StubPlatformServer):
+    """Instagram Graph API stand-in whose media containers take time to process"""
+
+    def __init__(self, processing_seconds=(1.0, 3.0), **kwargs):
+        super().__init__(**kwargs)
+        self.processing_seconds = processing_seconds
+        self.containers = {}
+        self.published = 0
+        self.status_lookups = 0
+
+    def respond(self, method, path, body):
+        route, _, query = path.partition('?')
+        if method == 'POST' and route.endswith('/media'):
+            container_id = uuid4().hex
+            with self._lock:
+                self.containers[container_id] = time.monotonic() + random.uniform(*self.processing_seconds)
+            return 200, {}, {'id': container_id}
+
+        if method == 'POST' and route.endswith('/media_publish'):
+            params = parse_qs(body.decode())
+            container_id = params.get('creation_id', [''])[0]
+            ready_at = self.containers.get(container_id)
+            if ready_at is None or ready_at > time.monotonic():
+                return 400, {}, {'error': {'code': 9007, 'message': 'Media ID is not available'}}
+            self.count('published')
+            return 200, {}, {'id': uuid4().hex}
+
+        if method == 'GET':
+            self.count('status_lookups')
+            ids = parse_qs(query).get('ids', [''])[0].split(',')
+            now = time.monotonic()
+            return 200, {}, {
+                container_id: {
+                    'id': container_id,
+                    'status_code': 'FINISHED' if self.containers[container_id] <= now else 'IN_PROGRESS'
+                }
+                for container_id in ids if container_id in self.containers
+            }
+
+        return super().respond(method, path, body)
+
+
+class StubOpenSearchServer(StubPlatformServer):
+    """OpenSearch stand-in that accepts _bulk requests and counts documents per index"""
+
+    def __init__(self, reject_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.reject_rate = reject_rate
+        self.documents = {}
+        self.ids = {}
+        self.bulk_requests = 0
+
+    def respond(self, method, path, body):
+        route = path.partition('?')[0]
+        if method == 'PUT':
+            return 200, {}, {'acknowledged': True, 'index': route.strip('/')}
+        if not route.endswith('/_bulk'):
+            return 404, {}, {'error': 'not found'}
+
+        self.count('bulk_requests')
+        lines = body.decode('utf-8').rstrip('\n').split('\n')
+        items = []
+        errors = False
+        for action_line in lines[0::2]:
+            action = json.loads(action_line)['index']
+            if self.reject_rate and random.random() < self.reject_rate:
+                errors = True
+                items.append({'index': {'_index': action['_index'], 'status': 429,
+                                        'error': {'type': 'es_rejected_execution_exception'}}})
+                continue
+            with self._lock:
+                self.documents[action['_index']] = self.documents.get(action['_index'], 0) + 1
+                if '_id' in action:
+                    self.ids[action['_id']] = self.ids.get(action['_id'], 0) + 1
+            items.append({'index': {'_index': action['_index'], 'status': 201}})
+        return 200, {}, {'took': 1, 'errors': errors, 'items': items}
@@ -0,0 +1,45 @@
+"use client";
+
+import { useEffect, useState } from "react";
+import { StatusAggregate } from "@/types/pipeline";
+
+// StatusEventsURL output of the SAM stack
+const STATUS_EVENTS_URL = process.env.NEXT_PUBLIC_STATUS_EVENTS_URL;
+
+/**
+ * Live pipeline status from the status aggregate's server-sent events.
+ * A snapshot replaces the counters, a delta adds to them; EventSource
+ * reconnects after each long-poll with the last revision it applied.
+ */
+export function usePipelineStatusStream(url: string | undefined = STATUS_EVENTS_URL) {
+    const [aggregate, setAggregate] = useState<StatusAggregate | null>(null);
+    const [connected, setConnected] = useState(false);
+
+    useEffect(() => {
+        if (!url) return;
+        const source = new EventSource(url);
+
+        source.addEventListener("snapshot", (event) => {
+            setAggregate(JSON.parse((event as MessageEvent).data));
+        });
+        source.addEventListener("delta", (event) => {
+            const delta: StatusAggregate = JSON.parse((event as MessageEvent).data);
+            setAggregate((current) => {
+                if (!current) return current;
+                const counters = { ...current.counters };
+                Object.entries(delta.counters).forEach(([name, count]) => {
+                    counters[name] = (counters[name] ?? 0) + count;
+                    if (counters[name] === 0) delete counters[name];
+                });
+                return { revision: delta.revision, counters, latency: delta.latency };
+            });
+        });
+        source.onopen = () => setConnected(true);
+        // Each long-poll ends with an error event; only a closed source is disconnected
+        source.onerror = () => setConnected(source.readyState !== EventSource.CLOSED);
+
+        return () => source.close();
+    }, [url]);
+
+    return { aggregate, connected };
+}
@@ -51,3 +51,13 @@ export interface SocialPreview {
   hashtags?: string[];
   mediaAspect: "9:16" | "1:1" | "16:9";
 }
+
+export interface StatusAggregate {
+  revision: number;
+  // status#<status>, delivery#<platform>#<outcome>, language#<language>#<outcome>
+  counters: Record<string, number>;
+  latency: {
+    window_seconds: number;
+    buckets: Record<string, number>; // le_<seconds> upper bounds, le_inf last
+  };
+}
@@ -0,0 +1,52 @@
+import json
+
+from sanchaar_common import admission
+
+def acquire_handler(event, context):
+    """
+    Queue a request for a slot on a shared resource
+    Invoked with a task token; the execution resumes with its lease once granted
+    """
+    resource = event['resource']
+    if resource not in admission.ADMISSION_CAPACITY:
+        raise ValueError(f"Unknown admission resource: {resource}")
+    priority = admission.normalise_priority(event.get('priority'))
+    
+    # Every request queues, so one arriving as a slot frees cannot overtake those waiting
+    request_id = admission.enqueue(resource, priority, event['task_token'])
+    grants = admission.dispatch(resource)
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'request_id': request_id, 'resource': resource, 'priority': priority,
+                            'granted': len(grants)})
+    }
+
+def release_handler(event, context):
+    """
+    Return a lease and grant the slot to the next queued request
+    """
+    lease = event.get('lease')
+    admission.release_and_dispatch(lease)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'released': bool(lease)})
+    }
+
+def sweep_handler(event, context):
+    """
+    Reclaim expired leases, grant what they free and report utilisation
+    Triggered on a schedule
+    """
+    report = []
+    for resource in admission.ADMISSION_CAPACITY:
+        reclaimed = admission.reap(resource)
+        grants = admission.dispatch(resource)
+        state = admission.stats(resource)
+        print(json.dumps({'metric': 'admission_state', **state, 'reclaimed': reclaimed, 'granted': len(grants)}))
+        report.append(state)
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps(report)
+    }
@@ -0,0 +1,59 @@
+import json
+import time
+from datetime import datetime, timezone
+
+from sanchaar_common.claim_check import parse_body, resolve, resolve_all
+from sanchaar_common.content_store import get_store
+from sanchaar_common.delivery_outcome import delivery_counts
+from sanchaar_common.status_index import status_attributes
+
+def lambda_handler(event, context):
+    """
+    Record a finished pipeline run in the content table, with the bulky
+    results compressed and chunked by the content store
+    """
+    started = time.perf_counter()
+    content_id = event['content_id']
+    version = event['version']
+    
+    # Claim-check objects expire, so the record keeps the values themselves
+    payloads = {
+        'transcreations': resolve_all(event.get('transcreations')) or [],
+        'distribution_results': [distribution_result(result) for result in event.get('distribution_results') or []]
+    }
+    attributes = {
+        **status_attributes(event.get('status') or 'completed', content_id),
+        'created_at': event.get('created_at') or datetime.now(timezone.utc).isoformat()
+    }
+    if event.get('user_id'):
+        attributes['user_id'] = event['user_id']
+    # Plain attribute so the status aggregator counts deliveries without decoding payloads
+    counts = delivery_counts(payloads['distribution_results'])
+    if counts:
+        attributes['delivery_counts'] = counts
+    
+    summary = get_store().put_record(content_id, version, attributes, payloads)
+    
+    print(json.dumps({
+        'metric': 'content_record_write',
+        'content_id': content_id,
+        'version': version,
+        'items': summary['items'],
+        'layout': summary['layout'],
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1)
+    }))
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'content_id': content_id, 'version': version, 'items': summary['items']})
+    }
+
+def distribution_result(result):
+    """Platform distributor response as stored: parsed body with its rows resolved"""
+    response = result.get('Payload', result) if isinstance(result, dict) else result
+    if not isinstance(response, dict) or 'body' not in response:
+        return response
+    body = parse_body(response['body'])
+    if isinstance(body, dict) and 'result' in body:
+        body = dict(body, result=resolve(body['result']))
+    return dict(body, statusCode=response.get('statusCode')) if isinstance(body, dict) else body
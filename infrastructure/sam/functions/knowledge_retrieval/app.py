@@ -0,0 +1,138 @@
+import json
+import boto3
+import os
+import time
+from functools import lru_cache
+
+from kb_index import FILTER_FIELDS, get_index
+
+BEDROCK_REGION = os.environ.get('BEDROCK_REGION', 'us-east-1')
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'amazon.titan-embed-text-v1')
+KB_COLLECTION_ENDPOINT = os.environ.get('KB_COLLECTION_ENDPOINT', '')
+DEFAULT_K = int(os.environ.get('KB_RETRIEVAL_K', '5'))
+# Local results whose best cosine score is below this are treated as a miss
+LOCAL_MIN_SCORE = float(os.environ.get('KB_LOCAL_MIN_SCORE', '0.5'))
+QUERY_CACHE_SIZE = int(os.environ.get('KB_QUERY_CACHE_SIZE', '4096'))
+
+# Field the request's language filters on in each index
+LANGUAGE_FIELDS = {
+    'cultural-references': 'language',
+    'idioms-phrases': 'target_language'
+}
+
+bedrock = boto3.client('bedrock-runtime', region_name=BEDROCK_REGION)
+_opensearch = None
+
+def lambda_handler(event, context):
+    """
+    Retrieve idioms, cultural references or brand guidelines for phrases
+    from the in-process index, falling back to OpenSearch on a miss
+    """
+    try:
+        index_name = event['index']
+        phrases = event.get('phrases') or [event['text']]
+        k = int(event.get('k', DEFAULT_K))
+        filters = build_filters(index_name, event.get('language'), event.get('region'))
+        
+        started = time.perf_counter()
+        results = retrieve(index_name, phrases, filters, k)
+        print(json.dumps({
+            'index': index_name,
+            'phrases': len(phrases),
+            'local': sum(1 for result in results if result['source'] == 'local'),
+            'fallbacks': sum(1 for result in results if result['source'] == 'opensearch'),
+            'latency_ms': round((time.perf_counter() - started) * 1000, 1)
+        }))
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'index': index_name, 'results': results}, ensure_ascii=False)
+        }
+    
+    except Exception as e:
+        print(f"Error retrieving knowledge: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def build_filters(index_name, language=None, region=None):
+    filters = {}
+    if language:
+        filters[LANGUAGE_FIELDS.get(index_name, 'language')] = language
+    if region and 'region' in FILTER_FIELDS.get(index_name, []):
+        filters['region'] = region
+    return filters
+
+def retrieve(index_name, phrases, filters, k):
+    """One result per phrase with its hits and whether they came from the local index or OpenSearch"""
+    vectors = [embed_query(phrase) for phrase in phrases]
+    local = get_index(index_name)
+    local_hits = local.search(vectors, k, filters) if local else [[] for _ in phrases]
+    
+    results = []
+    for phrase, vector, hits in zip(phrases, vectors, local_hits):
+        if local_hit(hits, k) or not KB_COLLECTION_ENDPOINT:
+            results.append({
+                'phrase': phrase,
+                'source': 'local',
+                'hits': [{'score': round(score, 4), 'document': local.document(row)} for score, row in hits]
+            })
+        else:
+            results.append({
+                'phrase': phrase,
+                'source': 'opensearch',
+                'hits': opensearch_search(index_name, vector, k, filters)
+            })
+    return results
+
+def local_hit(hits, k):
+    """A full page of results with a confident best match"""
+    return len(hits) >= k and hits[0][0] >= LOCAL_MIN_SCORE
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def embed_query(text):
+    """Titan embedding of a phrase; hot phrases repeat across transcreations"""
+    response = bedrock.invoke_model(
+        modelId=EMBEDDING_MODEL,
+        body=json.dumps({'inputText': text}),
+        contentType='application/json',
+        accept='application/json'
+    )
+    return tuple(json.loads(response['body'].read())['embedding'])
+
+def opensearch_search(index_name, vector, k, filters):
+    body = {
+        'size': k,
+        'query': {
+            'bool': {
+                'must': [{'knn': {'embedding': {'vector': list(vector), 'k': k}}}],
+                'filter': [{'term': {field: value}} for field, value in filters.items()]
+            }
+        },
+        '_source': {'excludes': ['embedding']}
+    }
+    response = opensearch_client().search(index=index_name, body=body)
+    return [{'score': round(hit['_score'], 4), 'document': hit['_source']} for hit in response['hits']['hits']]
+
+def opensearch_client():
+    """Shared SigV4-signed client for the collection, created on the first fallback"""
+    global _opensearch
+    if _opensearch is None:
+        from opensearchpy import OpenSearch, RequestsHttpConnection
+        from requests_aws4auth import AWS4Auth
+        
+        if KB_COLLECTION_ENDPOINT.startswith('http://'):
+            _opensearch = OpenSearch(hosts=[KB_COLLECTION_ENDPOINT], connection_class=RequestsHttpConnection)
+        else:
+            session = boto3.Session()
+            credentials = session.get_credentials()
+            _opensearch = OpenSearch(
+                hosts=[{'host': KB_COLLECTION_ENDPOINT.replace('https://', ''), 'port': 443}],
+                http_auth=AWS4Auth(credentials.access_key, credentials.secret_key, session.region_name,
+                                   'aoss', session_token=credentials.token),
+                use_ssl=True,
+                verify_certs=True,
+                connection_class=RequestsHttpConnection
+            )
+    return _opensearch
@@ -0,0 +1,328 @@
+"""
+Keyframe-sampled Rekognition content analysis with an ETag-keyed result cache
+
+Videos are analyzed from still frames: keyframes already stored beside the
+source are used when present, otherwise frames are extracted with ffmpeg from
+the layer mounted at /opt/bin. A video object is never passed to the image
+APIs itself.
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from botocore.exceptions import ClientError
+
+from clients import get_client
+
+# Keyframes for s3://bucket/key are read from s3://bucket/{KEYFRAME_PREFIX}{key}/
+KEYFRAME_PREFIX = os.environ.get('KEYFRAME_PREFIX', 'keyframes/')
+MAX_KEYFRAMES = int(os.environ.get('ANALYSIS_MAX_KEYFRAMES', '5'))
+MAX_WORKERS = int(os.environ.get('ANALYSIS_MAX_WORKERS', '8'))
+MIN_CONFIDENCE = int(os.environ.get('MODERATION_MIN_CONFIDENCE', '75'))
+
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', '/opt/bin/ffmpeg')
+FFMPEG_TIMEOUT_SECONDS = int(os.environ.get('FFMPEG_TIMEOUT_SECONDS', '60'))
+PRESIGNED_URL_SECONDS = 900
+
+_DURATION = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+
+ANALYSIS_CACHE_BUCKET = os.environ.get('ANALYSIS_CACHE_BUCKET') or os.environ.get('OUTPUT_BUCKET')
+ANALYSIS_CACHE_PREFIX = 'analysis-cache/'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Analyses a warm container keeps to answer repeat requests without touching S3
+ANALYSIS_MEMORY_ENTRIES = int(os.environ.get('ANALYSIS_MEMORY_ENTRIES', '256'))
+# How long a caller waits for a sibling already analyzing the same object
+ANALYSIS_WAIT_SECONDS = float(os.environ.get('ANALYSIS_WAIT_SECONDS', '60'))
+ANALYSIS_POLL_SECONDS = 1.0
+# A pending marker older than this belongs to an invocation that died mid-analysis
+ANALYSIS_CLAIM_STALE_SECONDS = 300
+
+
+class AnalysisCache:
+    """Least recently used analyses by cache key, bounded by entry count"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self._lock:
+            if cache_key not in self._entries:
+                return None
+            self._entries.move_to_end(cache_key)
+            return self._entries[cache_key]
+
+    def put(self, cache_key, analysis):
+        with self._lock:
+            self._entries[cache_key] = analysis
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_memory_cache = AnalysisCache(ANALYSIS_MEMORY_ENTRIES)
+# cache key -> Event set when this container's analysis of it finishes
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def analyze_content(bucket, key, etag=None, rekognition=None, s3=None):
+    """
+    Analyze a media object from a bounded sample of keyframes. Results are
+    cached by bucket/key/ETag so sibling Map branches and re-runs reuse them.
+    """
+    rekognition = rekognition or get_client('rekognition')
+    s3 = s3 or get_client('s3')
+
+    etag = (etag or s3.head_object(Bucket=bucket, Key=key)['ETag']).strip('"')
+    cache_key = analysis_cache_key(bucket, key, etag)
+
+    cached = read_cached_analysis(s3, cache_key)
+    if cached is not None:
+        return dict(cached, cache_hit=True)
+
+    with single_flight(s3, cache_key) as leader:
+        if not leader:
+            cached = read_cached_analysis(s3, cache_key)
+            if cached is not None:
+                return dict(cached, cache_hit=True)
+        frames = sample_keyframes(s3, bucket, key)
+        analysis = merge_frame_results(analyze_frames(rekognition, frames))
+        write_cached_analysis(s3, cache_key, analysis)
+    return dict(analysis, cache_hit=False)
+
+
+@contextmanager
+def single_flight(s3, cache_key):
+    """
+    Let one caller per cache key analyze while the others wait for its
+    result: threads of this container through an in-flight event, sibling
+    invocations through a pending marker in the cache bucket. Yields True
+    to the caller that should analyze; a waiter whose leader produced no
+    result in time analyzes itself.
+    """
+    with _in_flight_lock:
+        event = _in_flight.get(cache_key)
+        leader = event is None
+        if leader:
+            _in_flight[cache_key] = event = threading.Event()
+    if not leader:
+        event.wait(ANALYSIS_WAIT_SECONDS)
+        yield False
+        return
+    try:
+        if claim_analysis(s3, cache_key):
+            try:
+                yield True
+            finally:
+                release_analysis(s3, cache_key)
+        else:
+            wait_for_analysis(s3, cache_key)
+            yield False
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(cache_key, None)
+        event.set()
+
+
+def pending_key(cache_key):
+    return f'{ANALYSIS_CACHE_PREFIX}{cache_key}.pending'
+
+
+def claim_analysis(s3, cache_key):
+    """Create the pending marker; False while a live sibling holds it"""
+    if not ANALYSIS_CACHE_BUCKET:
+        return True
+    try:
+        s3.put_object(Bucket=ANALYSIS_CACHE_BUCKET, Key=pending_key(cache_key), Body=b'', IfNoneMatch='*')
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            raise
+    try:
+        marker = s3.head_object(Bucket=ANALYSIS_CACHE_BUCKET, Key=pending_key(cache_key))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return True
+        raise
+    return time.time() - marker['LastModified'].timestamp() > ANALYSIS_CLAIM_STALE_SECONDS
+
+
+def release_analysis(s3, cache_key):
+    if ANALYSIS_CACHE_BUCKET:
+        s3.delete_object(Bucket=ANALYSIS_CACHE_BUCKET, Key=pending_key(cache_key))
+
+
+def wait_for_analysis(s3, cache_key):
+    """Poll until the sibling's result is cached or its marker is gone"""
+    deadline = time.monotonic() + ANALYSIS_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(ANALYSIS_POLL_SECONDS)
+        if read_cached_analysis(s3, cache_key) is not None:
+            return
+        try:
+            s3.head_object(Bucket=ANALYSIS_CACHE_BUCKET, Key=pending_key(cache_key))
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return
+            raise
+
+
+def analysis_cache_key(bucket, key, etag):
+    """Cache key covering the object version and the sampling/moderation settings"""
+    identity = f'{bucket}/{key}/{etag}/{MAX_KEYFRAMES}/{MIN_CONFIDENCE}'
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def sample_keyframes(s3, bucket, key):
+    """
+    Pick up to MAX_KEYFRAMES evenly spaced frames as (name, Rekognition
+    Image) pairs. Images are analyzed directly; videos use the keyframes
+    stored under KEYFRAME_PREFIX, or frames extracted with ffmpeg.
+    """
+    if key.lower().endswith(IMAGE_EXTENSIONS):
+        return [(key, {'S3Object': {'Bucket': bucket, 'Name': key}})]
+
+    frames = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f'{KEYFRAME_PREFIX}{key}/'):
+        frames.extend(obj['Key'] for obj in page.get('Contents', [])
+                      if obj['Key'].lower().endswith(IMAGE_EXTENSIONS))
+    if not frames:
+        return extract_keyframes(s3, bucket, key)
+
+    frames.sort()
+    if len(frames) > MAX_KEYFRAMES:
+        step = (len(frames) - 1) / (MAX_KEYFRAMES - 1) if MAX_KEYFRAMES > 1 else 0
+        frames = [frames[round(i * step)] for i in range(MAX_KEYFRAMES)]
+    return [(frame, {'S3Object': {'Bucket': bucket, 'Name': frame}}) for frame in frames]
+
+
+def ffmpeg_available():
+    return os.path.isfile(FFMPEG_PATH) and os.access(FFMPEG_PATH, os.X_OK)
+
+
+def extract_keyframes(s3, bucket, key):
+    """
+    Grab MAX_KEYFRAMES JPEG frames spread over a video. ffmpeg reads a
+    presigned URL and seeks before decoding, so it fetches byte ranges
+    around each frame instead of downloading the whole object.
+    """
+    if not ffmpeg_available():
+        raise ValueError(f'No keyframes under {KEYFRAME_PREFIX}{key}/ and no ffmpeg at {FFMPEG_PATH} to extract them')
+    url = s3.generate_presigned_url('get_object', Params={'Bucket': bucket, 'Key': key},
+                                    ExpiresIn=PRESIGNED_URL_SECONDS)
+    duration = probe_duration(url)
+    timestamps = [duration * (index + 0.5) / MAX_KEYFRAMES for index in range(MAX_KEYFRAMES)]
+
+    def grab(timestamp):
+        completed = subprocess.run(
+            [FFMPEG_PATH, '-hide_banner', '-nostats', '-loglevel', 'error', '-ss', f'{timestamp:.3f}',
+             '-i', url, '-frames:v', '1', '-q:v', '3', '-c:v', 'mjpeg', '-f', 'image2', 'pipe:1'],
+            capture_output=True, check=True, timeout=FFMPEG_TIMEOUT_SECONDS
+        )
+        return completed.stdout
+
+    with ThreadPoolExecutor(max_workers=max(min(MAX_WORKERS, len(timestamps)), 1)) as executor:
+        images = list(executor.map(grab, timestamps))
+    frames = [(f'{key}@{timestamp:.3f}s', {'Bytes': image})
+              for timestamp, image in zip(timestamps, images) if image]
+    if not frames:
+        raise ValueError(f'ffmpeg extracted no frames from s3://{bucket}/{key}')
+    return frames
+
+
+def probe_duration(url):
+    """Duration in seconds that ffmpeg reports for the input"""
+    # Without an output ffmpeg exits non-zero after printing the input details
+    completed = subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-nostats', '-i', url],
+        capture_output=True, text=True, timeout=FFMPEG_TIMEOUT_SECONDS
+    )
+    match = _DURATION.search(completed.stderr)
+    if match is None:
+        raise ValueError('ffmpeg did not report a duration')
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def analyze_frames(rekognition, frames):
+    """Issue every Rekognition call for every frame concurrently"""
+    def detect(task):
+        (name, image), operation = task
+        if operation == 'faces':
+            return name, operation, rekognition.detect_faces(Image=image, Attributes=['ALL'])
+        if operation == 'text':
+            return name, operation, rekognition.detect_text(Image=image)
+        return name, operation, rekognition.detect_moderation_labels(
+            Image=image,
+            MinConfidence=MIN_CONFIDENCE
+        )
+
+    tasks = [(frame, operation) for frame in frames for operation in ('faces', 'text', 'moderation')]
+    with ThreadPoolExecutor(max_workers=max(min(MAX_WORKERS, len(tasks)), 1)) as executor:
+        results = list(executor.map(detect, tasks))
+
+    per_frame = {}
+    for name, operation, response in results:
+        per_frame.setdefault(name, {})[operation] = response
+    return [per_frame[name] for name, _ in frames]
+
+
+def merge_frame_results(frame_results):
+    """Combine per-frame verdicts; any flagged frame flags the whole object"""
+    labels = []
+    for result in frame_results:
+        for label in result['moderation']['ModerationLabels']:
+            if label['Name'] not in labels:
+                labels.append(label['Name'])
+
+    return {
+        'faces_detected': max((len(r['faces']['FaceDetails']) for r in frame_results), default=0),
+        'text_detected': any(r['text']['TextDetections'] for r in frame_results),
+        'moderation_labels': labels,
+        'safe_for_distribution': not labels,
+        'frames_analyzed': len(frame_results)
+    }
+
+
+def read_cached_analysis(s3, cache_key):
+    cached = _memory_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    if not ANALYSIS_CACHE_BUCKET:
+        return None
+    try:
+        response = s3.get_object(Bucket=ANALYSIS_CACHE_BUCKET, Key=f'{ANALYSIS_CACHE_PREFIX}{cache_key}.json')
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    analysis = json.loads(response['Body'].read())
+    _memory_cache.put(cache_key, analysis)
+    return analysis
+
+
+def write_cached_analysis(s3, cache_key, analysis):
+    _memory_cache.put(cache_key, analysis)
+    if not ANALYSIS_CACHE_BUCKET:
+        return
+    s3.put_object(
+        Bucket=ANALYSIS_CACHE_BUCKET,
+        Key=f'{ANALYSIS_CACHE_PREFIX}{cache_key}.json',
+        Body=json.dumps(analysis).encode('utf-8'),
+        ContentType='application/json'
+    )
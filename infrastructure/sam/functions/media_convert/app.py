@@ -1,36 +1,30 @@
+# Imported first so the cold start init duration covers the imports below
+from sanchaar_common.instrumentation import instrument_boto3, instrumented, timed
+
+import codecs
 import json
-import boto3
 import os
+import tempfile
+import time
 
-mediaconvert = boto3.client('mediaconvert')
-rekognition = boto3.client('rekognition')
-s3 = boto3.client('s3')
-
-OUTPUT_BUCKET = os.environ['OUTPUT_BUCKET']
+from analysis import analyze_content
+import completion
+import encode_cache
+from clients import get_client
+from job_settings import build_job_settings, normalize_aspect_ratios, predict_outputs
+from profiles import get_profile
+from sanchaar_common.admission import release_and_dispatch
+from sanchaar_common.claim_check import offload, resolve
+from subtitles import build_subtitle_files, upload_subtitle_files
 
-# Get MediaConvert endpoint
-endpoints = mediaconvert.describe_endpoints()
-mediaconvert_endpoint = endpoints['Endpoints'][0]['Url']
-mediaconvert = boto3.client('mediaconvert', endpoint_url=mediaconvert_endpoint)
+# Clients are created lazily, so every AWS call they make is timed
+instrument_boto3()
 
-ASPECT_RATIO_CONFIGS = {
-    '9:16': {
-        'width': 720,
-        'height': 1280,
-        'bitrate': 2500000
-    },
-    '1:1': {
-        'width': 1080,
-        'height': 1080,
-        'bitrate': 4000000
-    },
-    '16:9': {
-        'width': 1920,
-        'height': 1080,
-        'bitrate': 8000000
-    }
-}
+OUTPUT_BUCKET = os.environ['OUTPUT_BUCKET']
+# sidecar: WebVTT renditions in the HLS ladder; burn_in: open-caption MP4 per language
+SUBTITLE_MODE = os.environ.get('SUBTITLE_MODE', 'sidecar')
 
+@instrumented('media_convert')
 def lambda_handler(event, context):
     """
     Process media files using AWS Elemental MediaConvert
@@ -38,123 +32,181 @@ def lambda_handler(event, context):
     """
     try:
         media_uri = event['media_uri']
-        aspect_ratio = event['aspect_ratio']
+        # One job for all requested ratios, or the single ratio of a Map branch
+        aspect_ratios = normalize_aspect_ratios(event.get('aspect_ratios') or event['aspect_ratio'])
         subtitle_languages = event.get('subtitle_languages', [])
+        profile = get_profile(event.get('encoding_profile'))
+        
+        bucket, key = parse_s3_uri(media_uri)
+        head = get_client('s3').head_object(Bucket=bucket, Key=key)
         
-        # Analyze content with Rekognition
-        content_analysis = analyze_content(media_uri)
+        # Analyze sampled keyframes with Rekognition (cached per source ETag)
+        content_analysis = analyze_content(bucket, key, etag=head['ETag'])
         
         if not content_analysis['safe_for_distribution']:
-            return {
+            return respond(event, {
                 'statusCode': 400,
                 'body': json.dumps({'error': 'Content flagged by moderation'})
+            })
+        
+        captions = prepare_captions(event, subtitle_languages)
+        
+        # Reuse encodes of identical sources; only transcode what is missing
+        source_hash = encode_cache.source_fingerprint(head)
+        hits, misses = encode_cache.lookup(source_hash, aspect_ratios, profile, captions)
+        outputs = {ratio: manifest['outputs'] for ratio, manifest in hits.items()}
+        
+        job_id = None
+        if misses:
+            job_id = create_mediaconvert_job(
+                media_uri,
+                misses,
+                subtitle_languages,
+                content_analysis,
+                profile,
+                source_hash,
+                captions
+            )
+            new_outputs = {
+                ratio: predict_outputs(media_uri, ratio, OUTPUT_BUCKET, profile, source_hash, captions)
+                for ratio in misses
             }
+            encode_cache.record(source_hash, new_outputs, job_id, profile, captions)
+            outputs.update(new_outputs)
         
-        # Create MediaConvert job
-        job_id = create_mediaconvert_job(
-            media_uri,
-            aspect_ratio,
-            subtitle_languages,
-            content_analysis
-        )
+        result = {
+            'job_id': job_id,
+            'aspect_ratios': aspect_ratios,
+            'encoding_profile': profile['name'],
+            'outputs': {ratio: outputs[ratio]['video'] for ratio in aspect_ratios},
+            'streaming_manifests': {ratio: outputs[ratio]['stream'] for ratio in aspect_ratios},
+            'subtitled_videos': {
+                ratio: outputs[ratio]['subtitled_videos']
+                for ratio in aspect_ratios if outputs[ratio].get('subtitled_videos')
+            },
+            # Bulky fields travel by reference once they outgrow the claim-check threshold
+            'subtitles': offload(captions['tracks'] if captions else [], 'subtitles'),
+            'cache_hits': {ratio: manifest['job_id'] for ratio, manifest in hits.items()},
+            'content_analysis': offload(content_analysis, 'content-analysis')
+        }
+        if 'aspect_ratios' not in event:
+            result['aspect_ratio'] = aspect_ratios[0]
         
-        return {
+        # Joined encodes of other executions may still be running too
+        pending_jobs = [job_id] if job_id else []
+        pending_jobs += [manifest['job_id'] for manifest in hits.values()
+                         if manifest['status'] != encode_cache.STATUS_COMPLETE]
+        return respond(event, {
             'statusCode': 200,
-            'body': json.dumps({
-                'job_id': job_id,
-                'aspect_ratio': aspect_ratio,
-                'content_analysis': content_analysis
-            })
-        }
+            'body': json.dumps(result)
+        }, pending_jobs)
         
     except Exception as e:
         print(f"Error in media processing: {str(e)}")
-        return {
+        return respond(event, {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
-        }
+        })
 
-def analyze_content(s3_uri):
-    """Analyze video content using Rekognition"""
-    bucket, key = parse_s3_uri(s3_uri)
-    
-    # Detect faces
-    faces_response = rekognition.detect_faces(
-        Image={'S3Object': {'Bucket': bucket, 'Name': key}},
-        Attributes=['ALL']
-    )
-    
-    # Detect text
-    text_response = rekognition.detect_text(
-        Image={'S3Object': {'Bucket': bucket, 'Name': key}}
-    )
+def respond(event, response, pending_jobs=()):
+    """
+    Return the response, and when invoked with a task token, hand it to the
+    execution now or once the pending jobs' completion events arrive
+    """
+    task_token = event.get('task_token')
+    if not task_token:
+        return response
+    if not pending_jobs:
+        completion.send_success(task_token, response)
+        release_and_dispatch(event.get('lease'))
+        return response
     
-    # Content moderation
-    moderation_response = rekognition.detect_moderation_labels(
-        Image={'S3Object': {'Bucket': bucket, 'Name': key}},
-        MinConfidence=75
-    )
+    # The encode slot is held until the completion event releases it
+    waiter = completion.register(task_token, pending_jobs, response, event.get('lease'))
+    # A joined job can finish before the waiter exists, and its event is not redelivered
+    outcome = completion.resume_if_ready(waiter)
+    print(json.dumps({'event': 'mediaconvert_waiter_registered', 'jobs': waiter['jobs'], 'outcome': outcome}))
+    return response
+
+@instrumented('media_convert_complete')
+def job_complete_handler(event, context):
+    """
+    Resume the executions waiting on a MediaConvert job
+    Triggered by MediaConvert job state change events
+    """
+    detail = event['detail']
+    job_id = detail['jobId']
+    outcomes = {}
+    for waiter in completion.waiters_for(job_id):
+        outcome = completion.resume_if_ready(waiter, {job_id: detail})
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
     
+    timing = detail.get('timing') or {}
+    print(json.dumps({
+        'event': 'mediaconvert_job_state',
+        'job_id': job_id,
+        'status': detail.get('status'),
+        'waiters': outcomes,
+        # Event timestamps are epoch milliseconds
+        'encode_ms': timing['finishTime'] - timing['startTime'] if 'finishTime' in timing and 'startTime' in timing else None
+    }))
     return {
-        'faces_detected': len(faces_response['FaceDetails']),
-        'text_detected': len(text_response['TextDetections']) > 0,
-        'moderation_labels': [l['Name'] for l in moderation_response['ModerationLabels']],
-        'safe_for_distribution': len(moderation_response['ModerationLabels']) == 0
+        'statusCode': 200,
+        'body': json.dumps({'job_id': job_id, 'status': detail.get('status'), 'waiters': outcomes})
     }
 
-def create_mediaconvert_job(media_uri, aspect_ratio, subtitle_languages, analysis):
-    """Create MediaConvert job with specified configuration"""
-    config = ASPECT_RATIO_CONFIGS[aspect_ratio]
-    bucket, key = parse_s3_uri(media_uri)
+def prepare_captions(event, subtitle_languages):
+    """
+    Build SRT/WebVTT files for the requested languages from the Transcribe
+    output at transcript_uri and return the caption config for the job.
+    Languages other than the source are retimed from subtitle_texts.
+    """
+    transcript_uri = event.get('transcript_uri')
+    if not subtitle_languages or not transcript_uri:
+        return None
     
-    job_settings = {
-        'Inputs': [{
-            'FileInput': media_uri,
-            'AudioSelectors': {
-                'Audio Selector 1': {'DefaultSelection': 'DEFAULT'}
-            },
-            'VideoSelector': {},
-            'TimecodeSource': 'ZEROBASED'
-        }],
-        'OutputGroups': [{
-            'Name': f'Output_{aspect_ratio}',
-            'OutputGroupSettings': {
-                'Type': 'FILE_GROUP_SETTINGS',
-                'FileGroupSettings': {
-                    'Destination': f's3://{OUTPUT_BUCKET}/{aspect_ratio}/'
-                }
-            },
-            'Outputs': [{
-                'VideoDescription': {
-                    'Width': config['width'],
-                    'Height': config['height'],
-                    'CodecSettings': {
-                        'Codec': 'H_264',
-                        'H264Settings': {
-                            'RateControlMode': 'CBR',
-                            'Bitrate': config['bitrate'],
-                            'FramerateControl': 'SPECIFIED',
-                            'FramerateNumerator': 30,
-                            'FramerateDenominator': 1
-                        }
-                    }
-                },
-                'AudioDescriptions': [{
-                    'CodecSettings': {
-                        'Codec': 'AAC',
-                        'AacSettings': {
-                            'Bitrate': 128000,
-                            'SampleRate': 48000
-                        }
-                    }
-                }]
-            }]
-        }]
+    started = time.perf_counter()
+    s3 = get_client('s3')
+    bucket, key = parse_s3_uri(transcript_uri)
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    with tempfile.TemporaryDirectory() as workdir:
+        with timed('subtitles.build'):
+            files = build_subtitle_files(
+                codecs.getreader('utf-8')(body),
+                subtitle_languages,
+                # Transcribe reports locales such as hi-IN; subtitle languages are bare codes
+                (event.get('source_language') or subtitle_languages[0]).split('-')[0],
+                transcreated_texts(event.get('subtitle_texts')),
+                workdir
+            )
+        tracks = upload_subtitle_files(s3, files, OUTPUT_BUCKET)
+    print(json.dumps({
+        'event': 'subtitles_generated',
+        'languages': [track['language'] for track in tracks],
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2)
+    }))
+    return {'mode': event.get('subtitle_mode', SUBTITLE_MODE), 'tracks': tracks}
+
+def transcreated_texts(transcreations):
+    """{language: text} from the pipeline's transcreations, possibly by claim check"""
+    transcreations = resolve(transcreations) or {}
+    if isinstance(transcreations, dict):
+        return transcreations
+    return {
+        item['language']: item['text'] for item in transcreations
+        if isinstance(item, dict) and item.get('language') and item.get('text')
     }
+
+def create_mediaconvert_job(media_uri, aspect_ratios, subtitle_languages, analysis, profile,
+                            source_hash=None, captions=None):
+    """Create one MediaConvert job rendering every requested aspect ratio"""
+    job_settings = build_job_settings(media_uri, aspect_ratios, OUTPUT_BUCKET, profile, source_hash, captions)
     
-    response = mediaconvert.create_job(
+    response = get_client('mediaconvert').create_job(
         Role=os.environ['MEDIACONVERT_ROLE'],
-        Settings=job_settings
+        Settings=job_settings,
+        # Lets the job state change rule pick out pipeline jobs
+        UserMetadata={'pipeline': 'sanchaar'}
     )
     
     return response['Job']['Id']
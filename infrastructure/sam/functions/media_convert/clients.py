@@ -0,0 +1,100 @@
+"""
+Lazily constructed AWS clients and MediaConvert endpoint resolution
+"""
+import json
+import os
+import threading
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+MEDIACONVERT_ENDPOINT = os.environ.get('MEDIACONVERT_ENDPOINT')
+MEDIACONVERT_ENDPOINT_PARAMETER = os.environ.get('MEDIACONVERT_ENDPOINT_PARAMETER')
+ENDPOINT_CACHE_PATH = os.environ.get('MEDIACONVERT_ENDPOINT_CACHE', '/tmp/mediaconvert-endpoint.json')
+
+_clients = {}
+# Re-entrant: resolving the MediaConvert endpoint may itself need the SSM client
+_clients_lock = threading.RLock()
+
+
+def get_client(service):
+    """Return a shared boto3 client, creating it on first use"""
+    with _clients_lock:
+        if service not in _clients:
+            if service == 'mediaconvert':
+                _clients[service] = boto3.client('mediaconvert', endpoint_url=resolve_mediaconvert_endpoint())
+            else:
+                _clients[service] = boto3.client(service)
+        return _clients[service]
+
+
+def resolve_mediaconvert_endpoint():
+    """
+    Resolve the account MediaConvert endpoint without calling DescribeEndpoints
+    when possible: environment, /tmp cache, SSM parameter, then discovery.
+    Discovered endpoints are written back to the cache and the parameter.
+    """
+    started = time.perf_counter()
+    source = 'environment'
+    endpoint = MEDIACONVERT_ENDPOINT
+
+    if not endpoint:
+        source = 'tmp_cache'
+        endpoint = read_cached_endpoint()
+    if not endpoint and MEDIACONVERT_ENDPOINT_PARAMETER:
+        source = 'parameter'
+        endpoint = read_endpoint_parameter()
+    if not endpoint:
+        source = 'discovery'
+        response = boto3.client('mediaconvert').describe_endpoints()
+        endpoint = response['Endpoints'][0]['Url']
+        write_endpoint_parameter(endpoint)
+    if source != 'tmp_cache':
+        write_cached_endpoint(endpoint)
+
+    print(json.dumps({
+        'event': 'mediaconvert_endpoint_resolved',
+        'source': source,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2)
+    }))
+    return endpoint
+
+
+def read_cached_endpoint():
+    try:
+        with open(ENDPOINT_CACHE_PATH) as f:
+            return json.load(f).get('endpoint')
+    except (OSError, ValueError):
+        return None
+
+
+def write_cached_endpoint(endpoint):
+    try:
+        with open(ENDPOINT_CACHE_PATH, 'w') as f:
+            json.dump({'endpoint': endpoint}, f)
+    except OSError:
+        pass
+
+
+def read_endpoint_parameter():
+    try:
+        response = get_client('ssm').get_parameter(Name=MEDIACONVERT_ENDPOINT_PARAMETER)
+        return response['Parameter']['Value']
+    except ClientError:
+        return None
+
+
+def write_endpoint_parameter(endpoint):
+    """Persist a discovered endpoint so later cold starts skip discovery"""
+    if not MEDIACONVERT_ENDPOINT_PARAMETER:
+        return
+    try:
+        get_client('ssm').put_parameter(
+            Name=MEDIACONVERT_ENDPOINT_PARAMETER,
+            Value=endpoint,
+            Type='String',
+            Overwrite=True
+        )
+    except ClientError as e:
+        print(f"Could not persist MediaConvert endpoint: {str(e)}")
@@ -0,0 +1,163 @@
+"""
+Task-token completion for MediaConvert jobs
+
+The pipeline invokes media processing with .waitForTaskToken. The handler
+submits the job and registers a waiter (task token, the jobs it waits on and
+the response to send) under task-tokens/<job_id>/ in the output bucket. The
+MediaConvert job state change event for each job resumes its waiters once
+every job they wait on has finished, with output URIs taken from the event.
+"""
+import hashlib
+import json
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+from clients import get_client
+from sanchaar_common.admission import release_and_dispatch
+
+TASK_TOKEN_BUCKET = os.environ.get('OUTPUT_BUCKET')
+TASK_TOKEN_PREFIX = 'task-tokens/'
+
+STATUS_COMPLETE = 'COMPLETE'
+FAILED_JOB_STATUSES = {'ERROR', 'CANCELED'}
+# The token is gone once the execution has been resumed, failed or timed out
+STALE_TOKEN_ERRORS = {'TaskTimedOut', 'InvalidToken', 'TaskDoesNotExist'}
+
+
+def waiter_id(task_token):
+    return hashlib.sha256(task_token.encode('utf-8')).hexdigest()[:32]
+
+
+def waiter_key(job_id, task_token):
+    return f'{TASK_TOKEN_PREFIX}{job_id}/{waiter_id(task_token)}.json'
+
+
+def register(task_token, job_ids, response, lease=None, s3=None):
+    """
+    Record that task_token resumes with response once every job has
+    finished, and that the encode admission lease is held until then
+    """
+    s3 = s3 or get_client('s3')
+    waiter = {
+        'task_token': task_token,
+        'jobs': sorted(set(job_ids)),
+        'response': response,
+        'lease': lease,
+        'registered_at': time.time()
+    }
+    body = json.dumps(waiter).encode('utf-8')
+    for job_id in waiter['jobs']:
+        s3.put_object(Bucket=TASK_TOKEN_BUCKET, Key=waiter_key(job_id, task_token), Body=body,
+                      ContentType='application/json')
+    return waiter
+
+
+def waiters_for(job_id, s3=None):
+    s3 = s3 or get_client('s3')
+    waiters = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=TASK_TOKEN_BUCKET, Prefix=f'{TASK_TOKEN_PREFIX}{job_id}/'):
+        for obj in page.get('Contents', []):
+            try:
+                waiters.append(json.loads(s3.get_object(Bucket=TASK_TOKEN_BUCKET, Key=obj['Key'])['Body'].read()))
+            except ClientError as e:
+                # Removed by a concurrent resume of the same waiter
+                if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                    raise
+    return waiters
+
+
+def forget(waiter, s3=None):
+    s3 = s3 or get_client('s3')
+    for job_id in waiter['jobs']:
+        s3.delete_object(Bucket=TASK_TOKEN_BUCKET, Key=waiter_key(job_id, waiter['task_token']))
+
+
+def resume_if_ready(waiter, events=None, mediaconvert=None, s3=None):
+    """
+    Resume a waiter when all of its jobs have finished. events maps job id
+    to the state change event detail already at hand; other jobs are
+    checked with a single GetJob each. Returns 'resumed', 'failed' or
+    'waiting'.
+    """
+    events = events or {}
+    statuses = {}
+    for job_id in waiter['jobs']:
+        if job_id in events:
+            statuses[job_id] = events[job_id].get('status')
+        else:
+            mediaconvert = mediaconvert or get_client('mediaconvert')
+            statuses[job_id] = mediaconvert.get_job(Id=job_id)['Job']['Status']
+
+    failed = sorted(job_id for job_id, status in statuses.items() if status in FAILED_JOB_STATUSES)
+    if failed:
+        messages = [events.get(job_id, {}).get('errorMessage') or statuses[job_id] for job_id in failed]
+        send_failure(waiter['task_token'], 'MediaConvert.JobFailed',
+                     '; '.join(f'{job_id}: {message}' for job_id, message in zip(failed, messages)))
+        forget(waiter, s3)
+        release_and_dispatch(waiter.get('lease'))
+        return 'failed'
+    if any(status != STATUS_COMPLETE for status in statuses.values()):
+        return 'waiting'
+
+    paths = set()
+    for detail in events.values():
+        paths.update(output_paths(detail))
+    send_success(waiter['task_token'], resolve_outputs(waiter['response'], paths))
+    forget(waiter, s3)
+    release_and_dispatch(waiter.get('lease'))
+    return 'resumed'
+
+
+def output_paths(detail):
+    """Every file and playlist a finished job wrote, from its COMPLETE event"""
+    paths = set()
+    for group in detail.get('outputGroupDetails', []):
+        paths.update(group.get('playlistFilePaths', []))
+        for output in group.get('outputDetails', []):
+            paths.update(output.get('outputFilePaths', []))
+    return paths
+
+
+def resolve_outputs(response, paths):
+    """
+    Replace the predicted output URIs in a media response with the objects
+    the job reports, matched on directory and extension
+    """
+    if not paths or response.get('statusCode') != 200:
+        return response
+    body = json.loads(response['body'])
+    for field in ('outputs', 'streaming_manifests'):
+        for ratio, uri in (body.get(field) or {}).items():
+            if not uri or uri in paths:
+                continue
+            directory, extension = uri.rsplit('/', 1)[0], uri.rsplit('.', 1)[-1]
+            actual = sorted(path for path in paths
+                            if path.rsplit('/', 1)[0] == directory and path.rsplit('.', 1)[-1] == extension)
+            if actual:
+                body[field][ratio] = actual[0]
+    return dict(response, body=json.dumps(body))
+
+
+def send_success(task_token, response):
+    try:
+        get_client('stepfunctions').send_task_success(taskToken=task_token, output=json.dumps(response))
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] not in STALE_TOKEN_ERRORS:
+            raise
+        print(f"Task token already settled: {e.response['Error']['Code']}")
+        return False
+
+
+def send_failure(task_token, error, cause):
+    try:
+        get_client('stepfunctions').send_task_failure(taskToken=task_token, error=error, cause=cause[:32768])
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] not in STALE_TOKEN_ERRORS:
+            raise
+        print(f"Task token already settled: {e.response['Error']['Code']}")
+        return False
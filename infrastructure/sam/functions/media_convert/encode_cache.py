@@ -0,0 +1,143 @@
+"""
+Content-addressed cache of finished encodes, indexed by S3 manifests
+"""
+import hashlib
+import json
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+from clients import get_client
+from job_settings import build_input, build_ratio_output_groups
+
+ENCODE_CACHE_BUCKET = os.environ.get('OUTPUT_BUCKET')
+ENCODE_CACHE_PREFIX = 'encode-cache/'
+# Matches the OutputBucket lifecycle rule; entries are treated as expired a
+# day early so a hit never points at an object the lifecycle is removing.
+ENCODE_CACHE_TTL_DAYS = int(os.environ.get('ENCODE_CACHE_TTL_DAYS', '30'))
+
+STATUS_SUBMITTED = 'SUBMITTED'
+STATUS_COMPLETE = 'COMPLETE'
+IN_FLIGHT_JOB_STATUSES = {'SUBMITTED', 'PROGRESSING'}
+
+
+def source_fingerprint(head):
+    """
+    Content hash for a source object from its HEAD response: the SHA-256
+    checksum when the uploader supplied one, otherwise ETag plus size.
+    """
+    identity = head.get('ChecksumSHA256') or head['ETag'].strip('"')
+    return hashlib.sha256(f"{identity}:{head['ContentLength']}".encode('utf-8')).hexdigest()
+
+
+def settings_fingerprint(aspect_ratio, profile, captions=None):
+    """
+    Hash of the encode settings for one ratio, excluding source and
+    destination. Caption sidecars are content-addressed, so their URIs
+    stand in for the subtitle content.
+    """
+    groups = build_ratio_output_groups(aspect_ratio, '', profile, captions=captions)
+    for group in groups:
+        for settings in group['OutputGroupSettings'].values():
+            if isinstance(settings, dict):
+                settings.pop('Destination', None)
+    job_input = build_input('', captions)
+    job_input.pop('FileInput')
+    canonical = json.dumps({'input': job_input, 'output_groups': groups}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def manifest_key(source_hash, aspect_ratio, profile, captions=None):
+    fingerprint = settings_fingerprint(aspect_ratio, profile, captions)
+    return f'{ENCODE_CACHE_PREFIX}{source_hash}/{aspect_ratio}/{fingerprint}.json'
+
+
+def lookup(source_hash, aspect_ratios, profile, captions=None, s3=None, mediaconvert=None):
+    """
+    Split ratios into cache hits and misses. A hit is either a finished
+    output or a job for the same encode that is still running, which the
+    caller joins instead of transcoding again. Returns (hits, misses) where
+    hits maps ratio -> manifest.
+    """
+    s3 = s3 or get_client('s3')
+    hits, misses = {}, []
+    for aspect_ratio in aspect_ratios:
+        key = manifest_key(source_hash, aspect_ratio, profile, captions)
+        manifest = read_manifest(s3, key)
+        submitted = bool(manifest) and manifest['status'] != STATUS_COMPLETE
+        if manifest and is_usable(manifest, s3, mediaconvert):
+            if submitted and manifest['status'] == STATUS_COMPLETE:
+                # Later lookups take the hit without checking the outputs again
+                write_manifest(s3, key, manifest)
+            hits[aspect_ratio] = manifest
+        else:
+            misses.append(aspect_ratio)
+    return hits, misses
+
+
+def is_usable(manifest, s3, mediaconvert=None):
+    if manifest['expires_at'] <= time.time():
+        return False
+    if manifest['status'] == STATUS_COMPLETE:
+        return True
+
+    # Submitted earlier: finished if the outputs exist, joinable if still running
+    if all(object_exists(s3, uri) for uri in (manifest['outputs']['video'], manifest['outputs']['stream']) if uri):
+        manifest['status'] = STATUS_COMPLETE
+        return True
+    mediaconvert = mediaconvert or get_client('mediaconvert')
+    try:
+        job = mediaconvert.get_job(Id=manifest['job_id'])['Job']
+    except ClientError:
+        return False
+    return job['Status'] in IN_FLIGHT_JOB_STATUSES
+
+
+def object_exists(s3, uri):
+    bucket, key = uri.replace('s3://', '').split('/', 1)
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def record(source_hash, outputs, job_id, profile, captions=None, s3=None):
+    """Write a manifest for every ratio the job renders"""
+    s3 = s3 or get_client('s3')
+    now = time.time()
+    for aspect_ratio, ratio_outputs in outputs.items():
+        manifest = {
+            'source_hash': source_hash,
+            'aspect_ratio': aspect_ratio,
+            'profile': profile['name'],
+            'settings_fingerprint': settings_fingerprint(aspect_ratio, profile, captions),
+            'outputs': ratio_outputs,
+            'job_id': job_id,
+            'status': STATUS_SUBMITTED,
+            'created_at': now,
+            'expires_at': now + (ENCODE_CACHE_TTL_DAYS - 1) * 86400
+        }
+        write_manifest(s3, manifest_key(source_hash, aspect_ratio, profile, captions), manifest)
+
+
+def write_manifest(s3, key, manifest):
+    s3.put_object(
+        Bucket=ENCODE_CACHE_BUCKET,
+        Key=key,
+        Body=json.dumps(manifest).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def read_manifest(s3, key):
+    try:
+        response = s3.get_object(Bucket=ENCODE_CACHE_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(response['Body'].read())
@@ -0,0 +1,193 @@
+"""
+Pure builders for MediaConvert job settings
+"""
+import copy
+
+from profiles import compile_ladder_group, has_ladder
+from subtitles import build_caption_selectors, burn_in_caption_description, webvtt_caption_output
+
+ASPECT_RATIO_CONFIGS = {
+    '9:16': {
+        'width': 720,
+        'height': 1280,
+        'bitrate': 2500000
+    },
+    '1:1': {
+        'width': 1080,
+        'height': 1080,
+        'bitrate': 4000000
+    },
+    '16:9': {
+        'width': 1920,
+        'height': 1080,
+        'bitrate': 8000000
+    }
+}
+
+
+def build_input(media_uri, captions=None):
+    """Single decoded input shared by every output group"""
+    job_input = {
+        'FileInput': media_uri,
+        'AudioSelectors': {
+            'Audio Selector 1': {'DefaultSelection': 'DEFAULT'}
+        },
+        'VideoSelector': {},
+        'TimecodeSource': 'ZEROBASED'
+    }
+    if captions and captions['tracks']:
+        job_input['CaptionSelectors'] = build_caption_selectors(captions['tracks'])
+    return job_input
+
+
+def output_destination(output_bucket, aspect_ratio, source_hash=None, name='video'):
+    """
+    Destination for one aspect ratio. With a source hash the location is
+    content-addressed, so identical sources always map to the same objects.
+    """
+    if source_hash:
+        return f's3://{output_bucket}/{aspect_ratio}/{source_hash[:16]}/{name}'
+    if name == 'video':
+        return f's3://{output_bucket}/{aspect_ratio}/'
+    return f's3://{output_bucket}/{aspect_ratio}/{name}/'
+
+
+def output_uri(destination, media_uri, extension='mp4', name_modifier=''):
+    """Object MediaConvert writes for a group destination (file or master playlist)"""
+    if destination.endswith('/'):
+        basename = media_uri.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        return f'{destination}{basename}{name_modifier}.{extension}'
+    return f'{destination}{name_modifier}.{extension}'
+
+
+def stream_name(profile):
+    return profile.get('packaging', 'HLS').lower()
+
+
+def build_output_group(aspect_ratio, destination):
+    """File output group rendering one aspect ratio"""
+    config = ASPECT_RATIO_CONFIGS[aspect_ratio]
+    return {
+        'Name': f'Output_{aspect_ratio}',
+        'OutputGroupSettings': {
+            'Type': 'FILE_GROUP_SETTINGS',
+            'FileGroupSettings': {
+                'Destination': destination
+            }
+        },
+        'Outputs': [{
+            'ContainerSettings': {'Container': 'MP4'},
+            'VideoDescription': {
+                'Width': config['width'],
+                'Height': config['height'],
+                'CodecSettings': {
+                    'Codec': 'H_264',
+                    'H264Settings': {
+                        'RateControlMode': 'CBR',
+                        'Bitrate': config['bitrate'],
+                        'FramerateControl': 'SPECIFIED',
+                        'FramerateNumerator': 30,
+                        'FramerateDenominator': 1
+                    }
+                }
+            },
+            'AudioDescriptions': [{
+                'CodecSettings': {
+                    'Codec': 'AAC',
+                    'AacSettings': {
+                        'Bitrate': 128000,
+                        'SampleRate': 48000
+                    }
+                }
+            }]
+        }]
+    }
+
+
+def normalize_aspect_ratios(aspect_ratios):
+    """Validate requested ratios and drop duplicates, keeping request order"""
+    if isinstance(aspect_ratios, str):
+        aspect_ratios = [aspect_ratios]
+    unknown = [ratio for ratio in aspect_ratios if ratio not in ASPECT_RATIO_CONFIGS]
+    if unknown:
+        raise ValueError(f"Unsupported aspect ratio(s): {', '.join(unknown)}")
+    if not aspect_ratios:
+        raise ValueError('At least one aspect ratio is required')
+    return list(dict.fromkeys(aspect_ratios))
+
+
+def burns_captions(profile, captions):
+    return bool(captions and captions['tracks'] and captions['mode'] == 'burn_in'
+                and profile.get('progressive', True))
+
+
+def attaches_caption_renditions(profile, aspect_ratio, captions):
+    return bool(captions and captions['tracks'] and captions['mode'] == 'sidecar'
+                and has_ladder(profile, aspect_ratio) and profile.get('packaging', 'HLS') == 'HLS')
+
+
+def build_ratio_output_groups(aspect_ratio, output_bucket, profile, source_hash=None, captions=None):
+    """
+    Output groups an encoding profile produces for one aspect ratio. Captions
+    are either burned into extra per-language progressive outputs or added
+    to an HLS ladder as WebVTT renditions.
+    """
+    groups = []
+    if profile.get('progressive', True):
+        group = build_output_group(
+            aspect_ratio,
+            output_destination(output_bucket, aspect_ratio, source_hash)
+        )
+        if burns_captions(profile, captions):
+            base = group['Outputs'][0]
+            for track in captions['tracks']:
+                output = copy.deepcopy(base)
+                output['NameModifier'] = f"_{track['language']}"
+                output['CaptionDescriptions'] = [burn_in_caption_description(track)]
+                group['Outputs'].append(output)
+        groups.append(group)
+    if has_ladder(profile, aspect_ratio):
+        group = compile_ladder_group(
+            profile,
+            aspect_ratio,
+            output_destination(output_bucket, aspect_ratio, source_hash, stream_name(profile))
+        )
+        if attaches_caption_renditions(profile, aspect_ratio, captions):
+            group['Outputs'].extend(webvtt_caption_output(track) for track in captions['tracks'])
+        groups.append(group)
+    return groups
+
+
+def predict_outputs(media_uri, aspect_ratio, output_bucket, profile, source_hash=None, captions=None):
+    """URIs of the progressive file(s) and master playlist a job will write for a ratio"""
+    outputs = {'video': None, 'stream': None}
+    if profile.get('progressive', True):
+        destination = output_destination(output_bucket, aspect_ratio, source_hash)
+        outputs['video'] = output_uri(destination, media_uri)
+        if burns_captions(profile, captions):
+            outputs['subtitled_videos'] = {
+                track['language']: output_uri(destination, media_uri, name_modifier=f"_{track['language']}")
+                for track in captions['tracks']
+            }
+    if has_ladder(profile, aspect_ratio):
+        outputs['stream'] = output_uri(
+            output_destination(output_bucket, aspect_ratio, source_hash, stream_name(profile)),
+            media_uri,
+            'm3u8'
+        )
+    return outputs
+
+
+def build_job_settings(media_uri, aspect_ratios, output_bucket, profile, source_hash=None, captions=None):
+    """
+    Job settings that decode the source once and encode the profile's
+    output groups for every requested aspect ratio
+    """
+    return {
+        'Inputs': [build_input(media_uri, captions)],
+        'OutputGroups': [
+            group
+            for aspect_ratio in normalize_aspect_ratios(aspect_ratios)
+            for group in build_ratio_output_groups(aspect_ratio, output_bucket, profile, source_hash, captions)
+        ]
+    }
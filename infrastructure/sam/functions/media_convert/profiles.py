@@ -0,0 +1,132 @@
+"""
+Compile declarative encoding profiles into MediaConvert output groups
+"""
+import json
+import os
+from pathlib import Path
+
+PROFILES_PATH = Path(os.environ.get(
+    'ENCODING_PROFILES_PATH',
+    Path(__file__).resolve().parent / 'encoding_profiles.json'
+))
+
+_profiles = None
+
+
+def load_profiles():
+    """Profile document, read once per execution environment"""
+    global _profiles
+    if _profiles is None:
+        with open(PROFILES_PATH) as f:
+            _profiles = json.load(f)
+    return _profiles
+
+
+def get_profile(name=None):
+    """Resolve a profile by name, falling back to ENCODING_PROFILE and the document default"""
+    document = load_profiles()
+    name = name or os.environ.get('ENCODING_PROFILE') or document['default_profile']
+    if name not in document['profiles']:
+        raise ValueError(f"Unknown encoding profile: {name}")
+    return dict(document['profiles'][name], name=name)
+
+
+def has_ladder(profile, aspect_ratio):
+    return bool(profile.get('ladders', {}).get(aspect_ratio))
+
+
+def qvbr_video_description(rendition, profile):
+    return {
+        'Width': rendition['width'],
+        'Height': rendition['height'],
+        'CodecSettings': {
+            'Codec': 'H_264',
+            'H264Settings': {
+                'RateControlMode': 'QVBR',
+                'MaxBitrate': rendition['max_bitrate'],
+                'QvbrSettings': {'QvbrQualityLevel': rendition['quality_level']},
+                'CodecProfile': 'HIGH',
+                'CodecLevel': 'AUTO',
+                'GopSize': profile.get('gop_seconds', 2),
+                'GopSizeUnits': 'SECONDS',
+                'SceneChangeDetect': 'TRANSITION_DETECTION',
+                'FramerateControl': 'SPECIFIED',
+                'FramerateNumerator': 30,
+                'FramerateDenominator': 1
+            }
+        }
+    }
+
+
+def audio_description(profile):
+    audio = profile.get('audio', {})
+    return {
+        'CodecSettings': {
+            'Codec': 'AAC',
+            'AacSettings': {
+                'Bitrate': audio.get('bitrate', 96000),
+                'SampleRate': audio.get('sample_rate', 48000),
+                'CodingMode': 'CODING_MODE_2_0'
+            }
+        }
+    }
+
+
+def compile_ladder_group(profile, aspect_ratio, destination):
+    """Adaptive-bitrate output group for one aspect ratio"""
+    ladder = profile['ladders'][aspect_ratio]
+    packaging = profile.get('packaging', 'HLS')
+    segment_seconds = profile.get('segment_seconds', 4)
+
+    if packaging == 'HLS':
+        return {
+            'Name': f'HLS_{aspect_ratio}',
+            'OutputGroupSettings': {
+                'Type': 'HLS_GROUP_SETTINGS',
+                'HlsGroupSettings': {
+                    'Destination': destination,
+                    'SegmentLength': segment_seconds,
+                    'MinSegmentLength': 0,
+                    'SegmentControl': 'SEGMENTED_FILES',
+                    'DirectoryStructure': 'SINGLE_DIRECTORY',
+                    'ManifestDurationFormat': 'INTEGER',
+                    'ClientCache': 'ENABLED'
+                }
+            },
+            'Outputs': [{
+                'NameModifier': f"_{rendition['height']}p",
+                'ContainerSettings': {'Container': 'M3U8', 'M3u8Settings': {}},
+                'VideoDescription': qvbr_video_description(rendition, profile),
+                'AudioDescriptions': [audio_description(profile)]
+            } for rendition in ladder]
+        }
+
+    if packaging == 'CMAF':
+        video_outputs = [{
+            'NameModifier': f"_{rendition['height']}p",
+            'ContainerSettings': {'Container': 'CMFC'},
+            'VideoDescription': qvbr_video_description(rendition, profile)
+        } for rendition in ladder]
+        audio_output = {
+            'NameModifier': '_audio',
+            'ContainerSettings': {'Container': 'CMFC'},
+            'AudioDescriptions': [audio_description(profile)]
+        }
+        return {
+            'Name': f'CMAF_{aspect_ratio}',
+            'OutputGroupSettings': {
+                'Type': 'CMAF_GROUP_SETTINGS',
+                'CmafGroupSettings': {
+                    'Destination': destination,
+                    'SegmentLength': segment_seconds,
+                    'FragmentLength': profile.get('gop_seconds', 2),
+                    'SegmentControl': 'SEGMENTED_FILES',
+                    'WriteHlsManifest': 'ENABLED',
+                    'WriteDashManifest': 'ENABLED',
+                    'ClientCache': 'ENABLED'
+                }
+            },
+            'Outputs': video_outputs + [audio_output]
+        }
+
+    raise ValueError(f"Unsupported packaging: {packaging}")
@@ -0,0 +1,387 @@
+"""
+Subtitle generation from Amazon Transcribe output
+
+Transcripts are stream-parsed item by item, segmented with the timing rules
+from .kiro/specs/media-factory-agent.md and written to WebVTT and SRT files
+as they are produced, so hour-long transcripts run in linear time and small
+memory: only the source cues' timing windows are held, to retime other
+languages onto.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import deque
+
+MAX_CHARS_PER_LINE = 42
+MAX_LINES = 2
+MIN_DURATION = 1.5
+MAX_DURATION = 7.0
+MIN_GAP = 0.1
+# A pause this long in speech always starts a new cue
+PAUSE_BREAK = 0.8
+
+SENTENCE_END = ('.', '?', '!', '।', '॥')
+
+# ISO 639-1 codes used by the pipeline -> ISO 639-2 codes MediaConvert expects
+LANGUAGE_CODES = {
+    'hi': 'HIN', 'ta': 'TAM', 'te': 'TEL', 'bn': 'BEN', 'mr': 'MAR',
+    'gu': 'GUJ', 'kn': 'KAN', 'ml': 'MAL', 'pa': 'PAN', 'or': 'ORI', 'en': 'ENG'
+}
+
+_STRUCTURAL = re.compile(r'["{}\[\]:]')
+# Unrolled so matching the full transcript string does not keep a backtrack state per character
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_NOT_SPACE_OR_COMMA = re.compile(r'[^\s,]')
+
+
+class Cue:
+    __slots__ = ('start', 'end', 'words')
+
+    def __init__(self, start, end, words):
+        self.start = start
+        self.end = end
+        self.words = words
+
+    @property
+    def text(self):
+        return ' '.join(self.words)
+
+
+def iter_transcript_items(stream, chunk_size=1 << 16):
+    """
+    Yield results.items entries of a Transcribe JSON document read from a
+    text stream, holding at most one item plus one chunk in memory.
+    """
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    # Locate the results.items array by tracking the key path of open containers
+    path = []
+    last_string = None
+    while True:
+        match = _STRUCTURAL.search(buf, pos)
+        if match is None:
+            pos = len(buf)
+            if not fill():
+                return
+            continue
+        token = match.group()
+        if token == '"':
+            string = _STRING.match(buf, match.start())
+            if string is None:
+                pos = match.start()
+                if not fill():
+                    return
+                continue
+            last_string = string.group()[1:-1]
+            pos = string.end()
+            continue
+
+        pos = match.end()
+        if token == ':':
+            if path:
+                path[-1] = last_string
+        elif token in '{[':
+            if token == '[' and path == ['results', 'items']:
+                break
+            path.append(None if token == '{' else '[')
+        else:
+            if path:
+                path.pop()
+
+    decoder = json.JSONDecoder()
+    while True:
+        match = _NOT_SPACE_OR_COMMA.search(buf, pos)
+        if match is None:
+            pos = len(buf)
+            if not fill():
+                return
+            continue
+        if buf[match.start()] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buf, match.start())
+        except ValueError:
+            pos = match.start()
+            if eof or not fill():
+                raise
+            continue
+        pos = end
+        yield item
+
+
+def iter_words(items):
+    """Turn Transcribe items into (start, end, word) with punctuation attached"""
+    pending = None
+    for item in items:
+        content = item['alternatives'][0]['content']
+        if item['type'] == 'punctuation':
+            if pending is not None:
+                pending = (pending[0], pending[1], pending[2] + content)
+            continue
+        if pending is not None:
+            yield pending
+        pending = (float(item['start_time']), float(item['end_time']), content)
+    if pending is not None:
+        yield pending
+
+
+def segment_words(words):
+    """
+    Group timed words into cues of at most two 42-character lines and seven
+    seconds, breaking after sentence punctuation and long pauses
+    """
+    max_chars = MAX_CHARS_PER_LINE * MAX_LINES
+    cue = None
+    length = 0
+    for start, end, word in words:
+        if cue is not None:
+            too_long = length + 1 + len(word) > max_chars
+            too_slow = end - cue.start > MAX_DURATION
+            paused = start - cue.end > PAUSE_BREAK
+            if too_long or too_slow or paused:
+                yield cue
+                cue = None
+        if cue is None:
+            cue = Cue(start, end, [word])
+            length = len(word)
+        else:
+            cue.words.append(word)
+            cue.end = end
+            length += 1 + len(word)
+        if word.endswith(SENTENCE_END):
+            yield cue
+            cue = None
+    if cue is not None:
+        yield cue
+
+
+def apply_timing_rules(cues):
+    """Stretch short cues towards the minimum duration and keep the minimum gap"""
+    previous = None
+    for cue in cues:
+        if previous is not None:
+            previous.end = min(max(previous.end, previous.start + MIN_DURATION), cue.start - MIN_GAP)
+            previous.end = max(previous.end, previous.start + 0.001)
+            yield previous
+        previous = cue
+    if previous is not None:
+        previous.end = max(previous.end, previous.start + MIN_DURATION)
+        yield previous
+
+
+def wrap_lines(text):
+    """Split cue text into at most two balanced lines of up to 42 characters"""
+    if len(text) <= MAX_CHARS_PER_LINE:
+        return [text]
+    best = None
+    for index, char in enumerate(text):
+        if char != ' ':
+            continue
+        first, second = text[:index], text[index + 1:]
+        if len(first) > MAX_CHARS_PER_LINE:
+            break
+        if len(second) <= MAX_CHARS_PER_LINE:
+            balance = abs(len(first) - len(second))
+            if best is None or balance < best[0]:
+                best = (balance, [first, second])
+    if best is None:
+        return [text[:MAX_CHARS_PER_LINE], text[MAX_CHARS_PER_LINE:]]
+    return best[1]
+
+
+def track_windows(cues, windows):
+    """Pass cues through, noting the (start, end, characters) window of each"""
+    for cue in cues:
+        windows.append((cue.start, cue.end, len(cue.text)))
+        yield cue
+
+
+def retime_translation(windows, text):
+    """
+    Spread translated text over the source cue windows in proportion to how
+    much of the source speech each window carries, splitting any window
+    whose share of the translation is too long for one cue
+    """
+    words = text.split()
+    if not words or not windows:
+        return
+    total_source = sum(characters for _, _, characters in windows) or 1
+    total_target = sum(len(word) for word in words) or 1
+
+    index = 0
+    consumed_source = 0
+    consumed_target = 0
+    for position, (start, end, characters) in enumerate(windows):
+        consumed_source += characters
+        share = []
+        is_last = position == len(windows) - 1
+        while index < len(words) and (is_last or consumed_target / total_target < consumed_source / total_source):
+            share.append(words[index])
+            consumed_target += len(words[index])
+            index += 1
+        if not share:
+            continue
+
+        # Re-segment the share inside the source window using evenly spaced pseudo-timings
+        step = (end - start) / len(share)
+        timed = ((start + i * step, start + (i + 1) * step, word) for i, word in enumerate(share))
+        for piece in segment_words(timed):
+            yield piece
+
+
+def format_timestamp(seconds, separator):
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}'
+
+
+def write_subtitles(cues, vtt, srt):
+    """Write cues to WebVTT and SRT streams in one pass; returns the cue count"""
+    vtt.write('WEBVTT\n\n')
+    count = 0
+    for count, cue in enumerate(cues, start=1):
+        lines = '\n'.join(wrap_lines(cue.text))
+        vtt.write(f'{format_timestamp(cue.start, ".")} --> {format_timestamp(cue.end, ".")}\n{lines}\n\n')
+        srt.write(f'{count}\n{format_timestamp(cue.start, ",")} --> {format_timestamp(cue.end, ",")}\n{lines}\n\n')
+    return count
+
+
+def write_subtitle_files(cues, directory, language):
+    """Write cues to {language}.vtt and {language}.srt in directory as they arrive"""
+    paths = {extension: os.path.join(directory, f'{language}.{extension}') for extension in ('vtt', 'srt')}
+    with open(paths['vtt'], 'w', encoding='utf-8') as vtt, open(paths['srt'], 'w', encoding='utf-8') as srt:
+        count = write_subtitles(cues, vtt, srt)
+    return dict(paths, cues=count)
+
+
+def build_subtitle_files(transcript_stream, languages, source_language, translations, directory):
+    """
+    Write SRT and WebVTT files for every requested language into directory
+    and return {language: {'vtt': path, 'srt': path, 'cues': n}}. The
+    source language uses transcript timings directly and is written while
+    the transcript is parsed; other languages are retimed onto its cues.
+    """
+    retimed = []
+    for language in languages:
+        if language == source_language:
+            continue
+        if translations.get(language):
+            retimed.append(language)
+        else:
+            print(f"No transcreated text for subtitle language {language}, skipping")
+    if source_language not in languages and not retimed:
+        return {}
+
+    windows = []
+    source_cues = apply_timing_rules(segment_words(iter_words(iter_transcript_items(transcript_stream))))
+    if retimed:
+        source_cues = track_windows(source_cues, windows)
+    files = {}
+    if source_language in languages:
+        files[source_language] = write_subtitle_files(source_cues, directory, source_language)
+    else:
+        deque(source_cues, maxlen=0)
+    for language in retimed:
+        cues = apply_timing_rules(retime_translation(windows, translations[language]))
+        files[language] = write_subtitle_files(cues, directory, language)
+    return {language: files[language] for language in languages if language in files}
+
+
+def file_digest(path, block_size=1 << 16):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def upload_subtitle_files(s3, files, output_bucket):
+    """
+    Upload subtitle files under content-addressed keys and return caption
+    tracks: [{'language', 'srt_uri', 'vtt_uri'}]
+    """
+    tracks = []
+    for language, content in files.items():
+        digest = file_digest(content['srt'])[:16]
+        uris = {}
+        for extension, content_type in (('srt', 'application/x-subrip'), ('vtt', 'text/vtt')):
+            key = f'subtitles/{digest}/{language}.{extension}'
+            s3.upload_file(
+                content[extension],
+                output_bucket,
+                key,
+                ExtraArgs={'ContentType': f'{content_type}; charset=utf-8'}
+            )
+            uris[f'{extension}_uri'] = f's3://{output_bucket}/{key}'
+        tracks.append(dict(uris, language=language))
+    return tracks
+
+
+def caption_selector_name(language):
+    return f'Captions {language}'
+
+
+def build_caption_selectors(tracks):
+    """Input caption selectors reading each SRT sidecar"""
+    return {
+        caption_selector_name(track['language']): {
+            'SourceSettings': {
+                'SourceType': 'SRT',
+                'FileSourceSettings': {'SourceFile': track['srt_uri']}
+            }
+        }
+        for track in tracks
+    }
+
+
+def webvtt_caption_output(track):
+    """Caption-only rendition for an HLS ladder"""
+    language = track['language']
+    return {
+        'NameModifier': f'_captions_{language}',
+        'ContainerSettings': {'Container': 'M3U8', 'M3u8Settings': {}},
+        'CaptionDescriptions': [{
+            'CaptionSelectorName': caption_selector_name(language),
+            'CustomLanguageCode': LANGUAGE_CODES.get(language, language.upper()),
+            'LanguageDescription': language,
+            'DestinationSettings': {
+                'DestinationType': 'WEBVTT',
+                'WebvttDestinationSettings': {}
+            }
+        }]
+    }
+
+
+def burn_in_caption_description(track):
+    """Open captions rendered into the picture of a progressive output"""
+    return {
+        'CaptionSelectorName': caption_selector_name(track['language']),
+        'DestinationSettings': {
+            'DestinationType': 'BURN_IN',
+            'BurninDestinationSettings': {
+                'FontColor': 'WHITE',
+                'BackgroundColor': 'BLACK',
+                'BackgroundOpacity': 204,
+                'FontOpacity': 255,
+                'OutlineColor': 'BLACK',
+                'OutlineSize': 2,
+                'TeletextSpacing': 'PROPORTIONAL',
+                'Alignment': 'CENTERED'
+            }
+        }
+    }
@@ -1,9 +1,20 @@
+# Imported first so the cold start init duration covers the imports below
+from sanchaar_common.instrumentation import dimensions, instrument_boto3, instrumented
+
 import json
 import boto3
 import os
-import requests
 from datetime import datetime
 
+from delivery import DeliveryEngine, parse_json
+from instagram import INSTAGRAM_PUBLISH_MODE, publish_pipelined, publish_sequential
+from ledger import get_ledger
+from sanchaar_common.claim_check import offload, parse_body, resolve
+from sanchaar_common.delivery_outcome import is_delivered
+from throttle import Deadline
+
+# Every AWS call below is timed; clients must be created after this
+instrument_boto3()
 dynamodb = boto3.resource('dynamodb')
 CONTENT_TABLE = os.environ['CONTENT_TABLE']
 table = dynamodb.Table(CONTENT_TABLE)
@@ -13,50 +24,140 @@ WHATSAPP_API_KEY = os.environ.get('WHATSAPP_API_KEY')
 SHARECHAT_API_KEY = os.environ.get('SHARECHAT_API_KEY')
 INSTAGRAM_ACCESS_TOKEN = os.environ.get('INSTAGRAM_ACCESS_TOKEN')
 
+# Platform endpoints (overridable so the engine can be pointed at local stubs)
+WHATSAPP_API_URL = os.environ.get('WHATSAPP_API_URL', 'https://graph.facebook.com/v18.0')
+WHATSAPP_PHONE_NUMBER_ID = os.environ.get('WHATSAPP_PHONE_NUMBER_ID', 'PHONE_NUMBER_ID')
+SHARECHAT_API_URL = os.environ.get('SHARECHAT_API_URL', 'https://api.sharechat.com/v2')
+INSTAGRAM_API_URL = os.environ.get('INSTAGRAM_API_URL', 'https://graph.facebook.com/v18.0')
+INSTAGRAM_USER_ID = os.environ.get('INSTAGRAM_USER_ID', 'IG_USER_ID')
+
+# Encoded outputs are served to the platforms through CloudFront
+CONTENT_CDN_DOMAIN = os.environ.get('CONTENT_CDN_DOMAIN')
+
+# Rate limits apply per sending account on each platform
+PLATFORM_ACCOUNTS = {
+    'whatsapp': WHATSAPP_PHONE_NUMBER_ID,
+    'instagram': INSTAGRAM_USER_ID
+}
+
+@instrumented('platform_distributor')
 def lambda_handler(event, context):
     """
     Distribute content to regional platforms
     """
     try:
         platform = event['platform']
-        content_variants = event['content_variants']
-        media_urls = event['media_urls']
+        content_variants = resolve(event['content_variants'])
+        media_urls = media_urls_from_outputs(event.get('media_outputs')) or resolve(event.get('media_urls') or {})
         
-        if platform == 'whatsapp':
-            result = distribute_to_whatsapp(content_variants, media_urls)
-        elif platform == 'sharechat':
-            result = distribute_to_sharechat(content_variants, media_urls)
-        elif platform == 'instagram':
-            result = distribute_to_instagram(content_variants, media_urls)
-        else:
+        if platform not in DISTRIBUTORS:
             raise ValueError(f"Unsupported platform: {platform}")
         
+        engine = DeliveryEngine(
+            platform,
+            max_in_flight=event.get('max_in_flight'),
+            deadline=Deadline.from_context(context),
+            account=PLATFORM_ACCOUNTS.get(platform, 'default')
+        )
+        with dimensions(platform=platform):
+            result = distribute(
+                DISTRIBUTORS[platform],
+                event.get('content_id'),
+                platform,
+                content_variants,
+                media_urls,
+                engine
+            )
+        
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'platform': platform,
-                'status': 'delivered',
-                'result': result
+                'status': summarize_status(result),
+                'result': offload(result, 'distribution-results')
             })
         }
         
     except Exception as e:
-        print(f"Error distributing to {platform}: {str(e)}")
+        print(f"Error distributing to {event.get('platform')}: {str(e)}")
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
 
-def distribute_to_whatsapp(content_variants, media_urls):
+def media_urls_from_outputs(media_outputs):
+    """Aspect ratio -> public URL of the encodes media processing reported"""
+    if isinstance(media_outputs, dict):
+        media_outputs = [media_outputs]
+    media_urls = {}
+    for output in media_outputs or []:
+        response = output.get('Payload', output)
+        if response.get('statusCode') != 200:
+            continue
+        for ratio, uri in (parse_body(response['body']).get('outputs') or {}).items():
+            if uri:
+                media_urls[ratio] = public_url(uri)
+    return media_urls
+
+def public_url(uri):
+    if not CONTENT_CDN_DOMAIN or not uri.startswith('s3://'):
+        return uri
+    return f"https://{CONTENT_CDN_DOMAIN}/{uri[len('s3://'):].split('/', 1)[1]}"
+
+def distribute(distributor, content_id, platform, content_variants, media_urls, engine):
+    """
+    Run a platform distributor, consulting the delivery ledger when the event
+    carries a content_id so retried executions only send undelivered variants
+    """
+    ledger = get_ledger()
+    if ledger is None or not content_id:
+        return distributor(content_variants, media_urls, engine)
+    
+    keys, to_send, done_rows, duplicates = ledger.plan(content_id, platform, content_variants, media_urls)
+    sent_rows = None
+    finished = {}
+    if to_send:
+        # Rows the distributor finishes are kept so a failure part way can still record them
+        position = {id(content_variants[index]): index for index in to_send}
+        engine.on_row = lambda variant, row: finished.__setitem__(position[id(variant)], row)
+        try:
+            sent_rows = distributor([content_variants[i] for i in to_send], media_urls, engine)
+        finally:
+            if sent_rows is None:
+                recorded = [index for index in to_send if index in finished]
+                ledger.record_all(keys, recorded, [finished[index] for index in recorded], is_delivered)
+                # Variants without an outcome lose their claim, so the retry sends them
+                ledger.release_all(keys, [index for index in to_send if index not in finished])
+            else:
+                ledger.record_all(keys, to_send, sent_rows, is_delivered)
+    
+    rows = dict(zip(to_send, sent_rows or []))
+    for index, row in done_rows.items():
+        rows[index] = dict(describe_variant(content_variants[index]), **row)
+    for index, original in duplicates.items():
+        rows[index] = dict(rows[original])
+    return [rows[index] for index in range(len(content_variants))]
+
+def summarize_status(result):
+    """Roll per-variant rows up into a single delivery status"""
+    delivered = sum(1 for row in result if is_delivered(row))
+    if delivered == len(result):
+        return 'delivered'
+    return 'partial' if delivered else 'failed'
+
+def describe_variant(variant):
+    """Identifying fields carried on every result row"""
+    return {'language': variant['language']}
+
+def distribute_to_whatsapp(content_variants, media_urls, engine):
     """Distribute via WhatsApp Business API"""
-    url = "https://graph.facebook.com/v18.0/PHONE_NUMBER_ID/messages"
+    url = f"{WHATSAPP_API_URL}/{WHATSAPP_PHONE_NUMBER_ID}/messages"
     headers = {
         'Authorization': f'Bearer {WHATSAPP_API_KEY}',
         'Content-Type': 'application/json'
     }
     
-    results = []
-    for variant in content_variants:
+    def send(engine, variant):
         payload = {
             'messaging_product': 'whatsapp',
             'to': variant['recipient'],
@@ -67,25 +168,23 @@ def distribute_to_whatsapp(content_variants, media_urls):
             }
         }
         
-        response = requests.post(url, headers=headers, json=payload)
-        results.append({
-            'language': variant['language'],
+        response = engine.post(url, headers=headers, json=payload, operation='messages')
+        return {
             'status': response.status_code,
-            'message_id': response.json().get('messages', [{}])[0].get('id')
-        })
+            'message_id': (parse_json(response).get('messages') or [{}])[0].get('id')
+        }
     
-    return results
+    return engine.deliver(content_variants, send, describe_variant)
 
-def distribute_to_sharechat(content_variants, media_urls):
+def distribute_to_sharechat(content_variants, media_urls, engine):
     """Distribute via ShareChat API"""
-    url = "https://api.sharechat.com/v2/posts"
+    url = f"{SHARECHAT_API_URL}/posts"
     headers = {
         'Authorization': f'Bearer {SHARECHAT_API_KEY}',
         'Content-Type': 'application/json'
     }
     
-    results = []
-    for variant in content_variants:
+    def send(engine, variant):
         payload = {
             'content_type': 'video',
             'video_url': media_urls.get('9:16'),
@@ -95,46 +194,37 @@ def distribute_to_sharechat(content_variants, media_urls):
             'visibility': 'public'
         }
         
-        response = requests.post(url, headers=headers, json=payload)
-        results.append({
-            'language': variant['language'],
+        response = engine.post(url, headers=headers, json=payload, operation='posts')
+        return {
             'status': response.status_code,
-            'post_id': response.json().get('post_id')
-        })
+            'post_id': parse_json(response).get('post_id')
+        }
     
-    return results
+    return engine.deliver(content_variants, send, describe_variant)
 
-def distribute_to_instagram(content_variants, media_urls):
+def distribute_to_instagram(content_variants, media_urls, engine):
     """Distribute via Instagram Graph API"""
-    base_url = "https://graph.facebook.com/v18.0"
-    ig_user_id = "IG_USER_ID"  # Should be from config
-    
-    results = []
-    for variant in content_variants:
-        # Step 1: Create media container
-        container_url = f"{base_url}/{ig_user_id}/media"
-        container_payload = {
+    def build_payload(variant):
+        return {
             'media_type': 'STORIES',
             'video_url': media_urls.get('9:16'),
             'caption': variant['text'][:2200],
             'access_token': INSTAGRAM_ACCESS_TOKEN
         }
-        
-        container_response = requests.post(container_url, data=container_payload)
-        container_id = container_response.json().get('id')
-        
-        # Step 2: Publish media
-        publish_url = f"{base_url}/{ig_user_id}/media_publish"
-        publish_payload = {
-            'creation_id': container_id,
-            'access_token': INSTAGRAM_ACCESS_TOKEN
-        }
-        
-        publish_response = requests.post(publish_url, data=publish_payload)
-        results.append({
-            'language': variant['language'],
-            'status': publish_response.status_code,
-            'media_id': publish_response.json().get('id')
-        })
     
-    return results
+    publish = publish_pipelined if INSTAGRAM_PUBLISH_MODE == 'pipelined' else publish_sequential
+    return publish(
+        engine,
+        content_variants,
+        build_payload,
+        INSTAGRAM_API_URL,
+        INSTAGRAM_USER_ID,
+        INSTAGRAM_ACCESS_TOKEN,
+        describe_variant
+    )
+
+DISTRIBUTORS = {
+    'whatsapp': distribute_to_whatsapp,
+    'sharechat': distribute_to_sharechat,
+    'instagram': distribute_to_instagram
+}
@@ -0,0 +1,186 @@
+"""
+Concurrent, connection-pooled delivery engine for platform APIs
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sanchaar_common.instrumentation import dimensions, timed
+from throttle import (
+    MAX_ATTEMPTS,
+    Deadline,
+    DeadlineExceeded,
+    RateLimiter,
+    backoff_seconds,
+    is_throttled,
+    retry_after_seconds,
+    usage_pause_seconds
+)
+
+MAX_IN_FLIGHT = int(os.environ.get('DELIVERY_MAX_IN_FLIGHT', '8'))
+REQUEST_TIMEOUT = float(os.environ.get('DELIVERY_TIMEOUT_SECONDS', '10'))
+
+# Sessions live at module scope so warm invocations reuse open TLS connections
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Buckets persist across warm invocations so limits hold between runs
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_session(platform, pool_size=MAX_IN_FLIGHT):
+    """Return the keep-alive session for a platform, creating it on first use"""
+    pool_size = max(pool_size, 1)
+    with _sessions_lock:
+        session, size = _sessions.get(platform, (None, 0))
+        if session is None:
+            session = requests.Session()
+        if pool_size > size:
+            # Grow the pool so every in-flight request can keep its connection alive
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            size = pool_size
+        _sessions[platform] = (session, size)
+        return session
+
+
+def get_limiter():
+    """Return the process-wide rate limiter"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def parse_json(response):
+    """Decode a JSON response body, tolerating empty or non-JSON bodies"""
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+class DeliveryEngine:
+    """Sends platform requests over a pooled session with bounded concurrency"""
+
+    def __init__(self, platform, max_in_flight=None, timeout=REQUEST_TIMEOUT,
+                 limiter=None, deadline=None, account='default'):
+        self.platform = platform
+        self.max_in_flight = max(int(max_in_flight or MAX_IN_FLIGHT), 1)
+        self.timeout = timeout
+        self.session = get_session(platform, self.max_in_flight)
+        self.limiter = limiter or get_limiter()
+        self.deadline = deadline or Deadline.from_context(None)
+        self.account = account
+        # Called with (item, row) as each item's final row is ready
+        self.on_row = None
+        self._item = threading.local()
+
+    def request(self, method, url, account=None, operation=None, idempotent=None, **kwargs):
+        """
+        Issue an HTTP request on the platform session, waiting for a rate-limit
+        token first and retrying throttled failures while the time budget
+        allows. Transient 5xx failures are retried only for idempotent calls
+        (GET by default), since a send or publish the platform already took
+        would go out twice; the 5xx response is returned and fails the row.
+        The last response is returned when retries run out. Each attempt is
+        timed as <platform>.<operation> (default: the method).
+        """
+        operation = f'{self.platform}.{operation or method.lower()}'
+        if idempotent is None:
+            idempotent = method.upper() in ('GET', 'HEAD')
+        bucket = self.limiter.bucket(self.platform, account or self.account)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._wait(bucket.reserve())
+            # A platform-imposed pause may have started while this call was queued
+            self._wait(bucket.paused_for())
+
+            kwargs['timeout'] = min(self.timeout, max(self.deadline.remaining(), 0.1))
+            with timed(operation, platform=self.platform) as timer:
+                response = self.session.request(method, url, **kwargs)
+                timer.error = response.status_code >= 400
+            self._count('attempts', 1)
+
+            usage_pause = usage_pause_seconds(response.headers)
+            if usage_pause:
+                bucket.pause(usage_pause)
+            if attempt >= MAX_ATTEMPTS or not is_throttled(response, parse_json(response), idempotent):
+                return response
+
+            retry_after = retry_after_seconds(response.headers)
+            delay = retry_after if retry_after is not None else backoff_seconds(attempt)
+            if delay >= self.deadline.remaining():
+                return response
+            if retry_after is not None:
+                # Shared pause: every worker on this bucket honours the hint
+                bucket.pause(retry_after)
+            else:
+                self._wait(delay)
+
+    def _wait(self, seconds):
+        if seconds <= 0:
+            return
+        if seconds >= self.deadline.remaining():
+            raise DeadlineExceeded(f'Rate limit wait of {seconds:.1f}s exceeds the time budget')
+        time.sleep(seconds)
+        self._count('waited', seconds)
+
+    def _count(self, name, amount):
+        setattr(self._item, name, getattr(self._item, name, 0) + amount)
+
+    def finished(self, item, row):
+        """Report the final row of an item to on_row"""
+        if self.on_row:
+            self.on_row(item, row)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def deliver(self, items, send, describe, final=True):
+        """
+        Run send(engine, item) for every item with at most max_in_flight
+        requests outstanding. Results come back in input order; a failure
+        only affects the row of the item that raised. Each row reports the
+        attempts made and the time spent waiting on rate limits. Unless
+        final is False (an intermediate step), each row is also passed to
+        on_row as it completes.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        def run(item):
+            self._item.attempts = 0
+            self._item.waited = 0.0
+            row = dict(describe(item))
+            # Worker threads do not inherit the caller's dimensions
+            with dimensions(platform=self.platform, language=row.get('language')):
+                try:
+                    row.update(send(self, item))
+                except Exception as e:
+                    row.update({'status': None, 'error': str(e)})
+            row['attempts'] = self._item.attempts
+            row['throttle_wait_ms'] = round(self._item.waited * 1000)
+            if final:
+                self.finished(item, row)
+            return row
+
+        if self.max_in_flight == 1 or len(items) == 1:
+            return [run(item) for item in items]
+
+        workers = min(self.max_in_flight, len(items))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run, items))
@@ -0,0 +1,221 @@
+"""
+Two-phase Instagram Graph API publishing: media containers, then media_publish
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from delivery import parse_json
+from throttle import DeadlineExceeded
+
+# pipelined: create every container up front and publish each one as soon as
+# it finishes processing. sequential: create, wait and publish one at a time.
+INSTAGRAM_PUBLISH_MODE = os.environ.get('INSTAGRAM_PUBLISH_MODE', 'pipelined')
+
+POLL_INTERVAL_SECONDS = float(os.environ.get('INSTAGRAM_POLL_INTERVAL_SECONDS', '2'))
+POLL_MAX_INTERVAL_SECONDS = float(os.environ.get('INSTAGRAM_POLL_MAX_INTERVAL_SECONDS', '10'))
+
+# The Graph API accepts at most 50 ids in a single multi-id lookup
+STATUS_BATCH_SIZE = 50
+
+READY_STATUS = 'FINISHED'
+FAILED_STATUSES = {'ERROR', 'EXPIRED'}
+
+
+def create_container(engine, base_url, ig_user_id, payload):
+    """Create a media container and return its result row fields"""
+    # A container is unpublished until media_publish, so a resent create is harmless
+    response = engine.post(f"{base_url}/{ig_user_id}/media", data=payload, operation='media', idempotent=True)
+    container_id = parse_json(response).get('id')
+    if not container_id:
+        return {
+            'status': response.status_code,
+            'media_id': None,
+            'error': 'Media container was not created'
+        }
+    return {'status': response.status_code, 'container_id': container_id}
+
+
+def publish_container(engine, base_url, ig_user_id, container_id, access_token):
+    """Publish a processed container"""
+    response = engine.post(f"{base_url}/{ig_user_id}/media_publish", operation='media_publish', data={
+        'creation_id': container_id,
+        'access_token': access_token
+    })
+    return {
+        'status': response.status_code,
+        'media_id': parse_json(response).get('id')
+    }
+
+
+def fetch_container_statuses(engine, base_url, container_ids, access_token, errors=None):
+    """
+    Look up status_code for many containers with one multi-id request per
+    batch. A batch whose request fails is left out, with the error recorded
+    in errors for each of its ids; DeadlineExceeded stops the lookup.
+    """
+    statuses = {}
+    for start in range(0, len(container_ids), STATUS_BATCH_SIZE):
+        batch = container_ids[start:start + STATUS_BATCH_SIZE]
+        try:
+            response = engine.get(f"{base_url}/", operation='container_status', params={
+                'ids': ','.join(batch),
+                'fields': 'status_code',
+                'access_token': access_token
+            })
+        except requests.RequestException as e:
+            if errors is not None:
+                errors.update({container_id: str(e) for container_id in batch})
+            continue
+        body = parse_json(response)
+        for container_id in batch:
+            node = body.get(container_id)
+            if isinstance(node, dict):
+                statuses[container_id] = node.get('status_code')
+    return statuses
+
+
+def wait_for_containers(engine, base_url, container_ids, access_token, on_settled):
+    """
+    Poll containers until each reaches a terminal status or the engine's time
+    budget runs out, calling on_settled(container_id, status_code) as soon as a
+    container settles. A failed poll is retried on the next round. Returns
+    {container_id: last poll error or None} for the containers left unsettled.
+    """
+    pending = list(container_ids)
+    errors = {}
+    interval = POLL_INTERVAL_SECONDS
+    while pending:
+        try:
+            statuses = fetch_container_statuses(engine, base_url, pending, access_token, errors)
+        except DeadlineExceeded as e:
+            errors.update({container_id: str(e) for container_id in pending})
+            break
+        still_pending = []
+        for container_id in pending:
+            status = statuses.get(container_id)
+            if status == READY_STATUS or status in FAILED_STATUSES:
+                on_settled(container_id, status)
+            else:
+                if status is not None:
+                    errors.pop(container_id, None)
+                still_pending.append(container_id)
+        pending = still_pending
+
+        if not pending or interval >= engine.deadline.remaining():
+            break
+        time.sleep(interval)
+        interval = min(interval * 1.5, POLL_MAX_INTERVAL_SECONDS)
+    return {container_id: errors.get(container_id) for container_id in pending}
+
+
+def merge_rows(container_row, publish_row):
+    """Combine the container and publish phases into one result row"""
+    row = dict(container_row)
+    row.update({key: value for key, value in publish_row.items()
+                if key not in ('attempts', 'throttle_wait_ms')})
+    row['attempts'] = container_row.get('attempts', 0) + publish_row.get('attempts', 0)
+    row['throttle_wait_ms'] = (container_row.get('throttle_wait_ms', 0)
+                               + publish_row.get('throttle_wait_ms', 0))
+    return row
+
+
+def settle_row(status, error=None):
+    """Result row fields for a container that never became publishable"""
+    if status in FAILED_STATUSES:
+        return {'status': None, 'media_id': None, 'error': f'Container processing {status}'}
+    if error:
+        return {'status': None, 'media_id': None, 'error': f'Container status unavailable: {error}'}
+    return {'status': None, 'media_id': None, 'error': 'Container still processing at deadline'}
+
+
+def publish_sequential(engine, variants, build_payload, base_url, ig_user_id, access_token, describe):
+    """Create, wait for and publish each variant in turn"""
+
+    def send(engine, variant):
+        created = create_container(engine, base_url, ig_user_id, build_payload(variant))
+        container_id = created.get('container_id')
+        if not container_id:
+            return created
+
+        settled = {}
+        unsettled = wait_for_containers(engine, base_url, [container_id], access_token,
+                                        lambda cid, status: settled.update({cid: status}))
+        if settled.get(container_id) != READY_STATUS:
+            return dict(created, **settle_row(settled.get(container_id), unsettled.get(container_id)))
+        try:
+            published = publish_container(engine, base_url, ig_user_id, container_id, access_token)
+        except Exception as e:
+            # Keep the container id so the failure can be traced and retried
+            return dict(created, status=None, media_id=None, error=str(e))
+        return dict(published, container_id=container_id)
+
+    return engine.deliver(variants, send, describe)
+
+
+def publish_pipelined(engine, variants, build_payload, base_url, ig_user_id, access_token, describe):
+    """
+    Create every container concurrently, poll their status in batches and
+    publish each container the moment it finishes processing, so total time
+    tracks the slowest container rather than the sum of all of them.
+    """
+    variants = list(variants)
+    rows = engine.deliver(
+        variants,
+        lambda engine, variant: create_container(engine, base_url, ig_user_id, build_payload(variant)),
+        describe,
+        final=False
+    )
+    index_by_container = {row['container_id']: index
+                          for index, row in enumerate(rows) if row.get('container_id')}
+    for index, row in enumerate(rows):
+        if not row.get('container_id'):
+            engine.finished(variants[index], row)
+    if not index_by_container:
+        return rows
+
+    def publish(container_id):
+        return engine.deliver(
+            [container_id],
+            lambda engine, cid: publish_container(engine, base_url, ig_user_id, cid, access_token),
+            lambda cid: {},
+            final=False
+        )[0]
+
+    futures = {}
+    settled = set()
+    with ThreadPoolExecutor(max_workers=min(engine.max_in_flight, len(index_by_container))) as executor:
+        def on_settled(container_id, status):
+            settled.add(container_id)
+            index = index_by_container[container_id]
+            if status == READY_STATUS:
+                futures[container_id] = executor.submit(publish, container_id)
+            else:
+                rows[index] = dict(rows[index], **settle_row(status))
+                engine.finished(variants[index], rows[index])
+
+        try:
+            unsettled = wait_for_containers(
+                engine, base_url, list(index_by_container), access_token, on_settled
+            )
+        except Exception as e:
+            # Containers already published keep their rows; only the rest fail
+            unsettled = {container_id: str(e) for container_id in index_by_container
+                         if container_id not in settled}
+        for container_id, error in unsettled.items():
+            index = index_by_container[container_id]
+            rows[index] = dict(rows[index], **settle_row(None, error))
+            engine.finished(variants[index], rows[index])
+
+        for container_id, future in futures.items():
+            index = index_by_container[container_id]
+            try:
+                published = future.result()
+            except Exception as e:
+                published = {'status': None, 'media_id': None, 'error': str(e)}
+            rows[index] = merge_rows(rows[index], published)
+            engine.finished(variants[index], rows[index])
+
+    return rows
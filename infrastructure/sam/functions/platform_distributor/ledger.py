@@ -0,0 +1,210 @@
+"""
+Idempotent delivery ledger so pipeline retries only send what is missing
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+
+DELIVERY_LEDGER_TABLE = os.environ.get('DELIVERY_LEDGER_TABLE')
+
+# A claim older than this is assumed to belong to a crashed invocation
+CLAIM_LEASE_SECONDS = int(os.environ.get('DELIVERY_CLAIM_LEASE_SECONDS', '300'))
+LEDGER_TTL_DAYS = int(os.environ.get('DELIVERY_LEDGER_TTL_DAYS', '30'))
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_SIZE = 100
+BATCH_GET_MAX_ROUNDS = 5
+
+STATUS_PENDING = 'pending'
+STATUS_DELIVERED = 'delivered'
+STATUS_FAILED = 'failed'
+
+# Fields of a result row that identify the published message/post
+RESULT_FIELDS = ('status', 'message_id', 'post_id', 'media_id', 'container_id')
+
+
+def payload_hash(variant, media_urls):
+    """Stable hash of everything that determines what the recipient receives"""
+    canonical = json.dumps({'variant': variant, 'media_urls': media_urls},
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def delivery_key(content_id, platform, language, recipient, digest):
+    """Ledger key for one (content, platform, language, recipient, payload) delivery"""
+    return '#'.join([content_id, platform, language, recipient or '-', digest])
+
+
+class DeliveryLedger:
+    """DynamoDB-backed record of deliveries that already reached a platform"""
+
+    def __init__(self, table_name, client=None, max_workers=8):
+        self.table_name = table_name
+        self.client = client or boto3.client('dynamodb')
+        self.max_workers = max_workers
+
+    def keys_for(self, content_id, platform, variants, media_urls):
+        return [
+            delivery_key(content_id, platform, variant['language'], variant.get('recipient'),
+                         payload_hash(variant, media_urls))
+            for variant in variants
+        ]
+
+    def lookup(self, keys):
+        """Batch-read ledger entries, returning {delivery_key: entry}"""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), BATCH_GET_SIZE):
+            request = {self.table_name: {
+                'Keys': [{'delivery_key': {'S': key}} for key in unique[start:start + BATCH_GET_SIZE]],
+                'ConsistentRead': True
+            }}
+            for attempt in range(BATCH_GET_MAX_ROUNDS):
+                response = self.client.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    found[item['delivery_key']['S']] = {
+                        'status': item['status']['S'],
+                        'lease_expires_at': int(item.get('lease_expires_at', {}).get('N', '0')),
+                        'result': json.loads(item.get('result', {}).get('S', '{}'))
+                    }
+                request = response.get('UnprocessedKeys') or {}
+                if not request:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+        return found
+
+    def claim(self, key, content_id, platform, language):
+        """
+        Conditionally mark a delivery as in progress. Fails when the delivery
+        already succeeded or another invocation holds a live claim.
+        """
+        now = int(time.time())
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'delivery_key': {'S': key},
+                    'content_id': {'S': content_id},
+                    'platform': {'S': platform},
+                    'language': {'S': language},
+                    'status': {'S': STATUS_PENDING},
+                    'lease_expires_at': {'N': str(now + CLAIM_LEASE_SECONDS)},
+                    'expires_at': {'N': str(now + LEDGER_TTL_DAYS * 86400)}
+                },
+                ConditionExpression=(
+                    'attribute_not_exists(delivery_key) OR #status = :failed '
+                    'OR (#status = :pending AND lease_expires_at < :now)'
+                ),
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':failed': {'S': STATUS_FAILED},
+                    ':pending': {'S': STATUS_PENDING},
+                    ':now': {'N': str(now)}
+                }
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def record(self, key, row, delivered):
+        """Store the outcome of a claimed delivery"""
+        result = {field: row[field] for field in RESULT_FIELDS if row.get(field) is not None}
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={'delivery_key': {'S': key}},
+            UpdateExpression='SET #status = :status, #result = :result, completed_at = :now',
+            ExpressionAttributeNames={'#status': 'status', '#result': 'result'},
+            ExpressionAttributeValues={
+                ':status': {'S': STATUS_DELIVERED if delivered else STATUS_FAILED},
+                ':result': {'S': json.dumps(result)},
+                ':now': {'N': str(int(time.time()))}
+            }
+        )
+
+    def release(self, key):
+        """Drop a claim that never reached an outcome so a retry sends it again"""
+        try:
+            self.client.delete_item(
+                TableName=self.table_name,
+                Key={'delivery_key': {'S': key}},
+                ConditionExpression='#status = :pending',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':pending': {'S': STATUS_PENDING}}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    def plan(self, content_id, platform, variants, media_urls):
+        """
+        Split variants into work to send and rows for work that is already done
+        or owned by another invocation. Returns (keys, to_send, done_rows,
+        duplicates) where to_send holds indexes into variants, done_rows maps
+        index -> row and duplicates maps the index of a repeated variant to the
+        index of its first occurrence, whose row it shares.
+        """
+        keys = self.keys_for(content_id, platform, variants, media_urls)
+        entries = self.lookup(keys)
+
+        first = {}
+        duplicates = {}
+        for index, key in enumerate(keys):
+            if key in first:
+                duplicates[index] = first[key]
+            else:
+                first[key] = index
+
+        done_rows = {}
+        candidates = []
+        for key, index in first.items():
+            entry = entries.get(key)
+            if entry and entry['status'] == STATUS_DELIVERED:
+                done_rows[index] = dict(entry['result'], deduplicated=True)
+            else:
+                candidates.append(index)
+
+        def try_claim(index):
+            return self.claim(keys[index], content_id, platform, variants[index]['language'])
+
+        with ThreadPoolExecutor(max_workers=max(min(self.max_workers, len(candidates)), 1)) as executor:
+            claimed = list(executor.map(try_claim, candidates))
+
+        to_send = []
+        for index, won in zip(candidates, claimed):
+            if won:
+                to_send.append(index)
+            else:
+                done_rows[index] = {'status': None, 'error': 'Delivery in progress in another invocation'}
+        return keys, to_send, done_rows, duplicates
+
+    def record_all(self, keys, indexes, rows, is_delivered):
+        """Record outcomes for the claimed indexes concurrently"""
+        def record(pair):
+            index, row = pair
+            self.record(keys[index], row, is_delivered(row))
+
+        with ThreadPoolExecutor(max_workers=max(min(self.max_workers, len(indexes)), 1)) as executor:
+            list(executor.map(record, zip(indexes, rows)))
+
+    def release_all(self, keys, indexes):
+        """Release the claims of indexes concurrently"""
+        with ThreadPoolExecutor(max_workers=max(min(self.max_workers, len(indexes)), 1)) as executor:
+            list(executor.map(lambda index: self.release(keys[index]), indexes))
+
+
+_ledger = None
+
+
+def get_ledger():
+    """Ledger for this function, or None when no ledger table is configured"""
+    global _ledger
+    if _ledger is None and DELIVERY_LEDGER_TABLE:
+        _ledger = DeliveryLedger(DELIVERY_LEDGER_TABLE)
+    return _ledger
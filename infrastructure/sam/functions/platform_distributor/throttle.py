@@ -0,0 +1,169 @@
+"""
+Per-platform rate limiting and retry policy for platform API calls
+"""
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Tokens per second and burst capacity per (platform, account). Override with
+# RATE_LIMITS='{"whatsapp": {"rate": 80, "burst": 80}}'.
+DEFAULT_RATE_LIMITS = {
+    'whatsapp': {'rate': 80, 'burst': 80},
+    'sharechat': {'rate': 20, 'burst': 20},
+    'instagram': {'rate': 1, 'burst': 10}
+}
+
+# The platform did not accept the request, so resending cannot duplicate it
+RETRYABLE_STATUS = {429, 503}
+# The platform may have acted before failing; only idempotent calls are resent
+TRANSIENT_STATUS = {500, 502, 504}
+
+# Graph API / WhatsApp error codes that signal throttling even on a 400
+THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80001, 80002, 80007, 130429, 131056}
+
+MAX_ATTEMPTS = int(os.environ.get('DELIVERY_MAX_ATTEMPTS', '5'))
+BACKOFF_BASE_SECONDS = float(os.environ.get('DELIVERY_BACKOFF_BASE_SECONDS', '0.5'))
+BACKOFF_CAP_SECONDS = float(os.environ.get('DELIVERY_BACKOFF_CAP_SECONDS', '20'))
+DEFAULT_TIME_BUDGET_SECONDS = float(os.environ.get('DELIVERY_TIME_BUDGET_SECONDS', '60'))
+# Time kept back from the Lambda deadline to build and return the response
+DEADLINE_MARGIN_SECONDS = float(os.environ.get('DELIVERY_DEADLINE_MARGIN_SECONDS', '5'))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when waiting for a rate limit would overrun the time budget"""
+
+
+class Deadline:
+    """Wall-clock budget for a delivery run"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + max(seconds, 0)
+
+    @classmethod
+    def from_context(cls, context, margin=DEADLINE_MARGIN_SECONDS):
+        """Budget from the Lambda context, or the default budget when run locally"""
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            return cls(context.get_remaining_time_in_millis() / 1000 - margin)
+        return cls(DEFAULT_TIME_BUDGET_SECONDS)
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0)
+
+
+class TokenBucket:
+    """Thread-safe token bucket that can also be paused by server hints"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        # Refill clock; it runs ahead of now while the bucket is paused
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.tokens -= 1
+            deficit = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return (self.updated - now) + deficit
+
+    def paused_for(self):
+        """Remaining pause imposed by the platform, if any"""
+        with self._lock:
+            return max(self.updated - time.monotonic(), 0.0)
+
+    def pause(self, seconds):
+        """Hold every caller back and restart refilling from empty afterwards"""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self.updated:
+                self.tokens = min(self.tokens, 0.0)
+                self.updated = until
+
+
+class RateLimiter:
+    """Registry of token buckets keyed by (platform, account)"""
+
+    def __init__(self, limits=None):
+        self.limits = limits or load_rate_limits()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, platform, account='default'):
+        key = (platform, account)
+        with self._lock:
+            if key not in self._buckets:
+                limit = self.limits.get(platform, {'rate': 10, 'burst': 10})
+                self._buckets[key] = TokenBucket(limit['rate'], limit.get('burst', limit['rate']))
+            return self._buckets[key]
+
+
+def load_rate_limits():
+    """Defaults merged with the RATE_LIMITS environment override"""
+    limits = {platform: dict(limit) for platform, limit in DEFAULT_RATE_LIMITS.items()}
+    override = os.environ.get('RATE_LIMITS')
+    if override:
+        for platform, limit in json.loads(override).items():
+            limits.setdefault(platform, {}).update(limit)
+    return limits
+
+
+def retry_after_seconds(headers):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date)"""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def usage_pause_seconds(headers):
+    """
+    Pause implied by Graph API usage headers: X-Business-Use-Case-Usage
+    carries estimated_time_to_regain_access (minutes) once a limit is hit.
+    """
+    value = headers.get('X-Business-Use-Case-Usage')
+    if not value:
+        return 0.0
+    try:
+        usage = json.loads(value)
+    except ValueError:
+        return 0.0
+    minutes = 0
+    for entries in usage.values():
+        for entry in entries if isinstance(entries, list) else []:
+            minutes = max(minutes, entry.get('estimated_time_to_regain_access') or 0)
+    return minutes * 60.0
+
+
+def is_throttled(response, body, idempotent=False):
+    """True for responses that should be retried after backing off"""
+    if response.status_code in RETRYABLE_STATUS:
+        return True
+    if idempotent and response.status_code in TRANSIENT_STATUS:
+        return True
+    error = body.get('error') if isinstance(body, dict) else None
+    return isinstance(error, dict) and error.get('code') in THROTTLE_ERROR_CODES
+
+
+def backoff_seconds(attempt):
+    """Full-jitter exponential backoff for the given (1-based) attempt"""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
@@ -0,0 +1,82 @@
+import json
+import os
+import time
+
+from sanchaar_common import status_aggregate
+
+# A Function URL buffers the response, so each request long-polls for the next change
+EVENTS_WAIT_SECONDS = float(os.environ.get('EVENTS_WAIT_SECONDS', '20'))
+EVENTS_POLL_SECONDS = float(os.environ.get('EVENTS_POLL_SECONDS', '1'))
+# EventSource reconnects this long after a response ends, sending the last event id
+EVENTS_RETRY_MS = int(os.environ.get('EVENTS_RETRY_MS', '250'))
+
+def stream_handler(event, context):
+    """
+    Fold a batch of SanchaarContent stream records into the status aggregate
+    Triggered by the content table's DynamoDB stream
+    """
+    started = time.perf_counter()
+    records = event.get('Records') or []
+    applied, skipped = status_aggregate.apply_records(records)
+    
+    print(json.dumps({
+        'metric': 'status_aggregate_batch',
+        'records': len(records),
+        'applied': applied,
+        'skipped': skipped,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1)
+    }))
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'records': len(records), 'applied': applied, 'skipped': skipped})
+    }
+
+def events_handler(event, context):
+    """
+    Server-sent events of the status aggregate for the dashboard
+    Waits until the aggregate moves past the client's Last-Event-ID, then
+    answers with the delta (or a snapshot when the client is further behind)
+    """
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    since = headers.get('last-event-id') or (event.get('queryStringParameters') or {}).get('since')
+    since = int(since) if since and since.isdigit() else None
+    
+    wait = EVENTS_WAIT_SECONDS
+    if context is not None:
+        # Leave time to answer before the function times out
+        wait = min(wait, context.get_remaining_time_in_millis() / 1000 - 2)
+    deadline = time.monotonic() + wait
+    polls = 1
+    totals = status_aggregate.read_totals()
+    # A client at or past the read revision has nothing new yet
+    while since is not None and totals['revision'] <= since and time.monotonic() + EVENTS_POLL_SECONDS < deadline:
+        time.sleep(EVENTS_POLL_SECONDS)
+        totals = status_aggregate.read_totals()
+        polls += 1
+    
+    body = f'retry: {EVENTS_RETRY_MS}\n\n' + feed_events(totals, since)
+    print(json.dumps({'metric': 'status_events', 'since': since, 'revision': totals['revision'],
+                      'polls': polls, 'bytes': len(body)}))
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'},
+        'body': body
+    }
+
+def feed_events(totals, since):
+    """SSE events bringing a client at revision `since` up to date"""
+    revision = totals['revision']
+    if since is not None and since >= revision:
+        return ': no changes\n\n'
+    latency = status_aggregate.read_latency()
+    if since == revision - 1 and totals['last_delta'] is not None:
+        # Counters are increments; the rolling latency histogram is sent whole
+        return sse_event('delta', {'revision': revision, 'counters': totals['last_delta'],
+                                   'latency': latency}, revision)
+    return sse_event('snapshot', {'revision': revision, 'counters': totals['counters'],
+                                  'latency': latency, 'updated_at': totals['updated_at']}, revision)
+
+def sse_event(name, data, event_id):
+    return f"event: {name}\nid: {event_id}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -0,0 +1,117 @@
+import json
+import math
+import time
+
+from cache import get_cache
+from sanchaar_common.claim_check import offload, resolve
+
+# Rough token count for agent output without usage figures
+CHARS_PER_TOKEN = 4
+
+def lookup_handler(event, context):
+    """
+    Split the supervisor's target languages into cached transcreations and
+    misses; only the misses go on to the transcreation agent
+    """
+    started = time.perf_counter()
+    supervisor_response = event.get('supervisor_response') or {}
+    items = event.get('target_languages') or supervisor_response.get('target_languages') or []
+    brand = event.get('brand') or supervisor_response.get('brand') or 'default'
+    
+    try:
+        cache = get_cache()
+        results = cache.lookup(brand, items) if cache and items else [None] * len(items)
+    except Exception as e:
+        # A cache outage must not stop the pipeline; everything is a miss
+        print(f"Error reading transcreation cache: {str(e)}")
+        results = [None] * len(items)
+    
+    hits = []
+    misses = []
+    for position, (item, result) in enumerate(zip(items, results)):
+        if result is None:
+            misses.append(dict(item, cache_position=position))
+        else:
+            hits.append({
+                'cache_position': position,
+                'language': item['language'],
+                'match': result['match'],
+                'similarity': result['similarity'],
+                'tokens': result['tokens'],
+                'transcreation': result['transcreation']
+            })
+    
+    print(json.dumps({
+        'metric': 'transcreation_cache_lookup',
+        'content_id': event.get('content_id'),
+        'brand': brand,
+        'exact_hits': sum(1 for hit in hits if hit['match'] == 'exact'),
+        'semantic_hits': sum(1 for hit in hits if hit['match'] == 'semantic'),
+        'misses': len(misses),
+        'tokens_saved': sum(hit['tokens'] for hit in hits),
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1)
+    }))
+    
+    return {
+        'statusCode': 200,
+        # Misses stay inline for the Map state; cached answers can travel by reference
+        'body': json.dumps({'brand': brand, 'hits': offload(hits, 'transcreations'), 'misses': misses},
+                           ensure_ascii=False)
+    }
+
+def store_handler(event, context):
+    """
+    Cache the agent's transcreations for the misses and return every
+    transcreation, cached or fresh, in target-language order
+    """
+    brand = event.get('brand') or 'default'
+    hits = resolve(event.get('hits')) or []
+    misses = event.get('misses') or []
+    results = event.get('results') or []
+    
+    merged = {hit['cache_position']: hit['transcreation'] for hit in hits}
+    entries = []
+    for index, (item, result) in enumerate(zip(misses, results)):
+        merged[item.get('cache_position', index)] = result
+        if is_cacheable(result):
+            entries.append({
+                'language': item['language'],
+                'source_text': item['source_text'],
+                'transcreation': result,
+                'tokens': tokens_used(item['source_text'], result)
+            })
+    
+    evicted = 0
+    try:
+        cache = get_cache()
+        if cache:
+            evicted = cache.store(brand, entries)
+    except Exception as e:
+        print(f"Error writing transcreation cache: {str(e)}")
+    
+    print(json.dumps({
+        'metric': 'transcreation_cache_store',
+        'brand': brand,
+        'stored': len(entries),
+        'evicted': evicted,
+        'tokens_spent': sum(entry['tokens'] for entry in entries)
+    }))
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'transcreations': offload([merged[position] for position in sorted(merged)], 'transcreations')
+        }, ensure_ascii=False)
+    }
+
+def is_cacheable(result):
+    """Only successful agent answers are worth reusing"""
+    return isinstance(result, (dict, str)) and bool(result) and not (isinstance(result, dict) and 'Error' in result)
+
+def tokens_used(source_text, result):
+    """Agent tokens behind a transcreation, from its usage figures when present"""
+    usage = result.get('usage') if isinstance(result, dict) else None
+    if usage:
+        return int(usage.get('inputTokens', 0)) + int(usage.get('outputTokens', 0))
+    output = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    return math.ceil((len(source_text) + len(output)) / CHARS_PER_TOKEN)
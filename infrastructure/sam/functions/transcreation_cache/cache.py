@@ -0,0 +1,329 @@
+"""
+Semantic cache of finished transcreations, partitioned by brand, target
+language and embedding model
+
+A lookup first tries the exact normalised source text, then the most
+similar cached source text in the same partition. Entries expire through
+DynamoDB TTL (refreshed by hits) and each partition keeps at most
+TRANSCREATION_CACHE_MAX_ENTRIES, evicting the least recently used.
+
+Similarity search runs against partitions held in memory across warm
+invocations. A held partition is brought up to date every
+PARTITION_REFRESH_SECONDS from the created_at index, which returns only
+entries written since, and reloaded whole every PARTITION_TTL_SECONDS to
+drop evicted entries. A hit refreshes its entry at most once per
+TOUCH_INTERVAL_SECONDS.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import numpy as np
+from botocore.exceptions import ClientError
+
+TRANSCREATION_CACHE_TABLE = os.environ.get('TRANSCREATION_CACHE_TABLE')
+SIMILARITY_THRESHOLD = float(os.environ.get('TRANSCREATION_CACHE_SIMILARITY', '0.95'))
+CACHE_TTL_DAYS = int(os.environ.get('TRANSCREATION_CACHE_TTL_DAYS', '30'))
+MAX_ENTRIES_PER_PARTITION = int(os.environ.get('TRANSCREATION_CACHE_MAX_ENTRIES', '500'))
+CREATED_INDEX = os.environ.get('TRANSCREATION_CACHE_CREATED_INDEX', 'partition-created_at-index')
+PARTITION_REFRESH_SECONDS = int(os.environ.get('TRANSCREATION_CACHE_PARTITION_REFRESH_SECONDS', '60'))
+PARTITION_TTL_SECONDS = int(os.environ.get('TRANSCREATION_CACHE_PARTITION_TTL_SECONDS', '900'))
+# LRU order only needs coarse recency; the TTL is days
+TOUCH_INTERVAL_SECONDS = int(os.environ.get('TRANSCREATION_CACHE_TOUCH_INTERVAL_SECONDS', '3600'))
+# The index is eventually consistent; each refresh re-reads this much of the past
+REFRESH_OVERLAP_SECONDS = 30
+TOUCH_WORKERS = 8
+
+MATCH_EXACT = 'exact'
+MATCH_SEMANTIC = 'semantic'
+
+# BatchGetItem accepts at most 100 keys and BatchWriteItem 25 requests per call
+BATCH_GET_SIZE = 100
+BATCH_WRITE_SIZE = 25
+BATCH_MAX_ROUNDS = 5
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalise_text(text):
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(normalise_text(text).encode('utf-8')).hexdigest()[:32]
+
+
+def partition_key(brand, language, model_id):
+    return '#'.join([brand or 'default', language, model_id])
+
+
+def unit_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class TranscreationCache:
+    """DynamoDB-backed transcreation cache with exact and similarity lookups"""
+
+    def __init__(self, table_name, embedder, client=None, threshold=SIMILARITY_THRESHOLD,
+                 ttl_days=CACHE_TTL_DAYS, max_entries=MAX_ENTRIES_PER_PARTITION,
+                 touch_interval=TOUCH_INTERVAL_SECONDS):
+        self.table_name = table_name
+        self.embedder = embedder
+        self.client = client or boto3.client('dynamodb')
+        self.threshold = threshold
+        self.ttl_seconds = ttl_days * 86400
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        # partition -> {'entries', 'embeddings' by text_hash, 'loaded_at', 'synced_at', 'matrix'}
+        self.partitions = {}
+
+    def lookup(self, brand, items):
+        """
+        Return one result per item ({language, source_text}): None for a miss,
+        otherwise the cached transcreation with its match type and similarity
+        """
+        now = int(time.time())
+        keys = [(partition_key(brand, item['language'], self.embedder.model_id), text_hash(item['source_text']))
+                for item in items]
+        entries = self.batch_get(keys)
+
+        results = [None] * len(items)
+        for position, key in enumerate(keys):
+            entry = entries.get(key)
+            if entry and entry['expires_at'] > now:
+                results[position] = dict(entry, match=MATCH_EXACT, similarity=1.0)
+
+        remaining = [position for position, result in enumerate(results) if result is None]
+        if remaining:
+            texts = list(dict.fromkeys(items[position]['source_text'] for position in remaining))
+            vectors = dict(zip(texts, (unit_vector(v) for v in self.embedder.embed(texts))))
+            partitions = {}
+            for position in remaining:
+                partition = keys[position][0]
+                if partition not in partitions:
+                    partitions[partition] = self.partition_matrix(partition, now)
+                candidates, matrix = partitions[partition]
+                if not candidates:
+                    continue
+                similarities = matrix @ vectors[items[position]['source_text']]
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    results[position] = dict(candidates[best], match=MATCH_SEMANTIC,
+                                             similarity=round(float(similarities[best]), 4))
+
+        self.touch([result for result in results if result], now)
+        return results
+
+    def partition_matrix(self, partition, now):
+        """Unexpired entries of a partition and their unit embeddings as one matrix"""
+        held = self.partitions.get(partition)
+        if held is None or now - held['loaded_at'] >= PARTITION_TTL_SECONDS:
+            held = {'entries': {}, 'embeddings': {}, 'loaded_at': now, 'synced_at': now, 'matrix': None}
+            self.merge(held, self.query_partition(partition))
+            self.partitions[partition] = held
+        elif now - held['synced_at'] >= PARTITION_REFRESH_SECONDS:
+            self.merge(held, self.query_partition(partition, since=held['synced_at'] - REFRESH_OVERLAP_SECONDS))
+            held['synced_at'] = now
+
+        expired = [digest for digest, entry in held['entries'].items() if entry['expires_at'] <= now]
+        for digest in expired:
+            del held['entries'][digest], held['embeddings'][digest]
+        if expired:
+            held['matrix'] = None
+        if not held['entries']:
+            return [], None
+        if held['matrix'] is None:
+            candidates = list(held['entries'].values())
+            matrix = np.stack([np.frombuffer(held['embeddings'][entry['text_hash']], dtype=np.float16)
+                               for entry in candidates])
+            held['matrix'] = (candidates, matrix.astype(np.float32))
+        return held['matrix']
+
+    def merge(self, held, entries):
+        for entry in entries:
+            held['embeddings'][entry['text_hash']] = entry.pop('embedding')
+            held['entries'][entry['text_hash']] = entry
+        if entries:
+            held['matrix'] = None
+
+    def query_partition(self, partition, since=None):
+        """Entries of a partition, or only those created since a time through the created_at index"""
+        request = {
+            'TableName': self.table_name,
+            'KeyConditionExpression': '#partition = :partition',
+            'ExpressionAttributeNames': {'#partition': 'partition'},
+            'ExpressionAttributeValues': {':partition': {'S': partition}}
+        }
+        if since is not None:
+            request['IndexName'] = CREATED_INDEX
+            request['KeyConditionExpression'] += ' AND created_at >= :since'
+            request['ExpressionAttributeValues'][':since'] = {'N': str(since)}
+        entries = []
+        while True:
+            response = self.client.query(**request)
+            entries.extend(map(self.parse_item, response['Items']))
+            if 'LastEvaluatedKey' not in response:
+                return entries
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def batch_get(self, keys):
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), BATCH_GET_SIZE):
+            request = {self.table_name: {'Keys': [
+                {'partition': {'S': partition}, 'text_hash': {'S': digest}}
+                for partition, digest in unique[start:start + BATCH_GET_SIZE]
+            ]}}
+            for attempt in range(BATCH_MAX_ROUNDS):
+                response = self.client.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    entry = self.parse_item(item)
+                    entry.pop('embedding')
+                    found[(entry['partition'], entry['text_hash'])] = entry
+                request = response.get('UnprocessedKeys') or {}
+                if not request:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+        return found
+
+    def parse_item(self, item):
+        return {
+            'partition': item['partition']['S'],
+            'text_hash': item['text_hash']['S'],
+            'source_text': item['source_text']['S'],
+            'transcreation': json.loads(item['transcreation']['S']),
+            'tokens': int(item.get('tokens', {}).get('N', '0')),
+            'embedding': item['embedding']['B'],
+            'expires_at': int(item['expires_at']['N']),
+            'last_used_at': int(item['last_used_at']['N'])
+        }
+
+    def touch(self, hits, now):
+        """
+        Record hits: refresh recency and push the TTL out, skipping entries
+        already refreshed within touch_interval. Returns how many were written.
+        """
+        due = {(hit['partition'], hit['text_hash']) for hit in hits
+               if now - hit['last_used_at'] >= self.touch_interval}
+
+        def write(key):
+            partition, digest = key
+            try:
+                self.client.update_item(
+                    TableName=self.table_name,
+                    Key={'partition': {'S': partition}, 'text_hash': {'S': digest}},
+                    UpdateExpression='SET last_used_at = :now, expires_at = :expires ADD hits :one',
+                    # An entry evicted since the partition was loaded stays deleted
+                    ConditionExpression='attribute_exists(text_hash)',
+                    ExpressionAttributeValues={
+                        ':now': {'N': str(now)},
+                        ':expires': {'N': str(now + self.ttl_seconds)},
+                        ':one': {'N': '1'}
+                    }
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                held = self.partitions.get(partition)
+                if held and held['entries'].pop(digest, None):
+                    held['embeddings'].pop(digest)
+                    held['matrix'] = None
+                return
+            held = self.partitions.get(partition)
+            if held and digest in held['entries']:
+                held['entries'][digest].update(last_used_at=now, expires_at=now + self.ttl_seconds)
+
+        if due:
+            with ThreadPoolExecutor(max_workers=min(TOUCH_WORKERS, len(due))) as executor:
+                list(executor.map(write, due))
+        return len(due)
+
+    def store(self, brand, entries):
+        """
+        Cache fresh transcreations ({language, source_text, transcreation,
+        tokens}) and trim every partition written to back to max_entries
+        """
+        if not entries:
+            return 0
+        now = int(time.time())
+        texts = list(dict.fromkeys(entry['source_text'] for entry in entries))
+        vectors = dict(zip(texts, (unit_vector(v) for v in self.embedder.embed(texts))))
+
+        # One write per key; a batch may not name the same item twice
+        items = {}
+        for entry in entries:
+            key = (partition_key(brand, entry['language'], self.embedder.model_id), text_hash(entry['source_text']))
+            items[key] = {
+                'partition': {'S': key[0]},
+                'text_hash': {'S': key[1]},
+                'source_text': {'S': entry['source_text']},
+                'transcreation': {'S': json.dumps(entry['transcreation'], ensure_ascii=False)},
+                'tokens': {'N': str(int(entry.get('tokens', 0)))},
+                'embedding': {'B': vectors[entry['source_text']].astype(np.float16).tobytes()},
+                'created_at': {'N': str(now)},
+                'last_used_at': {'N': str(now)},
+                'expires_at': {'N': str(now + self.ttl_seconds)}
+            }
+        self.batch_write([{'PutRequest': {'Item': item}} for item in items.values()])
+        for (partition, _), item in items.items():
+            if partition in self.partitions:
+                self.merge(self.partitions[partition], [self.parse_item(item)])
+        return sum(self.evict(partition) for partition in {partition for partition, _ in items})
+
+    def evict(self, partition):
+        """Delete the least recently used entries beyond max_entries"""
+        recency = []
+        request = {
+            'TableName': self.table_name,
+            'KeyConditionExpression': '#partition = :partition',
+            'ProjectionExpression': 'text_hash, last_used_at',
+            'ExpressionAttributeNames': {'#partition': 'partition'},
+            'ExpressionAttributeValues': {':partition': {'S': partition}}
+        }
+        while True:
+            response = self.client.query(**request)
+            recency.extend((int(item['last_used_at']['N']), item['text_hash']['S']) for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        if len(recency) <= self.max_entries:
+            return 0
+        stale = sorted(recency)[:len(recency) - self.max_entries]
+        self.batch_write([{'DeleteRequest': {'Key': {'partition': {'S': partition}, 'text_hash': {'S': digest}}}}
+                          for _, digest in stale])
+        held = self.partitions.get(partition)
+        if held:
+            for _, digest in stale:
+                held['entries'].pop(digest, None)
+                held['embeddings'].pop(digest, None)
+            held['matrix'] = None
+        return len(stale)
+
+    def batch_write(self, requests):
+        for start in range(0, len(requests), BATCH_WRITE_SIZE):
+            pending = {self.table_name: requests[start:start + BATCH_WRITE_SIZE]}
+            for attempt in range(BATCH_MAX_ROUNDS):
+                response = self.client.batch_write_item(RequestItems=pending)
+                pending = response.get('UnprocessedItems') or {}
+                if not pending:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+
+
+_cache = None
+
+
+def get_cache():
+    """Cache for this function, or None when no cache table is configured"""
+    global _cache
+    if _cache is None and TRANSCREATION_CACHE_TABLE:
+        from embedders import get_embedder
+
+        _cache = TranscreationCache(TRANSCREATION_CACHE_TABLE, get_embedder())
+    return _cache
@@ -0,0 +1,85 @@
+"""
+Text embedders for the transcreation cache
+
+Every embedder exposes model_id, dimension and embed(texts) returning one
+float vector per text. TRANSCREATION_CACHE_EMBEDDER picks one by name.
+"""
+import hashlib
+import json
+import os
+import re
+
+import boto3
+
+TRANSCREATION_CACHE_EMBEDDER = os.environ.get('TRANSCREATION_CACHE_EMBEDDER', 'titan')
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+class TitanEmbedder:
+    """Amazon Titan text embeddings through Bedrock"""
+
+    name = 'titan'
+    dimension = 1536
+
+    def __init__(self, model_id=None, region=None):
+        self.model_id = model_id or os.environ.get('EMBEDDING_MODEL', 'amazon.titan-embed-text-v1')
+        self.client = boto3.client(
+            'bedrock-runtime',
+            region_name=region or os.environ.get('BEDROCK_REGION', 'us-east-1')
+        )
+
+    def embed(self, texts):
+        vectors = []
+        for text in texts:
+            response = self.client.invoke_model(
+                modelId=self.model_id,
+                body=json.dumps({'inputText': text}),
+                contentType='application/json',
+                accept='application/json'
+            )
+            vectors.append(json.loads(response['body'].read())['embedding'])
+        return vectors
+
+
+class HashingEmbedder:
+    """
+    Stand-in embedder for tests and benchmarks: hashed bag of words and word
+    bigrams, so texts differing by a word or two stay close in cosine terms
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dimension=512):
+        self.dimension = dimension
+        self.model_id = f'hashing-{dimension}'
+
+    def embed(self, texts):
+        return [self.embed_one(text) for text in texts]
+
+    def embed_one(self, text):
+        vector = [0.0] * self.dimension
+        tokens = [token.lower() for token in _TOKEN.findall(text)]
+        for feature in tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'big') % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+
+EMBEDDERS = {
+    TitanEmbedder.name: TitanEmbedder,
+    HashingEmbedder.name: HashingEmbedder
+}
+
+_embedders = {}
+
+
+def get_embedder(name=None):
+    """Shared embedder instance, created on first use"""
+    name = name or TRANSCREATION_CACHE_EMBEDDER
+    if name not in _embedders:
+        if name not in EMBEDDERS:
+            raise ValueError(f'Unknown transcreation cache embedder: {name}')
+        _embedders[name] = EMBEDDERS[name]()
+    return _embedders[name]
@@ -1,75 +1,527 @@
+# Imported first so the cold start init duration covers the imports below
+from sanchaar_common.instrumentation import instrument_boto3, instrumented, timed
+
 import json
 import boto3
 import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from uuid import uuid4
+from uuid import NAMESPACE_URL, uuid5
+
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+import audio
+from chunking import plan_chunks, stitch_transcripts
+from sanchaar_common.claim_check import offload, resolve
+from sanchaar_common.status_index import status_attributes, status_update
+from transcribers import get_backend
 
+# Cap on concurrent StartTranscriptionJob calls from one batch
+TRANSCRIBE_MAX_CONCURRENCY = int(os.environ.get('TRANSCRIBE_MAX_CONCURRENCY', '10'))
+
+# Every AWS call below is timed; clients must be created after this
+instrument_boto3()
 s3 = boto3.client('s3')
-transcribe = boto3.client('transcribe')
+transcribe = boto3.client('transcribe', config=Config(
+    max_pool_connections=TRANSCRIBE_MAX_CONCURRENCY,
+    retries={'max_attempts': 8, 'mode': 'adaptive'}
+))
 dynamodb = boto3.resource('dynamodb')
 
 CONTENT_TABLE = os.environ['CONTENT_TABLE']
+OUTPUT_BUCKET = os.environ.get('OUTPUT_BUCKET')
 table = dynamodb.Table(CONTENT_TABLE)
 
+# whole: one Transcribe job per upload; chunked: long recordings are split at
+# silences and the overlapping chunks are transcribed in parallel
+TRANSCRIPTION_MODE = os.environ.get('TRANSCRIPTION_MODE', 'whole')
+CHUNKED_MIN_SECONDS = float(os.environ.get('CHUNKED_TRANSCRIPTION_MIN_SECONDS', '600'))
+CHUNK_PREFIX = 'transcription-chunks/'
+# ffmpeg reads the upload through a presigned URL for as long as chunking takes
+SOURCE_URL_SECONDS = 3600
+CHUNK_JOB_PATTERN = re.compile(r'^sanchaar-(?P<content_id>[0-9a-f-]{36})-c(?P<index>\d{3})$')
+# Whole-file jobs and stitched chunked transcriptions both end up here
+TRANSCRIPT_PREFIX = 'transcripts/'
+
+# Candidate languages for automatic language identification
+LANGUAGE_OPTIONS = os.environ.get('TRANSCRIBE_LANGUAGE_OPTIONS', 'hi-IN,ta-IN,te-IN,bn-IN,mr-IN').split(',')
+PREFERRED_LANGUAGE = os.environ.get('TRANSCRIBE_PREFERRED_LANGUAGE', 'hi-IN')
+
+# Short voice commands are transcribed synchronously by a streaming backend
+VOICE_COMMAND_FAST_PATH = os.environ.get('VOICE_COMMAND_FAST_PATH', 'false').lower() == 'true'
+VOICE_COMMAND_MAX_BYTES = int(os.environ.get('VOICE_COMMAND_MAX_BYTES', str(1024 * 1024)))
+
+@instrumented('voice_processor')
 def lambda_handler(event, context):
     """
     Process voice commands from S3 uploads
     Extract metadata and trigger transcription
     """
     try:
-        # Extract S3 event details
-        bucket = event['detail']['bucket']['name']
-        key = event['detail']['object']['key']
+        upload = parse_eventbridge_event(event)
         
-        # Generate content ID
-        content_id = str(uuid4())
+        if is_short_command(upload):
+            command = transcribe_command(upload)
+            if command:
+                persist_started = time.perf_counter()
+                table.put_item(Item=metadata_item(upload, {
+                    key: command[key] for key in ('transcript', 'language_code', 'media_format', 'transcription_mode')
+                }, status='transcribed'))
+                command['latency_ms']['persist'] = round((time.perf_counter() - persist_started) * 1000, 2)
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'content_id': upload['content_id'],
+                        **command,
+                        # Long dictations travel by reference; the state keeps the ids inline
+                        'transcript': offload(command['transcript'], 'transcripts'),
+                        'status': 'transcribed'
+                    }, ensure_ascii=False)
+                }
+                
+        transcription = start_transcription(upload)
         
-        # Start transcription job
-        job_name = f"sanchaar-{content_id}"
+        # Store initial metadata
+        table.put_item(Item=metadata_item(upload, transcription))
         
-        transcribe.start_transcription_job(
-            TranscriptionJobName=job_name,
-            Media={'MediaFileUri': f's3://{bucket}/{key}'},
-            MediaFormat='mp3',
-            LanguageCode='hi-IN',  # Default to Hindi, can be auto-detected
-            Settings={
-                'ShowSpeakerLabels': True,
-                'MaxSpeakerLabels': 2
-            }
-        )
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'content_id': upload['content_id'],
+                **transcription,
+                'status': 'initiated'
+            })
+        }
         
-        # Store initial metadata
-        table.put_item(
-            Item={
-                'content_id': content_id,
-                'version': int(datetime.now().timestamp()),
-                'user_id': extract_user_id(key),
-                'source_audio_uri': f's3://{bucket}/{key}',
-                'transcription_job': job_name,
-                'status': 'processing',
-                'created_at': datetime.now().isoformat()
+    except Exception as e:
+        print(f"Error processing voice command: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+@instrumented('voice_batch_processor')
+def batch_handler(event, context):
+    """
+    Process a burst of voice command uploads delivered as an SQS batch
+    Transcription jobs start concurrently, metadata is batch-written and
+    only the failed messages are reported back for redelivery
+    """
+    failed = set()
+    uploads = {}
+    message_ids = {}
+    
+    for record in event.get('Records', []):
+        try:
+            for upload in parse_upload_message(record['body']):
+                # Duplicate deliveries inside one batch collapse onto one upload
+                uploads.setdefault(upload['content_id'], upload)
+                message_ids.setdefault(upload['content_id'], []).append(record['messageId'])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Malformed ingestion message {record.get('messageId')}: {str(e)}")
+            failed.add(record['messageId'])
+            
+    started = {}
+    if uploads:
+        workers = max(min(TRANSCRIBE_MAX_CONCURRENCY, len(uploads)), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(try_start_transcription, uploads.values())
+            for content_id, (transcription, error) in zip(list(uploads), results):
+                if error:
+                    print(f"Error starting transcription for {content_id}: {error}")
+                    failed.update(message_ids[content_id])
+                else:
+                    started[content_id] = transcription
+                    
+    if started:
+        try:
+            with table.batch_writer(overwrite_by_pkeys=['content_id', 'version']) as batch:
+                for content_id, transcription in started.items():
+                    batch.put_item(Item=metadata_item(uploads[content_id], transcription))
+        except Exception as e:
+            # Content IDs are deterministic, so redelivering the whole set is safe
+            print(f"Error writing ingestion metadata: {str(e)}")
+            for content_id in started:
+                failed.update(message_ids[content_id])
+                
+    print(json.dumps({
+        'event': 'ingestion_batch',
+        'messages': len(event.get('Records', [])),
+        'uploads': len(uploads),
+        'transcriptions_started': len(started),
+        'failed_messages': len(failed)
+    }))
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in sorted(failed)]}
+
+@instrumented('transcription_complete')
+def transcription_complete_handler(event, context):
+    """
+    Stitch a chunked transcription once its last chunk job has finished
+    Triggered by Transcribe job state change events
+    """
+    try:
+        detail = event['detail']
+        match = CHUNK_JOB_PATTERN.match(detail.get('TranscriptionJobName', ''))
+        if not match:
+            return {'statusCode': 200, 'body': json.dumps({'status': 'ignored'})}
+            
+        content_id = match.group('content_id')
+        prefix = f"{CHUNK_PREFIX}{content_id}/"
+        plan = read_json(OUTPUT_BUCKET, f'{prefix}plan.json')
+        item_key = {'content_id': content_id, 'version': plan['version']}
+        
+        if detail.get('TranscriptionJobStatus') == 'FAILED':
+            update_status(item_key, 'transcription_failed')
+            return {
+                'statusCode': 500,
+                'body': json.dumps({'content_id': content_id, 'error': f"{detail['TranscriptionJobName']} failed"})
             }
+            
+        # Every chunk job writes its transcript next to the plan
+        expected = [f"{prefix}{chunk['index']:03d}.json" for chunk in plan['chunks']]
+        finished = list_keys(OUTPUT_BUCKET, prefix)
+        remaining = [key for key in expected if key not in finished]
+        if remaining:
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'content_id': content_id, 'status': 'waiting', 'remaining_chunks': len(remaining)})
+            }
+            
+        documents = [read_json(OUTPUT_BUCKET, key) for key in expected]
+        stitched = stitch_transcripts(plan['chunks'], documents, f"sanchaar-{content_id}")
+        transcript_key = f"{TRANSCRIPT_PREFIX}{content_id}.json"
+        s3.put_object(
+            Bucket=OUTPUT_BUCKET,
+            Key=transcript_key,
+            Body=json.dumps(stitched, ensure_ascii=False).encode('utf-8'),
+            ContentType='application/json'
         )
+        transcript_uri = f"s3://{OUTPUT_BUCKET}/{transcript_key}"
+        update_status(item_key, 'transcribed', transcript_uri)
         
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'content_id': content_id,
-                'transcription_job': job_name,
-                'status': 'initiated'
+                'transcript_uri': transcript_uri,
+                'chunks': len(plan['chunks']),
+                'status': 'transcribed'
             })
         }
         
     except Exception as e:
-        print(f"Error processing voice command: {str(e)}")
+        print(f"Error stitching transcription: {str(e)}")
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
 
+class TranscriptPending(Exception):
+    """The transcription job has not finished; the state machine retries"""
+
+class TranscriptionFailed(Exception):
+    pass
+
+@instrumented('transcript_resolver')
+def transcript_handler(event, context):
+    """
+    Resolve the transcript of a parsed voice command for the supervisor agent
+    The fast path carries the text, possibly by claim check; transcription
+    jobs are read from their output once finished. Errors raise so the
+    state machine's Retry and Catch see them.
+    """
+    command = event['command']
+    if command.get('transcript') is not None:
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'content_id': command['content_id'],
+                'text': resolve(command['transcript']),
+                'language_code': command.get('language_code'),
+                # Streaming results carry no word timings to build captions from
+                'transcript_uri': None
+            }, ensure_ascii=False)
+        }
+        
+    content_id = command['content_id']
+    job_name = command['transcription_job']
+    transcript_key = f"{TRANSCRIPT_PREFIX}{content_id}.json"
+    if command.get('transcription_chunks'):
+        failed = transcribe.list_transcription_jobs(JobNameContains=f'{job_name}-c', Status='FAILED')
+        if failed.get('TranscriptionJobSummaries'):
+            raise TranscriptionFailed(f"{failed['TranscriptionJobSummaries'][0]['TranscriptionJobName']} failed")
+        if transcript_key not in list_keys(OUTPUT_BUCKET, transcript_key):
+            raise TranscriptPending(f'{job_name} is still being transcribed in chunks')
+    else:
+        job = transcribe.get_transcription_job(TranscriptionJobName=job_name)['TranscriptionJob']
+        if job['TranscriptionJobStatus'] == 'FAILED':
+            raise TranscriptionFailed(f"{job_name} failed: {job.get('FailureReason')}")
+        if job['TranscriptionJobStatus'] != 'COMPLETED':
+            raise TranscriptPending(f"{job_name} is {job['TranscriptionJobStatus']}")
+            
+    results = read_json(OUTPUT_BUCKET, transcript_key)['results']
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'content_id': content_id,
+            'text': results['transcripts'][0]['transcript'],
+            'language_code': results.get('language_code'),
+            'transcript_uri': f"s3://{OUTPUT_BUCKET}/{transcript_key}"
+        }, ensure_ascii=False)
+    }
+
+def parse_eventbridge_event(event):
+    """Upload details from an EventBridge 'Object Created' event"""
+    detail = event['detail']
+    return build_upload(
+        detail['bucket']['name'],
+        detail['object']['key'],
+        detail['object'].get('sequencer') or detail['object'].get('etag', ''),
+        event.get('time'),
+        detail['object'].get('size')
+    )
+
+def parse_upload_message(body):
+    """
+    Uploads carried by one SQS message body: either an EventBridge event
+    forwarded by a rule or a native S3 event notification
+    """
+    message = json.loads(body)
+    if 'detail' in message:
+        return [parse_eventbridge_event(message)]
+    return [
+        build_upload(
+            record['s3']['bucket']['name'],
+            record['s3']['object']['key'],
+            record['s3']['object'].get('sequencer') or record['s3']['object'].get('eTag', ''),
+            record.get('eventTime'),
+            record['s3']['object'].get('size')
+        )
+        for record in message.get('Records', [])
+    ]
+
+def build_upload(bucket, key, sequencer, event_time, size=None):
+    """
+    Derive deterministic identifiers for an upload so every redelivery of
+    the same S3 event maps onto the same content ID and transcription job
+    """
+    uploaded_at = parse_event_time(event_time)
+    return {
+        'bucket': bucket,
+        'key': key,
+        'content_id': str(uuid5(NAMESPACE_URL, f's3://{bucket}/{key}#{sequencer}')),
+        'version': int(uploaded_at.timestamp()),
+        'created_at': uploaded_at.isoformat(),
+        'size': size
+    }
+
+def parse_event_time(event_time):
+    if not event_time:
+        return datetime.now()
+    return datetime.fromisoformat(event_time.replace('Z', '+00:00'))
+
+def is_short_command(upload):
+    return VOICE_COMMAND_FAST_PATH and upload['size'] is not None and upload['size'] <= VOICE_COMMAND_MAX_BYTES
+
+def transcribe_command(upload, backend=None):
+    """
+    Transcribe a short voice command synchronously with language
+    identification, timing each stage. Returns None when the command
+    cannot take the fast path and should become a transcription job.
+    """
+    latency_ms = {}
+    started = mark = time.perf_counter()
+    
+    def lap(stage):
+        nonlocal mark
+        now = time.perf_counter()
+        latency_ms[stage] = round((now - mark) * 1000, 2)
+        mark = now
+        
+    try:
+        data = s3.get_object(Bucket=upload['bucket'], Key=upload['key'])['Body'].read()
+        lap('fetch')
+        media_format = audio.detect_media_format(data[:64])
+        lap('detect')
+        media_encoding, sample_rate, payload = audio.streaming_input(data, media_format)
+        lap('prepare')
+        with timed('transcribe_streaming.transcribe'):
+            result = (backend or get_backend()).transcribe(
+                payload, media_encoding, sample_rate, LANGUAGE_OPTIONS, PREFERRED_LANGUAGE
+            )
+        lap('transcribe')
+    except Exception as e:
+        print(f"Voice command fast path unavailable, starting a transcription job: {str(e)}")
+        return None
+        
+    print(json.dumps({
+        'event': 'voice_command_transcribed',
+        'content_id': upload['content_id'],
+        'backend': result['backend'],
+        'media_format': media_format,
+        'language_code': result['language_code'],
+        'latency_ms': latency_ms,
+        'total_ms': round((time.perf_counter() - started) * 1000, 2)
+    }))
+    return {
+        'transcript': result['transcript'],
+        'language_code': result['language_code'],
+        'media_format': media_format,
+        'transcription_mode': 'streaming',
+        'latency_ms': latency_ms
+    }
+
+def start_transcription(upload):
+    """Start transcription for an upload and return the metadata fields describing it"""
+    job_name = f"sanchaar-{upload['content_id']}"
+    if TRANSCRIPTION_MODE == 'chunked':
+        chunks = start_chunked_transcription(upload, job_name)
+        if chunks:
+            return {'transcription_job': job_name, 'transcription_chunks': chunks}
+            
+    submit_transcription_job(
+        job_name,
+        f"s3://{upload['bucket']}/{upload['key']}",
+        audio.media_format_from_key(upload['key']),
+        OutputBucketName=OUTPUT_BUCKET,
+        OutputKey=f"{TRANSCRIPT_PREFIX}{upload['content_id']}.json"
+    )
+    return {'transcription_job': job_name}
+
+def submit_transcription_job(job_name, media_uri, media_format, **output):
+    """Start one Transcribe job, treating an existing job of the same name as started"""
+    try:
+        transcribe.start_transcription_job(
+            TranscriptionJobName=job_name,
+            Media={'MediaFileUri': media_uri},
+            MediaFormat=media_format,
+            IdentifyLanguage=True,
+            LanguageOptions=LANGUAGE_OPTIONS,
+            Settings={
+                'ShowSpeakerLabels': True,
+                'MaxSpeakerLabels': 2
+            },
+            **output
+        )
+    except ClientError as e:
+        # A redelivered event finds the job it already started
+        if e.response['Error']['Code'] != 'ConflictException':
+            raise
+
+def start_chunked_transcription(upload, job_name):
+    """
+    Split a long recording at silences into overlapping chunks and start
+    one Transcribe job per chunk. Returns the chunk count, or None when the
+    recording should be transcribed as a single job.
+    
+    ffmpeg reads the upload from a presigned URL: the duration comes from
+    the container header and each chunk from a ranged read, so the
+    recording is never copied to /tmp.
+    """
+    if not audio.ffmpeg_available():
+        print("ffmpeg not available, transcribing as a single job")
+        return None
+        
+    source = s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': upload['bucket'], 'Key': upload['key']},
+        ExpiresIn=SOURCE_URL_SECONDS
+    )
+    with timed('ffmpeg.probe'):
+        duration = audio.probe_duration(source)
+    if duration < CHUNKED_MIN_SECONDS:
+        return None
+        
+    prefix = f"{CHUNK_PREFIX}{upload['content_id']}/"
+    with tempfile.TemporaryDirectory() as workdir:
+        with timed('ffmpeg.analyze'):
+            duration, silences = audio.analyze_audio(source)
+        chunks = plan_chunks(duration, silences)
+        # The plan must exist before any chunk job can complete
+        s3.put_object(
+            Bucket=OUTPUT_BUCKET,
+            Key=f'{prefix}plan.json',
+            Body=json.dumps({
+                'content_id': upload['content_id'],
+                'version': upload['version'],
+                'source_audio_uri': f"s3://{upload['bucket']}/{upload['key']}",
+                'duration': duration,
+                'chunks': chunks
+            }).encode('utf-8'),
+            ContentType='application/json'
+        )
+        
+        def submit(chunk):
+            name = f"{chunk['index']:03d}"
+            with timed('ffmpeg.extract_chunk'):
+                path = audio.extract_chunk(source, chunk['start'], chunk['end'], os.path.join(workdir, f'{name}.flac'))
+            s3.upload_file(path, OUTPUT_BUCKET, f'{prefix}{name}.flac')
+            os.remove(path)
+            submit_transcription_job(
+                f'{job_name}-c{name}',
+                f's3://{OUTPUT_BUCKET}/{prefix}{name}.flac',
+                'flac',
+                OutputBucketName=OUTPUT_BUCKET,
+                OutputKey=f'{prefix}{name}.json'
+            )
+            
+        with ThreadPoolExecutor(max_workers=max(min(TRANSCRIBE_MAX_CONCURRENCY, len(chunks)), 1)) as executor:
+            list(executor.map(submit, chunks))
+            
+    print(json.dumps({
+        'event': 'chunked_transcription_started',
+        'content_id': upload['content_id'],
+        'duration_seconds': round(duration, 1),
+        'chunks': len(chunks)
+    }))
+    return len(chunks)
+
+def read_json(bucket, key):
+    return json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+def list_keys(bucket, prefix):
+    keys = set()
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys.update(obj['Key'] for obj in page.get('Contents', []))
+    return keys
+
+def update_status(item_key, status, transcript_uri=None):
+    expression, names, values = status_update(status, item_key['content_id'])
+    expression = f'SET {expression}'
+    if transcript_uri:
+        expression += ', transcript_uri = :uri'
+        values[':uri'] = transcript_uri
+    table.update_item(
+        Key=item_key,
+        UpdateExpression=expression,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+def try_start_transcription(upload):
+    try:
+        return start_transcription(upload), None
+    except Exception as e:
+        return None, str(e)
+
+def metadata_item(upload, transcription, status='processing'):
+    return {
+        'content_id': upload['content_id'],
+        'version': upload['version'],
+        'user_id': extract_user_id(upload['key']),
+        'source_audio_uri': f"s3://{upload['bucket']}/{upload['key']}",
+        **transcription,
+        **status_attributes(status, upload['content_id']),
+        'created_at': upload['created_at']
+    }
+
 def extract_user_id(s3_key):
     """Extract user ID from S3 key path"""
     parts = s3_key.split('/')
     if len(parts) > 1:
         return parts[1]
-    return 'unknown'
+    return 'unknown'
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+Audio container detection and ffmpeg helpers for silence detection, chunk
+extraction and decoding
+
+ffmpeg is not part of the Lambda runtime; it comes from a layer mounted at
+/opt/bin. Without it chunked transcription falls back to whole-file jobs.
+Sources may be local paths or presigned HTTPS URLs, which ffmpeg reads with
+range requests rather than needing a copy in /tmp.
+"""
+import io
+import os
+import re
+import struct
+import subprocess
+import wave
+
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', '/opt/bin/ffmpeg')
+SILENCE_NOISE_DB = os.environ.get('SILENCE_NOISE_DB', '-35')
+SILENCE_MIN_SECONDS = os.environ.get('SILENCE_MIN_SECONDS', '0.4')
+
+_DURATION = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+_SILENCE_START = re.compile(r'silence_start: (-?\d+(?:\.\d+)?)')
+_SILENCE_END = re.compile(r'silence_end: (\d+(?:\.\d+)?)')
+
+# Transcribe batch MediaFormat values by file extension
+EXTENSION_FORMATS = {
+    'mp3': 'mp3', 'mp4': 'mp4', 'm4a': 'm4a', 'wav': 'wav', 'flac': 'flac',
+    'ogg': 'ogg', 'opus': 'ogg', 'amr': 'amr', 'webm': 'webm'
+}
+
+# Sample rate streamed when a container has to be decoded to PCM
+PCM_SAMPLE_RATE = 16000
+
+
+def detect_media_format(header):
+    """Identify the container from the first bytes of an object, or None"""
+    if header.startswith(b'ID3') or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    if header.startswith(b'RIFF') and header[8:12] == b'WAVE':
+        return 'wav'
+    if header.startswith(b'fLaC'):
+        return 'flac'
+    if header.startswith(b'OggS'):
+        return 'ogg'
+    if header.startswith(b'#!AMR'):
+        return 'amr'
+    if header.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm'
+    if header[4:8] == b'ftyp':
+        return 'm4a' if header[8:11] == b'M4A' else 'mp4'
+    return None
+
+
+def media_format_from_key(key, default='mp3'):
+    extension = key.rsplit('.', 1)[-1].lower() if '.' in key else ''
+    return EXTENSION_FORMATS.get(extension, default)
+
+
+def streaming_input(data, media_format):
+    """
+    Return (media_encoding, sample_rate, payload) for Transcribe streaming,
+    passing FLAC, Ogg Opus and 16-bit mono WAV through and decoding anything
+    else to PCM with ffmpeg
+    """
+    if media_format == 'flac' and len(data) >= 21:
+        # STREAMINFO follows the marker and block header; the rate is 20 bits at byte 18
+        sample_rate = (data[18] << 12) | (data[19] << 4) | (data[20] >> 4)
+        return 'flac', sample_rate, data
+    if media_format == 'ogg':
+        head = data.find(b'OpusHead')
+        if head != -1 and len(data) >= head + 16:
+            return 'ogg-opus', struct.unpack_from('<I', data, head + 12)[0] or 48000, data
+    if media_format == 'wav':
+        try:
+            with wave.open(io.BytesIO(data)) as source:
+                if source.getnchannels() == 1 and source.getsampwidth() == 2:
+                    return 'pcm', source.getframerate(), source.readframes(source.getnframes())
+        except (wave.Error, EOFError):
+            pass
+    if not ffmpeg_available():
+        raise ValueError(f'Cannot stream {media_format or "unknown"} audio without ffmpeg')
+    return 'pcm', PCM_SAMPLE_RATE, decode_to_pcm(data)
+
+
+def decode_to_pcm(data):
+    """Decode any container ffmpeg understands to 16 kHz mono signed 16-bit PCM"""
+    completed = subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-nostats', '-loglevel', 'error', '-i', 'pipe:0',
+         '-ac', '1', '-ar', str(PCM_SAMPLE_RATE), '-f', 's16le', 'pipe:1'],
+        input=data, capture_output=True, check=True
+    )
+    return completed.stdout
+
+
+def ffmpeg_available():
+    return os.path.isfile(FFMPEG_PATH) and os.access(FFMPEG_PATH, os.X_OK)
+
+
+def probe_duration(source):
+    """Duration in seconds read from the container header, without decoding the audio"""
+    # With no output ffmpeg exits non-zero once it has printed the input's details
+    completed = subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-nostats', '-i', source],
+        capture_output=True, text=True
+    )
+    return parse_duration(completed.stderr)
+
+
+def analyze_audio(source):
+    """Return (duration_seconds, [(silence_start, silence_end), ...]) in one decode pass"""
+    completed = subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-nostats', '-i', source,
+         '-af', f'silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_SECONDS}',
+         '-f', 'null', '-'],
+        capture_output=True, text=True, check=True
+    )
+    return parse_silencedetect(completed.stderr)
+
+
+def parse_duration(output):
+    duration_match = _DURATION.search(output)
+    if duration_match is None:
+        raise ValueError('ffmpeg did not report a duration')
+    hours, minutes, seconds = duration_match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_silencedetect(output):
+    duration = parse_duration(output)
+    silences = []
+    start = None
+    for line in output.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = _SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None:
+        silences.append((start, duration))
+    return duration, silences
+
+
+def extract_chunk(source, start, end, output_path):
+    """
+    Cut [start, end) to 16 kHz mono FLAC so chunk timestamps are sample
+    accurate. Seeking before the input means a URL source is only read
+    from around the chunk's start.
+    """
+    subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-nostats', '-loglevel', 'error', '-y',
+         '-ss', f'{start:.3f}', '-i', source, '-t', f'{end - start:.3f}',
+         '-ac', '1', '-ar', '16000', '-c:a', 'flac', output_path],
+        check=True
+    )
+    return output_path
@@ -0,0 +1,217 @@
+"""
+Split long recordings into overlapping chunks at silences and stitch the
+per-chunk Transcribe results back into one transcript
+
+Everything here is pure: plans and transcripts in, plans and transcripts out.
+"""
+import os
+
+TARGET_CHUNK_SECONDS = float(os.environ.get('CHUNK_TARGET_SECONDS', '300'))
+MAX_CHUNK_SECONDS = float(os.environ.get('CHUNK_MAX_SECONDS', '420'))
+MIN_CHUNK_SECONDS = float(os.environ.get('CHUNK_MIN_SECONDS', '120'))
+# Audio shared by neighbouring chunks so words at a cut are heard whole by one of them
+OVERLAP_SECONDS = float(os.environ.get('CHUNK_OVERLAP_SECONDS', '3'))
+
+# Items from two chunks closer than this (seconds) are the same spoken word
+MATCH_TOLERANCE = 0.25
+# Matches MaxSpeakerLabels of the chunk jobs
+MAX_SPEAKERS = 2
+
+
+def plan_chunks(duration, silences, target=TARGET_CHUNK_SECONDS, max_chunk=MAX_CHUNK_SECONDS,
+                min_chunk=MIN_CHUNK_SECONDS, overlap=OVERLAP_SECONDS):
+    """
+    Cut [0, duration) into chunks near the target length, cutting in the
+    middle of the longest silence available and only hard-cutting when a
+    stretch of max_chunk seconds has no silence at all.
+
+    Each chunk has a core [core_start, core_end) that tiles the recording
+    and an audio window [start, end) widened by the overlap on both sides.
+    """
+    silences = sorted(silences)
+    cuts = [0.0]
+    while duration - cuts[-1] > max_chunk:
+        last = cuts[-1]
+        preferred = [s for s in silences if last + target <= (s[0] + s[1]) / 2 <= last + max_chunk]
+        early = [s for s in silences if last + min_chunk <= (s[0] + s[1]) / 2 < last + target]
+        if preferred:
+            start, end = max(preferred, key=lambda s: s[1] - s[0])
+            cut = (start + end) / 2
+        elif early:
+            start, end = early[-1]
+            cut = (start + end) / 2
+        else:
+            cut = last + max_chunk
+        cuts.append(round(cut, 3))
+    cuts.append(duration)
+
+    return [{
+        'index': index,
+        'core_start': core_start,
+        'core_end': core_end,
+        'start': round(max(0.0, core_start - overlap), 3),
+        'end': round(min(duration, core_end + overlap), 3)
+    } for index, (core_start, core_end) in enumerate(zip(cuts, cuts[1:]))]
+
+
+def labelled_items(document):
+    """Transcribe items with a speaker_label on every pronunciation"""
+    results = document['results']
+    items = [dict(item) for item in results.get('items', [])]
+    if any('speaker_label' in item for item in items):
+        return items
+
+    # Older output only carries labels in speaker_labels.segments
+    speakers = {}
+    for segment in results.get('speaker_labels', {}).get('segments', []):
+        for entry in segment.get('items', []):
+            speakers[entry['start_time']] = entry['speaker_label']
+    for item in items:
+        if item['type'] == 'pronunciation' and item['start_time'] in speakers:
+            item['speaker_label'] = speakers[item['start_time']]
+    return items
+
+
+def shift_items(items, offset):
+    """Move chunk-relative item times onto the recording timeline"""
+    shifted = []
+    for item in items:
+        item = dict(item)
+        if item['type'] == 'pronunciation':
+            item['start_time'] = format_time(float(item['start_time']) + offset)
+            item['end_time'] = format_time(float(item['end_time']) + offset)
+        shifted.append(item)
+    return shifted
+
+
+def format_time(seconds):
+    return f'{seconds:.3f}'
+
+
+def midpoint(item):
+    return (float(item['start_time']) + float(item['end_time'])) / 2
+
+
+def match_speakers(previous_items, items, known_speakers, max_speakers=MAX_SPEAKERS):
+    """
+    Map this chunk's speaker labels onto recording-wide labels by pairing the
+    words both chunks heard in their shared overlap. A label that was silent
+    in the overlap takes a known speaker this chunk has not claimed, and only
+    becomes a new speaker while fewer than max_speakers are known.
+    """
+    votes = {}
+    spoken = [item for item in items if item['type'] == 'pronunciation']
+    window_start = float(spoken[0]['start_time']) - MATCH_TOLERANCE if spoken else 0.0
+    previous = [item for item in previous_items
+                if item['type'] == 'pronunciation' and float(item['start_time']) >= window_start]
+    window_end = float(previous[-1]['start_time']) + MATCH_TOLERANCE if previous else 0.0
+    for item in spoken:
+        if 'speaker_label' not in item or float(item['start_time']) > window_end:
+            continue
+        for candidate in previous:
+            if (abs(float(candidate['start_time']) - float(item['start_time'])) <= MATCH_TOLERANCE
+                    and candidate['alternatives'][0]['content'] == item['alternatives'][0]['content']
+                    and 'speaker_label' in candidate):
+                pair = (item['speaker_label'], candidate['speaker_label'])
+                votes[pair] = votes.get(pair, 0) + 1
+                break
+
+    mapping = {}
+    taken = set()
+    for (local, known), _ in sorted(votes.items(), key=lambda vote: -vote[1]):
+        if local not in mapping and known not in taken:
+            mapping[local] = known
+            taken.add(known)
+
+    for item in items:
+        local = item.get('speaker_label')
+        if local is None or local in mapping:
+            continue
+        unclaimed = [known for known in known_speakers if known not in taken]
+        if unclaimed and len(known_speakers) >= max_speakers:
+            mapping[local] = unclaimed[0]
+        else:
+            mapping[local] = f'spk_{len(known_speakers)}'
+            known_speakers.append(mapping[local])
+        taken.add(mapping[local])
+    return mapping
+
+
+def trim_to_core(items, core_start, core_end):
+    """
+    Keep the words whose midpoint falls inside the chunk core, with the
+    punctuation that follows them, dropping the overlap duplicates
+    """
+    kept = []
+    keep_punctuation = False
+    for item in items:
+        if item['type'] == 'punctuation':
+            if keep_punctuation:
+                kept.append(item)
+            continue
+        keep_punctuation = core_start <= midpoint(item) < core_end
+        if keep_punctuation:
+            kept.append(item)
+    return kept
+
+
+def build_segments(items):
+    """Rebuild speaker_labels.segments from labelled items"""
+    segments = []
+    for item in items:
+        if item['type'] != 'pronunciation' or 'speaker_label' not in item:
+            continue
+        entry = {
+            'start_time': item['start_time'],
+            'end_time': item['end_time'],
+            'speaker_label': item['speaker_label']
+        }
+        if segments and segments[-1]['speaker_label'] == item['speaker_label']:
+            segments[-1]['end_time'] = item['end_time']
+            segments[-1]['items'].append(entry)
+        else:
+            segments.append(dict(entry, items=[entry]))
+    return segments
+
+
+def transcript_text(items):
+    parts = []
+    for item in items:
+        content = item['alternatives'][0]['content']
+        if item['type'] == 'punctuation' and parts:
+            parts[-1] += content
+        else:
+            parts.append(content)
+    return ' '.join(parts)
+
+
+def stitch_transcripts(chunks, documents, job_name=None):
+    """
+    Merge per-chunk Transcribe documents (in chunk order) into one
+    Transcribe-shaped document on the recording timeline with consistent
+    speaker labels and no duplicated overlap words
+    """
+    known_speakers = []
+    stitched = []
+    previous_items = []
+    for chunk, document in zip(chunks, documents):
+        items = shift_items(labelled_items(document), chunk['start'])
+        mapping = match_speakers(previous_items, items, known_speakers)
+        for item in items:
+            if 'speaker_label' in item:
+                item['speaker_label'] = mapping[item['speaker_label']]
+        stitched.extend(trim_to_core(items, chunk['core_start'], chunk['core_end']))
+        previous_items = items
+
+    segments = build_segments(stitched)
+    return {
+        'jobName': job_name,
+        'results': {
+            'transcripts': [{'transcript': transcript_text(stitched)}],
+            # Chunks share the recording's language; the first one identified it
+            'language_code': documents[0]['results'].get('language_code') if documents else None,
+            'speaker_labels': {'speakers': len(known_speakers), 'segments': segments},
+            'items': stitched
+        },
+        'status': 'COMPLETED'
+    }
@@ -0,0 +1,124 @@
+"""
+Pluggable synchronous transcription backends for the voice-command fast path
+
+Every backend exposes transcribe(payload, media_encoding, sample_rate,
+language_options, preferred_language) and returns a dict with transcript,
+language_code and backend. VOICE_COMMAND_BACKEND picks one by name.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+VOICE_COMMAND_BACKEND = os.environ.get('VOICE_COMMAND_BACKEND', 'transcribe-streaming')
+
+# 100 ms of 16 kHz 16-bit PCM per audio event
+STREAM_CHUNK_BYTES = int(os.environ.get('VOICE_COMMAND_STREAM_CHUNK_BYTES', '3200'))
+
+
+class TranscribeStreamingBackend:
+    """Amazon Transcribe streaming with automatic language identification"""
+
+    name = 'transcribe-streaming'
+
+    def __init__(self, region=None):
+        # Optional dependency, only needed when this backend is selected
+        from amazon_transcribe.client import TranscribeStreamingClient
+
+        self.client = TranscribeStreamingClient(
+            region=region or os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION')
+        )
+
+    def transcribe(self, payload, media_encoding, sample_rate, language_options, preferred_language):
+        return asyncio.run(self._transcribe(
+            payload, media_encoding, sample_rate, language_options, preferred_language
+        ))
+
+    async def _transcribe(self, payload, media_encoding, sample_rate, language_options, preferred_language):
+        stream = await self.client.start_stream_transcription(
+            media_sample_rate_hz=sample_rate,
+            media_encoding=media_encoding,
+            identify_language=True,
+            language_options=language_options,
+            preferred_language=preferred_language
+        )
+
+        async def send_audio():
+            for start in range(0, len(payload), STREAM_CHUNK_BYTES):
+                await stream.input_stream.send_audio_event(audio_chunk=payload[start:start + STREAM_CHUNK_BYTES])
+            await stream.input_stream.end_stream()
+
+        segments = []
+        language_code = None
+
+        async def read_results():
+            nonlocal language_code
+            async for event in stream.output_stream:
+                results = getattr(getattr(event, 'transcript', None), 'results', None) or []
+                for result in results:
+                    if result.is_partial or not result.alternatives:
+                        continue
+                    segments.append(result.alternatives[0].transcript)
+                    language_code = getattr(result, 'language_code', None) or language_code
+
+        await asyncio.gather(send_audio(), read_results())
+        return {
+            'transcript': ' '.join(segments),
+            'language_code': language_code or preferred_language,
+            'backend': self.name
+        }
+
+
+class LocalBackend:
+    """
+    Stand-in backend for tests and benchmarks: answers from a fixture map
+    keyed by the SHA-256 of the audio payload, after a simulated delay of
+    latency_seconds plus realtime_factor times the audio duration
+    """
+
+    name = 'local'
+
+    def __init__(self, fixtures=None, latency_seconds=None, realtime_factor=None):
+        if fixtures is None:
+            fixtures = load_fixtures(os.environ.get('VOICE_COMMAND_LOCAL_FIXTURES'))
+        self.fixtures = fixtures
+        self.latency_seconds = float(latency_seconds if latency_seconds is not None
+                                     else os.environ.get('VOICE_COMMAND_LOCAL_LATENCY_SECONDS', '0'))
+        self.realtime_factor = float(realtime_factor if realtime_factor is not None
+                                     else os.environ.get('VOICE_COMMAND_LOCAL_REALTIME_FACTOR', '0'))
+
+    def transcribe(self, payload, media_encoding, sample_rate, language_options, preferred_language):
+        audio_seconds = len(payload) / (2 * sample_rate) if media_encoding == 'pcm' else 0
+        time.sleep(self.latency_seconds + self.realtime_factor * audio_seconds)
+        fixture = self.fixtures.get(hashlib.sha256(payload).hexdigest(), {})
+        return {
+            'transcript': fixture.get('transcript', ''),
+            'language_code': fixture.get('language_code', preferred_language),
+            'backend': self.name
+        }
+
+
+def load_fixtures(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+BACKENDS = {
+    TranscribeStreamingBackend.name: TranscribeStreamingBackend,
+    LocalBackend.name: LocalBackend
+}
+
+_backends = {}
+
+
+def get_backend(name=None):
+    """Shared backend instance, created on first use"""
+    name = name or VOICE_COMMAND_BACKEND
+    if name not in _backends:
+        if name not in BACKENDS:
+            raise ValueError(f'Unknown voice command backend: {name}')
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
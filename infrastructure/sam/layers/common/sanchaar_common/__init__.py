@@ -0,0 +1,3 @@
+"""
+Helpers shared by the Sanchaar pipeline functions, shipped as the common layer
+"""
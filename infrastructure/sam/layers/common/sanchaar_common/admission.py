@@ -0,0 +1,317 @@
+"""
+Global admission control for Bedrock agent calls and MediaConvert submissions
+
+Every execution asks for a slot on a resource ("transcreation", "encode")
+before using it. Slots are leases in the admission table, counted on one
+counter item per resource so a grant is a single conditional transaction:
+
+  resource=<name>, slot=counter                       in_flight
+  resource=<name>, slot=lease#<lease_id>              priority, granted_at, expires_at
+  resource=<name>, slot=wait#<rank>#<enqueued>#<id>   task_token, priority, enqueued_at
+
+Requests queue as wait items, which sort by priority class and then
+arrival. dispatch grants queued requests in that order while capacity
+lasts and resumes their executions through the task token. Lower classes
+may only fill part of a resource, which keeps headroom for breaking news.
+Leases not released before expires_at are reclaimed by reap.
+"""
+import json
+import os
+import threading
+import time
+from uuid import uuid4
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+ADMISSION_TABLE = os.environ.get('ADMISSION_TABLE')
+# Concurrent slots per resource across all executions
+ADMISSION_CAPACITY = json.loads(os.environ.get('ADMISSION_CAPACITY', '{"transcreation": 50, "encode": 20}'))
+ADMISSION_LEASE_SECONDS = json.loads(os.environ.get('ADMISSION_LEASE_SECONDS', '{"transcreation": 900, "encode": 7200}'))
+
+# Share of a resource each class may fill, highest priority first
+PRIORITY_CLASSES = {'breaking_news': 1.0, 'standard': 0.8, 'evergreen': 0.5}
+PRIORITY_RANK = {name: rank for rank, name in enumerate(PRIORITY_CLASSES)}
+DEFAULT_PRIORITY = 'standard'
+
+COUNTER_SLOT = 'counter'
+LEASE_PREFIX = 'lease#'
+WAIT_PREFIX = 'wait#'
+# Items outlive their use by a day; leases are reclaimed by reap long before
+TTL_GRACE_SECONDS = 86400
+STALE_TOKEN_ERRORS = {'TaskTimedOut', 'InvalidToken', 'TaskDoesNotExist'}
+
+_clients = {}
+_clients_lock = threading.Lock()
+_deserializer = TypeDeserializer()
+
+
+def get_client(service):
+    with _clients_lock:
+        if service not in _clients:
+            _clients[service] = boto3.client(service)
+        return _clients[service]
+
+
+def normalise_priority(priority):
+    return priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+
+
+def class_limit(resource, priority):
+    """Slots a priority class may hold on a resource, counting every class"""
+    return max(1, int(ADMISSION_CAPACITY[resource] * PRIORITY_CLASSES[normalise_priority(priority)]))
+
+
+def try_acquire(resource, priority, lease_id=None, table=None, now=None):
+    """Take a slot if the class limit allows; returns the lease or None"""
+    table = table or ADMISSION_TABLE
+    now = now or time.time()
+    lease_id = lease_id or uuid4().hex
+    expires_at = int(now + ADMISSION_LEASE_SECONDS.get(resource, 900))
+    try:
+        get_client('dynamodb').transact_write_items(TransactItems=[
+            {'Update': {
+                'TableName': table,
+                'Key': {'resource': {'S': resource}, 'slot': {'S': COUNTER_SLOT}},
+                'UpdateExpression': 'SET in_flight = if_not_exists(in_flight, :zero) + :one',
+                'ConditionExpression': 'attribute_not_exists(in_flight) OR in_flight < :limit',
+                'ExpressionAttributeValues': {
+                    ':zero': {'N': '0'},
+                    ':one': {'N': '1'},
+                    ':limit': {'N': str(class_limit(resource, priority))}
+                }
+            }},
+            {'Put': {
+                'TableName': table,
+                'Item': {
+                    'resource': {'S': resource},
+                    'slot': {'S': f'{LEASE_PREFIX}{lease_id}'},
+                    'priority': {'S': normalise_priority(priority)},
+                    'granted_at': {'N': str(now)},
+                    'expires_at': {'N': str(expires_at)},
+                    'ttl': {'N': str(expires_at + TTL_GRACE_SECONDS)}
+                },
+                'ConditionExpression': 'attribute_not_exists(slot)'
+            }}
+        ])
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+        if len(reasons) > 1 and reasons[1] == 'ConditionalCheckFailed':
+            # A retried request already holds this lease
+            return {'lease_id': lease_id, 'resource': resource, 'priority': normalise_priority(priority)}
+        # A conflict is a concurrent grant or release on the counter; that caller dispatches next
+        if reasons and reasons[0] in ('ConditionalCheckFailed', 'TransactionConflict'):
+            return None
+        raise
+    return {'lease_id': lease_id, 'resource': resource, 'priority': normalise_priority(priority),
+            'expires_at': expires_at}
+
+
+def release(resource, lease_id, table=None):
+    """Return a slot; False when the lease was already released or reclaimed"""
+    table = table or ADMISSION_TABLE
+    try:
+        get_client('dynamodb').transact_write_items(TransactItems=[
+            {'Delete': {
+                'TableName': table,
+                'Key': {'resource': {'S': resource}, 'slot': {'S': f'{LEASE_PREFIX}{lease_id}'}},
+                'ConditionExpression': 'attribute_exists(slot)'
+            }},
+            {'Update': {
+                'TableName': table,
+                'Key': {'resource': {'S': resource}, 'slot': {'S': COUNTER_SLOT}},
+                'UpdateExpression': 'SET in_flight = in_flight - :one',
+                'ConditionExpression': 'in_flight > :zero',
+                'ExpressionAttributeValues': {':one': {'N': '1'}, ':zero': {'N': '0'}}
+            }}
+        ])
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        return False
+
+
+def enqueue(resource, priority, task_token, table=None, now=None):
+    """Queue a request; its execution resumes when dispatch grants it a lease"""
+    table = table or ADMISSION_TABLE
+    now = now or time.time()
+    priority = normalise_priority(priority)
+    request_id = uuid4().hex
+    get_client('dynamodb').put_item(TableName=table, Item={
+        'resource': {'S': resource},
+        'slot': {'S': f'{WAIT_PREFIX}{PRIORITY_RANK[priority]}#{int(now * 1000):015d}#{request_id}'},
+        'priority': {'S': priority},
+        'task_token': {'S': task_token},
+        'enqueued_at': {'N': str(now)},
+        'ttl': {'N': str(int(now) + TTL_GRACE_SECONDS)}
+    })
+    return request_id
+
+
+def query_slots(resource, prefix, table=None, limit=None):
+    request = {
+        'TableName': table or ADMISSION_TABLE,
+        'KeyConditionExpression': '#resource = :resource AND begins_with(slot, :prefix)',
+        'ExpressionAttributeNames': {'#resource': 'resource'},
+        'ExpressionAttributeValues': {':resource': {'S': resource}, ':prefix': {'S': prefix}},
+        'ConsistentRead': True
+    }
+    if limit:
+        request['Limit'] = limit
+    items = []
+    while True:
+        response = get_client('dynamodb').query(**request)
+        items.extend({name: _deserializer.deserialize(value) for name, value in item.items()}
+                     for item in response['Items'])
+        if 'LastEvaluatedKey' not in response or (limit and len(items) >= limit):
+            return items
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def dispatch(resource, table=None, batch_size=25):
+    """
+    Grant queued requests in priority and arrival order until one does not
+    fit. Classes have non-increasing shares, so nothing queued behind a
+    denied request could be admitted either. A denied request is put back
+    and the queue and counter read again: a release that raced the denial
+    may have found the queue empty, and it is then this call's slot to hand
+    out. Returns the grants made.
+    """
+    table = table or ADMISSION_TABLE
+    grants = []
+    while True:
+        waiting = query_slots(resource, WAIT_PREFIX, table, limit=batch_size)
+        if not waiting:
+            return grants
+        # A saturated resource is the common case under load; one read of the
+        # counter spares the claim, failed grant and put-back writes
+        if in_flight(resource, table) >= class_limit(resource, waiting[0]['priority']):
+            return grants
+        for waiter in waiting:
+            if not claim(resource, waiter['slot'], table):
+                # Granted by a concurrent dispatcher
+                continue
+            now = time.time()
+            lease = None
+            try:
+                lease = try_acquire(resource, waiter['priority'], table=table, now=now)
+                if lease is None:
+                    put_back(resource, waiter, table)
+                    break
+                lease['queue_wait_ms'] = round((now - float(waiter['enqueued_at'])) * 1000, 1)
+                resumed = resume(waiter['task_token'], lease)
+            except Exception:
+                # Keep the request queued rather than leave its execution waiting for a timeout
+                if lease is not None:
+                    release(resource, lease['lease_id'], table)
+                put_back(resource, waiter, table)
+                raise
+            if not resumed:
+                # The execution stopped waiting; give the slot to the next request
+                release(resource, lease['lease_id'], table)
+                continue
+            grants.append(lease)
+            log_grant(resource, lease)
+
+
+def claim(resource, slot, table):
+    try:
+        get_client('dynamodb').delete_item(
+            TableName=table,
+            Key={'resource': {'S': resource}, 'slot': {'S': slot}},
+            ConditionExpression='attribute_exists(slot)'
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+
+def put_back(resource, waiter, table):
+    """Re-queue a claimed request under its original key, keeping its place"""
+    get_client('dynamodb').put_item(TableName=table, Item={
+        'resource': {'S': resource},
+        'slot': {'S': waiter['slot']},
+        'priority': {'S': waiter['priority']},
+        'task_token': {'S': waiter['task_token']},
+        'enqueued_at': {'N': str(waiter['enqueued_at'])},
+        'ttl': {'N': str(waiter['ttl'])}
+    })
+
+
+def resume(task_token, lease):
+    try:
+        get_client('stepfunctions').send_task_success(taskToken=task_token, output=json.dumps(lease))
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] not in STALE_TOKEN_ERRORS:
+            raise
+        return False
+
+
+def reap(resource, table=None, now=None):
+    """Reclaim leases whose holders never released them; returns how many"""
+    now = now or time.time()
+    expired = [lease for lease in query_slots(resource, LEASE_PREFIX, table) if float(lease['expires_at']) < now]
+    reclaimed = sum(1 for lease in expired if release(resource, lease['slot'][len(LEASE_PREFIX):], table))
+    if reclaimed:
+        print(json.dumps({'metric': 'admission_reclaimed', 'resource': resource, 'leases': reclaimed}))
+    return reclaimed
+
+
+def in_flight(resource, table=None):
+    response = get_client('dynamodb').get_item(
+        TableName=table or ADMISSION_TABLE,
+        Key={'resource': {'S': resource}, 'slot': {'S': COUNTER_SLOT}},
+        ConsistentRead=True
+    )
+    return int(response.get('Item', {}).get('in_flight', {}).get('N', '0'))
+
+
+def stats(resource, table=None, now=None):
+    """In-flight, utilisation and queue depth/age per class for a resource"""
+    now = now or time.time()
+    current = in_flight(resource, table)
+    queued = {}
+    oldest = {}
+    for waiter in query_slots(resource, WAIT_PREFIX, table):
+        queued[waiter['priority']] = queued.get(waiter['priority'], 0) + 1
+        age = round((now - float(waiter['enqueued_at'])) * 1000, 1)
+        oldest[waiter['priority']] = max(oldest.get(waiter['priority'], 0), age)
+    return {
+        'resource': resource,
+        'capacity': ADMISSION_CAPACITY[resource],
+        'in_flight': current,
+        'utilisation': round(current / ADMISSION_CAPACITY[resource], 3),
+        'queued': queued,
+        'oldest_wait_ms': oldest
+    }
+
+
+def log_grant(resource, lease):
+    print(json.dumps({
+        'metric': 'admission_grant',
+        'resource': resource,
+        'priority': lease['priority'],
+        'queue_wait_ms': lease.get('queue_wait_ms', 0),
+        'lease_id': lease['lease_id']
+    }))
+
+
+def release_and_dispatch(lease, table=None):
+    """Release a lease handed out by dispatch and pass the slot on"""
+    if not lease:
+        return
+    released = release(lease['resource'], lease['lease_id'], table)
+    print(json.dumps({
+        'metric': 'admission_release',
+        'resource': lease['resource'],
+        'priority': lease.get('priority'),
+        'released': released
+    }))
+    dispatch(lease['resource'], table)
@@ -0,0 +1,157 @@
+"""
+Claim-check offloading for values passed between Step Functions states
+
+A value whose JSON form exceeds CLAIM_CHECK_THRESHOLD_BYTES is written to
+S3 gzip-compressed under a content-addressed key and replaced by a small
+reference; consumers resolve references only for the fields they read.
+
+Reference shape:
+  {"claim_check": {"uri": "s3://bucket/claim-check/<ns>/<sha256>.json.gz",
+                   "sha256": "...", "bytes": <uncompressed size>}}
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+
+CLAIM_CHECK_BUCKET = os.environ.get('CLAIM_CHECK_BUCKET') or os.environ.get('OUTPUT_BUCKET')
+CLAIM_CHECK_PREFIX = os.environ.get('CLAIM_CHECK_PREFIX', 'claim-check/')
+# Well under the 256 KB state limit so a state can carry several references and inline values
+CLAIM_CHECK_THRESHOLD_BYTES = int(os.environ.get('CLAIM_CHECK_THRESHOLD_BYTES', str(32 * 1024)))
+# Resolved payloads a warm container keeps, by uncompressed JSON size
+CLAIM_CHECK_CACHE_BYTES = int(os.environ.get('CLAIM_CHECK_CACHE_BYTES', str(16 * 1024 * 1024)))
+
+REFERENCE_KEY = 'claim_check'
+
+
+class ResolvedCache:
+    """
+    Least recently used payloads by sha256, bounded by their total size.
+    Content-addressed, so entries never go stale; they are only evicted.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            if digest not in self._entries:
+                return None
+            self._entries.move_to_end(digest)
+            return self._entries[digest][0]
+
+    def put(self, digest, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return
+            self._entries[digest] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+_s3 = None
+_s3_lock = threading.Lock()
+_resolved = ResolvedCache(CLAIM_CHECK_CACHE_BYTES)
+
+
+def get_s3():
+    global _s3
+    with _s3_lock:
+        if _s3 is None:
+            _s3 = boto3.client('s3')
+        return _s3
+
+
+def is_reference(value):
+    return isinstance(value, dict) and set(value) == {REFERENCE_KEY} and 'uri' in value[REFERENCE_KEY]
+
+
+def encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def offload(value, namespace='shared', threshold=None, bucket=None):
+    """Return value itself when small, otherwise a reference to its S3 copy"""
+    data = encode(value)
+    threshold = CLAIM_CHECK_THRESHOLD_BYTES if threshold is None else threshold
+    if len(data) <= threshold or is_reference(value):
+        return value
+
+    bucket = bucket or CLAIM_CHECK_BUCKET
+    if not bucket:
+        raise ValueError('CLAIM_CHECK_BUCKET or OUTPUT_BUCKET must be set to offload payloads')
+    digest = hashlib.sha256(data).hexdigest()
+    key = f'{CLAIM_CHECK_PREFIX}{namespace}/{digest}.json.gz'
+    if not exists(bucket, key):
+        get_s3().put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=gzip.compress(data, compresslevel=6),
+            ContentType='application/json',
+            ContentEncoding='gzip'
+        )
+    _resolved.put(digest, value, len(data))
+    print(json.dumps({'claim_check': 'offloaded', 'key': key, 'bytes': len(data)}))
+    return {REFERENCE_KEY: {'uri': f's3://{bucket}/{key}', 'sha256': digest, 'bytes': len(data)}}
+
+
+def exists(bucket, key):
+    """Identical payloads share a key, so an existing object is already the right one"""
+    try:
+        get_s3().head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def resolve(value):
+    """Fetch the value behind a reference; anything else is returned unchanged"""
+    if not is_reference(value):
+        return value
+    reference = value[REFERENCE_KEY]
+    digest = reference.get('sha256')
+    cached = _resolved.get(digest) if digest else None
+    if cached is not None:
+        return cached
+    bucket, _, key = reference['uri'][len('s3://'):].partition('/')
+    body = get_s3().get_object(Bucket=bucket, Key=key)['Body'].read()
+    data = gzip.decompress(body)
+    resolved = json.loads(data)
+    if digest:
+        _resolved.put(digest, resolved, len(data))
+    return resolved
+
+
+def resolve_all(values, max_workers=8):
+    """Resolve a list of possibly-referenced values, fetching references concurrently"""
+    values = resolve(values)
+    if not isinstance(values, list) or not any(is_reference(v) for v in values):
+        return values
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(values)))) as executor:
+        return list(executor.map(resolve, values))
+
+
+def parse_body(body):
+    """Decode a Lambda response body, resolving it when it was offloaded"""
+    return resolve(json.loads(body) if isinstance(body, str) else body)
@@ -0,0 +1,257 @@
+"""
+Compressed, chunked content records in the SanchaarContent table
+
+A record is a head item at (content_id, version) holding the plain
+attributes (status, user_id, created_at, ... so the GSIs keep working) and
+the bulky payload attributes compressed into binary. Payloads that do not
+fit in the head are split across chunk items stored under fractional sort
+keys version + n/1000, so one Query over [version, version + 1) returns the
+whole record. Payloads above CONTENT_OVERFLOW_BYTES go to S3 instead.
+
+Encoded payloads start with a one-byte codec tag: b'z' zstd, b'g' gzip,
+b'j' uncompressed JSON.
+"""
+import gzip
+import json
+import os
+import time
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available; zstd only where the layer ships it
+    zstandard = None
+
+CONTENT_TABLE = os.environ.get('CONTENT_TABLE')
+CONTENT_OVERFLOW_BUCKET = os.environ.get('CONTENT_OVERFLOW_BUCKET') or os.environ.get('OUTPUT_BUCKET')
+CONTENT_OVERFLOW_PREFIX = 'content-records/'
+
+# Payloads smaller than this are stored as JSON; compressing them saves nothing
+COMPRESS_MIN_BYTES = int(os.environ.get('CONTENT_COMPRESS_MIN_BYTES', '1024'))
+# Head budget for encoded payloads, leaving room below the 400 KB item limit for plain attributes
+HEAD_PAYLOAD_BYTES = int(os.environ.get('CONTENT_HEAD_PAYLOAD_BYTES', str(300 * 1024)))
+CHUNK_BYTES = int(os.environ.get('CONTENT_CHUNK_BYTES', str(380 * 1024)))
+# Encoded payloads larger than this go to S3 rather than chunk items
+CONTENT_OVERFLOW_BYTES = int(os.environ.get('CONTENT_OVERFLOW_BYTES', str(2 * 1024 * 1024)))
+
+MAX_CHUNKS = 999
+CHUNK_STEP = Decimal('0.001')
+CODEC_ZSTD = b'z'
+CODEC_GZIP = b'g'
+CODEC_JSON = b'j'
+
+# BatchWriteItem accepts at most 25 requests per call
+BATCH_WRITE_SIZE = 25
+BATCH_MAX_ROUNDS = 5
+# TransactWriteItems takes at most 100 items and 4 MB; keep headroom for keys and plain attributes
+TRANSACT_MAX_ITEMS = 100
+TRANSACT_PAYLOAD_BYTES = int(3.5 * 1024 * 1024)
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def encode_payload(value, codec=None):
+    data = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(data) < COMPRESS_MIN_BYTES:
+        return CODEC_JSON + data
+    codec = codec or (CODEC_ZSTD if zstandard else CODEC_GZIP)
+    if codec == CODEC_ZSTD:
+        return CODEC_ZSTD + zstandard.ZstdCompressor(level=9).compress(data)
+    return CODEC_GZIP + gzip.compress(data, compresslevel=6)
+
+
+def decode_payload(blob):
+    codec, data = blob[:1], blob[1:]
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read this content record')
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == CODEC_GZIP:
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def to_decimal(version):
+    return version if isinstance(version, Decimal) else Decimal(str(version))
+
+
+class ContentStore:
+    """Read and write content records with compressed, chunked payloads"""
+
+    def __init__(self, table_name, client=None, s3=None, bucket=CONTENT_OVERFLOW_BUCKET, codec=None):
+        self.table_name = table_name
+        self.client = client or boto3.client('dynamodb')
+        self.s3 = s3 or boto3.client('s3')
+        self.bucket = bucket
+        self.codec = codec
+
+    def put_record(self, content_id, version, attributes, payloads):
+        """
+        Write a record: attributes as plain DynamoDB attributes, payloads
+        (name -> JSON value) encoded into the head, chunks or S3. The head is
+        written last, in one transaction with the chunks when they fit, so a
+        reader never sees a head whose chunks are missing; if the head write
+        fails the chunks and S3 objects written for it are removed again.
+        Returns a summary of where each payload went.
+        """
+        version = to_decimal(version)
+        head = {name: _serializer.serialize(value) for name, value in attributes.items()}
+        head['content_id'] = {'S': content_id}
+        head['version'] = {'N': str(version)}
+
+        encoded = sorted(((name, encode_payload(value, self.codec)) for name, value in payloads.items()),
+                         key=lambda pair: len(pair[1]))
+        layout = {}
+        chunk_items = []
+        overflow = []
+        inline_bytes = 0
+        for name, blob in encoded:
+            if inline_bytes + len(blob) <= HEAD_PAYLOAD_BYTES:
+                head[f'payload_{name}'] = {'B': blob}
+                inline_bytes += len(blob)
+                layout[name] = {'inline': len(blob)}
+            elif len(blob) > CONTENT_OVERFLOW_BYTES or len(chunk_items) + len(blob) // CHUNK_BYTES >= MAX_CHUNKS:
+                key = f'{CONTENT_OVERFLOW_PREFIX}{content_id}/{version}/{name}.bin'
+                overflow.append((key, blob))
+                layout[name] = {'s3': f's3://{self.bucket}/{key}', 'bytes': len(blob)}
+            else:
+                first = len(chunk_items) + 1
+                for start in range(0, len(blob), CHUNK_BYTES):
+                    chunk_items.append({
+                        'content_id': {'S': content_id},
+                        'version': {'N': str(version + CHUNK_STEP * (len(chunk_items) + 1))},
+                        'payload': {'S': name},
+                        'data': {'B': blob[start:start + CHUNK_BYTES]}
+                    })
+                layout[name] = {'chunks': [first, len(chunk_items)], 'bytes': len(blob)}
+        head['payload_layout'] = {'S': json.dumps(layout)}
+
+        written = []
+        try:
+            for key, blob in overflow:
+                self.s3.put_object(Bucket=self.bucket, Key=key, Body=blob)
+                written.append(key)
+            chunk_bytes = sum(len(item['data']['B']) for item in chunk_items)
+            if chunk_items and len(chunk_items) < TRANSACT_MAX_ITEMS and inline_bytes + chunk_bytes <= TRANSACT_PAYLOAD_BYTES:
+                self.client.transact_write_items(TransactItems=[
+                    {'Put': {'TableName': self.table_name, 'Item': item}} for item in chunk_items + [head]
+                ])
+            else:
+                self.batch_write([{'PutRequest': {'Item': item}} for item in chunk_items])
+                self.client.put_item(TableName=self.table_name, Item=head)
+        except Exception:
+            self.discard(content_id, version, len(chunk_items), written)
+            raise
+        self.delete_stale_chunks(content_id, version, len(chunk_items))
+        return {'items': 1 + len(chunk_items), 'layout': layout}
+
+    def get_record(self, content_id, version, consistent=False):
+        """Reassemble a record from one Query over its head and chunks, or None"""
+        version = to_decimal(version)
+        items = self.query_record(content_id, version, consistent)
+        if not items or to_decimal(items[0]['version']['N']) != version:
+            return None
+        head, chunks = items[0], items[1:]
+
+        record = {name: _deserializer.deserialize(value) for name, value in head.items()
+                  if not name.startswith('payload_')}
+        layout = json.loads(head.get('payload_layout', {}).get('S', '{}'))
+        for name, placement in layout.items():
+            if 'inline' in placement:
+                blob = head[f'payload_{name}']['B']
+            elif 'chunks' in placement:
+                first, last = placement['chunks']
+                blob = b''.join(chunk['data']['B'] for chunk in chunks[first - 1:last])
+            else:
+                bucket, _, key = placement['s3'][len('s3://'):].partition('/')
+                blob = self.s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+            record[name] = decode_payload(blob)
+        return record
+
+    def latest_version(self, content_id):
+        """Highest record version for a content id (chunks round down to their head)"""
+        response = self.client.query(
+            TableName=self.table_name,
+            KeyConditionExpression='content_id = :id',
+            ExpressionAttributeValues={':id': {'S': content_id}},
+            ProjectionExpression='version',
+            ScanIndexForward=False,
+            Limit=1
+        )
+        if not response['Items']:
+            return None
+        return int(to_decimal(response['Items'][0]['version']['N']))
+
+    def query_record(self, content_id, version, consistent=False):
+        items = []
+        request = {
+            'TableName': self.table_name,
+            'KeyConditionExpression': 'content_id = :id AND version BETWEEN :head AND :last',
+            'ExpressionAttributeValues': {
+                ':id': {'S': content_id},
+                ':head': {'N': str(version)},
+                ':last': {'N': str(version + CHUNK_STEP * MAX_CHUNKS)}
+            },
+            'ConsistentRead': consistent
+        }
+        # One Query; pagination only continues it past the 1 MB page size
+        while True:
+            response = self.client.query(**request)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                return items
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def delete_stale_chunks(self, content_id, version, keep):
+        """Remove chunks left by an earlier, larger write of the same record"""
+        response = self.client.query(
+            TableName=self.table_name,
+            KeyConditionExpression='content_id = :id AND version BETWEEN :first AND :last',
+            ExpressionAttributeValues={
+                ':id': {'S': content_id},
+                ':first': {'N': str(version + CHUNK_STEP * (keep + 1))},
+                ':last': {'N': str(version + CHUNK_STEP * MAX_CHUNKS)}
+            },
+            ProjectionExpression='content_id, version'
+        )
+        self.batch_write([{'DeleteRequest': {'Key': item}} for item in response['Items']])
+
+    def discard(self, content_id, version, chunks, keys):
+        """Best-effort removal of the chunks and S3 objects of a write whose head failed"""
+        try:
+            self.batch_write([{'DeleteRequest': {'Key': {
+                'content_id': {'S': content_id},
+                'version': {'N': str(version + CHUNK_STEP * number)}
+            }}} for number in range(1, chunks + 1)])
+            for key in keys:
+                self.s3.delete_object(Bucket=self.bucket, Key=key)
+        except Exception as exc:
+            print(json.dumps({'metric': 'content_record_discard_failed', 'content_id': content_id,
+                              'version': str(version), 'error': str(exc)}))
+
+    def batch_write(self, requests):
+        for start in range(0, len(requests), BATCH_WRITE_SIZE):
+            pending = {self.table_name: requests[start:start + BATCH_WRITE_SIZE]}
+            for attempt in range(BATCH_MAX_ROUNDS):
+                response = self.client.batch_write_item(RequestItems=pending)
+                pending = response.get('UnprocessedItems') or {}
+                if not pending:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+            if pending:
+                raise RuntimeError(f'{len(pending[self.table_name])} content items unprocessed after {BATCH_MAX_ROUNDS} rounds')
+
+
+_store = None
+
+
+def get_store():
+    """Store for the CONTENT_TABLE of this function"""
+    global _store
+    if _store is None:
+        _store = ContentStore(CONTENT_TABLE)
+    return _store
@@ -0,0 +1,28 @@
+"""
+Delivery outcome of platform distributor result rows
+
+platform_distributor decides delivered/failed per row when it records the
+ledger, content_recorder when it stores the per-platform delivery counts the
+status aggregator rolls up; both use is_delivered so the counts agree.
+"""
+
+
+def is_delivered(row):
+    """True when a result row carries a 2xx platform response and no error"""
+    status = row.get('status')
+    return isinstance(status, int) and 200 <= status < 300 and not row.get('error')
+
+
+def delivery_counts(distribution_results):
+    """Variants per "<platform>#<language>#<delivered|failed>" across distributor results"""
+    counts = {}
+    for result in distribution_results:
+        if not isinstance(result, dict) or not isinstance(result.get('result'), list):
+            continue
+        for row in result['result']:
+            if not isinstance(row, dict):
+                continue
+            outcome = 'delivered' if is_delivered(row) else 'failed'
+            key = f"{result.get('platform', 'unknown')}#{row.get('language', 'unknown')}#{outcome}"
+            counts[key] = counts.get(key, 0) + 1
+    return counts
@@ -0,0 +1,294 @@
+"""
+Hot-path latency instrumentation: CloudWatch Embedded Metric Format and X-Ray
+
+instrument_boto3 times every AWS API call of clients created afterwards, as
+the caller sees it (retries included; streaming bodies up to the headers).
+timed wraps anything else, such as platform HTTP requests. Measurements are
+buffered in memory and the handler decorator writes them once per
+invocation as EMF log lines, one per dimension combination carrying all of
+its values, so the hot path costs two clock reads and a list append:
+
+  Namespace  METRICS_NAMESPACE (Sanchaar/Pipeline)
+  Metrics    Latency (Milliseconds, one value per call), Errors (Count)
+  Dimensions [function, operation] and, when known,
+             [function, operation, platform, language]
+
+The handler's own duration is operation handler.<name>. The first
+invocation of an execution environment also writes ColdStart and
+InitDuration, the time from this module's import to that invocation.
+When the X-Ray SDK is installed and the invocation is sampled, every timed
+operation is also a subsegment annotated with the same dimensions.
+"""
+import time
+
+_IMPORTED_AT = time.perf_counter()
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import traceback
+
+import boto3
+
+try:
+    from aws_xray_sdk.core import xray_recorder
+except ImportError:  # Metrics work without the SDK; only subsegments need it
+    xray_recorder = None
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Sanchaar/Pipeline')
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+BASE_DIMENSIONS = ['function', 'operation']
+EXTRA_DIMENSIONS = ('platform', 'language')
+# EMF accepts at most 100 values per metric in one document
+MAX_VALUES_PER_METRIC = 100
+
+_records = []
+_records_lock = threading.Lock()
+_dimensions = contextvars.ContextVar('sanchaar_dimensions', default={})
+_cold_start = True
+
+
+class Timer:
+    """Times one operation; set error inside the block to count a failed call"""
+
+    __slots__ = ('operation', 'platform', 'language', 'error', 'started', 'subsegment')
+
+    def __init__(self, operation, platform=None, language=None):
+        self.operation = operation
+        self.platform = platform
+        self.language = language
+        self.error = False
+
+    def __enter__(self):
+        self.subsegment = begin_subsegment(self.operation, self.platform, self.language)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        record(self.operation, duration_ms, self.error or exc is not None, self.platform, self.language)
+        end_subsegment(self.subsegment, exc)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Timer(self.operation, self.platform, self.language):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def timed(operation, platform=None, language=None):
+    """Context manager and decorator timing a block as one operation"""
+    return Timer(operation, platform, language)
+
+
+class dimensions:
+    """
+    Default platform/language for operations timed in this context, such as
+    the AWS calls made while delivering one variant. Context variables do not
+    follow work into thread pools; set them again inside the worker.
+    """
+
+    def __init__(self, **values):
+        self.values = {name: value for name, value in values.items() if name in EXTRA_DIMENSIONS and value}
+
+    def __enter__(self):
+        self.token = _dimensions.set({**_dimensions.get(), **self.values})
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _dimensions.reset(self.token)
+        return False
+
+
+def record(operation, duration_ms, error=False, platform=None, language=None):
+    if not (platform and language):
+        defaults = _dimensions.get()
+        platform = platform or defaults.get('platform')
+        language = language or defaults.get('language')
+    with _records_lock:
+        _records.append((operation, platform, language, duration_ms, error))
+
+
+def begin_subsegment(name, platform=None, language=None):
+    # Unsampled invocations skip the SDK altogether
+    if xray_recorder is None or 'Sampled=1' not in os.environ.get('_X_AMZN_TRACE_ID', ''):
+        return None
+    try:
+        subsegment = xray_recorder.begin_subsegment(name, 'remote')
+    except Exception:
+        return None
+    if subsegment is not None:
+        if platform:
+            subsegment.put_annotation('platform', platform)
+        if language:
+            subsegment.put_annotation('language', language)
+    return subsegment
+
+
+def end_subsegment(subsegment, exc=None):
+    if subsegment is None:
+        return
+    try:
+        if exc is not None:
+            subsegment.add_exception(exc, traceback.extract_tb(exc.__traceback__))
+        xray_recorder.end_subsegment()
+    except Exception:
+        pass
+
+
+def _before_call(model, context, **kwargs):
+    timer = Timer(f'{model.service_model.service_name}.{model.name}')
+    context['sanchaar_timer'] = timer.__enter__()
+
+
+def _after_call(context, **kwargs):
+    timer = context.pop('sanchaar_timer', None)
+    if timer is not None:
+        timer.__exit__(None, None, None)
+
+
+def _after_call_error(context, exception, **kwargs):
+    timer = context.pop('sanchaar_timer', None)
+    if timer is not None:
+        timer.__exit__(type(exception), exception, exception.__traceback__)
+
+
+def instrument_boto3(session=None):
+    """
+    Time every API call of clients created from session (the default boto3
+    session) from now on; clients created earlier are not affected
+    """
+    if session is None:
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        session = boto3.DEFAULT_SESSION
+    # Started once parameters have validated, so every timer started is ended by after-call or after-call-error
+    session.events.register('before-call', _before_call, unique_id='sanchaar-before-call')
+    session.events.register('after-call', _after_call, unique_id='sanchaar-after-call')
+    session.events.register('after-call-error', _after_call_error, unique_id='sanchaar-after-call-error')
+    return session
+
+
+def take_cold_start():
+    """(cold_start, init_duration_ms) for this invocation; only the first is cold"""
+    global _cold_start
+    if not _cold_start:
+        return False, None
+    _cold_start = False
+    # Provisioned environments initialise ahead of any request
+    if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'provisioned-concurrency':
+        return False, None
+    return True, round((time.perf_counter() - _IMPORTED_AT) * 1000, 2)
+
+
+def emf_document(function, operation, platform, language, latencies, errors, properties):
+    names = [name for name, value in zip(EXTRA_DIMENSIONS, (platform, language)) if value]
+    document = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [BASE_DIMENSIONS] + ([BASE_DIMENSIONS + names] if names else []),
+                'Metrics': [
+                    {'Name': 'Latency', 'Unit': 'Milliseconds'},
+                    {'Name': 'Errors', 'Unit': 'Count'}
+                ]
+            }]
+        },
+        'function': function,
+        'operation': operation,
+        'Latency': latencies,
+        'Errors': errors
+    }
+    if platform:
+        document['platform'] = platform
+    if language:
+        document['language'] = language
+    document.update(properties)
+    return document
+
+
+def cold_start_document(function, init_duration_ms, properties):
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['function']],
+                'Metrics': [
+                    {'Name': 'ColdStart', 'Unit': 'Count'},
+                    {'Name': 'InitDuration', 'Unit': 'Milliseconds'}
+                ]
+            }]
+        },
+        'event': 'cold_start',
+        'function': function,
+        'ColdStart': 1,
+        'InitDuration': init_duration_ms,
+        'init_duration_ms': init_duration_ms,
+        **properties
+    }
+
+
+def flush(function, request_id=None, init_duration_ms=None):
+    """Write the buffered measurements as EMF log lines; returns how many"""
+    with _records_lock:
+        records = _records[:]
+        del _records[:]
+    if not METRICS_ENABLED:
+        return 0
+
+    properties = {}
+    if request_id:
+        properties['request_id'] = request_id
+    trace_id = os.environ.get('_X_AMZN_TRACE_ID')
+    if trace_id:
+        properties['trace_id'] = trace_id.split(';')[0].replace('Root=', '')
+
+    groups = {}
+    for operation, platform, language, duration_ms, error in records:
+        group = groups.setdefault((operation, platform, language), [[], 0])
+        group[0].append(round(duration_ms, 2))
+        group[1] += error
+
+    documents = []
+    if init_duration_ms is not None:
+        documents.append(cold_start_document(function, init_duration_ms, properties))
+    for (operation, platform, language), (latencies, errors) in groups.items():
+        for start in range(0, len(latencies), MAX_VALUES_PER_METRIC):
+            documents.append(emf_document(function, operation, platform, language,
+                                          latencies[start:start + MAX_VALUES_PER_METRIC],
+                                          errors if start == 0 else 0, properties))
+    if documents:
+        # One write; every line is its own log event and EMF document
+        print('\n'.join(json.dumps(document, separators=(',', ':')) for document in documents))
+    return len(documents)
+
+
+def instrumented(function):
+    """
+    Handler decorator: times the invocation (responses with a 5xx statusCode
+    count as errors), marks the cold start and flushes the invocation's
+    measurements, also when the handler raises
+    """
+    def decorate(handler):
+        operation = f'handler.{handler.__name__}'
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            _, init_duration_ms = take_cold_start()
+            try:
+                with Timer(operation) as timer:
+                    response = handler(event, context)
+                    status = response.get('statusCode') if isinstance(response, dict) else None
+                    timer.error = isinstance(status, int) and status >= 500
+                    return response
+            finally:
+                flush(function, getattr(context, 'aws_request_id', None), init_duration_ms)
+        return wrapper
+    return decorate
@@ -0,0 +1,278 @@
+"""
+Rolled-up pipeline status counters maintained from the SanchaarContent stream
+
+The status aggregator folds each batch of content table stream records into
+a few small items of the status aggregate table, so the dashboard reads
+those instead of scanning or querying the content table:
+
+  aggregate_id=totals            status#<status>, delivery#<platform>#<outcome>,
+                                language#<language>#<outcome>, revision, last_delta
+  aggregate_id=latency#<window>  le_<seconds> histogram buckets, expires_at
+  aggregate_id=record#<eventID>  marker of an applied stream record, expires_at
+  aggregate_id=batch#<id>        marker of an applied one-off delta (the seed), expires_at
+
+A record change contributes its new image minus its old image, so a record
+moving from processing to completed moves one status count, and a re-recorded
+run replaces its delivery counts instead of adding to them. Chunk items carry
+no status and contribute nothing.
+
+Latency is upload to terminal status, bucketed into the LATENCY_WINDOW_SECONDS
+window the change landed in; readers sum the last LATENCY_WINDOWS windows for
+the rolling histogram and TTL removes older ones.
+
+Every record that changes a count is applied in a transaction together with
+its own marker, up to TRANSACT_RECORDS records per transaction, so a batch
+Lambda retries after applying some or all of it, whether whole, bisected or
+resized, skips exactly the records applied before. Each transaction bumps
+revision and stores its delta beside it, which lets a reader one revision
+behind catch up from the delta alone.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+STATUS_AGGREGATE_TABLE = os.environ.get('STATUS_AGGREGATE_TABLE')
+TOTALS_KEY = 'totals'
+LATENCY_PREFIX = 'latency#'
+BATCH_PREFIX = 'batch#'
+RECORD_PREFIX = 'record#'
+
+TERMINAL_STATUSES = ('completed', 'failed', 'requires_human_review')
+# Upper bounds in seconds of the upload-to-terminal histogram buckets; slower runs land in le_inf
+LATENCY_BUCKETS = [30, 60, 120, 300, 600, 1200, 1800, 3600]
+LATENCY_WINDOW_SECONDS = int(os.environ.get('LATENCY_WINDOW_SECONDS', '300'))
+LATENCY_WINDOWS = int(os.environ.get('LATENCY_WINDOWS', '12'))
+# Lambda retries a stream batch for as long as the stream keeps it (24 hours)
+MARKER_TTL_SECONDS = 25 * 3600
+TRANSACT_ATTEMPTS = 5
+# A transaction holds at most 100 items: a marker per record, the totals and a latency window per record
+TRANSACT_RECORDS = 49
+
+_clients = {}
+_clients_lock = threading.Lock()
+_deserializer = TypeDeserializer()
+
+
+def get_client(service):
+    with _clients_lock:
+        if service not in _clients:
+            _clients[service] = boto3.client(service)
+        return _clients[service]
+
+
+def bucket_label(seconds):
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            return f'le_{bound}'
+    return 'le_inf'
+
+
+BUCKET_LABELS = [bucket_label(bound) for bound in LATENCY_BUCKETS] + ['le_inf']
+
+
+def image_attributes(image):
+    """Plain attributes of a stream image; encoded payloads are skipped"""
+    if not image:
+        return None
+    return {name: _deserializer.deserialize(value) for name, value in image.items()
+            if not name.startswith('payload_')}
+
+
+def contribution(item):
+    """Counters one content item adds to the totals (nothing for chunks)"""
+    counts = Counter()
+    if not item or 'status' not in item:
+        return counts
+    counts[f"status#{item['status']}"] += 1
+    for key, count in (item.get('delivery_counts') or {}).items():
+        platform, language, outcome = key.split('#')
+        counts[f'delivery#{platform}#{outcome}'] += int(count)
+        counts[f'language#{language}#{outcome}'] += int(count)
+    return counts
+
+
+def latency_observation(old, new, event_time):
+    """(window, bucket) when a change brings a record to a terminal status, else None"""
+    if not new or new.get('status') not in TERMINAL_STATUSES:
+        return None
+    if old and old.get('status') in TERMINAL_STATUSES:
+        return None
+    # A record's version is its upload time in epoch seconds
+    seconds = max(0.0, float(event_time) - float(new['version']))
+    return int(event_time // LATENCY_WINDOW_SECONDS), bucket_label(seconds)
+
+
+def batch_delta(records):
+    """Counter deltas and {window: bucket counts} of a batch of stream records"""
+    counters = Counter()
+    latency = {}
+    for record in records:
+        change = record.get('dynamodb') or {}
+        old = image_attributes(change.get('OldImage'))
+        new = image_attributes(change.get('NewImage'))
+        for name, count in contribution(new).items():
+            counters[name] += count
+        for name, count in contribution(old).items():
+            counters[name] -= count
+        observation = latency_observation(old, new, change.get('ApproximateCreationDateTime') or time.time())
+        if observation:
+            window, bucket = observation
+            latency.setdefault(window, Counter())[bucket] += 1
+    return {name: count for name, count in counters.items() if count}, latency
+
+
+def add_update(key, counts, table, extra_set=None, names=None, values=None):
+    """Update transaction item that ADDs each count to a top-level attribute"""
+    names = dict(names or {})
+    values = dict(values or {})
+    adds = []
+    for index, (name, count) in enumerate(sorted(counts.items())):
+        names[f'#c{index}'] = name
+        values[f':c{index}'] = {'N': str(count)}
+        adds.append(f'#c{index} :c{index}')
+    expression = 'ADD ' + ', '.join(adds)
+    if extra_set:
+        expression += ' SET ' + ', '.join(extra_set)
+    return {'Update': {
+        'TableName': table,
+        'Key': {'aggregate_id': {'S': key}},
+        'UpdateExpression': expression,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }}
+
+
+def transaction_items(markers, counters, latency, table, now):
+    """Marker puts that fail once applied, then the totals and latency window updates"""
+    items = [
+        {'Put': {
+            'TableName': table,
+            'Item': {'aggregate_id': {'S': marker},
+                     'expires_at': {'N': str(int(now + MARKER_TTL_SECONDS))}},
+            'ConditionExpression': 'attribute_not_exists(aggregate_id)'
+        }}
+        for marker in markers
+    ]
+    items.append(
+        add_update(TOTALS_KEY, {**counters, 'revision': 1}, table,
+                   extra_set=['#last_delta = :last_delta', '#updated_at = :updated_at'],
+                   names={'#last_delta': 'last_delta', '#updated_at': 'updated_at'},
+                   values={':last_delta': {'S': json.dumps(counters, separators=(',', ':'))},
+                           ':updated_at': {'N': str(int(now))}})
+    )
+    for window, buckets in sorted(latency.items()):
+        window_start = window * LATENCY_WINDOW_SECONDS
+        items.append(add_update(
+            f'{LATENCY_PREFIX}{window}', buckets, table,
+            extra_set=['#window_start = :window_start', '#expires_at = :expires_at'],
+            names={'#window_start': 'window_start', '#expires_at': 'expires_at'},
+            values={':window_start': {'N': str(window_start)},
+                    ':expires_at': {'N': str(window_start + LATENCY_WINDOW_SECONDS * (LATENCY_WINDOWS + 1))}}
+        ))
+    return items
+
+
+def transact(items):
+    """
+    Write a transaction, retrying conflicts. Returns the indexes of items
+    whose condition failed, empty when it was written.
+    """
+    for attempt in range(TRANSACT_ATTEMPTS):
+        try:
+            get_client('dynamodb').transact_write_items(TransactItems=items)
+            return set()
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            failed = {index for index, reason in enumerate(reasons) if reason == 'ConditionalCheckFailed'}
+            if failed:
+                return failed
+            # Batches of other stream shards update the same totals item concurrently
+            if 'TransactionConflict' not in reasons or attempt == TRANSACT_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def apply_batch(batch, counters, latency, table=None, now=None):
+    """
+    Add a one-off delta to the aggregate in one transaction with its marker
+    Returns False when the batch was applied before
+    """
+    items = transaction_items([f'{BATCH_PREFIX}{batch}'], counters, latency,
+                              table or STATUS_AGGREGATE_TABLE, now or time.time())
+    return not transact(items)
+
+
+def apply_records(records, table=None, now=None):
+    """
+    Add the deltas of stream records to the aggregate, each record once
+    Returns (applied, skipped): records applied now and records whose
+    marker showed they were applied before
+    """
+    table = table or STATUS_AGGREGATE_TABLE
+    now = now or time.time()
+    # Records that change no count need no marker: applying them again changes nothing
+    changes = [record for record in records if any(batch_delta([record]))]
+    applied = skipped = 0
+    for start in range(0, len(changes), TRANSACT_RECORDS):
+        pending = changes[start:start + TRANSACT_RECORDS]
+        while pending:
+            counters, latency = batch_delta(pending)
+            markers = [f"{RECORD_PREFIX}{record['eventID']}" for record in pending]
+            failed = transact(transaction_items(markers, counters, latency, table, now))
+            if not failed:
+                applied += len(pending)
+                break
+            # Markers come first, so the failed indexes are the records applied before
+            skipped += len(failed)
+            pending = [record for index, record in enumerate(pending) if index not in failed]
+    return applied, skipped
+
+
+def read_totals(table=None):
+    """The totals item as {'revision', 'counters', 'last_delta', 'updated_at'}"""
+    response = get_client('dynamodb').get_item(
+        TableName=table or STATUS_AGGREGATE_TABLE,
+        Key={'aggregate_id': {'S': TOTALS_KEY}},
+        ConsistentRead=True
+    )
+    item = {name: _deserializer.deserialize(value) for name, value in response.get('Item', {}).items()}
+    counters = {name: int(value) for name, value in item.items()
+                if name.startswith(('status#', 'delivery#', 'language#')) and value}
+    return {
+        'revision': int(item.get('revision', 0)),
+        'counters': counters,
+        'last_delta': json.loads(item['last_delta']) if 'last_delta' in item else None,
+        'updated_at': int(item['updated_at']) if 'updated_at' in item else None
+    }
+
+
+def read_latency(table=None, now=None):
+    """Rolling upload-to-terminal histogram over the last LATENCY_WINDOWS windows"""
+    table = table or STATUS_AGGREGATE_TABLE
+    current = int((now or time.time()) // LATENCY_WINDOW_SECONDS)
+    pending = {table: {'Keys': [{'aggregate_id': {'S': f'{LATENCY_PREFIX}{window}'}}
+                                for window in range(current - LATENCY_WINDOWS + 1, current + 1)]}}
+    buckets = Counter({label: 0 for label in BUCKET_LABELS})
+    for attempt in range(TRANSACT_ATTEMPTS):
+        response = get_client('dynamodb').batch_get_item(RequestItems=pending)
+        for item in response['Responses'].get(table, []):
+            for label in BUCKET_LABELS:
+                if label in item:
+                    buckets[label] += int(item[label]['N'])
+        pending = response.get('UnprocessedKeys') or {}
+        if not pending:
+            break
+        time.sleep(0.05 * 2 ** attempt)
+    return {
+        'window_seconds': LATENCY_WINDOW_SECONDS * LATENCY_WINDOWS,
+        'buckets': {label: buckets[label] for label in BUCKET_LABELS}
+    }
+
@@ -0,0 +1,123 @@
+"""
+Write-sharded status index for the SanchaarContent table
+
+Items carry `status_shard` = "<status>#<n>" next to `status`, where n is a
+stable hash of the content id modulo STATUS_SHARDS, and the GSI is keyed on
+status_shard instead of status. Every writer that sets `status` sets
+`status_shard` from the same content id, so a run of new "processing"
+items spreads over STATUS_SHARDS index partitions instead of one.
+
+query_by_status reads all shards of a status in parallel and merge-sorts
+them by created_at. Its cursor records the position in every shard, so
+pages are exact however unevenly the shards fill.
+"""
+import base64
+import heapq
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+STATUS_INDEX = os.environ.get('STATUS_INDEX', 'status_shard-created_at-index')
+SHARD_ATTRIBUTE = 'status_shard'
+# Changing the shard count re-shards only items written afterwards; backfill before lowering it
+STATUS_SHARDS = int(os.environ.get('STATUS_SHARDS', '16'))
+
+_deserializer = TypeDeserializer()
+
+
+def shard_for(content_id, shards=None):
+    """Stable shard number for a content id (crc32, unlike hash(), survives restarts)"""
+    return zlib.crc32(str(content_id).encode('utf-8')) % (shards or STATUS_SHARDS)
+
+
+def status_key(status, content_id, shards=None):
+    return f'{status}#{shard_for(content_id, shards)}'
+
+
+def status_attributes(status, content_id, shards=None):
+    """The status attributes every writer puts on a content item"""
+    return {'status': status, SHARD_ATTRIBUTE: status_key(status, content_id, shards)}
+
+
+def status_update(status, content_id, shards=None):
+    """UpdateExpression fragment, names and values that set both status attributes"""
+    return (
+        '#status = :status, #status_shard = :status_shard',
+        {'#status': 'status', '#status_shard': SHARD_ATTRIBUTE},
+        {':status': status, ':status_shard': status_key(status, content_id, shards)}
+    )
+
+
+def encode_cursor(positions):
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+
+
+def query_by_status(table_name, status, limit=50, cursor=None, newest_first=True, shards=None, client=None,
+                    max_workers=16):
+    """
+    One page of items with the given status, ordered by created_at, and the
+    cursor for the next page (None when there are no more)
+
+    Each shard is queried for up to `limit` items from its cursor position;
+    a page can only contain that many from any one shard, so merging the
+    shard heads and keeping the first `limit` is exact.
+    """
+    client = client or boto3.client('dynamodb')
+    shards = shards or STATUS_SHARDS
+    # Shard number -> ExclusiveStartKey, None for not started; missing means exhausted
+    positions = decode_cursor(cursor) if cursor else {str(n): None for n in range(shards)}
+
+    def query_shard(shard):
+        request = {
+            'TableName': table_name,
+            'IndexName': STATUS_INDEX,
+            'KeyConditionExpression': '#status_shard = :status_shard',
+            'ExpressionAttributeNames': {'#status_shard': SHARD_ATTRIBUTE},
+            'ExpressionAttributeValues': {':status_shard': {'S': f'{status}#{shard}'}},
+            'ScanIndexForward': not newest_first,
+            'Limit': limit
+        }
+        if positions[shard]:
+            request['ExclusiveStartKey'] = positions[shard]
+        response = client.query(**request)
+        return shard, response['Items'], response.get('LastEvaluatedKey')
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(positions)))) as executor:
+        pages = list(executor.map(query_shard, sorted(positions, key=int)))
+
+    def sort_key(entry):
+        return entry[1]['created_at']['S']
+
+    streams = [[(shard, item) for item in items] for shard, items, _ in pages]
+    merged = heapq.merge(*streams, key=sort_key, reverse=newest_first)
+    page = [entry for _, entry in zip(range(limit), merged)]
+
+    consumed = {}
+    for shard, item in page:
+        consumed[shard] = consumed.get(shard, 0) + 1
+    next_positions = {}
+    for shard, items, last_key in pages:
+        taken = consumed.get(shard, 0)
+        if taken < len(items):
+            # Resume after the last item this page used from the shard
+            next_positions[shard] = index_key(items[taken - 1]) if taken else positions[shard]
+        elif last_key:
+            next_positions[shard] = last_key
+
+    return {
+        'items': [{name: _deserializer.deserialize(value) for name, value in item.items()} for _, item in page],
+        'cursor': encode_cursor(next_positions) if next_positions else None
+    }
+
+
+def index_key(item):
+    """ExclusiveStartKey for a GSI item: the table key plus the index key"""
+    return {name: item[name] for name in ('content_id', 'version', SHARD_ATTRIBUTE, 'created_at')}
@@ -0,0 +1,168 @@
+"""
+Memory-mapped, quantised copies of the knowledge base vector indexes for
+in-process retrieval
+
+Each index lives in its own directory:
+  manifest.json       dimension, quantization, row count and filter vocabularies
+  vectors.bin         unit-length vectors as int8 (per-row scale) or float16
+  scales.bin          float32 per-row scales (int8 only)
+  <field>.codes       int16 filter codes per row, -1 when the field is missing
+  documents.jsonl     document fields without the embedding, one line per row
+  offsets.bin         int64 byte offset of each document line
+"""
+import json
+import mmap
+import os
+from pathlib import Path
+
+import numpy as np
+
+KB_INDEX_PATH = os.environ.get('KB_INDEX_PATH', '/opt/python/kb-index')
+
+# Keyword fields that can filter each index, from the mappings in init-knowledge-base.py
+FILTER_FIELDS = {
+    'cultural-references': ['language', 'region', 'category'],
+    'idioms-phrases': ['target_language', 'source_language'],
+    'brand-guidelines': ['category']
+}
+
+QUANTIZATIONS = ('int8', 'float16')
+
+# Rows scored per matrix product, bounding the float32 working set
+BLOCK_ROWS = 4096
+
+
+def normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def write_index(directory, index_name, vectors, documents, quantization='int8'):
+    """Write a quantised index from float vectors and their documents"""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f'Unknown quantization: {quantization}')
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    vectors = normalise(vectors)
+
+    if quantization == 'int8':
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        quantised = np.round(vectors / scales[:, None]).astype(np.int8)
+        scales.astype(np.float32).tofile(directory / 'scales.bin')
+    else:
+        quantised = vectors.astype(np.float16)
+    quantised.tofile(directory / 'vectors.bin')
+
+    filters = {}
+    for field in FILTER_FIELDS.get(index_name, []):
+        vocabulary = sorted({str(d[field]) for d in documents if d.get(field) is not None})
+        codes = {value: code for code, value in enumerate(vocabulary)}
+        column = np.array([codes.get(str(d.get(field)), -1) if d.get(field) is not None else -1
+                           for d in documents], dtype=np.int16)
+        column.tofile(directory / f'{field}.codes')
+        filters[field] = vocabulary
+
+    offsets = []
+    with open(directory / 'documents.jsonl', 'wb') as f:
+        for document in documents:
+            offsets.append(f.tell())
+            fields = {k: v for k, v in document.items() if k != 'embedding'}
+            f.write(json.dumps(fields, ensure_ascii=False).encode('utf-8') + b'\n')
+    np.array(offsets, dtype=np.int64).tofile(directory / 'offsets.bin')
+
+    manifest = {
+        'index': index_name,
+        'dimension': int(vectors.shape[1]),
+        'count': int(vectors.shape[0]),
+        'quantization': quantization,
+        'filters': filters
+    }
+    (directory / 'manifest.json').write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+class LocalIndex:
+    """Exhaustive cosine top-k over one memory-mapped quantised index"""
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        self.manifest = json.loads((directory / 'manifest.json').read_text())
+        self.name = self.manifest['index']
+        self.dimension = self.manifest['dimension']
+        self.count = self.manifest['count']
+        dtype = np.int8 if self.manifest['quantization'] == 'int8' else np.float16
+        self.vectors = np.memmap(directory / 'vectors.bin', dtype=dtype, mode='r',
+                                 shape=(self.count, self.dimension))
+        self.scales = None
+        if self.manifest['quantization'] == 'int8':
+            self.scales = np.fromfile(directory / 'scales.bin', dtype=np.float32)
+        self.codes = {field: np.fromfile(directory / f'{field}.codes', dtype=np.int16)
+                      for field in self.manifest['filters']}
+        self.offsets = np.fromfile(directory / 'offsets.bin', dtype=np.int64)
+        with open(directory / 'documents.jsonl', 'rb') as f:
+            self.documents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b''
+
+    def candidates(self, filters):
+        """Row numbers matching every filter, or None for all rows"""
+        mask = None
+        for field, value in (filters or {}).items():
+            if value is None:
+                continue
+            if field not in self.codes:
+                raise ValueError(f'{self.name} cannot filter on {field}')
+            vocabulary = self.manifest['filters'][field]
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            wanted = [vocabulary.index(str(v)) for v in values if str(v) in vocabulary]
+            field_mask = np.isin(self.codes[field], wanted)
+            mask = field_mask if mask is None else mask & field_mask
+        return None if mask is None else np.flatnonzero(mask)
+
+    def search(self, queries, k=5, filters=None):
+        """
+        Score query vectors (one or a matrix) against every candidate row.
+        Returns, per query, a list of (score, row) best first.
+        """
+        queries = normalise(np.atleast_2d(queries)).T
+        rows = self.candidates(filters)
+        total = self.count if rows is None else len(rows)
+        if total == 0:
+            return [[] for _ in range(queries.shape[1])]
+
+        best_scores = []
+        best_rows = []
+        for start in range(0, total, BLOCK_ROWS):
+            block_rows = np.arange(start, min(start + BLOCK_ROWS, total)) if rows is None \
+                else rows[start:start + BLOCK_ROWS]
+            block = self.vectors[start:start + BLOCK_ROWS] if rows is None else self.vectors[block_rows]
+            scores = block.astype(np.float32) @ queries
+            if self.scales is not None:
+                scores *= self.scales[block_rows][:, None]
+            keep = min(k, len(block_rows))
+            top = np.argpartition(-scores, keep - 1, axis=0)[:keep]
+            best_scores.append(np.take_along_axis(scores, top, axis=0))
+            best_rows.append(block_rows[top])
+
+        scores = np.concatenate(best_scores)
+        candidates = np.concatenate(best_rows)
+        order = np.argsort(-scores, axis=0)[:k]
+        return [[(float(scores[i, q]), int(candidates[i, q])) for i in order[:, q]]
+                for q in range(queries.shape[1])]
+
+    def document(self, row):
+        start = int(self.offsets[row])
+        end = self.documents.find(b'\n', start)
+        return json.loads(self.documents[start:end])
+
+
+_indexes = {}
+
+
+def get_index(index_name, root=None):
+    """Shared LocalIndex for an index name, or None when the layer does not ship it"""
+    root = Path(root or KB_INDEX_PATH)
+    key = (str(root), index_name)
+    if key not in _indexes:
+        directory = root / index_name
+        _indexes[key] = LocalIndex(directory) if (directory / 'manifest.json').exists() else None
+    return _indexes[key]
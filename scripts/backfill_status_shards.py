@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Backfill status_shard on SanchaarContent items written before the status
+index was sharded
+
+Items without status_shard are missing from status_shard-created_at-index.
+Safe to re-run: the update only applies while status is unchanged, and
+items already carrying the right shard key are skipped.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import boto3
+
+LAYER_DIR = Path(__file__).resolve().parent.parent / 'infrastructure' / 'sam' / 'layers' / 'common'
+sys.path.insert(0, str(LAYER_DIR))
+
+from sanchaar_common.status_index import SHARD_ATTRIBUTE, status_key  # noqa: E402
+
+def backfill(table, shards, dry_run=False):
+    counts = {'scanned': 0, 'updated': 0, 'skipped': 0, 'changed_meanwhile': 0}
+    request = {
+        'ProjectionExpression': 'content_id, version, #status, #status_shard, created_at',
+        'ExpressionAttributeNames': {'#status': 'status', '#status_shard': SHARD_ATTRIBUTE}
+    }
+    while True:
+        response = table.scan(**request)
+        for item in response['Items']:
+            counts['scanned'] += 1
+            # Chunk items of compressed records carry no status and stay out of the index
+            if 'status' not in item or 'created_at' not in item:
+                counts['skipped'] += 1
+                continue
+            shard_key = status_key(item['status'], item['content_id'], shards)
+            if item.get(SHARD_ATTRIBUTE) == shard_key:
+                counts['skipped'] += 1
+                continue
+            if dry_run:
+                counts['updated'] += 1
+                continue
+            try:
+                table.update_item(
+                    Key={'content_id': item['content_id'], 'version': item['version']},
+                    UpdateExpression='SET #status_shard = :status_shard',
+                    ConditionExpression='#status = :status',
+                    ExpressionAttributeNames={'#status': 'status', '#status_shard': SHARD_ATTRIBUTE},
+                    ExpressionAttributeValues={':status': item['status'], ':status_shard': shard_key}
+                )
+                counts['updated'] += 1
+            except table.meta.client.exceptions.ConditionalCheckFailedException:
+                # A writer changed the status and set its shard key itself
+                counts['changed_meanwhile'] += 1
+        if 'LastEvaluatedKey' not in response:
+            return counts
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill status_shard on existing content items')
+    parser.add_argument('--table', required=True, help='Content table name, e.g. SanchaarContent-dev')
+    parser.add_argument('--shards', type=int, default=16, help='Must match STATUS_SHARDS of the stack')
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    
+    table = boto3.resource('dynamodb', endpoint_url=args.endpoint_url).Table(args.table)
+    print(json.dumps(backfill(table, args.shards, args.dry_run), indent=2))
+
+if __name__ == '__main__':
+    main()
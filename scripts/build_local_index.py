@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Build the quantised local retrieval indexes shipped in the kb_index Lambda layer
+
+Reads the same corpus as kb_ingest.py, embeds it through the embedding cache
+(so vectors match what OpenSearch holds without calling Titan again) and
+writes one memory-mapped index per knowledge base index.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from kb_ingest import INDEX_TEXT_FIELDS, FakeEmbedder, TitanEmbedder, cached_embedder, corpus_files, read_batches
+
+LAYER_DIR = Path(__file__).resolve().parent.parent / 'infrastructure' / 'sam' / 'layers' / 'kb_index'
+sys.path.insert(0, str(LAYER_DIR))
+
+from kb_index import QUANTIZATIONS, write_index  # noqa: E402
+
+# Lambda layers share the 250 MB unzipped limit with the function code
+LAYER_SIZE_LIMIT = 200 * 1024 * 1024
+
+def build(corpus_dir, output_dir, embedder, index_names, quantization='int8', batch_size=64):
+    manifests = []
+    for index_name in index_names:
+        field = INDEX_TEXT_FIELDS[index_name]
+        vectors = []
+        documents = []
+        for source_name, name, path in corpus_files(corpus_dir):
+            if name != index_name:
+                continue
+            for _, batch, _ in read_batches(path, 0, batch_size):
+                vectors.extend(embedder.embed([document.get(field, '') for document in batch]))
+                documents.extend(batch)
+        if not documents:
+            print(f"⚠ No documents for {index_name}")
+            continue
+        manifest = write_index(Path(output_dir) / index_name, index_name, vectors, documents, quantization)
+        manifests.append(manifest)
+        print(f"✓ Built {index_name}: {manifest['count']} rows, {quantization}")
+    if hasattr(embedder, 'flush'):
+        embedder.flush()
+    
+    size = sum(path.stat().st_size for path in Path(output_dir).rglob('*') if path.is_file())
+    if size > LAYER_SIZE_LIMIT:
+        print(f"⚠ Index is {size / 2 ** 20:.0f} MB; trim the corpus or use int8 to fit a Lambda layer")
+    return manifests
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the local retrieval indexes for the kb_index layer')
+    parser.add_argument('--corpus-path', default='./data/indic-corpus')
+    parser.add_argument('--output', default=str(LAYER_DIR / 'kb-index'))
+    parser.add_argument('--indexes', nargs='+', default=['idioms-phrases', 'cultural-references'],
+                        choices=sorted(INDEX_TEXT_FIELDS))
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, default='int8')
+    parser.add_argument('--embedding-cache', default='./data/indic-corpus/.embedding-cache')
+    parser.add_argument('--fake-embedder', action='store_true', help='Use hash-derived vectors')
+    args = parser.parse_args()
+    
+    embedder = cached_embedder(FakeEmbedder() if args.fake_embedder else TitanEmbedder(), args.embedding_cache)
+    manifests = build(args.corpus_path, args.output, embedder, args.indexes, args.quantization)
+    print(json.dumps({'indexes': manifests, 'embedding_cache': embedder.stats()}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Persistent embedding cache keyed by (model id, normalised text hash)
+
+Vectors live in one memory-mapped float16/float32 matrix per model; a JSON
+index maps text hashes to rows and last-use ticks for LRU eviction.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+# Share of entries dropped at once when the cache is full, so eviction is amortised
+EVICTION_FRACTION = 0.1
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalise_text(text):
+    """Unicode NFC with collapsed whitespace; Indic scripts have many equivalent encodings"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+def text_key(text):
+    return hashlib.sha256(normalise_text(text).encode('utf-8')).hexdigest()[:32]
+
+class EmbeddingCache:
+    """
+    Size-bounded on-disk cache of embeddings for one model. Rows freed by
+    eviction are only reused after the next flush, so a crash never leaves
+    the saved index pointing at overwritten vectors.
+    """
+    
+    def __init__(self, cache_dir, model_id, dimension, dtype='float16', max_entries=1_000_000):
+        self.directory = Path(cache_dir) / re.sub(r'[^A-Za-z0-9._-]', '_', model_id)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_id = model_id
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self.index_path = self.directory / 'index.json'
+        self.vectors_path = self.directory / f'vectors-{self.dtype.name}-{dimension}.bin'
+        index = json.loads(self.index_path.read_text()) if self.index_path.exists() else {}
+        if index and (index['dimension'] != dimension or index['dtype'] != self.dtype.name):
+            raise ValueError(f'{self.directory} holds {index["dtype"]} vectors of dimension {index["dimension"]}')
+        self.entries = index.get('entries', {})
+        self.next_row = index.get('next_row', 0)
+        self.free_rows = index.get('free_rows', [])
+        self.pending_free = []
+        self.tick = index.get('tick', 0)
+        self.vectors = None
+        self._map(max(index.get('capacity', 0), min(INITIAL_CAPACITY, max_entries)))
+    
+    def _map(self, capacity):
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+        row_bytes = self.dimension * self.dtype.itemsize
+        with open(self.vectors_path, 'ab') as f:
+            if f.tell() < capacity * row_bytes:
+                f.truncate(capacity * row_bytes)
+        self.capacity = capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r+',
+                                 shape=(capacity, self.dimension))
+    
+    def get_many(self, texts):
+        """Cached vectors (float32 lists) for texts, None for misses"""
+        results = []
+        with self.lock:
+            for text in texts:
+                entry = self.entries.get(text_key(text))
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self.tick += 1
+                entry[1] = self.tick
+                results.append(self.vectors[entry[0]].astype(np.float32).tolist())
+        return results
+    
+    def put_many(self, texts, vectors):
+        with self.lock:
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                entry = self.entries.get(key)
+                row = entry[0] if entry else self._allocate_row()
+                self.vectors[row] = vector
+                self.tick += 1
+                self.entries[key] = [row, self.tick]
+    
+    def _allocate_row(self):
+        if len(self.entries) >= self.max_entries:
+            self._evict(max(1, int(self.max_entries * EVICTION_FRACTION)))
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.next_row >= self.capacity:
+            self._map(min(self.capacity * 2, self.max_entries + len(self.pending_free) + 1))
+        row = self.next_row
+        self.next_row += 1
+        return row
+    
+    def _evict(self, count):
+        oldest = sorted(self.entries.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in oldest:
+            del self.entries[key]
+            self.pending_free.append(row)
+        self.evictions += len(oldest)
+    
+    def flush(self):
+        """Persist vectors, then the index that refers to them"""
+        with self.lock:
+            self.vectors.flush()
+            self.free_rows.extend(self.pending_free)
+            self.pending_free = []
+            data = json.dumps({
+                'model_id': self.model_id,
+                'dimension': self.dimension,
+                'dtype': self.dtype.name,
+                'capacity': self.capacity,
+                'next_row': self.next_row,
+                'free_rows': self.free_rows,
+                'tick': self.tick,
+                'entries': self.entries
+            })
+        temporary = self.index_path.with_suffix('.tmp')
+        temporary.write_text(data)
+        os.replace(temporary, self.index_path)
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'bytes': self.capacity * self.dimension * self.dtype.itemsize
+            }
+
+class CachedEmbedder:
+    """Wrap an embedder so only texts missing from the cache are embedded"""
+    
+    def __init__(self, embedder, cache):
+        self.embedder = embedder
+        self.cache = cache
+        self.model_id = embedder.model_id
+        self.dimension = embedder.dimension
+    
+    def embed(self, texts):
+        vectors = self.cache.get_many(texts)
+        # Embed each distinct missing text once, even when it repeats in the batch
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            embedded = dict(zip(missing, self.embedder.embed(missing)))
+            self.cache.put_many(missing, [embedded[text] for text in missing])
+            vectors = [vector if vector is not None else embedded[text] for text, vector in zip(texts, vectors)]
+        return vectors
+    
+    def flush(self):
+        self.cache.flush()
+    
+    def stats(self):
+        return self.cache.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect an embedding cache')
+    parser.add_argument('cache_dir')
+    args = parser.parse_args()
+    
+    for index_path in sorted(Path(args.cache_dir).glob('*/index.json')):
+        index = json.loads(index_path.read_text())
+        row_bytes = index['dimension'] * np.dtype(index['dtype']).itemsize
+        print(json.dumps({
+            'model_id': index['model_id'],
+            'dtype': index['dtype'],
+            'dimension': index['dimension'],
+            'entries': len(index['entries']),
+            'bytes': index['capacity'] * row_bytes
+        }))
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,11 @@ Initialize OpenSearch Serverless Knowledge Base for Indic RAG
 import boto3
 import json
 import argparse
+import time
 from pathlib import Path
 
+from kb_ingest import FakeEmbedder, TitanEmbedder, build_client, cached_embedder, ingest
+
 opensearch = boto3.client('opensearchserverless')
 bedrock_agent = boto3.client('bedrock-agent')
 
@@ -30,28 +33,20 @@ def create_collection():
         )
         return collections['collectionSummaries'][0]['id']
 
+def get_collection_endpoint(collection_id, timeout=600):
+    """Wait for the collection to become active and return its endpoint"""
+    deadline = time.time() + timeout
+    while True:
+        details = opensearch.batch_get_collection(ids=[collection_id])['collectionDetails'][0]
+        if details['status'] == 'ACTIVE':
+            return details['collectionEndpoint']
+        if details['status'] == 'FAILED' or time.time() > deadline:
+            raise RuntimeError(f"Collection {COLLECTION_NAME} is {details['status']}")
+        time.sleep(10)
+
 def create_indexes(collection_endpoint):
     """Create vector indexes for different content types"""
-    from opensearchpy import OpenSearch, RequestsHttpConnection
-    from requests_aws4auth import AWS4Auth
-    
-    session = boto3.Session()
-    credentials = session.get_credentials()
-    awsauth = AWS4Auth(
-        credentials.access_key,
-        credentials.secret_key,
-        session.region_name,
-        'aoss',
-        session_token=credentials.token
-    )
-    
-    client = OpenSearch(
-        hosts=[{'host': collection_endpoint, 'port': 443}],
-        http_auth=awsauth,
-        use_ssl=True,
-        verify_certs=True,
-        connection_class=RequestsHttpConnection
-    )
+    client = build_client(collection_endpoint)
     
     indexes = {
         'cultural-references': {
@@ -101,8 +96,12 @@ def create_indexes(collection_endpoint):
         except Exception as e:
             print(f"Index {index_name} may already exist: {e}")
 
-def upload_corpus(corpus_path, collection_id):
-    """Upload Indic language corpus to knowledge base"""
+def upload_corpus(corpus_path, collection_endpoint, checkpoint_path, fake_embedder=False,
+                  embedding_cache=None):
+    """
+    Stream the Indic language corpus into the vector indexes, resuming from
+    the checkpoint and embedding only passages missing from the cache
+    """
     corpus_dir = Path(corpus_path)
     
     if not corpus_dir.exists():
@@ -110,6 +109,27 @@ def upload_corpus(corpus_path, collection_id):
         print("Please add your Indic language datasets to data/indic-corpus/")
         return
     
+    embedder = FakeEmbedder() if fake_embedder else TitanEmbedder()
+    if embedding_cache is not False:
+        embedder = cached_embedder(embedder, embedding_cache or corpus_dir / '.embedding-cache')
+    
+    summary = ingest(
+        corpus_dir,
+        build_client(collection_endpoint),
+        embedder,
+        checkpoint_path or corpus_dir / '.ingest-checkpoint.json',
+        # OpenSearch Serverless vector collections assign their own document ids, so batches go one at a time
+        with_ids='aoss.amazonaws.com' not in collection_endpoint
+    )
+    print(f"✓ Indexed {summary['documents']} documents at {summary['docs_per_second']} docs/s")
+    for index_name, count in summary['per_index'].items():
+        print(f"  {index_name}: {count}")
+    if 'embedding_cache' in summary:
+        cache = summary['embedding_cache']
+        print(f"  embedding cache: {cache['hits']} hits, {cache['misses']} misses")
+
+def create_knowledge_base(collection_id):
+    """Register the cultural-references index as a Bedrock Knowledge Base"""
     # Create Bedrock Knowledge Base
     try:
         kb_response = bedrock_agent.create_knowledge_base(
@@ -143,27 +163,45 @@ def main():
     parser = argparse.ArgumentParser(description='Initialize Sanchaar Knowledge Base')
     parser.add_argument('--corpus-path', default='./data/indic-corpus',
                        help='Path to Indic language corpus')
+    parser.add_argument('--collection-endpoint', default=None,
+                       help='Skip collection setup and index into this endpoint (e.g. http://localhost:9200)')
+    parser.add_argument('--checkpoint', default=None,
+                       help='Ingestion checkpoint file (default: <corpus-path>/.ingest-checkpoint.json)')
+    parser.add_argument('--fake-embedder', action='store_true',
+                       help='Use deterministic local vectors instead of Titan')
+    parser.add_argument('--embedding-cache', default=None,
+                       help='Embedding cache directory (default: <corpus-path>/.embedding-cache)')
+    parser.add_argument('--no-embedding-cache', action='store_true',
+                       help='Embed every passage even if it was embedded before')
     args = parser.parse_args()
     
     print("🚀 Initializing Sanchaar Knowledge Base...")
     
     # Step 1: Create collection
-    collection_id = create_collection()
+    collection_id = None
+    collection_endpoint = args.collection_endpoint
+    if not collection_endpoint:
+        collection_id = create_collection()
+        collection_endpoint = get_collection_endpoint(collection_id)
     
     # Step 2: Create indexes
     print("\n📊 Creating vector indexes...")
-    # Note: You'll need the collection endpoint from AWS Console
-    print("⚠ Please create indexes manually via AWS Console or provide endpoint")
+    create_indexes(collection_endpoint)
     
     # Step 3: Upload corpus
-    print("\n📚 Setting up knowledge base...")
-    upload_corpus(args.corpus_path, collection_id)
+    print("\n📚 Indexing corpus...")
+    upload_corpus(args.corpus_path, collection_endpoint, args.checkpoint, args.fake_embedder,
+                  embedding_cache=False if args.no_embedding_cache else args.embedding_cache)
+    
+    # Step 4: Register the knowledge base
+    if collection_id:
+        print("\n🧠 Setting up knowledge base...")
+        create_knowledge_base(collection_id)
     
     print("\n✅ Knowledge Base initialization complete!")
     print("\nNext steps:")
-    print("1. Add your Indic language datasets to data/indic-corpus/")
-    print("2. Configure data source in Bedrock Knowledge Base console")
-    print("3. Start ingestion job to index the corpus")
+    print("1. Add more Indic language datasets to data/indic-corpus/<index-name>/*.jsonl")
+    print("2. Re-run this script; indexed files are skipped using the checkpoint")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Stream the Indic corpus into the knowledge base OpenSearch indexes
+
+Corpus layout: data/indic-corpus/<index-name>/*.jsonl[.gz], one JSON
+document per line. Files are read line by line, embedded in batches with
+Titan and written with _bulk. A checkpoint records how far every file has
+been indexed, so an interrupted load resumes where it stopped.
+
+Loading is at least once: batches written after the last checkpoint save
+are written again on resume. Documents carry ids derived from their source
+line, so the rewrite overwrites them, except on OpenSearch Serverless vector
+collections, which assign their own ids; there batches are written one at a
+time, so a resume duplicates at most the batch in flight when it stopped.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import struct
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import boto3
+from botocore.exceptions import ClientError
+
+EMBEDDING_MODEL = 'amazon.titan-embed-text-v1'
+EMBEDDING_DIMENSION = 1536
+
+# Field embedded for each index declared in init-knowledge-base.py
+INDEX_TEXT_FIELDS = {
+    'cultural-references': 'text',
+    'idioms-phrases': 'source_phrase',
+    'brand-guidelines': 'guideline'
+}
+
+THROTTLING_ERRORS = ('ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException')
+MAX_ATTEMPTS = 6
+
+class TitanEmbedder:
+    """Titan text embeddings, one InvokeModel call per text issued concurrently"""
+    
+    def __init__(self, model_id=EMBEDDING_MODEL, max_workers=16, region=None):
+        self.model_id = model_id
+        self.dimension = EMBEDDING_DIMENSION
+        self.client = boto3.client(
+            'bedrock-runtime',
+            region_name=region or os.environ.get('BEDROCK_REGION', 'us-east-1')
+        )
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        
+    def embed(self, texts):
+        return list(self.executor.map(self.embed_one, texts))
+        
+    def embed_one(self, text):
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                response = self.client.invoke_model(
+                    modelId=self.model_id,
+                    body=json.dumps({'inputText': text}),
+                    contentType='application/json',
+                    accept='application/json'
+                )
+                return json.loads(response['body'].read())['embedding']
+            except ClientError as e:
+                if e.response['Error']['Code'] not in THROTTLING_ERRORS or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+
+class FakeEmbedder:
+    """Deterministic hash-derived vectors for local runs against a stub or container"""
+    
+    def __init__(self, dimension=EMBEDDING_DIMENSION, latency=0.0):
+        self.model_id = f'fake-embedder-{dimension}'
+        self.dimension = dimension
+        self.latency = latency
+        
+    def embed(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed_one(text) for text in texts]
+        
+    def embed_one(self, text):
+        values = []
+        counter = 0
+        while len(values) < self.dimension:
+            digest = hashlib.sha256(f'{counter}:{text}'.encode('utf-8')).digest()
+            values.extend(v / 2 ** 31 - 1 for v in struct.unpack('>8I', digest))
+            counter += 1
+        return values[:self.dimension]
+
+def build_client(endpoint, region=None, service='aoss'):
+    """OpenSearch client for a collection endpoint, or an unauthenticated http:// endpoint"""
+    from opensearchpy import OpenSearch, RequestsHttpConnection
+    
+    if endpoint.startswith('http://'):
+        return OpenSearch(hosts=[endpoint], connection_class=RequestsHttpConnection,
+                          pool_maxsize=32, timeout=60)
+                          
+    from requests_aws4auth import AWS4Auth
+    
+    session = boto3.Session()
+    credentials = session.get_credentials()
+    awsauth = AWS4Auth(
+        credentials.access_key,
+        credentials.secret_key,
+        region or session.region_name,
+        service,
+        session_token=credentials.token
+    )
+    return OpenSearch(
+        hosts=[{'host': endpoint.replace('https://', ''), 'port': 443}],
+        http_auth=awsauth,
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=RequestsHttpConnection,
+        pool_maxsize=32,
+        timeout=60
+    )
+
+class Checkpoint:
+    """
+    Per-file byte offsets below which every document is indexed, saved
+    atomically so a crash never leaves a torn checkpoint
+    """
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.state = {'files': {}, 'documents': 0}
+        if self.path.exists():
+            self.state = json.loads(self.path.read_text())
+        self.lock = threading.Lock()
+        
+    def offset(self, name):
+        return self.state['files'].get(name, {}).get('offset', 0)
+        
+    def is_done(self, name):
+        return self.state['files'].get(name, {}).get('done', False)
+        
+    def advance(self, name, offset, documents, done=False):
+        with self.lock:
+            self.state['files'][name] = {'offset': offset, 'done': done}
+            self.state['documents'] += documents
+            
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.state, indent=2)
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(data)
+        os.replace(temporary, self.path)
+
+def corpus_files(corpus_dir):
+    """(relative name, index name, path) for every corpus file in a stable order"""
+    corpus_dir = Path(corpus_dir)
+    for index_name in sorted(INDEX_TEXT_FIELDS):
+        index_dir = corpus_dir / index_name
+        if not index_dir.is_dir():
+            continue
+        for path in sorted(index_dir.rglob('*')):
+            if path.is_file() and path.name.endswith(('.jsonl', '.jsonl.gz')):
+                yield str(path.relative_to(corpus_dir)), index_name, path
+
+def read_batches(path, start_offset, batch_size):
+    """
+    Yield (offsets, documents, end_offset) batches from a JSON-lines file,
+    starting at a byte offset of the uncompressed stream and holding one
+    batch in memory. offsets are the byte offsets of each document's line.
+    """
+    opener = gzip.open if path.name.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        if start_offset:
+            f.seek(start_offset)
+        offset = start_offset
+        batch = []
+        for line in f:
+            line_offset = offset
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            batch.append((line_offset, json.loads(line)))
+            if len(batch) >= batch_size:
+                yield [o for o, _ in batch], [d for _, d in batch], offset
+                batch = []
+        if batch:
+            yield [o for o, _ in batch], [d for _, d in batch], offset
+
+def bulk_body(index_name, documents, embeddings, source_name, offsets, with_ids):
+    """_bulk NDJSON lines; document ids derive from the source line so reloads overwrite"""
+    lines = []
+    for offset, document, embedding in zip(offsets, documents, embeddings):
+        action = {'_index': index_name}
+        if with_ids:
+            action['_id'] = document.get('id') or hashlib.sha1(
+                f'{source_name}:{offset}'.encode('utf-8')).hexdigest()
+        lines.append(json.dumps({'index': action}))
+        lines.append(json.dumps(dict(document, embedding=embedding), ensure_ascii=False))
+    return '\n'.join(lines) + '\n'
+
+def write_bulk(client, body):
+    """Send one _bulk request, resending only the items rejected with 429"""
+    lines = body.rstrip('\n').split('\n')
+    for attempt in range(MAX_ATTEMPTS):
+        response = client.bulk(body='\n'.join(lines) + '\n')
+        if not response.get('errors'):
+            return
+        retry = []
+        for position, item in enumerate(response['items']):
+            result = next(iter(item.values()))
+            status = result.get('status', 200)
+            if status == 429:
+                retry.extend(lines[2 * position:2 * position + 2])
+            elif status >= 300:
+                raise RuntimeError(f"Bulk item rejected: {result.get('error')}")
+        if not retry:
+            return
+        lines = retry
+        time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+    raise RuntimeError('Bulk items still throttled after retries')
+
+def ingest(corpus_dir, client, embedder, checkpoint_path, batch_size=64, max_in_flight=4,
+           with_ids=True, report_every=5.0):
+    """
+    Index every corpus file not yet covered by the checkpoint. Batches are
+    embedded and bulk-written concurrently; a file's checkpoint only moves
+    past batches that, together with every batch before them, completed.
+    
+    A resume rewrites every batch written past the checkpoint. Without
+    with_ids nothing overwrites them, and batches that completed ahead of
+    an unfinished earlier one would be indexed twice, so they are written
+    one at a time: at most the single batch in flight is duplicated.
+    """
+    if not with_ids:
+        max_in_flight = 1
+    checkpoint = Checkpoint(checkpoint_path)
+    started = time.perf_counter()
+    last_report = started
+    indexed = 0
+    per_index = {}
+    
+    def process(index_name, source_name, offsets, documents):
+        field = INDEX_TEXT_FIELDS[index_name]
+        embeddings = embedder.embed([document.get(field, '') for document in documents])
+        write_bulk(client, bulk_body(index_name, documents, embeddings, source_name, offsets, with_ids))
+        return len(documents)
+        
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for source_name, index_name, path in corpus_files(corpus_dir):
+            if checkpoint.is_done(source_name):
+                continue
+                
+            # Completed batches wait here until every earlier batch of the file is done
+            pending = {}
+            order = []
+            completed = {}
+            start_offset = checkpoint.offset(source_name)
+            
+            def settle(done_futures):
+                nonlocal indexed, last_report
+                for future in done_futures:
+                    completed[pending.pop(future)] = future.result()
+                while order and order[0] in completed:
+                    end_offset = order.pop(0)
+                    count = completed.pop(end_offset)
+                    checkpoint.advance(source_name, end_offset, count)
+                    indexed += count
+                    per_index[index_name] = per_index.get(index_name, 0) + count
+                checkpoint.save()
+                now = time.perf_counter()
+                if now - last_report >= report_every:
+                    last_report = now
+                    print(f"  {indexed} documents, {indexed / (now - started):.0f} docs/s")
+                    
+            for offsets, documents, end_offset in read_batches(path, start_offset, batch_size):
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    settle(done)
+                future = executor.submit(process, index_name, source_name, offsets, documents)
+                pending[future] = end_offset
+                order.append(end_offset)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                settle(done)
+                
+            checkpoint.advance(source_name, checkpoint.offset(source_name), 0, done=True)
+            # Cached vectors are persisted before the next file so a crash loses at most one file's worth
+            if hasattr(embedder, 'flush'):
+                embedder.flush()
+            checkpoint.save()
+            print(f"✓ Indexed {source_name}")
+            
+    elapsed = time.perf_counter() - started
+    summary = {
+        'documents': indexed,
+        'per_index': per_index,
+        'seconds': round(elapsed, 2),
+        'docs_per_second': round(indexed / elapsed, 1) if elapsed else 0.0,
+        'total_documents': checkpoint.state['documents']
+    }
+    if hasattr(embedder, 'stats'):
+        summary['embedding_cache'] = embedder.stats()
+    return summary
+
+def cached_embedder(embedder, cache_dir, dtype='float16', max_entries=1_000_000):
+    """Wrap an embedder with the on-disk embedding cache (needs numpy)"""
+    from embedding_cache import CachedEmbedder, EmbeddingCache
+    
+    cache = EmbeddingCache(cache_dir, embedder.model_id, embedder.dimension,
+                           dtype=dtype, max_entries=max_entries)
+    return CachedEmbedder(embedder, cache)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream the Indic corpus into the knowledge base indexes')
+    parser.add_argument('--corpus-path', default='./data/indic-corpus')
+    parser.add_argument('--endpoint', required=True,
+                        help='Collection endpoint, or http://host:port for a local OpenSearch')
+    parser.add_argument('--checkpoint', default='./data/indic-corpus/.ingest-checkpoint.json')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-in-flight', type=int, default=4,
+                        help='Concurrent batches; always 1 for OpenSearch Serverless, which assigns document ids')
+    parser.add_argument('--embed-concurrency', type=int, default=16, help='Concurrent Titan calls')
+    parser.add_argument('--fake-embedder', action='store_true', help='Use hash-derived vectors')
+    parser.add_argument('--embedding-cache', default='./data/indic-corpus/.embedding-cache',
+                        help='Directory of cached embeddings, reused across reindexing runs')
+    parser.add_argument('--no-embedding-cache', action='store_true')
+    parser.add_argument('--embedding-cache-dtype', choices=['float16', 'float32'], default='float16')
+    parser.add_argument('--embedding-cache-max-entries', type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    client = build_client(args.endpoint)
+    embedder = FakeEmbedder() if args.fake_embedder else TitanEmbedder(max_workers=args.embed_concurrency)
+    if not args.no_embedding_cache:
+        embedder = cached_embedder(embedder, args.embedding_cache, dtype=args.embedding_cache_dtype,
+                                   max_entries=args.embedding_cache_max_entries)
+    # OpenSearch Serverless vector collections assign their own document ids, so batches go one at a time
+    with_ids = 'aoss.amazonaws.com' not in args.endpoint
+    
+    summary = ingest(args.corpus_path, client, embedder, args.checkpoint,
+                     batch_size=args.batch_size, max_in_flight=args.max_in_flight, with_ids=with_ids)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == '__main__':
+    main()
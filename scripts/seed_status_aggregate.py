@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Seed the status aggregate with SanchaarContent records written before the
+content table stream was enabled
+
+The status aggregator only counts changes it reads from the stream, so run
+this once, right after deploying the stream and while the pipeline is quiet:
+records that change during the scan are counted by both. The seed is applied
+as one marked batch, so re-running it within a day with the same --seed-id
+is a no-op.
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+
+import boto3
+
+LAYER_DIR = Path(__file__).resolve().parent.parent / 'infrastructure' / 'sam' / 'layers' / 'common'
+sys.path.insert(0, str(LAYER_DIR))
+
+from sanchaar_common import status_aggregate  # noqa: E402
+
+def scan_counters(client, table):
+    counters = Counter()
+    counts = {'scanned': 0, 'records': 0}
+    request = {
+        'TableName': table,
+        'ProjectionExpression': '#status, delivery_counts',
+        'ExpressionAttributeNames': {'#status': 'status'}
+    }
+    while True:
+        response = client.scan(**request)
+        for item in response['Items']:
+            counts['scanned'] += 1
+            # Chunk items of compressed records carry no status and contribute nothing
+            if 'status' in item:
+                counts['records'] += 1
+                counters.update(status_aggregate.contribution(status_aggregate.image_attributes(item)))
+        if 'LastEvaluatedKey' not in response:
+            return {name: count for name, count in counters.items() if count}, counts
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the status aggregate from existing content records')
+    parser.add_argument('--table', required=True, help='Content table name, e.g. SanchaarContent-dev')
+    parser.add_argument('--aggregate-table', required=True, help='e.g. SanchaarStatusAggregate-dev')
+    parser.add_argument('--seed-id', default='seed', help='Marker of this seed; the same id is applied once')
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    client = boto3.client('dynamodb', endpoint_url=args.endpoint_url)
+    counters, counts = scan_counters(client, args.table)
+    applied = False
+    if counters and not args.dry_run:
+        # Apply through the same endpoint as the scan
+        status_aggregate._clients['dynamodb'] = client
+        applied = status_aggregate.apply_batch(args.seed_id, counters, {}, table=args.aggregate_table)
+    print(json.dumps({**counts, 'counters': counters, 'applied': applied}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Import SAM function modules for tests, as benchmarks/_lambda.py does
+"""
+import importlib
+import importlib.util
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FUNCTIONS_DIR = REPO_ROOT / 'infrastructure' / 'sam' / 'functions'
+LAYERS_DIR = REPO_ROOT / 'infrastructure' / 'sam' / 'layers'
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+DEFAULT_ENV = {
+    'AWS_DEFAULT_REGION': 'ap-south-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'CONTENT_TABLE': 'SanchaarContent-test',
+    'OUTPUT_BUCKET': 'sanchaar-output-test',
+    'INGESTION_BUCKET': 'sanchaar-ingestion-test'
+}
+
+
+def function_module(function, module):
+    """Import functions/<function>/<module>.py with its siblings importable"""
+    function_dir = str(FUNCTIONS_DIR / function)
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+    return importlib.import_module(module)
+
+
+def load_function(name):
+    """Import functions/<name>/app.py as a fresh module"""
+    function_dir = FUNCTIONS_DIR / name
+    if str(function_dir) not in sys.path:
+        sys.path.insert(0, str(function_dir))
+    spec = importlib.util.spec_from_file_location(f'{name}_app', function_dir / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,15 @@
+"""
+Settings shared by every test: moto-safe AWS configuration and the Lambda
+layers on the import path, as they are mounted for every function
+"""
+import os
+import sys
+
+from _lambda import DEFAULT_ENV, LAYERS_DIR
+
+for key, value in DEFAULT_ENV.items():
+    os.environ.setdefault(key, value)
+
+for layer_dir in sorted(LAYERS_DIR.iterdir()):
+    if layer_dir.is_dir() and str(layer_dir) not in sys.path:
+        sys.path.append(str(layer_dir))
@@ -0,0 +1,107 @@
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from sanchaar_common import admission
+
+TABLE = 'SanchaarAdmission-test'
+
+
+class StepFunctions:
+    def __init__(self):
+        self.resumed = []
+
+    def send_task_success(self, taskToken, output):
+        self.resumed.append(taskToken)
+
+
+class RacingGrant:
+    """
+    DynamoDB client on which the first grant loses the counter to another
+    execution's lease, released again while the request is claimed, so the
+    release's dispatch finds the queue empty
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.raced = False
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def transact_write_items(self, TransactItems):
+        if not self.raced:
+            self.raced = True
+            other = admission.try_acquire('transcreation', 'standard', table=TABLE)
+            admission.release_and_dispatch(other, table=TABLE)
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException'},
+                               'CancellationReasons': [{'Code': 'TransactionConflict'}, {'Code': 'None'}]},
+                              'TransactWriteItems')
+        return self.client.transact_write_items(TransactItems=TransactItems)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_CAPACITY', {'transcreation': 1})
+    with mock_aws():
+        dynamodb = boto3.client('dynamodb')
+        dynamodb.create_table(
+            TableName=TABLE,
+            BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': 'resource', 'AttributeType': 'S'},
+                                  {'AttributeName': 'slot', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'resource', 'KeyType': 'HASH'},
+                       {'AttributeName': 'slot', 'KeyType': 'RANGE'}]
+        )
+        stepfunctions = StepFunctions()
+        monkeypatch.setattr(admission, '_clients', {'dynamodb': dynamodb, 'stepfunctions': stepfunctions})
+        yield dynamodb, stepfunctions
+
+
+def waiting(table=TABLE):
+    return [waiter['task_token'] for waiter in admission.query_slots('transcreation', admission.WAIT_PREFIX, table)]
+
+
+def test_denied_request_stays_queued_until_a_release(queue):
+    dynamodb, stepfunctions = queue
+    admission.enqueue('transcreation', 'standard', 'first', table=TABLE)
+    admission.enqueue('transcreation', 'standard', 'second', table=TABLE)
+
+    first, = admission.dispatch('transcreation', table=TABLE)
+    assert stepfunctions.resumed == ['first'] and waiting() == ['second']
+
+    admission.release_and_dispatch(first, table=TABLE)
+    assert stepfunctions.resumed == ['first', 'second'] and waiting() == []
+    assert admission.in_flight('transcreation', TABLE) == 1
+
+
+def test_request_denied_while_a_release_dispatches_is_not_stranded(queue, monkeypatch):
+    dynamodb, stepfunctions = queue
+    admission.enqueue('transcreation', 'standard', 'waiter', table=TABLE)
+    monkeypatch.setitem(admission._clients, 'dynamodb', RacingGrant(dynamodb))
+
+    # The release's dispatch saw no queue, so the denied dispatcher grants the freed slot
+    grant, = admission.dispatch('transcreation', table=TABLE)
+    assert stepfunctions.resumed == ['waiter'] and waiting() == []
+    assert grant['priority'] == 'standard' and admission.in_flight('transcreation', TABLE) == 1
+
+
+class ThrottledStepFunctions(StepFunctions):
+    def send_task_success(self, taskToken, output):
+        raise ClientError({'Error': {'Code': 'ThrottlingException'}}, 'SendTaskSuccess')
+
+
+def test_request_stays_queued_when_resuming_it_fails(queue, monkeypatch):
+    dynamodb, stepfunctions = queue
+    admission.enqueue('transcreation', 'standard', 'waiter', table=TABLE)
+    monkeypatch.setitem(admission._clients, 'stepfunctions', ThrottledStepFunctions())
+
+    with pytest.raises(ClientError):
+        admission.dispatch('transcreation', table=TABLE)
+    assert waiting() == ['waiter'] and admission.in_flight('transcreation', TABLE) == 0
+
+    # The next dispatch grants it once Step Functions answers again
+    monkeypatch.setitem(admission._clients, 'stepfunctions', stepfunctions)
+    grant, = admission.dispatch('transcreation', table=TABLE)
+    assert stepfunctions.resumed == ['waiter'] and waiting() == []
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import function_module
+
+analysis = function_module('media_convert', 'analysis')
+
+BUCKET = 'sanchaar-ingestion-test'
+VIDEO_KEY = 'media-uploads/video/clip.mp4'
+
+# Reports a 10 s input when probed and writes a fake JPEG when asked for a frame
+FAKE_FFMPEG = """#!/bin/sh
+case "$*" in
+  *pipe:1*) printf 'jpeg-frame' ;;
+  *) echo '  Duration: 00:00:10.00, start: 0.000000, bitrate: 800 kb/s' >&2; exit 1 ;;
+esac
+"""
+
+
+class Rekognition:
+    def __init__(self, latency=0.0):
+        self.images = []
+        self.latency = latency
+
+    def detect_faces(self, Image, **kwargs):
+        time.sleep(self.latency)
+        self.images.append(Image)
+        return {'FaceDetails': []}
+
+    def detect_text(self, Image):
+        return {'TextDetections': []}
+
+    def detect_moderation_labels(self, Image, MinConfidence):
+        return {'ModerationLabels': []}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(analysis, 'ANALYSIS_CACHE_BUCKET', None)
+    monkeypatch.setattr(analysis, '_memory_cache', analysis.AnalysisCache(8))
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': 'ap-south-1'})
+        client.put_object(Bucket=BUCKET, Key=VIDEO_KEY, Body=b'video')
+        yield client
+
+
+def test_stored_keyframes_are_sampled_evenly(s3):
+    for number in range(9):
+        s3.put_object(Bucket=BUCKET, Key=f'keyframes/{VIDEO_KEY}/frame-{number}.jpg', Body=b'jpeg')
+    rekognition = Rekognition()
+    result = analysis.analyze_content(BUCKET, VIDEO_KEY, rekognition=rekognition, s3=s3)
+
+    names = [image['S3Object']['Name'] for image in rekognition.images]
+    assert sorted(names) == [f'keyframes/{VIDEO_KEY}/frame-{number}.jpg' for number in (0, 2, 4, 6, 8)]
+    assert result['frames_analyzed'] == 5
+
+
+def test_video_frames_are_extracted_with_ffmpeg(s3, tmp_path, monkeypatch):
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+    monkeypatch.setattr(analysis, 'FFMPEG_PATH', str(ffmpeg))
+
+    frames = analysis.sample_keyframes(s3, BUCKET, VIDEO_KEY)
+    assert [name for name, _ in frames] == [f'{VIDEO_KEY}@{second}.000s' for second in (1, 3, 5, 7, 9)]
+    assert all(image == {'Bytes': b'jpeg-frame'} for _, image in frames)
+
+
+def test_video_is_never_sent_to_the_image_apis(s3, monkeypatch):
+    monkeypatch.setattr(analysis, 'FFMPEG_PATH', '/nonexistent/ffmpeg')
+    rekognition = Rekognition()
+    with pytest.raises(ValueError, match='no ffmpeg'):
+        analysis.analyze_content(BUCKET, VIDEO_KEY, rekognition=rekognition, s3=s3)
+    assert rekognition.images == []
+
+
+def test_memory_cache_keeps_the_most_recently_used_analyses():
+    cache = analysis.AnalysisCache(2)
+    cache.put('a', {'n': 1})
+    cache.put('b', {'n': 2})
+    assert cache.get('a') == {'n': 1}
+    cache.put('c', {'n': 3})
+    assert len(cache) == 2 and cache.get('b') is None and cache.get('a') == {'n': 1}
+
+
+def test_concurrent_requests_for_one_object_analyze_it_once(s3):
+    s3.put_object(Bucket=BUCKET, Key=f'keyframes/{VIDEO_KEY}/frame-0.jpg', Body=b'jpeg')
+    rekognition = Rekognition(latency=0.2)
+    results = []
+
+    def analyze():
+        results.append(analysis.analyze_content(BUCKET, VIDEO_KEY, rekognition=rekognition, s3=s3))
+
+    threads = [threading.Thread(target=analyze) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(rekognition.images) == 1
+    assert sorted(result['cache_hit'] for result in results) == [False, True, True, True]
+
+
+def test_sibling_invocation_analyzing_the_object_is_waited_for(s3, monkeypatch):
+    monkeypatch.setattr(analysis, 'ANALYSIS_CACHE_BUCKET', BUCKET)
+    monkeypatch.setattr(analysis, 'ANALYSIS_POLL_SECONDS', 0.01)
+    etag = s3.head_object(Bucket=BUCKET, Key=VIDEO_KEY)['ETag'].strip('"')
+    cache_key = analysis.analysis_cache_key(BUCKET, VIDEO_KEY, etag)
+    s3.put_object(Bucket=BUCKET, Key=analysis.pending_key(cache_key), Body=b'')
+
+    def sibling_finishes():
+        time.sleep(0.1)
+        s3.put_object(Bucket=BUCKET, Key=f'{analysis.ANALYSIS_CACHE_PREFIX}{cache_key}.json',
+                      Body=json.dumps({'frames_analyzed': 5}).encode('utf-8'))
+        s3.delete_object(Bucket=BUCKET, Key=analysis.pending_key(cache_key))
+
+    threading.Thread(target=sibling_finishes).start()
+    rekognition = Rekognition()
+    result = analysis.analyze_content(BUCKET, VIDEO_KEY, rekognition=rekognition, s3=s3)
+    assert result == {'frames_analyzed': 5, 'cache_hit': True} and rekognition.images == []
@@ -0,0 +1,218 @@
+import json
+import math
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, function_module
+
+cache = function_module('transcreation_cache', 'cache')
+encode_cache = function_module('media_convert', 'encode_cache')
+profiles = function_module('media_convert', 'profiles')
+
+TABLE = 'SanchaarTranscreationCache-test'
+OUTPUT_BUCKET = DEFAULT_ENV['OUTPUT_BUCKET']
+NOW = 1_800_000_000
+
+
+class FixedEmbedder:
+    """Embedder with hand-picked vectors, so each test sets the cosine it needs"""
+
+    model_id = 'fixed-2'
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed(self, texts):
+        return [self.vectors[text] for text in texts]
+
+
+def at_angle(cosine):
+    return [cosine, math.sqrt(1 - cosine ** 2)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [NOW]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def dynamodb():
+    with mock_aws():
+        client = boto3.client('dynamodb')
+        client.create_table(
+            TableName=TABLE,
+            BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': 'partition', 'AttributeType': 'S'},
+                                  {'AttributeName': 'text_hash', 'AttributeType': 'S'},
+                                  {'AttributeName': 'created_at', 'AttributeType': 'N'}],
+            KeySchema=[{'AttributeName': 'partition', 'KeyType': 'HASH'},
+                       {'AttributeName': 'text_hash', 'KeyType': 'RANGE'}],
+            GlobalSecondaryIndexes=[{
+                'IndexName': cache.CREATED_INDEX,
+                'KeySchema': [{'AttributeName': 'partition', 'KeyType': 'HASH'},
+                              {'AttributeName': 'created_at', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }]
+        )
+        yield client
+
+
+def make_cache(dynamodb, vectors, **kwargs):
+    return cache.TranscreationCache(TABLE, FixedEmbedder(vectors), client=dynamodb, **kwargs)
+
+
+def stored(text, language='hi'):
+    return {'language': language, 'source_text': text, 'transcreation': f'[{language}] {text}', 'tokens': 100}
+
+
+def test_exact_hit_ignores_whitespace(dynamodb, clock):
+    transcreations = make_cache(dynamodb, {'Diwali sale today': [1.0, 0.0]})
+    transcreations.store('brand', [stored('Diwali sale today')])
+
+    result, = transcreations.lookup('brand', [{'language': 'hi', 'source_text': '  Diwali   sale today '}])
+    assert result['match'] == cache.MATCH_EXACT and result['similarity'] == 1.0
+    assert result['transcreation'] == '[hi] Diwali sale today'
+
+
+def test_semantic_hit_needs_the_similarity_threshold(dynamodb, clock):
+    transcreations = make_cache(dynamodb, {
+        'Diwali sale today': [1.0, 0.0],
+        'Diwali sale starts today': at_angle(0.96),
+        'Pongal offers this week': at_angle(0.90)
+    }, threshold=0.95)
+    transcreations.store('brand', [stored('Diwali sale today')])
+
+    close, far = transcreations.lookup('brand', [{'language': 'hi', 'source_text': 'Diwali sale starts today'},
+                                                 {'language': 'hi', 'source_text': 'Pongal offers this week'}])
+    assert close['match'] == cache.MATCH_SEMANTIC and close['similarity'] >= 0.95
+    assert close['transcreation'] == '[hi] Diwali sale today'
+    assert far is None
+
+
+def test_other_languages_do_not_match(dynamodb, clock):
+    transcreations = make_cache(dynamodb, {'Diwali sale today': [1.0, 0.0]})
+    transcreations.store('brand', [stored('Diwali sale today', language='hi')])
+    assert transcreations.lookup('brand', [{'language': 'ta', 'source_text': 'Diwali sale today'}]) == [None]
+
+
+def test_entries_expire_after_the_ttl_unless_hit(dynamodb, clock):
+    transcreations = make_cache(dynamodb, {'kept': [1.0, 0.0], 'expired': [0.0, 1.0]}, ttl_days=1)
+    transcreations.store('brand', [stored('kept'), stored('expired')])
+
+    # A hit pushes the TTL out from the time of the hit
+    clock[0] += 20 * 3600
+    assert transcreations.lookup('brand', [{'language': 'hi', 'source_text': 'kept'}])[0] is not None
+
+    clock[0] += 10 * 3600
+    kept, expired = transcreations.lookup('brand', [{'language': 'hi', 'source_text': 'kept'},
+                                                    {'language': 'hi', 'source_text': 'expired'}])
+    assert kept is not None and expired is None
+
+
+def test_partitions_are_trimmed_to_the_least_recently_used(dynamodb, clock):
+    vectors = {text: at_angle(cosine) for text, cosine in
+               (('first', 0.1), ('second', 0.4), ('third', 0.7), ('fourth', 0.99))}
+    transcreations = make_cache(dynamodb, vectors, max_entries=3, touch_interval=60)
+    for text in ('first', 'second', 'third'):
+        clock[0] += 60
+        transcreations.store('brand', [stored(text)])
+
+    # Reading "first" makes "second" the least recently used
+    clock[0] += 60
+    transcreations.lookup('brand', [{'language': 'hi', 'source_text': 'first'}])
+    clock[0] += 60
+    assert transcreations.store('brand', [stored('fourth')]) == 1
+
+    remaining = dynamodb.scan(TableName=TABLE)['Items']
+    assert sorted(item['source_text']['S'] for item in remaining) == ['first', 'fourth', 'third']
+
+
+class CountingClient:
+    """DynamoDB client that counts the calls made through it"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            self.calls.append((name, kwargs.get('IndexName')))
+            return getattr(self.client, name)(**kwargs)
+        return call
+
+
+def test_held_partitions_are_refreshed_from_entries_created_since(dynamodb, clock):
+    vectors = {'Diwali sale today': [1.0, 0.0], 'Pongal offers': [0.0, 1.0], 'Pongal offers now': at_angle(0.0)}
+    counting = CountingClient(dynamodb)
+    warm = cache.TranscreationCache(TABLE, FixedEmbedder(vectors), client=counting)
+    warm.store('brand', [stored('Diwali sale today')])
+    assert warm.lookup('brand', [{'language': 'hi', 'source_text': 'Pongal offers now'}]) == [None]
+
+    # Another container caches an entry; this one keeps its partition until the refresh interval
+    make_cache(dynamodb, vectors).store('brand', [stored('Pongal offers')])
+    counting.calls.clear()
+    clock[0] += 10
+    assert warm.lookup('brand', [{'language': 'hi', 'source_text': 'Pongal offers now'}]) == [None]
+    assert ('query', None) not in counting.calls
+
+    clock[0] += cache.PARTITION_REFRESH_SECONDS
+    counting.calls.clear()
+    hit, = warm.lookup('brand', [{'language': 'hi', 'source_text': 'Pongal offers now'}])
+    assert hit['match'] == cache.MATCH_SEMANTIC and hit['transcreation'] == '[hi] Pongal offers'
+    assert ('query', cache.CREATED_INDEX) in counting.calls and ('query', None) not in counting.calls
+
+
+def test_hits_are_touched_at_most_once_per_interval(dynamodb, clock):
+    counting = CountingClient(dynamodb)
+    transcreations = cache.TranscreationCache(TABLE, FixedEmbedder({'Diwali sale today': [1.0, 0.0]}),
+                                              client=counting, touch_interval=3600)
+    transcreations.store('brand', [stored('Diwali sale today')])
+    request = [{'language': 'hi', 'source_text': 'Diwali sale today'}]
+
+    touches = []
+    for _ in range(3):
+        clock[0] += 1800
+        counting.calls.clear()
+        assert transcreations.lookup('brand', request)[0] is not None
+        touches.append(sum(1 for name, _ in counting.calls if name == 'update_item'))
+    assert touches == [0, 1, 0]
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=OUTPUT_BUCKET, CreateBucketConfiguration={'LocationConstraint': 'ap-south-1'})
+        yield client
+
+
+class MediaConvert:
+    def __init__(self, status):
+        self.status = status
+        self.calls = 0
+
+    def get_job(self, Id):
+        self.calls += 1
+        return {'Job': {'Id': Id, 'Status': self.status}}
+
+
+def test_encode_manifest_is_persisted_complete_once_outputs_exist(s3):
+    profile = profiles.get_profile('progressive')
+    outputs = {'9:16': {'video': f's3://{OUTPUT_BUCKET}/9:16/abc/video.mp4', 'stream': None}}
+    encode_cache.record('abc', outputs, 'job-1', profile, s3=s3)
+
+    running = MediaConvert('PROGRESSING')
+    hits, misses = encode_cache.lookup('abc', ['9:16'], profile, s3=s3, mediaconvert=running)
+    assert hits['9:16']['status'] == encode_cache.STATUS_SUBMITTED and running.calls == 1
+
+    s3.put_object(Bucket=OUTPUT_BUCKET, Key='9:16/abc/video.mp4', Body=b'mp4')
+    hits, misses = encode_cache.lookup('abc', ['9:16'], profile, s3=s3, mediaconvert=running)
+    assert hits['9:16']['status'] == encode_cache.STATUS_COMPLETE
+
+    key = encode_cache.manifest_key('abc', '9:16', profile)
+    manifest = json.loads(s3.get_object(Bucket=OUTPUT_BUCKET, Key=key)['Body'].read())
+    assert manifest['status'] == encode_cache.STATUS_COMPLETE
@@ -0,0 +1,82 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, load_function
+
+OUTPUT_BUCKET = DEFAULT_ENV['OUTPUT_BUCKET']
+INGESTION_BUCKET = DEFAULT_ENV['INGESTION_BUCKET']
+CONTENT_ID = '6f1c1d2e-4b7a-4f7e-9d55-0c3e2f9a8b10'
+UPLOAD = {'bucket': INGESTION_BUCKET, 'key': f'voice/user-1/{CONTENT_ID}.mp3',
+          'content_id': CONTENT_ID, 'version': 1}
+
+
+class Transcribe:
+    def __init__(self):
+        self.jobs = []
+
+    def start_transcription_job(self, TranscriptionJobName, **kwargs):
+        self.jobs.append(TranscriptionJobName)
+
+
+class Ffmpeg:
+    """Stand-in for the audio helpers recording which sources ffmpeg was pointed at"""
+
+    def __init__(self, duration, silences=()):
+        self.duration = duration
+        self.silences = list(silences)
+        self.sources = []
+
+    def probe_duration(self, source):
+        self.sources.append(('probe', source))
+        return self.duration
+
+    def analyze_audio(self, source):
+        self.sources.append(('analyze', source))
+        return self.duration, self.silences
+
+    def extract_chunk(self, source, start, end, output_path):
+        self.sources.append(('extract', source))
+        with open(output_path, 'wb') as chunk:
+            chunk.write(b'fLaC')
+        return output_path
+
+
+@pytest.fixture
+def app(monkeypatch):
+    with mock_aws():
+        s3 = boto3.client('s3')
+        for bucket in (OUTPUT_BUCKET, INGESTION_BUCKET):
+            s3.create_bucket(Bucket=bucket, CreateBucketConfiguration={'LocationConstraint': 'ap-south-1'})
+        s3.put_object(Bucket=INGESTION_BUCKET, Key=UPLOAD['key'], Body=b'ID3' + b'\0' * 1024)
+        module = load_function('voice_processor')
+        module.s3 = s3
+        module.transcribe = Transcribe()
+        monkeypatch.setattr(module.audio, 'ffmpeg_available', lambda: True)
+        monkeypatch.setattr(s3, 'download_file', None)
+        yield module
+
+
+def use_ffmpeg(app, monkeypatch, ffmpeg):
+    for name in ('probe_duration', 'analyze_audio', 'extract_chunk'):
+        monkeypatch.setattr(app.audio, name, getattr(ffmpeg, name))
+
+
+def test_short_recording_is_only_probed(app, monkeypatch):
+    ffmpeg = Ffmpeg(duration=120)
+    use_ffmpeg(app, monkeypatch, ffmpeg)
+
+    assert app.start_chunked_transcription(UPLOAD, f'sanchaar-{CONTENT_ID}') is None
+    (step, source), = ffmpeg.sources
+    assert step == 'probe' and source.startswith('https://') and app.transcribe.jobs == []
+
+
+def test_long_recording_is_chunked_from_the_presigned_url(app, monkeypatch):
+    ffmpeg = Ffmpeg(duration=1500, silences=[(590, 591), (1190, 1191)])
+    use_ffmpeg(app, monkeypatch, ffmpeg)
+
+    chunks = app.start_chunked_transcription(UPLOAD, f'sanchaar-{CONTENT_ID}')
+    assert chunks == len(app.transcribe.jobs) > 1
+    assert {source for _, source in ffmpeg.sources} == {ffmpeg.sources[0][1]}
+    keys = [obj['Key'] for obj in app.s3.list_objects_v2(Bucket=OUTPUT_BUCKET)['Contents']]
+    assert f'transcription-chunks/{CONTENT_ID}/plan.json' in keys
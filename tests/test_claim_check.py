@@ -0,0 +1,49 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV
+from sanchaar_common import claim_check
+
+OUTPUT_BUCKET = DEFAULT_ENV['OUTPUT_BUCKET']
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=OUTPUT_BUCKET, CreateBucketConfiguration={'LocationConstraint': 'ap-south-1'})
+        monkeypatch.setattr(claim_check, '_s3', client)
+        monkeypatch.setattr(claim_check, '_resolved', claim_check.ResolvedCache(1000))
+        yield client
+
+
+def test_cache_evicts_least_recently_used_payloads_by_size():
+    cache = claim_check.ResolvedCache(100)
+    cache.put('a', 'A', 40)
+    cache.put('b', 'B', 40)
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 40)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c'), cache.bytes) == ('A', 'C', 80)
+
+    # A payload larger than the whole budget is never kept
+    cache.put('d', 'D', 101)
+    assert cache.get('d') is None and cache.bytes == 80
+
+
+def test_resolve_reads_s3_once_while_the_payload_stays_cached(s3):
+    reference = claim_check.offload({'rows': ['x' * 50] * 5}, 'test', threshold=10)
+    claim_check._resolved.clear()
+    fetched = []
+    s3.meta.events.register('before-call.s3.GetObject', lambda **kwargs: fetched.append(1))
+
+    assert claim_check.resolve(reference) == {'rows': ['x' * 50] * 5}
+    assert claim_check.resolve(reference) == {'rows': ['x' * 50] * 5}
+    assert len(fetched) == 1
+
+    # Payloads pushed out by newer ones are fetched again
+    claim_check.offload({'rows': ['y' * 50] * 15}, 'test', threshold=10)
+    claim_check.resolve(reference)
+    assert len(fetched) == 2
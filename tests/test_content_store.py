@@ -0,0 +1,90 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from sanchaar_common import content_store
+from sanchaar_common.delivery_outcome import delivery_counts
+
+TABLE = 'SanchaarContent-test'
+BUCKET = 'sanchaar-output-test'
+CONTENT_ID = '6f1c1d2e-4b7a-4f7e-9d55-0c3e2f9a8b10'
+VERSION = 1_800_000_000
+
+
+class FailingHead:
+    """DynamoDB client whose head write fails after the chunks went through"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def put_item(self, **kwargs):
+        raise RuntimeError('head write failed')
+
+    def transact_write_items(self, **kwargs):
+        raise RuntimeError('head write failed')
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    # Small budgets so a few KB of random payload needs chunks and S3
+    monkeypatch.setattr(content_store, 'HEAD_PAYLOAD_BYTES', 1024)
+    monkeypatch.setattr(content_store, 'CHUNK_BYTES', 1024)
+    monkeypatch.setattr(content_store, 'CONTENT_OVERFLOW_BYTES', 8 * 1024)
+    with mock_aws():
+        dynamodb = boto3.client('dynamodb')
+        dynamodb.create_table(
+            TableName=TABLE,
+            BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': 'content_id', 'AttributeType': 'S'},
+                                  {'AttributeName': 'version', 'AttributeType': 'N'}],
+            KeySchema=[{'AttributeName': 'content_id', 'KeyType': 'HASH'},
+                       {'AttributeName': 'version', 'KeyType': 'RANGE'}]
+        )
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': 'ap-south-1'})
+        yield dynamodb, s3
+
+
+def payloads():
+    # Random hex does not compress, so the encoded sizes follow the lengths
+    return {'chunked': os.urandom(2 * 1024).hex(), 'overflow': os.urandom(8 * 1024).hex()}
+
+
+def test_chunked_record_is_written_in_one_transaction(aws):
+    dynamodb, s3 = aws
+    store = content_store.ContentStore(TABLE, client=dynamodb, s3=s3, bucket=BUCKET)
+    values = payloads()
+    summary = store.put_record(CONTENT_ID, VERSION, {'status': 'completed'}, values)
+
+    assert 'chunks' in summary['layout']['chunked'] and 's3' in summary['layout']['overflow']
+    assert store.get_record(CONTENT_ID, VERSION, consistent=True) == dict(values, content_id=CONTENT_ID,
+                                                                          version=VERSION, status='completed')
+
+
+@pytest.mark.parametrize('transact_items', [100, 1])
+def test_failed_head_write_removes_its_chunks_and_objects(aws, monkeypatch, transact_items):
+    dynamodb, s3 = aws
+    monkeypatch.setattr(content_store, 'TRANSACT_MAX_ITEMS', transact_items)
+    store = content_store.ContentStore(TABLE, client=FailingHead(dynamodb), s3=s3, bucket=BUCKET)
+    with pytest.raises(RuntimeError, match='head write failed'):
+        store.put_record(CONTENT_ID, VERSION, {'status': 'completed'}, payloads())
+
+    assert dynamodb.scan(TableName=TABLE)['Items'] == []
+    assert s3.list_objects_v2(Bucket=BUCKET).get('KeyCount') == 0
+
+
+def test_delivery_counts_split_by_platform_language_and_outcome():
+    results = [
+        {'platform': 'whatsapp', 'result': [{'language': 'hi', 'status': 200},
+                                            {'language': 'hi', 'status': 200, 'error': 'template rejected'},
+                                            {'language': 'ta', 'status': 429}]},
+        {'platform': 'instagram', 'result': [{'language': 'hi', 'status': 201}]},
+        {'platform': 'sms', 'error': 'no result rows'}
+    ]
+    assert delivery_counts(results) == {'whatsapp#hi#delivered': 1, 'whatsapp#hi#failed': 1,
+                                        'whatsapp#ta#failed': 1, 'instagram#hi#delivered': 1}
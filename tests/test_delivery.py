@@ -0,0 +1,60 @@
+import pytest
+
+from _lambda import function_module
+
+delivery = function_module('platform_distributor', 'delivery')
+throttle = function_module('platform_distributor', 'throttle')
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def json(self):
+        return {}
+
+
+class ScriptedSession:
+    """Session answering each request with the next status of a script"""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return Response(self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0])
+
+
+def engine_for(session):
+    limiter = throttle.RateLimiter({'whatsapp': {'rate': 1000, 'burst': 1000}})
+    engine = delivery.DeliveryEngine('whatsapp', limiter=limiter, deadline=throttle.Deadline(5))
+    engine.session = session
+    return engine
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(delivery, 'backoff_seconds', lambda attempt: 0.0)
+
+
+@pytest.mark.parametrize('status', [500, 502, 504])
+def test_post_is_not_resent_after_a_server_error(status):
+    session = ScriptedSession([status, 200])
+    assert engine_for(session).post('https://graph.test/messages').status_code == status
+    assert session.calls == 1
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_post_is_resent_when_the_platform_did_not_accept_it(status):
+    session = ScriptedSession([status, 200])
+    assert engine_for(session).post('https://graph.test/messages').status_code == 200
+    assert session.calls == 2
+
+
+def test_idempotent_calls_are_resent_after_a_server_error():
+    session = ScriptedSession([502, 200])
+    assert engine_for(session).get('https://graph.test/status').status_code == 200
+    session = ScriptedSession([502, 200])
+    assert engine_for(session).post('https://graph.test/media', idempotent=True).status_code == 200
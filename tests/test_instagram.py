@@ -0,0 +1,104 @@
+import pytest
+import requests
+
+from _lambda import function_module
+from sanchaar_common.delivery_outcome import is_delivered
+
+instagram = function_module('platform_distributor', 'instagram')
+delivery = function_module('platform_distributor', 'delivery')
+throttle = function_module('platform_distributor', 'throttle')
+
+BASE_URL = 'https://graph.test/v18.0'
+
+
+class Response:
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class GraphSession:
+    """Graph API stand-in: containers c0..cn, statuses from a script of poll results"""
+
+    def __init__(self, polls, publish_error=None):
+        self.polls = list(polls)
+        self.publish_error = publish_error
+        self.created = 0
+        self.published = []
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if url.endswith('/media'):
+            container_id = f'c{self.created}'
+            self.created += 1
+            return Response({'id': container_id})
+        if url.endswith('/media_publish'):
+            if self.publish_error:
+                raise self.publish_error
+            self.published.append(data['creation_id'])
+            return Response({'id': f"m-{data['creation_id']}"})
+        poll = self.polls.pop(0) if len(self.polls) > 1 else self.polls[0]
+        if isinstance(poll, Exception):
+            raise poll
+        return Response({cid: {'status_code': poll.get(cid, 'IN_PROGRESS')} for cid in params['ids'].split(',')})
+
+
+def engine_for(session, budget=0.5):
+    limiter = throttle.RateLimiter({'instagram': {'rate': 1000, 'burst': 1000}})
+    engine = delivery.DeliveryEngine('instagram', max_in_flight=4, limiter=limiter,
+                                     deadline=throttle.Deadline(budget))
+    engine.session = session
+    return engine
+
+
+def publish(mode, session, variants=3, budget=0.5):
+    publisher = instagram.publish_pipelined if mode == 'pipelined' else instagram.publish_sequential
+    return publisher(engine_for(session, budget), [{'language': f'l{n}'} for n in range(variants)],
+                     lambda variant: {'caption': variant['language']}, BASE_URL, 'ig-user', 'token',
+                     lambda variant: {'language': variant['language']})
+
+
+@pytest.fixture(autouse=True)
+def fast_polls(monkeypatch):
+    monkeypatch.setattr(instagram, 'POLL_INTERVAL_SECONDS', 0.01)
+    monkeypatch.setattr(instagram, 'POLL_MAX_INTERVAL_SECONDS', 0.02)
+
+
+def test_pipelined_publishes_every_finished_container():
+    session = GraphSession([{'c0': 'FINISHED'}, {'c1': 'FINISHED', 'c2': 'FINISHED'}])
+    rows = publish('pipelined', session)
+    assert [row['media_id'] for row in rows] == ['m-c0', 'm-c1', 'm-c2']
+    assert all(is_delivered(row) for row in rows)
+
+
+def test_poll_connection_error_fails_only_unsettled_rows():
+    # c0 finishes on the first poll, then the status endpoint goes away
+    session = GraphSession([{'c0': 'FINISHED'}, requests.ConnectionError('connection reset')])
+    rows = publish('pipelined', session)
+
+    assert [row['language'] for row in rows] == ['l0', 'l1', 'l2']
+    assert rows[0]['media_id'] == 'm-c0' and is_delivered(rows[0])
+    for row in rows[1:]:
+        assert row['container_id'] in ('c1', 'c2')
+        assert 'connection reset' in row['error']
+        assert not is_delivered(row)
+    assert session.published == ['c0']
+
+
+def test_poll_deadline_marks_unsettled_rows_timed_out():
+    session = GraphSession([{'c0': 'FINISHED', 'c1': 'ERROR'},
+                            throttle.DeadlineExceeded('Rate limit wait exceeds the time budget')])
+    rows = publish('pipelined', session)
+    assert rows[0]['media_id'] == 'm-c0'
+    assert rows[1]['error'] == 'Container processing ERROR'
+    assert rows[2]['container_id'] == 'c2' and 'time budget' in rows[2]['error']
+
+
+def test_sequential_keeps_container_id_when_publish_fails():
+    session = GraphSession([{'c0': 'FINISHED'}], publish_error=requests.ConnectionError('publish reset'))
+    rows = publish('sequential', session, variants=1)
+    assert rows[0]['container_id'] == 'c0'
+    assert 'publish reset' in rows[0]['error']
@@ -0,0 +1,28 @@
+import boto3
+import pytest
+from botocore.exceptions import ParamValidationError
+from moto import mock_aws
+
+from sanchaar_common import instrumentation
+
+
+@pytest.fixture
+def subsegments(monkeypatch):
+    opened = []
+    monkeypatch.setattr(instrumentation, 'begin_subsegment', lambda name, *args: opened.append(name) or name)
+    monkeypatch.setattr(instrumentation, 'end_subsegment', lambda subsegment, exc=None: opened.remove(subsegment))
+    monkeypatch.setattr(instrumentation, '_records', [])
+    return opened
+
+
+def test_call_failing_validation_leaves_no_open_subsegment(subsegments):
+    with mock_aws():
+        s3 = instrumentation.instrument_boto3(boto3.session.Session()).client('s3', region_name='ap-south-1')
+        with pytest.raises(ParamValidationError):
+            s3.get_object(Bucket='sanchaar-output-test')
+        assert subsegments == [] and instrumentation._records == []
+
+        s3.list_buckets()
+    assert subsegments == []
+    (operation, _, _, _, error), = instrumentation._records
+    assert operation == 's3.ListBuckets' and not error
@@ -0,0 +1,53 @@
+"""
+Golden MediaConvert job settings for every packaging, aspect ratio and
+caption mode. Regenerate the fixtures after an intended change with
+
+    UPDATE_GOLDEN=1 python -m pytest tests/test_job_settings.py
+"""
+import json
+import os
+
+import pytest
+
+from _lambda import FIXTURES_DIR, function_module
+
+job_settings = function_module('media_convert', 'job_settings')
+profiles = function_module('media_convert', 'profiles')
+
+GOLDEN_DIR = FIXTURES_DIR / 'job_settings'
+MEDIA_URI = 's3://sanchaar-ingestion-test/uploads/clip.mp4'
+OUTPUT_BUCKET = 'sanchaar-output-test'
+SOURCE_HASH = '0123456789abcdef0123456789abcdef'
+
+PACKAGINGS = {'hls': 'bharat-abr', 'cmaf': 'bharat-cmaf'}
+TRACKS = [
+    {'language': language,
+     'srt_uri': f's3://{OUTPUT_BUCKET}/subtitles/0011223344556677/{language}.srt',
+     'vtt_uri': f's3://{OUTPUT_BUCKET}/subtitles/0011223344556677/{language}.vtt'}
+    for language in ('hi', 'ta')
+]
+CAPTIONS = {
+    'none': None,
+    'sidecar': {'mode': 'sidecar', 'tracks': TRACKS},
+    'burn_in': {'mode': 'burn_in', 'tracks': TRACKS}
+}
+CASES = [
+    (packaging, ratio, captions)
+    for packaging in PACKAGINGS
+    for ratio in job_settings.ASPECT_RATIO_CONFIGS
+    for captions in CAPTIONS
+]
+
+
+@pytest.mark.parametrize('packaging,ratio,captions', CASES)
+def test_job_settings_match_golden(packaging, ratio, captions):
+    settings = job_settings.build_job_settings(
+        MEDIA_URI, [ratio], OUTPUT_BUCKET, profiles.get_profile(PACKAGINGS[packaging]),
+        SOURCE_HASH, CAPTIONS[captions]
+    )
+    path = GOLDEN_DIR / f"{packaging}_{ratio.replace(':', 'x')}_{captions}.json"
+    rendered = json.dumps(settings, indent=2, sort_keys=True) + '\n'
+    if os.environ.get('UPDATE_GOLDEN'):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(rendered)
+    assert json.loads(rendered) == json.loads(path.read_text()), f'{path.name} differs from the built settings'
@@ -0,0 +1,73 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import function_module, load_function
+
+ledger = function_module('platform_distributor', 'ledger')
+
+LEDGER_TABLE = 'SanchaarDeliveryLedger-test'
+MEDIA_URLS = {'9:16': 'https://cdn.test/video.mp4'}
+
+
+@pytest.fixture
+def app():
+    with mock_aws():
+        client = boto3.client('dynamodb')
+        client.create_table(
+            TableName=LEDGER_TABLE,
+            BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': 'delivery_key', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'delivery_key', 'KeyType': 'HASH'}]
+        )
+        module = load_function('platform_distributor')
+        module.get_ledger = lambda: ledger.DeliveryLedger(LEDGER_TABLE, client=client)
+        yield module
+
+
+def variant(language, recipient='919000000000'):
+    return {'language': language, 'recipient': recipient, 'text': f'text {language}'}
+
+
+def sender(sent, fail_after=None):
+    """Distributor stand-in that reports each row through the engine as it finishes"""
+    def distributor(variants, media_urls, engine):
+        rows = []
+        for item in variants:
+            if fail_after is not None and len(rows) == fail_after:
+                raise RuntimeError('distributor crashed')
+            sent.append(item['language'])
+            row = {'language': item['language'], 'status': 200, 'message_id': f"m-{item['language']}"}
+            engine.finished(item, row)
+            rows.append(row)
+        return rows
+    return distributor
+
+
+def engine():
+    return function_module('platform_distributor', 'delivery').DeliveryEngine('whatsapp')
+
+
+def test_identical_variants_in_one_batch_are_sent_once(app):
+    sent = []
+    rows = app.distribute(sender(sent), 'content-1', 'whatsapp',
+                          [variant('hi'), variant('hi'), variant('ta')], MEDIA_URLS, engine())
+
+    assert sent == ['hi', 'ta']
+    assert [row['message_id'] for row in rows] == ['m-hi', 'm-hi', 'm-ta']
+    assert all(not row.get('error') for row in rows)
+
+
+def test_rows_finished_before_a_crash_are_recorded(app):
+    sent = []
+    variants = [variant('hi'), variant('ta'), variant('te')]
+    with pytest.raises(RuntimeError):
+        app.distribute(sender(sent, fail_after=1), 'content-1', 'whatsapp', variants, MEDIA_URLS, engine())
+
+    # The retry skips the recorded delivery and sends the variants the crash left unsent
+    retried = []
+    rows = app.distribute(sender(retried), 'content-1', 'whatsapp', variants, MEDIA_URLS, engine())
+    assert sent == ['hi'] and retried == ['ta', 'te']
+    assert rows[0]['deduplicated'] and rows[0]['message_id'] == 'm-hi'
+    assert [row['message_id'] for row in rows[1:]] == ['m-ta', 'm-te']
+    assert all(not row.get('error') for row in rows)
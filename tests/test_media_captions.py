@@ -0,0 +1,87 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, FIXTURES_DIR, load_function
+
+INGESTION_BUCKET = DEFAULT_ENV['INGESTION_BUCKET']
+OUTPUT_BUCKET = DEFAULT_ENV['OUTPUT_BUCKET']
+VIDEO_KEY = 'media-uploads/video/offer.mp4'
+TRANSCRIPT_KEY = 'transcripts/6f1c1d2e-4b7a-4f7e-9d55-0c3e2f9a8b10.json'
+
+
+class MediaConvert:
+    def __init__(self):
+        self.jobs = []
+
+    def create_job(self, Role, Settings, UserMetadata=None):
+        self.jobs.append(Settings)
+        return {'Job': {'Id': f'job-{len(self.jobs)}'}}
+
+
+class Rekognition:
+    def detect_faces(self, **kwargs):
+        return {'FaceDetails': []}
+
+    def detect_text(self, **kwargs):
+        return {'TextDetections': []}
+
+    def detect_moderation_labels(self, **kwargs):
+        return {'ModerationLabels': []}
+
+
+@pytest.fixture
+def media(monkeypatch):
+    monkeypatch.setenv('MEDIACONVERT_ROLE', 'arn:aws:iam::123456789012:role/mediaconvert-test')
+    monkeypatch.setenv('ENCODING_PROFILE', 'bharat-abr')
+    with mock_aws():
+        s3 = boto3.client('s3')
+        for bucket in (INGESTION_BUCKET, OUTPUT_BUCKET):
+            s3.create_bucket(Bucket=bucket, CreateBucketConfiguration={'LocationConstraint': 'ap-south-1'})
+        s3.put_object(Bucket=INGESTION_BUCKET, Key=VIDEO_KEY, Body=b'video')
+        s3.put_object(Bucket=INGESTION_BUCKET, Key=f'keyframes/{VIDEO_KEY}/frame-0.jpg', Body=b'jpeg')
+        s3.put_object(Bucket=OUTPUT_BUCKET, Key=TRANSCRIPT_KEY,
+                      Body=(FIXTURES_DIR / 'transcript_hi.json').read_bytes())
+
+        app = load_function('media_convert')
+        import clients
+        mediaconvert = MediaConvert()
+        monkeypatch.setattr(clients, '_clients', {'s3': s3, 'mediaconvert': mediaconvert,
+                                                  'rekognition': Rekognition()})
+        yield app, mediaconvert
+
+
+def test_transcript_and_transcreations_become_caption_tracks(media):
+    app, mediaconvert = media
+    response = app.lambda_handler({
+        'media_uri': f's3://{INGESTION_BUCKET}/{VIDEO_KEY}',
+        'aspect_ratios': ['9:16'],
+        'subtitle_languages': ['hi', 'ta'],
+        'transcript_uri': f's3://{OUTPUT_BUCKET}/{TRANSCRIPT_KEY}',
+        'source_language': 'hi-IN',
+        # The state machine's transcreations: agent answers in target-language order
+        'subtitle_texts': [{'language': 'ta', 'text': 'இன்று புதிய பண்டிகை சலுகை. அனைவருக்கும் தள்ளுபடி.'}]
+    }, None)
+
+    assert response['statusCode'] == 200, response['body']
+    assert [track['language'] for track in json.loads(response['body'])['subtitles']] == ['hi', 'ta']
+
+    settings, = mediaconvert.jobs
+    selectors = settings['Inputs'][0]['CaptionSelectors']
+    assert set(selectors) == {'Captions hi', 'Captions ta'}
+    assert all(selector['SourceSettings']['SourceType'] == 'SRT' for selector in selectors.values())
+
+    ladder = next(group for group in settings['OutputGroups']
+                  if group['OutputGroupSettings']['Type'] == 'HLS_GROUP_SETTINGS')
+    captions = [description for output in ladder['Outputs'] for description in output.get('CaptionDescriptions', [])]
+    assert [(caption['CaptionSelectorName'], caption['DestinationSettings']['DestinationType'])
+            for caption in captions] == [('Captions hi', 'WEBVTT'), ('Captions ta', 'WEBVTT')]
+
+    s3 = boto3.client('s3')
+    for selector in selectors.values():
+        bucket, key = selector['SourceSettings']['FileSourceSettings']['SourceFile'][5:].split('/', 1)
+        srt = s3.get_object(Bucket=bucket, Key=key)
+        assert srt['ContentType'] == 'application/x-subrip; charset=utf-8'
+        assert srt['Body'].read().decode('utf-8').startswith('1\n00:00:')
@@ -0,0 +1,110 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import load_function
+from sanchaar_common import status_aggregate
+
+TABLE = 'SanchaarStatusAggregate-test'
+VERSION = 1_800_000_000
+
+
+def image(status=None, delivery_counts=None, chunk=0):
+    item = {'content_id': {'S': 'c-1'}, 'version': {'N': str(VERSION + chunk / 1000)}}
+    if status:
+        item['status'] = {'S': status}
+    if delivery_counts:
+        item['delivery_counts'] = {'M': {key: {'N': str(count)} for key, count in delivery_counts.items()}}
+    return item
+
+
+def record(event_id, old=None, new=None, seconds=90):
+    change = {'ApproximateCreationDateTime': VERSION + seconds}
+    if old:
+        change['OldImage'] = old
+    if new:
+        change['NewImage'] = new
+    return {'eventID': event_id, 'eventName': 'MODIFY' if old and new else 'INSERT' if new else 'REMOVE',
+            'dynamodb': change}
+
+
+def test_status_transition_moves_one_count_and_observes_latency():
+    counters, latency = status_aggregate.batch_delta([
+        record('e1', new=image('processing'), seconds=5),
+        record('e2', old=image('processing'), new=image('completed'), seconds=90)
+    ])
+    assert counters == {'status#completed': 1}
+    window = (VERSION + 90) // status_aggregate.LATENCY_WINDOW_SECONDS
+    assert latency == {window: {'le_120': 1}}
+
+
+def test_rerecorded_delivery_counts_replace_the_earlier_ones():
+    before = {'whatsapp#hi#delivered': 2, 'whatsapp#ta#failed': 1}
+    after = {'whatsapp#hi#delivered': 3, 'whatsapp#ta#delivered': 1}
+    counters, latency = status_aggregate.batch_delta([
+        record('e1', old=image('completed', before), new=image('completed', after))
+    ])
+    assert counters == {'delivery#whatsapp#delivered': 2, 'delivery#whatsapp#failed': -1,
+                        'language#hi#delivered': 1, 'language#ta#delivered': 1, 'language#ta#failed': -1}
+    # Already terminal before the change, so no second latency observation
+    assert latency == {}
+
+
+def test_chunk_items_contribute_nothing():
+    assert status_aggregate.contribution(status_aggregate.image_attributes(image(chunk=1))) == {}
+    assert status_aggregate.batch_delta([record('e1', new=image(chunk=1))]) == ({}, {})
+
+
+@pytest.fixture
+def aggregate(monkeypatch):
+    monkeypatch.setattr(status_aggregate, 'STATUS_AGGREGATE_TABLE', TABLE)
+    with mock_aws():
+        client = boto3.client('dynamodb')
+        client.create_table(
+            TableName=TABLE,
+            BillingMode='PAY_PER_REQUEST',
+            AttributeDefinitions=[{'AttributeName': 'aggregate_id', 'AttributeType': 'S'}],
+            KeySchema=[{'AttributeName': 'aggregate_id', 'KeyType': 'HASH'}]
+        )
+        monkeypatch.setattr(status_aggregate, '_clients', {'dynamodb': client})
+        yield client
+
+
+def test_redelivered_batch_is_applied_once(aggregate):
+    records = [record('e1', new=image('processing')),
+               record('e2', old=image('processing'), new=image('completed', {'sms#hi#delivered': 4}))]
+
+    assert status_aggregate.apply_records(records) == (2, 0)
+    assert status_aggregate.apply_records(records) == (0, 2)
+
+    totals = status_aggregate.read_totals()
+    assert totals['revision'] == 1
+    assert totals['counters'] == {'status#completed': 1, 'delivery#sms#delivered': 4, 'language#hi#delivered': 4}
+    assert totals['last_delta'] == status_aggregate.batch_delta(records)[0]
+
+
+def test_bisected_and_resized_retries_apply_only_new_records(aggregate, monkeypatch):
+    monkeypatch.setattr(status_aggregate, 'TRANSACT_RECORDS', 2)
+    records = [record(f'e{index}', new=image('processing')) for index in range(5)]
+
+    assert status_aggregate.apply_records(records[:3]) == (3, 0)
+    # The first half of a bisected retry, then a retry grown by newer records
+    assert status_aggregate.apply_records(records[:2]) == (0, 2)
+    assert status_aggregate.apply_records(records[1:]) == (2, 2)
+    assert status_aggregate.read_totals()['counters'] == {'status#processing': 5}
+
+
+def test_client_ahead_of_the_aggregate_gets_no_changes(aggregate, monkeypatch):
+    app = load_function('status_aggregator')
+    monkeypatch.setattr(app, 'EVENTS_WAIT_SECONDS', 0.05)
+    monkeypatch.setattr(app, 'EVENTS_POLL_SECONDS', 0.01)
+    status_aggregate.apply_batch('e1-e1', {'status#processing': 1}, {})
+
+    assert app.feed_events(status_aggregate.read_totals(), 5) == ': no changes\n\n'
+    response = app.events_handler({'headers': {'Last-Event-ID': '5'}}, None)
+    assert response['body'].endswith(': no changes\n\n')
+
+    snapshot = app.events_handler({'headers': {}}, None)['body']
+    assert json.loads(snapshot.split('data: ')[1])['counters'] == {'status#processing': 1}
@@ -0,0 +1,87 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from _lambda import DEFAULT_ENV, load_function
+
+OUTPUT_BUCKET = DEFAULT_ENV['OUTPUT_BUCKET']
+CONTENT_ID = '6f1c1d2e-4b7a-4f7e-9d55-0c3e2f9a8b10'
+JOB_NAME = f'sanchaar-{CONTENT_ID}'
+
+
+class Transcribe:
+    """Transcribe stand-in with scripted job statuses"""
+
+    def __init__(self, status, failed_chunks=()):
+        self.status = status
+        self.failed_chunks = list(failed_chunks)
+
+    def get_transcription_job(self, TranscriptionJobName):
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName,
+                                     'TranscriptionJobStatus': self.status, 'FailureReason': 'bad audio'}}
+
+    def list_transcription_jobs(self, JobNameContains, Status):
+        return {'TranscriptionJobSummaries': [{'TranscriptionJobName': name} for name in self.failed_chunks]}
+
+
+@pytest.fixture
+def app():
+    with mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=OUTPUT_BUCKET, CreateBucketConfiguration={'LocationConstraint': 'ap-south-1'})
+        module = load_function('voice_processor')
+        module.s3 = s3
+        from sanchaar_common import claim_check
+        claim_check._s3 = s3
+        yield module
+
+
+def put_transcript(app, text, language_code='hi-IN'):
+    app.s3.put_object(Bucket=OUTPUT_BUCKET, Key=f'transcripts/{CONTENT_ID}.json', Body=json.dumps({
+        'results': {'transcripts': [{'transcript': text}], 'language_code': language_code, 'items': []}
+    }).encode('utf-8'))
+
+
+def resolved(app, command):
+    return json.loads(app.transcript_handler({'command': command}, None)['body'])
+
+
+def test_fast_path_claim_check_is_resolved(app):
+    from sanchaar_common import claim_check
+    reference = claim_check.offload('नमस्ते ' * 20, 'transcripts', threshold=16)
+    claim_check._resolved.clear()
+
+    body = resolved(app, {'content_id': CONTENT_ID, 'transcript': reference, 'language_code': 'hi-IN'})
+    assert body['text'] == 'नमस्ते ' * 20
+    assert body['language_code'] == 'hi-IN' and body['transcript_uri'] is None
+
+
+def test_running_job_raises_pending(app):
+    app.transcribe = Transcribe('IN_PROGRESS')
+    with pytest.raises(app.TranscriptPending):
+        resolved(app, {'content_id': CONTENT_ID, 'transcription_job': JOB_NAME, 'status': 'initiated'})
+
+
+def test_finished_job_is_read_from_its_output(app):
+    app.transcribe = Transcribe('COMPLETED')
+    put_transcript(app, 'promote the new festival offer')
+
+    body = resolved(app, {'content_id': CONTENT_ID, 'transcription_job': JOB_NAME, 'status': 'initiated'})
+    assert body == {'content_id': CONTENT_ID, 'text': 'promote the new festival offer', 'language_code': 'hi-IN',
+                    'transcript_uri': f's3://{OUTPUT_BUCKET}/transcripts/{CONTENT_ID}.json'}
+
+
+def test_chunked_job_waits_for_the_stitched_transcript(app):
+    app.transcribe = Transcribe(None)
+    command = {'content_id': CONTENT_ID, 'transcription_job': JOB_NAME, 'transcription_chunks': 3}
+    with pytest.raises(app.TranscriptPending):
+        resolved(app, command)
+
+    put_transcript(app, 'stitched text')
+    assert resolved(app, command)['text'] == 'stitched text'
+
+    app.transcribe = Transcribe(None, failed_chunks=[f'{JOB_NAME}-c001'])
+    with pytest.raises(app.TranscriptionFailed):
+        resolved(app, command)